@@ -0,0 +1,190 @@
+"""
+並行クルー数のスケーリング ベンチマーク（asyncio vs スレッド）
+記録・再生サーバー（llm_replay.py）をLLMの代わりに起動し、N個のクルーを同時に実行して
+1つのイベントループで execute_crew_async を多重化する場合と、クルーごとにスレッドで execute_crew を実行する場合を比べる
+
+使用方法:
+    python benchmarks/bench_async_crews.py --crews 1,8,32,64 --latency 0.5
+    python benchmarks/bench_async_crews.py --crews 16 --tasks 3 --process dag --output async_crews.json
+
+計測項目:
+    wall_s            N個のクルーがすべて完了するまでの時間
+    crews_per_s       wall_s あたりの完了クルー数
+    speedup           1クルーの実行時間 × N / wall_s（理想値はN）
+    peak_threads      実行中のスレッド数の最大値（再生サーバーのスレッドを除く）
+    peak_rss_growth_mb 実行中のRSSの最大増加量
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+from llm_replay import Cassette, LatencyModel, ReplayServer
+
+MODES = ("asyncio", "threads")
+
+
+def build_crew(index: int, tasks: int, process: str) -> Dict[str, Any]:
+    """tasks個のタスクが順に前のタスクの出力を受け取るクルー"""
+    return {
+        "name": f"bench-async-{index}",
+        "process": process,
+        "verbose": False,
+        "agents": [
+            {"role": f"Worker {i}", "goal": f"Complete step {i}", "backstory": "A benchmark agent",
+             "verbose": False, "maxIter": 3}
+            for i in range(tasks)
+        ],
+        "tasks": [
+            {"name": f"step_{i}", "description": f"Produce the output for step {i} of crew {index}.",
+             "expectedOutput": "A short paragraph", "context": [i - 1] if i else []}
+            for i in range(tasks)
+        ],
+    }
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _Sampler:
+    """実行中のスレッド数とRSSを一定間隔で記録し、最大値を保持する"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # サンプラー自身と再生サーバーのリクエスト処理スレッドは数えない
+            threads = sum(1 for t in threading.enumerate()
+                          if t is not self._thread and "process_request_thread" not in t.name)
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss = max(self.peak_rss, _rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "_Sampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_asyncio(engine, crews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def run():
+        return await asyncio.gather(*(engine.job_engine().execute_crew_async(crew) for crew in crews))
+    return asyncio.run(run())
+
+
+def run_threads(engine, crews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=len(crews)) as executor:
+        return list(executor.map(lambda crew: engine.job_engine().execute_crew(crew), crews))
+
+
+def bench_mode(engine, server: ReplayServer, mode: str, crews: List[Dict[str, Any]], single_s: float) -> Dict[str, Any]:
+    server.reset_stats()
+    rss_before = _rss_mb()
+    runner = run_asyncio if mode == "asyncio" else run_threads
+    with _Sampler() as sampler, contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        results = runner(engine, crews)
+        wall = time.perf_counter() - start
+
+    errors = [r.get("error") for r in results if not r.get("success")]
+    llm = server.stats()
+    return {
+        "crews": len(crews),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_s": round(wall, 3),
+        "crews_per_s": round(len(crews) / wall, 3),
+        "speedup": round(single_s * len(crews) / wall, 2) if single_s else None,
+        "llm_calls": llm["requests"],
+        "llm_busy_s": round(llm["busy_seconds"], 3),
+        "peak_threads": sampler.peak_threads,
+        "peak_rss_growth_mb": round(max(0.0, sampler.peak_rss - rss_before), 2),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="並行クルー数のスケーリング（asyncio vs スレッド、記録・再生LLMを使用）")
+    parser.add_argument("--crews", type=_int_list, default=[1, 8, 32], help="同時に実行するクルー数（カンマ区切り）")
+    parser.add_argument("--tasks", type=int, default=2, help="クルーあたりのタスク数")
+    parser.add_argument("--process", choices=("sequential", "dag"), default="sequential", help="クルーのプロセス")
+    parser.add_argument("--mode", action="append", choices=MODES, help="計測する実行方式（複数指定可、省略時は両方）")
+    parser.add_argument("--latency", type=float, default=0.5, help="LLMの基本遅延（秒）")
+    parser.add_argument("--synthetic-tokens", type=int, default=32, help="合成レスポンスの出力トークン数")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        Cassette(None), latency=LatencyModel(args.latency), synthetic_tokens=args.synthetic_tokens,
+    ).start()
+
+    # エンジンは接続先をimport時に読み込むため、サーバー起動後にimportする
+    os.environ["CREWAI_LLM_REPLAY_URL"] = server.url
+    os.environ.setdefault("BUILT_IN_FORGE_API_KEY", "replay")
+    os.environ.pop("CREWAI_EVENT_FD", None)
+    from crewai_engine import CrewAIEngine
+
+    engine = CrewAIEngine()
+    engine.preload()
+
+    results: Dict[str, Any] = {}
+    try:
+        # ウォームアップを兼ねて1クルーの実行時間を測る
+        with contextlib.redirect_stdout(sys.stderr):
+            engine.execute_crew(build_crew(0, args.tasks, args.process))
+            start = time.perf_counter()
+            engine.execute_crew(build_crew(0, args.tasks, args.process))
+            single_s = time.perf_counter() - start
+
+        for n in args.crews:
+            crews = [build_crew(i, args.tasks, args.process) for i in range(n)]
+            for mode in args.mode or MODES:
+                label = f"{mode}/{n}"
+                print(f"[bench] {label}", file=sys.stderr, flush=True)
+                results[label] = bench_mode(engine, server, mode, crews, single_s)
+    finally:
+        server.stop()
+
+    report = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "llm": {"latency": args.latency, "synthetic_tokens": args.synthetic_tokens},
+        "tasks_per_crew": args.tasks,
+        "process": args.process,
+        "single_crew_s": round(single_s, 3),
+        "configs": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+音声ミックスダウン（audio_mix.py）のベンチマーク
+5秒ごとのシーンにBGM（44.1kHz）・SE（48kHz）・ボイス（24kHz）を配置した合成タイムラインを作り、
+CMの長さ・ブロックサイズごとにマスターWAVを書き出して、実時間比とヒープのピークを計測する
+
+使用方法:
+    python benchmarks/bench_audio_mix.py --seconds 45,300,1800
+    python benchmarks/bench_audio_mix.py --seconds 300 --blocks 1024,4096,16384,65536 --output mix.json
+
+計測項目:
+    realtime_factor  CMの長さ / ミックスダウンの時間（大きいほど速い）
+    elapsed_s        配置・読み込み・リサンプリング・合成・書き出しの合計
+    peak_heap_mb     tracemalloc で計測したヒープのピーク（CMの長さによらず一定なら、素材と出力はストリーミングされている）
+    output_mb        マスターWAVの大きさ
+"""
+
+import os
+import sys
+import json
+import wave
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from typing import List, Dict, Any
+
+import numpy as np
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PYTHON_DIR, "cm_generator"))
+
+SCENE_SECONDS = 5
+SCENES_PER_BGM = 6
+
+
+def make_wav(path: str, seconds: float, rate: int, channels: int, freq: float, seed: int) -> str:
+    """正弦波 + ノイズの16bit WAVを1秒ずつ書き出す"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        for offset in range(0, int(seconds * rate), rate):
+            t = (offset + np.arange(min(rate, int(seconds * rate) - offset))) / rate
+            tone = 0.3 * np.sin(2 * np.pi * freq * t) + rng.normal(0, 0.02, len(t))
+            f.writeframes(np.rint(np.repeat(tone[:, None], channels, axis=1) * 32767).astype("<i2").tobytes())
+    return path
+
+
+def make_timeline(root: str, seconds: int) -> str:
+    """シーン数が長さに比例するタイムライン（素材ファイルは長さによらず共通）"""
+    make_wav(os.path.join(root, "audio", "bgm", "a.wav"), SCENE_SECONDS * SCENES_PER_BGM, 44100, 2, 220, 0)
+    make_wav(os.path.join(root, "audio", "bgm", "b.wav"), SCENE_SECONDS * SCENES_PER_BGM, 44100, 2, 330, 1)
+    make_wav(os.path.join(root, "audio", "se", "pop.wav"), 0.6, 48000, 2, 1200, 2)
+    make_wav(os.path.join(root, "audio", "se", "hum_loop.wav"), 0.5, 48000, 1, 90, 3)
+    make_wav(os.path.join(root, "audio", "voice", "line.wav"), 2.0, 24000, 1, 180, 4)
+
+    scenes = []
+    for index in range(max(1, seconds // SCENE_SECONDS)):
+        start = index * SCENE_SECONDS
+        bgm = "audio/bgm/a.wav" if index // SCENES_PER_BGM % 2 == 0 else "audio/bgm/b.wav"
+        scenes.append({
+            "id": index + 1,
+            "start": f"{start // 3600:02d}:{start // 60 % 60:02d}:{start % 60:02d}",
+            "end": f"{(start + SCENE_SECONDS) // 3600:02d}:{(start + SCENE_SECONDS) // 60 % 60:02d}:"
+                   f"{(start + SCENE_SECONDS) % 60:02d}",
+            "assets": {"bgm": bgm, "se": ["audio/se/pop.wav"] + (["audio/se/hum_loop.wav"] if index % 3 == 0 else []),
+                       "voice": ["audio/voice/line.wav"] if index % 2 == 0 else []},
+        })
+    path = os.path.join(root, f"timeline_{seconds}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"duration_seconds": len(scenes) * SCENE_SECONDS, "scenes": scenes}, f)
+    return path
+
+
+def bench(timeline_path: str, root: str, block: int) -> Dict[str, Any]:
+    import audio_mix
+
+    output_path = os.path.join(root, "master.wav")
+    tracemalloc.start()
+    try:
+        report = audio_mix.mixdown(timeline_path, root, output_path=output_path, block_frames=block)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    os.remove(output_path)
+    return {
+        "duration_s": report["duration_seconds"],
+        "clips": len(report["clips"]),
+        "elapsed_s": report["elapsed_seconds"],
+        "realtime_factor": report["realtime_factor"],
+        "peak_heap_mb": round(peak / 1024 / 1024, 1),
+        "output_mb": round(report["bytes"] / 1024 / 1024, 1),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音声ミックスダウンの実時間比とメモリ（CMの長さ・ブロックサイズ別）")
+    parser.add_argument("--seconds", type=_int_list, default=[45, 300], help="CMの長さ（秒、カンマ区切り）")
+    parser.add_argument("--blocks", type=_int_list, default=[4096, 16384], help="1ブロックのサンプル数（カンマ区切り）")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-audio-mix-")
+    results = {}
+    try:
+        for seconds in args.seconds:
+            timeline_path = make_timeline(root, seconds)
+            for block in args.blocks:
+                label = f"seconds={seconds}/block={block}"
+                print(f"[bench] {label}", file=sys.stderr, flush=True)
+                results[label] = bench(timeline_path, root, block)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "scene_seconds": SCENE_SECONDS,
+        "configs": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+フレーム合成（compositor.py）のフレームレート ベンチマーク
+合成した背景（FHD）・透明キャラクターPNG・エフェクト連番から、SequenceGeneratorTool と同じ構成
+（キャラクターは複数シーンで共通）のタイムラインを作り、プロセス数とレイヤーキャッシュの有無ごとに
+compose_timeline のfpsを計測する
+
+使用方法:
+    python benchmarks/bench_compositor.py --scenes 9 --fx-frames 8 --workers 1,2,4
+    python benchmarks/bench_compositor.py --scenes 18 --workers 4 --no-cache --output compositor.json
+
+計測項目:
+    fps              書き出したフレーム数 / 合成全体の時間（PNGのエンコード・書き込みを含む）
+    ms_per_frame     1フレームあたりの時間
+    cache_hits       デコード済みレイヤーのキャッシュヒット数（ワーカープロセスの合計）
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any
+
+import numpy as np
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PYTHON_DIR, "cm_generator"))
+
+CHARACTERS = ["protagonist/worried", "protagonist/happy", "agent_researcher/idle", "agent_writer/idle",
+              "agent_analyst/idle", "agent_designer/idle", "agent_manager/idle"]
+
+
+def _save(path: str, pixels: np.ndarray) -> None:
+    from PIL import Image
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(pixels).save(path, compress_level=1)
+
+
+def make_assets(root: str, scenes: int, char_px: int, fx_frames: int, seed: int) -> str:
+    """背景・キャラクター・エフェクト連番とタイムラインを作成し、タイムラインのパスを返す"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:1080, 0:1920].astype(np.float32)
+    for i in range(scenes):
+        # グラデーション + ノイズ（実際の背景と同程度にPNGの圧縮が効かない）
+        bg = np.stack([xx / 1920 * 255, yy / 1080 * 255, np.full_like(xx, 40 * (i % 6))], axis=-1)
+        bg += rng.normal(0, 6, bg.shape)
+        _save(os.path.join(root, "backgrounds", f"scene{i + 1}.png"), np.clip(bg, 0, 255).astype(np.uint8))
+
+    cy, cx = np.mgrid[0:char_px, 0:char_px].astype(np.float32) / char_px - 0.5
+    body = (cx ** 2 / 0.12 + cy ** 2 / 0.2) < 1.0
+    for name in CHARACTERS:
+        char = np.zeros((char_px, char_px, 4), dtype=np.uint8)
+        char[..., :3] = rng.integers(0, 256, 3)
+        char[..., 3] = body * 255
+        _save(os.path.join(root, "characters", f"{name}.png"), char)
+
+    fy, fx = np.mgrid[0:512, 0:512].astype(np.float32) / 512 - 0.5
+    radius = np.sqrt(fx ** 2 + fy ** 2)
+    for i in range(fx_frames):
+        ring = np.exp(-((radius - 0.05 - 0.4 * i / fx_frames) ** 2) / 0.002)
+        frame = np.zeros((512, 512, 4), dtype=np.uint8)
+        frame[..., :3] = (255, 230, 120)
+        frame[..., 3] = (ring * 255).astype(np.uint8)
+        _save(os.path.join(root, "effects", "energy_wave", f"frame_{i:02d}.png"), frame)
+
+    timeline = {"fps": 24, "scenes": [
+        {
+            "id": i + 1,
+            "assets": {
+                "bg": f"backgrounds/scene{i + 1}.png",
+                "char": [f"characters/{name}.png" for name in CHARACTERS[i % 3:i % 3 + 1 + (i % 2) * 3]],
+                "fx": ["effects/energy_wave/"],
+            },
+        }
+        for i in range(scenes)
+    ]}
+    path = os.path.join(root, "sequences", "timeline.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(timeline, f, ensure_ascii=False)
+    return path
+
+
+def bench(timeline: str, root: str, workers: int, cache: bool) -> Dict[str, Any]:
+    import compositor
+
+    # ワーカープロセスはspawnで起動するため、キャッシュの上限は環境変数で渡す
+    cache_mb = str(compositor.LAYER_CACHE_MB if cache else 0)
+    os.environ["CM_LAYER_CACHE_MB"] = cache_mb
+    compositor.LAYER_CACHE = compositor.LayerCache(int(float(cache_mb) * 1024 * 1024))
+    output_dir = os.path.join(root, "frames")
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    start = time.perf_counter()
+    report = compositor.compose_timeline(timeline, root, output_dir=output_dir, workers=workers)
+    wall = time.perf_counter() - start
+    return {
+        "workers": report["workers"],
+        "cache": cache,
+        "frames": report["frames"],
+        "wall_s": round(wall, 3),
+        "fps": round(report["frames"] / wall, 2),
+        "ms_per_frame": round(wall * 1000 / report["frames"], 1),
+        "cache_hits": report["cache"]["hits"],
+        "cache_misses": report["cache"]["misses"],
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フレーム合成のfps（プロセス数・レイヤーキャッシュ別）")
+    parser.add_argument("--scenes", type=int, default=9, help="シーン数")
+    parser.add_argument("--fx-frames", type=int, default=8, help="エフェクト連番のフレーム数（シーンあたりのフレーム数）")
+    parser.add_argument("--char-px", type=int, default=1024, help="キャラクターPNGの一辺（px）")
+    parser.add_argument("--workers", type=_int_list, default=[1, 2, 4], help="合成するプロセス数（カンマ区切り）")
+    parser.add_argument("--no-cache", action="store_true", help="レイヤーキャッシュなしの計測も行う")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--dir", type=str, default=None, help="素材とフレームを作成するディレクトリ")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="bench-compositor-")
+    try:
+        print("[bench] generating assets", file=sys.stderr, flush=True)
+        timeline = make_assets(root, args.scenes, args.char_px, args.fx_frames, args.seed)
+        results = {}
+        for workers in args.workers:
+            for cache in ((True, False) if args.no_cache else (True,)):
+                label = f"workers={workers}/{'cache' if cache else 'no-cache'}"
+                print(f"[bench] {label}", file=sys.stderr, flush=True)
+                results[label] = bench(timeline, root, workers, cache)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "scenes": args.scenes,
+        "frames_per_scene": args.fx_frames,
+        "frame_size": [1920, 1080],
+        "configs": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
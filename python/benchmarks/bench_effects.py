@@ -0,0 +1,124 @@
+"""
+エフェクト連番生成（effects.py）のベンチマーク
+tasks.yaml の generate_effects の6種類を既定のフレーム数で生成し、解像度・プロセス数ごとに
+全連番の生成時間とフレームレート、エフェクトごとのシミュレーション・ラスタライズ・エンコードの時間を計測する
+
+使用方法:
+    python benchmarks/bench_effects.py --sizes 512,1024 --workers 1,2,4
+    python benchmarks/bench_effects.py --effects sparkles,confetti --frames 48 --output effects.json
+
+計測項目:
+    wall_s           全エフェクトの連番を書き出すまでの時間
+    fps              書き出したフレーム数 / wall_s
+    simulate_ms      シミュレーション（全フレーム分）
+    rasterize_ms     1フレームあたりのラスタライズ
+    encode_ms        1フレームあたりのPNGエンコード・書き込み
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PYTHON_DIR, "cm_generator"))
+
+
+def profile_effect(spec: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """1種類のエフェクトを1プロセスで生成し、段階ごとの時間を返す"""
+    import effects
+    from imaging import to_uint8, write_png
+
+    start = time.perf_counter()
+    frames = effects.simulate(spec)
+    simulate = time.perf_counter() - start
+
+    rasterize = encode = 0.0
+    for index, layers in enumerate(frames):
+        start = time.perf_counter()
+        pixels = to_uint8(effects.rasterize(layers, spec["size"]), straight_alpha=True)
+        rasterize += time.perf_counter() - start
+        start = time.perf_counter()
+        write_png(os.path.join(directory, f"{spec['name']}_{index:04d}.png"), pixels)
+        encode += time.perf_counter() - start
+
+    return {
+        "frames": len(frames),
+        "particles": sum(len(layer["x"]) for layers in frames for layer in layers) // len(frames),
+        "simulate_ms": round(simulate * 1000, 2),
+        "rasterize_ms": round(rasterize * 1000 / len(frames), 2),
+        "encode_ms": round(encode * 1000 / len(frames), 2),
+    }
+
+
+def bench(specs: List[Dict[str, Any]], root: str, workers: int) -> Dict[str, Any]:
+    import effects
+
+    output_dir = os.path.join(root, f"effects-{workers}")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    start = time.perf_counter()
+    report = effects.render_effects(specs, output_dir, workers=workers)
+    wall = time.perf_counter() - start
+    return {
+        "workers": report["workers"],
+        "frames": report["frames"],
+        "wall_s": round(wall, 3),
+        "fps": round(report["frames"] / wall, 2),
+        "bytes": sum(effect["bytes"] for effect in report["effects"]),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    import effects
+
+    parser = argparse.ArgumentParser(description="エフェクト連番の生成時間（解像度・プロセス数別）")
+    parser.add_argument("--effects", type=str, default=",".join(effects.EFFECTS), help="エフェクト名（カンマ区切り）")
+    parser.add_argument("--sizes", type=_int_list, default=[512, 1024], help="連番の一辺（px、カンマ区切り）")
+    parser.add_argument("--frames", type=int, default=0, help="フレーム数（0でエフェクトの既定値）")
+    parser.add_argument("--workers", type=_int_list, default=[1, 2, 4], help="書き出すプロセス数（カンマ区切り）")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    names = [name for name in args.effects.split(",") if name]
+    root = tempfile.mkdtemp(prefix="bench-effects-")
+    results = {}
+    try:
+        for size in args.sizes:
+            specs = [effects.effect_spec(name, size=size, frames=args.frames) for name in names]
+            print(f"[bench] size={size} profile", file=sys.stderr, flush=True)
+            profile_dir = os.path.join(root, "profile")
+            os.makedirs(profile_dir, exist_ok=True)
+            results[str(size)] = {
+                "effects": {spec["name"]: profile_effect(spec, profile_dir) for spec in specs},
+                "configs": {},
+            }
+            for workers in args.workers:
+                print(f"[bench] size={size} workers={workers}", file=sys.stderr, flush=True)
+                results[str(size)]["configs"][f"workers={workers}"] = bench(specs, root, workers)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "effects": names,
+        "sizes": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+実行エンジン オフラインベンチマーク
+記録・再生サーバー（llm_replay.py）をLLMの代わりに起動し、幅（1段あたりのタスク数）と深さ（段数）を
+変えたクルーを CrewAIEngine.execute_crew で実行して、スループット・レイテンシ・メモリ・フェーズ別の時間を計測する
+
+使用方法:
+    python benchmarks/bench_engine.py --runs 5 --widths 1,4 --depths 1,3 --latency 0.05 --jitter 0.01
+    python benchmarks/bench_engine.py --cassette session.jsonl.gz --recorded-latency --process sequential
+    python benchmarks/bench_engine.py --runs 5 --output engine.json
+    python benchmarks/bench_engine.py --runs 5 --baseline engine.json
+
+各段のタスクは前の段の全タスクをcontextに持つ。sequential・hierarchicalではタスクを順に実行し、
+dagでは同じ段のタスクを並列に実行する。フェーズ別の時間は以下の通り:
+    build_ms    エージェント・タスクの作成
+    llm_ms      LLMサーバーが応答中だった時間（並列呼び出しの重なりは1回分）
+    overhead_ms 実行時間のうちLLM待ち以外（CrewAI・エンジン・HTTPクライアントの処理）
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import contextlib
+from typing import List, Dict, Any, Optional
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+from llm_replay import Cassette, LatencyModel, ReplayServer
+
+PROCESSES = ("sequential", "hierarchical", "dag")
+
+
+def build_crew(process: str, width: int, depth: int) -> Dict[str, Any]:
+    """幅 × 深さのタスクを持つクルー定義（エンジンはi番目のタスクをi番目のエージェントに割り当てる）"""
+    agents = []
+    tasks = []
+    for level in range(depth):
+        previous = list(range((level - 1) * width, level * width)) if level else []
+        for column in range(width):
+            name = f"step_{level}_{column}"
+            agents.append({
+                "role": f"Worker {level}-{column}",
+                "goal": f"Complete {name}",
+                "backstory": "A benchmark agent",
+                "verbose": False,
+                "maxIter": 3,
+            })
+            tasks.append({
+                "name": name,
+                "description": f"Produce the output for {name}.",
+                "expectedOutput": "A short paragraph",
+                "context": previous,
+            })
+    crew = {
+        "name": f"bench-{process}-{width}x{depth}",
+        "process": process,
+        "verbose": False,
+        "agents": agents,
+        "tasks": tasks,
+        "maxConcurrency": width,
+    }
+    if process == "hierarchical":
+        crew["managerLlmConfig"] = {"model": "gpt-4.1-mini", "temperature": 0}
+    return crew
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _peak_rss_mb() -> float:
+    # Linuxではキロバイト単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class _PhaseTimer:
+    """エンジンのエージェント・タスク作成メソッドをラップして所要時間を合計する"""
+
+    def __init__(self, engine):
+        self.build = 0.0
+        for name in ("_create_agent", "_create_task"):
+            setattr(engine, name, self._wrap(getattr(engine, name)))
+
+    def _wrap(self, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.build += time.perf_counter() - start
+        return timed
+
+    def reset(self) -> None:
+        self.build = 0.0
+
+
+def bench_config(engine, timer: _PhaseTimer, server: ReplayServer, crew: Dict[str, Any], runs: int) -> Dict[str, Any]:
+    """同じクルーをruns回実行（1回目のウォームアップは除外）"""
+    samples = []
+    calls = 0
+    errors = []
+    rss_before = _rss_mb()
+    for i in range(runs + 1):
+        server.cassette.rewind()
+        server.reset_stats()
+        timer.reset()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            result = engine.execute_crew(crew)
+        wall = time.perf_counter() - start
+        if i == 0:
+            continue
+        if not result.get("success"):
+            errors.append(result.get("error"))
+            continue
+        llm = server.stats()
+        if not llm["requests"]:
+            # LLMが再生サーバー以外（本番のAPIなど）に接続している
+            raise RuntimeError(f"{crew['name']}: no LLM request reached the replay server at {server.url}")
+        calls += llm["requests"]
+        samples.append({
+            "wall": wall,
+            "build": timer.build,
+            "llm": llm["busy_seconds"],
+            "overhead": max(0.0, wall - timer.build - llm["busy_seconds"]),
+        })
+
+    if not samples:
+        return {"error": errors[0] if errors else "no successful runs"}
+
+    walls = [s["wall"] for s in samples]
+    total = sum(walls)
+    return {
+        "tasks": len(crew["tasks"]),
+        "runs": len(samples),
+        "errors": len(errors),
+        "throughput_crews_per_s": round(len(samples) / total, 3),
+        "throughput_llm_calls_per_s": round(calls / total, 2),
+        "llm_calls_per_run": round(calls / len(samples), 1),
+        "p50_ms": round(_percentile(walls, 50) * 1000, 2),
+        "p99_ms": round(_percentile(walls, 99) * 1000, 2),
+        "phases_ms": {
+            phase: round(statistics.mean(s[phase] for s in samples) * 1000, 2)
+            for phase in ("build", "llm", "overhead")
+        },
+        "rss_growth_mb": round(_rss_mb() - rss_before, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """ベースラインとの差分（p50・p99・オーバーヘッドの比率、1より大きければ遅くなった）"""
+    diff = {}
+    for label, current in report["configs"].items():
+        previous = baseline.get("configs", {}).get(label)
+        if not previous or "p50_ms" not in previous or "p50_ms" not in current:
+            continue
+        diff[label] = {
+            "p50_ratio": round(current["p50_ms"] / previous["p50_ms"], 3) if previous["p50_ms"] else None,
+            "p99_ratio": round(current["p99_ms"] / previous["p99_ms"], 3) if previous["p99_ms"] else None,
+            "overhead_ms": round(current["phases_ms"]["overhead"] - previous["phases_ms"]["overhead"], 2),
+        }
+    return diff
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="実行エンジンのオフラインベンチマーク（記録・再生LLMを使用）")
+    parser.add_argument("--runs", type=int, default=5, help="構成ごとの計測回数")
+    parser.add_argument("--widths", type=_int_list, default=[1, 4], help="1段あたりのタスク数（カンマ区切り）")
+    parser.add_argument("--depths", type=_int_list, default=[1, 3], help="段数（カンマ区切り）")
+    parser.add_argument("--process", action="append", choices=PROCESSES, help="計測するプロセス（複数指定可、省略時は全て）")
+    parser.add_argument("--cassette", type=str, default=None, help="再生するカセット（省略時は合成レスポンス）")
+    parser.add_argument("--latency", type=float, default=0.05, help="LLMの基本遅延（秒）")
+    parser.add_argument("--per-token", type=float, default=0.0, help="出力トークンあたりの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のジッター幅（±秒）")
+    parser.add_argument("--recorded-latency", action="store_true", help="カセットに記録されたレイテンシで再生する")
+    parser.add_argument("--seed", type=int, default=0, help="ジッターの乱数シード")
+    parser.add_argument("--synthetic-tokens", type=int, default=64, help="合成レスポンスの出力トークン数")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    parser.add_argument("--baseline", type=str, default=None, help="比較対象の過去の結果JSON")
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        Cassette(args.cassette),
+        latency=LatencyModel(args.latency, args.per_token, args.jitter, args.seed, recorded=args.recorded_latency),
+        synthetic_tokens=args.synthetic_tokens,
+    ).start()
+
+    # エンジンは接続先をimport時に読み込むため、サーバー起動後にimportする
+    os.environ["CREWAI_LLM_REPLAY_URL"] = server.url
+    os.environ.setdefault("BUILT_IN_FORGE_API_KEY", "replay")
+    os.environ.pop("CREWAI_EVENT_FD", None)
+    from crewai_engine import CrewAIEngine
+
+    engine = CrewAIEngine()
+    timer = _PhaseTimer(engine)
+
+    configs: Dict[str, Any] = {}
+    try:
+        for process in args.process or PROCESSES:
+            for width in args.widths:
+                for depth in args.depths:
+                    label = f"{process}/{width}x{depth}"
+                    print(f"[bench] {label}", file=sys.stderr, flush=True)
+                    configs[label] = bench_config(engine, timer, server, build_crew(process, width, depth), args.runs)
+    finally:
+        server.stop()
+
+    report: Dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "llm": {
+            "source": args.cassette or "synthetic",
+            "latency": args.latency,
+            "per_token": args.per_token,
+            "jitter": args.jitter,
+            "seed": args.seed,
+        },
+        "configs": configs,
+    }
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["diff"] = compare(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in report.items() if k != "diff"}, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+画像保存のメモリベンチマーク
+DALL-E互換のb64_jsonレスポンスを返すローカルサーバーに対して、
+従来方式（response.json() + b64decode）とストリーミング方式のピークRSSを比較する
+
+使用方法:
+    python benchmarks/bench_image_memory.py --size-mb 6 --assets 4
+
+各方式は別プロセスで実行し、import後のRSSを基準としたピークRSSの増分を素材数で割って報告する。
+"""
+
+import os
+import sys
+import json
+import base64
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CM_GENERATOR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cm_generator")
+
+
+def _make_handler(payload: bytes):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def _peak_rss_kb() -> int:
+    # Linuxではキロバイト単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_child(mode: str, url: str, assets: int, output_dir: str) -> None:
+    """子プロセス: 指定方式で素材を並列保存し、ピークRSSの増分を出力"""
+    import requests
+    sys.path.insert(0, CM_GENERATOR_DIR)
+    from streaming import stream_b64_json_field
+
+    def buffered(path: str):
+        response = requests.post(url, json={}, timeout=120)
+        response.raise_for_status()
+        image_b64 = response.json()["data"][0]["b64_json"]
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(image_b64))
+
+    def streaming(path: str):
+        with requests.post(url, json={}, timeout=120, stream=True) as response:
+            response.raise_for_status()
+            stream_b64_json_field(response, path)
+
+    func = buffered if mode == "buffered" else streaming
+    baseline = _peak_rss_kb()
+
+    threads = [
+        threading.Thread(target=func, args=(os.path.join(output_dir, f"{mode}_{i}.png"),))
+        for i in range(assets)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    peak_delta = _peak_rss_kb() - baseline
+    print(json.dumps({"mode": mode, "peak_rss_delta_mb": round(peak_delta / 1024, 2)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画像保存のピークRSS比較")
+    parser.add_argument("--size-mb", type=float, default=6.0, help="デコード後の画像サイズ（MB）")
+    parser.add_argument("--assets", type=int, default=4, help="同時に保存する素材数")
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--url", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.url, args.assets, args.output_dir)
+        return
+
+    image = os.urandom(int(args.size_mb * 1024 * 1024))
+    payload = json.dumps({"created": 0, "data": [{"b64_json": base64.b64encode(image).decode("ascii")}]}).encode()
+    del image
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(payload))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/images/generations"
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for mode in ("buffered", "streaming"):
+            completed = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--url", url,
+                 "--assets", str(args.assets), "--output-dir", output_dir],
+                capture_output=True, text=True, check=True,
+            )
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])["peak_rss_delta_mb"]
+    server.shutdown()
+
+    report = {
+        "image_size_mb": args.size_mb,
+        "concurrent_assets": args.assets,
+        "peak_rss_delta_mb": results,
+        "peak_rss_per_asset_mb": {mode: round(mb / args.assets, 2) for mode, mb in results.items()},
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+import時間プロファイル ベンチマーク
+各エントリーポイントを新しいプロセスで `python -X importtime` 付きでimportし、
+合計import時間とトップレベルパッケージ別の内訳を集計する
+
+使用方法:
+    python benchmarks/bench_import_time.py --runs 5 --output import_time.json
+    python benchmarks/bench_import_time.py --runs 5 --baseline import_time_prev.json
+
+--output で保存したJSONを次のリリースで --baseline に渡すと、ターゲット別・パッケージ別の差分を表示する。
+
+計測例（Python 3.11.7・crewai 1.8.0・1CPU、--runs 5 の中央値）:
+    requests / httpx を tools.py・transport.py の先頭でimportしていた場合 → 使用する時点までimportする場合
+    cm_transport  164 ms（requests・urllib3・charset_normalizer を含む） → 99 ms（HTTPライブラリなし）
+    cm_tools      1665 ms → 1792 ms（差は計測のばらつき。crewai.tools 自体が requests と httpx をimportするため、
+                  BaseTool を継承するツールモジュールの合計は変わらない）
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import List, Dict, Any, Optional
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CM_DIR = os.path.join(PYTHON_DIR, "cm_generator")
+
+# ラベル → (作業ディレクトリ, importするモジュール)
+TARGETS = {
+    "engine": (PYTHON_DIR, "crewai_engine"),
+    "cm_main": (CM_DIR, "main"),
+    "cm_plan": (CM_DIR, "plan"),
+    "cm_tools": (CM_DIR, "tools"),
+    "cm_transport": (CM_DIR, "transport"),
+}
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """
+    -X importtime の出力（"import time: self [us] | cumulative | imported package"）を解析
+    合計はネストしていない（インデントのない）行のcumulativeの和
+    """
+    total_us = 0
+    by_package: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        module = name.strip()
+        if not name[1:].startswith(" "):
+            total_us += cumulative_us
+        package = module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    return {"total_us": total_us, "by_package": by_package}
+
+
+def measure(cwd: str, module: str) -> Dict[str, Any]:
+    """新しいプロセスでモジュールを1回importして計測"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    result = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        error = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        result["error"] = error[-1] if error else f"exit code {proc.returncode}"
+    return result
+
+
+def bench_target(cwd: str, module: str, runs: int, top: int) -> Dict[str, Any]:
+    # 1回目はバイトコード生成を含むため捨てる
+    measure(cwd, module)
+    samples = [measure(cwd, module) for _ in range(runs)]
+    errors = [s["error"] for s in samples if "error" in s]
+    if errors:
+        return {"error": errors[0]}
+
+    totals = [s["total_us"] / 1000 for s in samples]
+    packages = {}
+    for package in samples[0]["by_package"]:
+        packages[package] = round(statistics.median(s["by_package"].get(package, 0) for s in samples) / 1000, 2)
+    heaviest = dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top])
+
+    return {
+        "median_ms": round(statistics.median(totals), 2),
+        "min_ms": round(min(totals), 2),
+        "max_ms": round(max(totals), 2),
+        "top_packages_ms": heaviest,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """ベースラインとの差分（正の値は遅くなったことを示す）"""
+    diff = {}
+    for label, current in report["targets"].items():
+        previous = baseline.get("targets", {}).get(label)
+        if not previous or "median_ms" not in previous or "median_ms" not in current:
+            continue
+        packages = {}
+        for package in set(current["top_packages_ms"]) | set(previous["top_packages_ms"]):
+            delta = current["top_packages_ms"].get(package, 0) - previous["top_packages_ms"].get(package, 0)
+            if abs(delta) >= 1:
+                packages[package] = round(delta, 2)
+        diff[label] = {
+            "median_ms": round(current["median_ms"] - previous["median_ms"], 2),
+            "ratio": round(current["median_ms"] / previous["median_ms"], 3) if previous["median_ms"] else None,
+            "packages_ms": dict(sorted(packages.items(), key=lambda item: abs(item[1]), reverse=True)),
+        }
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エントリーポイントのimport時間ベンチマーク")
+    parser.add_argument("--runs", type=int, default=5, help="ターゲットごとの計測回数")
+    parser.add_argument("--top", type=int, default=10, help="表示するパッケージ数")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="計測対象（複数指定可、省略時は全て）")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    parser.add_argument("--baseline", type=str, default=None, help="比較対象の過去の結果JSON")
+    args = parser.parse_args()
+
+    labels: List[str] = args.target or list(TARGETS)
+    report: Dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "targets": {label: bench_target(*TARGETS[label], args.runs, args.top) for label in labels},
+    }
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["diff"] = compare(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in report.items() if k != "diff"}, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+ナレッジ取り込みのベンチマーク
+合成したストーリーボード風の文書（--mb MB）を knowledge_ingest で取り込み、バッチサイズごとの
+スループット・埋め込み時間・ピークメモリ（tracemalloc）・同じ文書の再取り込み時間（重複判定のみ）と、
+取り込み後の検索レイテンシを計測する
+
+使用方法:
+    python benchmarks/bench_knowledge_ingest.py --mb 20 --batch-sizes 1,16,64,256
+    python benchmarks/bench_knowledge_ingest.py --mb 100 --batch-sizes 64 --output ingest.json
+
+文書はファイルに書き出してから読み込むため、ピークメモリは文書の大きさではなく
+読み込みバッファと1バッチ分のチャンクで決まる（--mb を増やしても変わらないことを確認できる）。
+tracemalloc は処理を大きく遅くするため、ピークメモリは時間計測とは別の取り込みで計測する
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import tracemalloc
+from typing import List, Dict, Any
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+import knowledge_ingest
+from knowledge_ingest import open_knowledge, ingest_files
+
+_SUBJECTS = ["主人公", "小人エージェント", "背景", "ロゴ", "テロップ", "BGM", "効果音", "ナレーション"]
+_ACTIONS = ["画面中央に登場する", "フェードアウトする", "3秒間表示する", "ズームインする", "左から右へ移動する",
+            "明るい色調で描く", "テンポを上げる", "ポップに弾む"]
+
+
+def write_corpus(path: str, mb: float, seed: int) -> int:
+    """シーンごとの段落を書き出す（全体をメモリに作らない）"""
+    rng = random.Random(seed)
+    target = int(mb * 1024 * 1024)
+    written = 0
+    scene = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            scene += 1
+            sentences = [f"{rng.choice(_SUBJECTS)}が{rng.choice(_ACTIONS)}。" for _ in range(rng.randint(4, 12))]
+            data = f"シーン{scene}: " + "".join(sentences) + "\n\n"
+            f.write(data)
+            written += len(data.encode("utf-8"))
+    return written
+
+
+def _peak_memory(corpus: str, directory: str, batch_size: int) -> int:
+    knowledge = open_knowledge(directory)
+    tracemalloc.start()
+    try:
+        ingest_files([corpus], knowledge, batch_size=batch_size)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        knowledge.index.close()
+
+
+def bench_batch(corpus: str, directory: str, batch_size: int, queries: int) -> Dict[str, Any]:
+    knowledge = open_knowledge(directory)
+    stats = ingest_files([corpus], knowledge, batch_size=batch_size)
+    # 2回目はすべて取り込み済みのため、チャンク分割とハッシュ・登録済み判定だけになる
+    again = ingest_files([corpus], knowledge, batch_size=batch_size)
+
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        knowledge.search(f"{_SUBJECTS[i % len(_SUBJECTS)]}が{_ACTIONS[i % len(_ACTIONS)]}", limit=5)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    knowledge.index.close()
+    peak = _peak_memory(corpus, directory + "-memory", batch_size)
+
+    return {
+        "chunks": stats["chunks"],
+        "duplicates": stats["duplicates"],
+        "embedded": stats["embedded"],
+        "batches": stats["batches"],
+        "elapsed_s": stats["elapsed_seconds"],
+        "embed_s": stats["embed_seconds"],
+        "chunks_per_s": round(stats["chunks"] / max(stats["elapsed_seconds"], 1e-9)),
+        "reingest_s": again["elapsed_seconds"],
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "search_p50_ms": round(timings[len(timings) // 2], 3),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ナレッジ取り込みのスループット・ピークメモリを計測")
+    parser.add_argument("--mb", type=float, default=20, help="合成する文書の大きさ（MB）")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 16, 64, 256], help="埋め込みのバッチサイズ（カンマ区切り）")
+    parser.add_argument("--queries", type=int, default=100, help="取り込み後の検索回数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--dir", type=str, default=None, help="文書とインデックスを作成するディレクトリ")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-knowledge-", dir=args.dir)
+    runs: Dict[str, Any] = {}
+    try:
+        corpus = os.path.join(root, "storyboard.md")
+        size = write_corpus(corpus, args.mb, args.seed)
+        for batch_size in args.batch_sizes:
+            print(f"[bench] batch_size={batch_size}", file=sys.stderr, flush=True)
+            directory = os.path.join(root, f"kb-{batch_size}")
+            runs[str(batch_size)] = bench_batch(corpus, directory, batch_size, args.queries)
+            shutil.rmtree(directory, ignore_errors=True)
+            shutil.rmtree(directory + "-memory", ignore_errors=True)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "corpus_mb": round(size / (1024 * 1024), 1),
+        "chunk_chars": knowledge_ingest.CHUNK_CHARS,
+        "overlap": knowledge_ingest.CHUNK_OVERLAP,
+        "batch_sizes": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+トランジション生成（transitions.py）のベンチマーク
+合成したFHDのシーン連番2本の間に、種類・フレーム数・ブレンドのチャンクごとにトランジションを書き出し、
+段階ごとの時間と、memmap バッファに対するヒープ（NumPyの配列を含む）のピークを計測する
+
+使用方法:
+    python benchmarks/bench_transitions.py --kinds fade,iris --frames 12,48,96
+    python benchmarks/bench_transitions.py --frames 96 --chunks 1,4,16 --output transitions.json
+    python benchmarks/bench_transitions.py --kinds iris --frames 48 --workers 1,2,4
+
+計測項目:
+    fps              書き出したフレーム数 / 全体の時間
+    load_s / blend_s / encode_s
+                     元フレームのデコード・ブレンド・PNGのエンコード
+    buffer_mb        memmap バッファ（前後のシーン・中間フレーム）の大きさ
+    peak_heap_mb     tracemalloc で計測したこのプロセスのヒープのピーク（memmap のページは含まない）
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from typing import List, Dict, Any
+
+import numpy as np
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PYTHON_DIR, "cm_generator"))
+
+
+def make_scene(directory: str, frames: int, hue: int, seed: int) -> List[str]:
+    """グラデーション + ノイズの上を四角形が動くFHD連番を作成"""
+    from PIL import Image
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:1080, 0:1920].astype(np.float32)
+    base = np.stack([xx / 1920 * 255, yy / 1080 * 255, np.full_like(xx, hue)], axis=-1)
+    base += rng.normal(0, 6, base.shape)
+    base = np.clip(base, 0, 255).astype(np.uint8)
+    paths = []
+    for index in range(frames):
+        frame = base.copy()
+        x = 200 + index * 1400 // max(frames, 1)
+        frame[400:680, x:x + 280] = (255, 240, 200)
+        path = os.path.join(directory, f"frame_{index + 1:04d}.png")
+        Image.fromarray(frame).save(path, compress_level=1)
+        paths.append(path)
+    return paths
+
+
+def bench(outgoing: List[str], incoming: List[str], kind: str, frames: int, chunk: int, workers: int,
+          root: str) -> Dict[str, Any]:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import transitions
+
+    output_dir = os.path.join(root, "transitions", f"{kind}-{frames}-{chunk}-{workers}")
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        # ワーカーの起動時間を計測に含めない
+        list(executor.map(abs, range(workers)))
+    tracemalloc.start()
+    try:
+        result = transitions.render_transition(outgoing, incoming, kind, frames, output_dir, root,
+                                               chunk_frames=chunk, executor=executor, workers=workers)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        if executor is not None:
+            executor.shutdown()
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return {
+        "frames": result["frames"],
+        "fps": result["fps"],
+        "load_s": result["load_seconds"],
+        "blend_s": result["blend_seconds"],
+        "encode_s": result["encode_seconds"],
+        "buffer_mb": round(result["buffer_bytes"] / 1024 / 1024, 1),
+        "peak_heap_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="トランジション生成の時間とメモリ（種類・フレーム数・チャンク別）")
+    parser.add_argument("--kinds", type=str, default="fade,flash,wipe,iris", help="トランジションの種類（カンマ区切り）")
+    parser.add_argument("--frames", type=_int_list, default=[12, 48], help="トランジションのフレーム数（カンマ区切り）")
+    parser.add_argument("--chunks", type=_int_list, default=[1, 4], help="1回にブレンドするフレーム数（カンマ区切り）")
+    parser.add_argument("--workers", type=_int_list, default=[1], help="エンコードするプロセス数（カンマ区切り）")
+    parser.add_argument("--scene-frames", type=int, default=8, help="元のシーン連番のフレーム数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-transitions-")
+    results = {}
+    try:
+        print("[bench] generating scene frames", file=sys.stderr, flush=True)
+        outgoing = make_scene(os.path.join(root, "scene_01"), args.scene_frames, 40, args.seed)
+        incoming = make_scene(os.path.join(root, "scene_02"), args.scene_frames, 200, args.seed + 1)
+        for kind in [k for k in args.kinds.split(",") if k]:
+            for frames in args.frames:
+                for chunk in args.chunks:
+                    for workers in args.workers:
+                        label = f"{kind}/frames={frames}/chunk={chunk}/workers={workers}"
+                        print(f"[bench] {label}", file=sys.stderr, flush=True)
+                        results[label] = bench(outgoing, incoming, kind, frames, chunk, workers, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "frame_size": [1920, 1080],
+        "scene_frames": args.scene_frames,
+        "configs": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+ベクトルストアのベンチマーク
+vector_store.VectorIndex に合成ベクトルを書き込み、件数ごとの構築時間・検索レイテンシ（全件探索とIVF）・
+IVFの再現率を計測する
+
+使用方法:
+    python benchmarks/bench_vector_store.py --sizes 10000,100000,1000000 --dim 384
+    python benchmarks/bench_vector_store.py --sizes 100000 --nprobe 8,16,32 --output vector.json
+
+埋め込みの分布を模すため、ベクトルはクラスタ（--clusters個）の周りに散らばる正規分布から作成し、
+クエリは書き込んだベクトルに雑音を加えたものを使う。再現率は全件探索の上位k件のうちIVFが返した割合。
+ベクトルファイルは --dir（省略時は一時ディレクトリ）に作成し、計測後に削除する
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from typing import List, Dict, Any
+
+import numpy as np
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+import vector_store
+from vector_store import VectorIndex
+
+# 1回のupsertで書き込む件数
+BATCH = 10000
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _batches(size: int, dim: int, clusters: int, seed: int):
+    """クラスタ構造を持つ正規化済みベクトルをBATCH件ずつ生成（全件をメモリに載せない）"""
+    rng = np.random.default_rng(seed)
+    centers = vector_store._normalize(rng.standard_normal((clusters, dim)).astype(np.float32))
+    for start in range(0, size, BATCH):
+        count = min(BATCH, size - start)
+        labels = rng.integers(0, clusters, count)
+        noise = rng.standard_normal((count, dim)).astype(np.float32) * (0.6 / np.sqrt(dim))
+        yield start, vector_store._normalize(centers[labels] + noise)
+
+
+def _latency(index: VectorIndex, queries: np.ndarray, k: int, exact: bool):
+    timings = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query, limit=k, exact=exact)
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append({hit["id"] for hit in hits})
+    return timings, results
+
+
+def bench_size(directory: str, size: int, dim: int, clusters: int, queries: int, k: int,
+               nprobes: List[int], seed: int) -> Dict[str, Any]:
+    index = VectorIndex(directory, dim, "bench", max_entries=size)
+    sample = []
+    rng = np.random.default_rng(seed + 1)
+
+    start = time.perf_counter()
+    for offset, vectors in _batches(size, dim, clusters, seed):
+        index.upsert([str(offset + i) for i in range(len(vectors))], vectors, [""] * len(vectors))
+        picks = rng.choice(len(vectors), max(1, queries * len(vectors) // size), replace=False)
+        sample.append(vectors[picks])
+    build = time.perf_counter() - start
+
+    query_vectors = np.concatenate(sample)[:queries]
+    query_vectors = vector_store._normalize(
+        query_vectors + rng.standard_normal(query_vectors.shape).astype(np.float32) * (0.3 / np.sqrt(dim)))
+
+    flat_ms, truth = _latency(index, query_vectors, k, exact=True)
+    report: Dict[str, Any] = {
+        "entries": len(index),
+        "build_s": round(build, 2),
+        "build_per_s": round(size / build),
+        "disk_mb": round(sum(os.path.getsize(os.path.join(directory, name))
+                             for name in os.listdir(directory)) / (1024 * 1024), 1),
+        "ivf_lists": index.stats()["ivf_lists"],
+        "flat": {"p50_ms": round(_percentile(flat_ms, 50), 3), "p99_ms": round(_percentile(flat_ms, 99), 3)},
+    }
+
+    if index.stats()["ivf_lists"]:
+        report["ivf"] = {}
+        for nprobe in nprobes:
+            index.nprobe = nprobe
+            ivf_ms, found = _latency(index, query_vectors, k, exact=False)
+            recall = statistics.mean(len(a & b) / max(1, len(b)) for a, b in zip(found, truth))
+            report["ivf"][f"nprobe={nprobe}"] = {
+                "p50_ms": round(_percentile(ivf_ms, 50), 3),
+                "p99_ms": round(_percentile(ivf_ms, 99), 3),
+                f"recall@{k}": round(recall, 3),
+            }
+    index.close()
+    return report
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベクトルストアの構築時間・検索レイテンシ・再現率を計測")
+    parser.add_argument("--sizes", type=_int_list, default=[10000, 100000, 1000000], help="件数（カンマ区切り）")
+    parser.add_argument("--dim", type=int, default=vector_store.DEFAULT_DIM, help="ベクトルの次元")
+    parser.add_argument("--clusters", type=int, default=256, help="合成データのクラスタ数")
+    parser.add_argument("--queries", type=int, default=200, help="件数ごとのクエリ数")
+    parser.add_argument("--k", type=int, default=10, help="取得件数")
+    parser.add_argument("--nprobe", type=_int_list, default=[vector_store.IVF_NPROBE], help="IVFで探索するリスト数（カンマ区切り）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--dir", type=str, default=None, help="インデックスを作成するディレクトリ")
+    parser.add_argument("--output", type=str, default=None, help="結果を保存するJSONファイル")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-vector-", dir=args.dir)
+    sizes: Dict[str, Any] = {}
+    try:
+        for size in args.sizes:
+            print(f"[bench] {size} entries", file=sys.stderr, flush=True)
+            directory = os.path.join(root, str(size))
+            sizes[str(size)] = bench_size(directory, size, args.dim, args.clusters, args.queries, args.k,
+                                          args.nprobe, args.seed)
+            shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "dim": args.dim,
+        "k": args.k,
+        "queries": args.queries,
+        "sizes": sizes,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
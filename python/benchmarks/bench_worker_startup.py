@@ -0,0 +1,121 @@
+"""
+ワーカーモード ベンチマーク
+コールドスタート（毎回プロセス起動）と常駐ワーカーのレイテンシを比較する
+
+使用方法:
+    python benchmarks/bench_worker_startup.py --runs 5
+    python benchmarks/bench_worker_startup.py --runs 3 --crew crew.json
+
+--crew を省略した場合は ping フレームで「起動からジョブ受付可能になるまで」を計測し、
+指定した場合は実際のクルー実行（LLM呼び出しを含む）で比較する。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import List, Dict, Any, Optional
+
+ENGINE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "crewai_engine.py")
+
+
+def _request(proc: subprocess.Popen, frame: Dict[str, Any]) -> Dict[str, Any]:
+    """フレームを1つ送信し、レスポンスフレームを1つ受け取る"""
+    proc.stdin.write(json.dumps(frame, ensure_ascii=False) + "\n")
+    proc.stdin.flush()
+    line = proc.stdout.readline()
+    if not line:
+        raise RuntimeError("worker exited before responding")
+    return json.loads(line)
+
+
+def _spawn_worker() -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, ENGINE_PATH, "--worker"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        encoding="utf-8",
+    )
+
+
+def _job_frame(crew: Optional[Dict[str, Any]], index: int) -> Dict[str, Any]:
+    if crew is None:
+        return {"type": "ping", "id": f"bench-{index}"}
+    return {"type": "job", "id": f"bench-{index}", "crew": crew}
+
+
+def bench_cold(runs: int, crew: Optional[Dict[str, Any]]) -> List[float]:
+    """毎回新しいプロセスを起動してジョブを1つ処理する"""
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        proc = _spawn_worker()
+        _request(proc, _job_frame(crew, i))
+        timings.append(time.perf_counter() - start)
+        proc.stdin.close()
+        proc.wait()
+    return timings
+
+
+def bench_warm(runs: int, crew: Optional[Dict[str, Any]]) -> List[float]:
+    """起動済みのワーカーにジョブを繰り返し投入する"""
+    proc = _spawn_worker()
+    # ウォームアップ（起動完了待ち）
+    _request(proc, {"type": "ping", "id": "warmup"})
+
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        _request(proc, _job_frame(crew, i))
+        timings.append(time.perf_counter() - start)
+
+    _request_shutdown(proc)
+    return timings
+
+
+def _request_shutdown(proc: subprocess.Popen) -> None:
+    proc.stdin.write(json.dumps({"type": "shutdown"}) + "\n")
+    proc.stdin.close()
+    proc.wait()
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    return {
+        "mean_ms": round(statistics.mean(timings) * 1000, 2),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+        "max_ms": round(max(timings) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コールドスタート vs 常駐ワーカー ベンチマーク")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数")
+    parser.add_argument("--crew", type=str, default=None, help="実行するクルー定義JSON（省略時はping）")
+    args = parser.parse_args()
+
+    crew = None
+    if args.crew:
+        with open(args.crew, "r", encoding="utf-8") as f:
+            crew = json.load(f)
+
+    cold = _summary(bench_cold(args.runs, crew))
+    warm = _summary(bench_warm(args.runs, crew))
+
+    report = {
+        "mode": "crew" if crew else "ping",
+        "runs": args.runs,
+        "cold_spawn": cold,
+        "warm_worker": warm,
+        "speedup": round(cold["mean_ms"] / warm["mean_ms"], 1) if warm["mean_ms"] else None,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
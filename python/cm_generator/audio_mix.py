@@ -0,0 +1,476 @@
+"""
+タイムラインの音声ミックスダウン（マスタートラックの書き出し）
+sequences/timeline.json の各シーンの BGM・SE・ボイスを時間軸に並べ、48kHz ステレオのマスターWAVを
+固定長のブロック（CM_MIX_BLOCK_FRAMES サンプル）ごとに合成して書き足していく
+
+- 素材は先頭から少しずつ読み、48kHz でなければブロックごとに線形補間でリサンプリングする
+  （WAVは標準ライブラリの wave で読み、MP3などは ffmpeg があればパイプでデコード・リサンプリングする）
+- 同時に開くのはそのブロックで鳴っている素材だけなので、CMの長さによらずメモリ使用量は一定
+- レイヤーごとのゲイン、ボイスが鳴っている間のBGMのダッキング、クリップ端のフェードは
+  ブロック単位のNumPy配列演算で行う
+
+配置のルール:
+    bgm    シーンの開始から、別のBGMを指定したシーンの開始（またはCMの終わり）まで
+    se     シーンの開始に1回（ファイル名に loop を含むものはシーンの終わりまで繰り返す）
+    voice  シーンの開始から順番に（間隔 VOICE_GAP 秒）
+シーンの mix で素材パスごとに上書きできる:
+    {"mix": {"audio/se/sigh.wav": {"offset": 0.5, "gain_db": -3, "loop": false}}}
+"""
+
+import os
+import re
+import json
+import time
+import wave
+import shutil
+import subprocess
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from streaming import atomic_writer
+
+# ReadmeGeneratorTool の素材仕様（48kHz）
+SAMPLE_RATE = 48000
+CHANNELS = 2
+
+# 1ブロックのサンプル数（メモリ使用量はこのサイズと同時に鳴る素材の数に比例する）
+BLOCK_FRAMES = int(os.getenv("CM_MIX_BLOCK_FRAMES", "16384"))
+
+# マスターWAVの量子化ビット数（16 / 24）
+MIX_BITS = int(os.getenv("CM_MIX_BITS", "24"))
+
+# レイヤーごとのゲイン（dB）
+LAYER_GAIN_DB = {"bgm": -8.0, "se": -4.0, "voice": 0.0}
+LAYERS = tuple(LAYER_GAIN_DB)
+
+# ボイスが鳴っている間にBGMを下げる量（dB）と、下げ始め・戻すまでの時間（秒）
+DUCK_DB = float(os.getenv("CM_MIX_DUCK_DB", "-10"))
+DUCK_ATTACK = 0.08
+DUCK_RELEASE = 0.4
+
+# クリップの端のフェード（秒）。BGMの切り替わりは長め、SE・ボイスはクリックノイズ防止のみ
+FADE_SECONDS = {"bgm": 0.25, "se": 0.005, "voice": 0.005}
+
+# 同じシーンのボイスどうしの間隔（秒）
+VOICE_GAP = 0.25
+
+
+class AudioMixError(ValueError):
+    """タイムライン・音声素材の指定が不正、または読み込めない"""
+    pass
+
+
+def parse_time(value: Any) -> float:
+    """"00:00:03" / "01:02.5" / 数値（秒）を秒に変換"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str) and re.fullmatch(r"(\d+:){0,2}\d+(\.\d+)?", value.strip()):
+        seconds = 0.0
+        for part in value.strip().split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    raise AudioMixError(f"invalid time {value!r} (expected HH:MM:SS or seconds)")
+
+
+def _ffmpeg() -> Optional[str]:
+    return shutil.which("ffmpeg")
+
+
+def _ffprobe() -> Optional[str]:
+    return shutil.which("ffprobe")
+
+
+# ===============================================
+# 素材の読み込み（ストリーミング）
+# ===============================================
+
+class WavSource:
+    """PCM WAVを先頭から少しずつ float32 ステレオ（元のサンプリング周波数）で読む"""
+
+    def __init__(self, path: str):
+        try:
+            self._wave = wave.open(path, "rb")
+        except (wave.Error, EOFError) as e:
+            raise AudioMixError(f"{path}: unsupported WAV ({e})") from e
+        self.rate = self._wave.getframerate()
+        self.channels = self._wave.getnchannels()
+        self.width = self._wave.getsampwidth()
+        if self.width not in (1, 2, 3, 4):
+            self._wave.close()
+            raise AudioMixError(f"{path}: unsupported sample width {self.width}")
+
+    def read(self, frames: int) -> np.ndarray:
+        data = self._wave.readframes(frames)
+        if self.width == 1:
+            samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        elif self.width == 2:
+            samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+        elif self.width == 3:
+            # 24bit を上位3バイトに詰めた int32 にして符号を保ったまま戻す
+            packed = np.zeros((len(data) // 3, 4), dtype=np.uint8)
+            packed[:, 1:] = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            samples = (packed.view("<i4").reshape(-1) >> 8).astype(np.float32) / 8388608.0
+        else:
+            samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+        return _to_stereo(samples.reshape(-1, self.channels))
+
+    def close(self) -> None:
+        self._wave.close()
+
+
+class FfmpegSource:
+    """ffmpeg で 48kHz の float32 ステレオにデコードしながら読む（MP3などWAV以外の素材）"""
+
+    def __init__(self, path: str, ffmpeg: str):
+        self.rate = SAMPLE_RATE
+        self._process = subprocess.Popen(
+            [ffmpeg, "-nostdin", "-v", "error", "-i", path, "-f", "f32le", "-ac", str(CHANNELS),
+             "-ar", str(SAMPLE_RATE), "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+
+    def read(self, frames: int) -> np.ndarray:
+        data = self._process.stdout.read(frames * CHANNELS * 4)
+        usable = len(data) - len(data) % (CHANNELS * 4)
+        return np.frombuffer(data[:usable], dtype="<f4").reshape(-1, CHANNELS)
+
+    def close(self) -> None:
+        self._process.stdout.close()
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+
+
+def _to_stereo(samples: np.ndarray) -> np.ndarray:
+    if samples.shape[1] == 1:
+        return np.repeat(samples, 2, axis=1)
+    return samples[:, :2]
+
+
+def open_source(path: str):
+    """素材を開く（WAVは wave、それ以外や wave で読めないWAVは ffmpeg）"""
+    ffmpeg = _ffmpeg()
+    if path.lower().endswith(".wav"):
+        try:
+            return WavSource(path)
+        except AudioMixError:
+            if ffmpeg is None:
+                raise
+    if ffmpeg is None:
+        raise AudioMixError(f"{path}: decoding {os.path.splitext(path)[1] or 'this file'} requires ffmpeg")
+    return FfmpegSource(path, ffmpeg)
+
+
+def audio_duration(path: str) -> float:
+    """素材の長さ（秒）。WAVはヘッダー、それ以外は ffprobe で調べる"""
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as source:
+                return source.getnframes() / source.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    ffprobe = _ffprobe()
+    if ffprobe is None:
+        raise AudioMixError(f"{path}: reading the duration of this file requires ffprobe")
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1",
+         path],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        raise AudioMixError(f"{path}: ffprobe could not read the duration") from None
+
+
+class LinearResampler:
+    """
+    ブロックごとに渡すサンプル列を線形補間で別のサンプリング周波数に変換する
+    ブロックの境目をまたいで補間できるよう、前のブロックの最後のサンプルと読み出し位置の端数を持ち越す
+    """
+
+    def __init__(self, source_rate: int, target_rate: int = SAMPLE_RATE):
+        self.step = source_rate / target_rate
+        self.position = 0.0
+        self.tail = np.zeros((0, CHANNELS), dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self.tail, samples]) if len(self.tail) else samples
+        if len(buffer) < 2:
+            self.tail = buffer
+            return np.zeros((0, CHANNELS), dtype=np.float32)
+        count = int(np.ceil((len(buffer) - 1 - self.position) / self.step))
+        positions = self.position + self.step * np.arange(count)
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)[:, None]
+        out = buffer[index] * (1.0 - frac) + buffer[index + 1] * frac
+        self.position = self.position + self.step * count - (len(buffer) - 1)
+        self.tail = buffer[-1:]
+        return out
+
+
+class ClipReader:
+    """クリップの素材を 48kHz で要求されたサンプル数ずつ返す（終わったら無音、loop なら先頭から繰り返す）"""
+
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+        self._source = None
+        self._resampler = None
+        self._pending = np.zeros((0, CHANNELS), dtype=np.float32)
+        self._ended = False
+        self._open()
+
+    def _open(self) -> None:
+        self._source = open_source(self.path)
+        self._resampler = LinearResampler(self._source.rate) if self._source.rate != SAMPLE_RATE else None
+
+    def read(self, frames: int) -> np.ndarray:
+        parts, have = [self._pending], len(self._pending)
+        while have < frames and not self._ended:
+            samples = self._source.read(max(frames - have, 1024))
+            if len(samples) == 0:
+                self._source.close()
+                if not self.loop:
+                    self._ended = True
+                    break
+                self._open()
+                continue
+            if self._resampler is not None:
+                samples = self._resampler.process(samples)
+            parts.append(samples)
+            have += len(samples)
+        block = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self._pending = block[frames:]
+        if len(block) < frames:
+            block = np.concatenate([block, np.zeros((frames - len(block), CHANNELS), dtype=np.float32)])
+        return block[:frames]
+
+    def close(self) -> None:
+        if not self._ended:
+            self._source.close()
+            self._ended = True
+
+
+# ===============================================
+# 配置（タイムライン → クリップ）
+# ===============================================
+
+def _as_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _override(scene: Dict[str, Any], path: str) -> Dict[str, Any]:
+    overrides = (scene.get("mix") or {}).get(path) or {}
+    if not isinstance(overrides, dict):
+        raise AudioMixError(f"scene {scene.get('id')}: mix[{path!r}] must be an object")
+    return overrides
+
+
+def build_schedule(timeline: Dict[str, Any], assets_dir: str,
+                   gains: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """タイムラインから、各素材を鳴らす区間（秒）・ゲインのリストと、見つからない・読めない素材を返す"""
+    scenes = timeline.get("scenes")
+    if not isinstance(scenes, list) or not scenes:
+        raise AudioMixError("timeline has no scenes")
+    layer_gain = {**LAYER_GAIN_DB, **(gains or {})}
+    spans = [(parse_time(scene.get("start", 0)), parse_time(scene.get("end", 0))) for scene in scenes]
+    duration = float(timeline.get("duration_seconds") or max(end for _, end in spans))
+
+    clips, missing, unreadable = [], [], []
+
+    def add(scene, layer, path, start, span_end, loop=False, hold=False):
+        """素材を確認してクリップを追加する（見つからない・読めない・鳴らす区間がなければ None）
+        loop なら span_end まで繰り返し、hold なら span_end で打ち切る（それ以外は素材の長さだけ鳴らす）"""
+        overrides = _override(scene, path)
+        full_path = os.path.join(assets_dir, path)
+        if not os.path.isfile(full_path):
+            missing.append(path)
+            return None
+        try:
+            length = audio_duration(full_path)
+        except AudioMixError as e:
+            unreadable.append({"path": path, "reason": str(e)})
+            return None
+        start += parse_time(overrides.get("offset", 0))
+        loop = bool(overrides.get("loop", loop))
+        end = span_end if loop else start + length
+        if hold:
+            end = min(end, span_end)
+        end = min(end, duration)
+        if end <= start:
+            return None
+        clip = {
+            "path": path, "full_path": full_path, "layer": layer, "scene": scene.get("id"),
+            "start": round(start, 4), "end": round(end, 4), "duration": round(length, 4), "loop": loop,
+            "gain_db": float(overrides.get("gain_db", 0.0)) + layer_gain[layer],
+        }
+        clips.append(clip)
+        return clip
+
+    # BGM は別のBGMを指定したシーンまで鳴らし続ける
+    current_bgm, bgm_start, bgm_scene = None, 0.0, None
+    for scene, (start, _) in zip(scenes, spans):
+        bgm = (scene.get("assets") or {}).get("bgm")
+        if bgm and bgm != current_bgm:
+            if current_bgm:
+                add(bgm_scene, "bgm", current_bgm, bgm_start, start, hold=True)
+            current_bgm, bgm_start, bgm_scene = bgm, start, scene
+    if current_bgm:
+        add(bgm_scene, "bgm", current_bgm, bgm_start, duration, hold=True)
+
+    for scene, (start, end) in zip(scenes, spans):
+        assets = scene.get("assets") or {}
+        for path in _as_list(assets.get("se")):
+            add(scene, "se", path, start, end, loop="loop" in os.path.basename(path).lower())
+        cursor = start
+        for path in _as_list(assets.get("voice")):
+            clip = add(scene, "voice", path, cursor, end)
+            if clip is not None:
+                cursor = clip["end"] + VOICE_GAP
+
+    clips.sort(key=lambda clip: clip["start"])
+    return {"clips": clips, "duration": duration, "missing": sorted(set(missing)), "unreadable": unreadable}
+
+
+# ===============================================
+# ミックス
+# ===============================================
+
+def _db_to_gain(db: Any) -> Any:
+    return np.power(10.0, np.asarray(db, dtype=np.float32) / 20.0)
+
+
+def clip_envelope(clip: Dict[str, Any], start: int, stop: int) -> np.ndarray:
+    """クリップの [start, stop) サンプルのゲイン（レイヤー・個別のゲインと端のフェード）"""
+    frames = np.arange(start, stop, dtype=np.float32)
+    fade = max(FADE_SECONDS[clip["layer"]] * SAMPLE_RATE, 1.0)
+    clip_start, clip_end = clip["start"] * SAMPLE_RATE, clip["end"] * SAMPLE_RATE
+    ramp = np.minimum((frames - clip_start + 1) / fade, (clip_end - frames) / fade)
+    return np.clip(ramp, 0.0, 1.0) * _db_to_gain(clip["gain_db"])
+
+
+def duck_gain(start: int, stop: int, voices: np.ndarray, duck_db: float) -> np.ndarray:
+    """[start, stop) サンプルのBGMのゲイン。voices はボイスの区間（秒）の (m, 2) 配列"""
+    if not len(voices) or duck_db == 0:
+        return np.ones(stop - start, dtype=np.float32)
+    # このブロックにかかるボイスだけで計算する
+    near = voices[(voices[:, 0] - DUCK_ATTACK < stop / SAMPLE_RATE) & (voices[:, 1] + DUCK_RELEASE > start / SAMPLE_RATE)]
+    if not len(near):
+        return np.ones(stop - start, dtype=np.float32)
+    t = np.arange(start, stop, dtype=np.float64)[None, :] / SAMPLE_RATE
+    begin, end = near[:, :1], near[:, 1:]
+    # ボイスの区間の前後に attack / release の傾斜を付けた台形の最大値
+    amount = np.clip(np.minimum((t - (begin - DUCK_ATTACK)) / DUCK_ATTACK, ((end + DUCK_RELEASE) - t) / DUCK_RELEASE),
+                     0.0, 1.0).max(axis=0)
+    return _db_to_gain(duck_db * amount)
+
+
+def to_pcm(samples: np.ndarray, bits: int) -> bytes:
+    """[-1, 1] の float32 ステレオを little-endian のPCMバイト列に変換"""
+    if bits == 16:
+        return np.rint(samples * 32767.0).astype("<i2").tobytes()
+    if bits == 24:
+        scaled = np.rint(samples * 8388607.0).astype("<i4")
+        return scaled.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    raise AudioMixError(f"bits must be 16 or 24, got {bits}")
+
+
+def mixdown(timeline_path: str, assets_dir: str, output_path: Optional[str] = None,
+            gains: Optional[Dict[str, float]] = None, duck_db: Optional[float] = None,
+            block_frames: int = BLOCK_FRAMES, bits: int = MIX_BITS) -> Dict[str, Any]:
+    """
+    タイムラインの音声を48kHzステレオのマスターWAV（省略時は <assets_dir>/audio/master.wav）に書き出し、
+    配置したクリップ・ピーク・ラウドネスの目安・処理時間（実時間比）を返す（同じ内容を <出力>.json にも保存）
+    gains はレイヤーごとのゲイン（dB）の上書き、duck_db はボイス中のBGMの下げ幅
+    """
+    if bits not in (16, 24):
+        raise AudioMixError(f"bits must be 16 or 24, got {bits}")
+    if block_frames < 1:
+        raise AudioMixError("block_frames must be positive")
+    unknown = set(gains or {}) - set(LAYERS)
+    if unknown:
+        raise AudioMixError(f"unknown layer {', '.join(sorted(unknown))} (choose from {', '.join(LAYERS)})")
+    with open(timeline_path, "r", encoding="utf-8") as f:
+        timeline = json.load(f)
+    output_path = output_path or os.path.join(assets_dir, "audio", "master.wav")
+    duck_db = DUCK_DB if duck_db is None else duck_db
+
+    started = time.perf_counter()
+    schedule = build_schedule(timeline, assets_dir, gains)
+    clips = schedule["clips"]
+    total = int(round(schedule["duration"] * SAMPLE_RATE))
+    voices = np.array([(clip["start"], clip["end"]) for clip in clips if clip["layer"] == "voice"],
+                      dtype=np.float64).reshape(-1, 2)
+
+    pending = deque(clips)
+    active: List[Tuple[Dict[str, Any], ClipReader]] = []
+    peak, square_sum, clipped = 0.0, 0.0, 0
+    try:
+        with atomic_writer(output_path) as f:
+            with wave.open(f, "wb") as master:
+                master.setnchannels(CHANNELS)
+                master.setsampwidth(bits // 8)
+                master.setframerate(SAMPLE_RATE)
+                for block_start in range(0, total, block_frames):
+                    block_stop = min(block_start + block_frames, total)
+                    size = block_stop - block_start
+                    while pending and pending[0]["start"] * SAMPLE_RATE < block_stop:
+                        clip = pending.popleft()
+                        active.append((clip, ClipReader(clip["full_path"], loop=clip["loop"])))
+
+                    bgm = np.zeros((size, CHANNELS), dtype=np.float32)
+                    bus = np.zeros((size, CHANNELS), dtype=np.float32)
+                    for clip, reader in active:
+                        lo = max(int(round(clip["start"] * SAMPLE_RATE)), block_start)
+                        hi = min(int(round(clip["end"] * SAMPLE_RATE)), block_stop)
+                        if hi <= lo:
+                            continue
+                        samples = reader.read(hi - lo)
+                        samples *= clip_envelope(clip, lo, hi)[:, None]
+                        (bgm if clip["layer"] == "bgm" else bus)[lo - block_start:hi - block_start] += samples
+                    finished = [(clip, reader) for clip, reader in active if clip["end"] * SAMPLE_RATE <= block_stop]
+                    for clip, reader in finished:
+                        reader.close()
+                    active = [entry for entry in active if entry not in finished]
+
+                    bgm *= duck_gain(block_start, block_stop, voices, duck_db)[:, None]
+                    bgm += bus
+                    magnitude = np.abs(bgm)
+                    peak = max(peak, float(magnitude.max(initial=0.0)))
+                    clipped += int(np.count_nonzero(magnitude > 1.0))
+                    square_sum += float(np.square(bgm, dtype=np.float64).sum())
+                    np.clip(bgm, -1.0, 1.0, out=bgm)
+                    master.writeframes(to_pcm(bgm, bits))
+            written = f.tell()
+    finally:
+        for _, reader in active:
+            reader.close()
+    elapsed = time.perf_counter() - started
+
+    def dbfs(value: float) -> Optional[float]:
+        return round(20 * np.log10(value), 2) if value > 0 else None
+
+    report = {
+        "output_path": output_path,
+        "duration_seconds": round(total / SAMPLE_RATE, 3),
+        "sample_rate": SAMPLE_RATE,
+        "bits": bits,
+        "block_frames": block_frames,
+        "bytes": written,
+        "peak_dbfs": dbfs(peak),
+        "rms_dbfs": dbfs(np.sqrt(square_sum / max(total * CHANNELS, 1))),
+        "clipped_samples": clipped,
+        "elapsed_seconds": round(elapsed, 3),
+        "realtime_factor": round(total / SAMPLE_RATE / elapsed, 1) if elapsed > 0 else None,
+        "clips": [{key: value for key, value in clip.items() if key != "full_path"} for clip in clips],
+        "missing": schedule["missing"],
+        "unreadable": schedule["unreadable"],
+    }
+    with atomic_writer(os.path.splitext(output_path)[0] + ".json") as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8"))
+    return report
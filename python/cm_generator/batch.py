@@ -0,0 +1,165 @@
+"""
+CM素材のバッチ生成
+複数のストーリーボード・演出指示書の組（A/Bのプロンプト違いを含む）を、組ごとの出力先で生成する
+
+各組は run_cm_generator で実行し、実行中の素材記録（ジャーナル・ナレッジ）がプロセス単位のため
+最大 max_parallel 個のワーカープロセスで並行して実行する。ワーカープロセスは複数の組を順に処理し、
+CrewAIのimport・ツールのインスタンス（tool_registry）・LLMクライアント（LLM_POOL）をその間で再利用する
+
+バッチファイル（JSON配列・{"items": [...]}・JSONLのいずれか）:
+    [{"name": "a", "storyboard": "a/storyboard.md", "direction": "a/direction.md"},
+     {"name": "a-v2", "storyboard": "a/storyboard.md", "direction": "a/direction.md", "inputs": {"tone": "calm"}}]
+    相対パスはバッチファイルのディレクトリ基準。output を省略すると <出力先>/<name>/ に生成する
+"""
+
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Any, List
+
+from streaming import atomic_writer
+
+# 同時に生成する組数の上限
+BATCH_CONCURRENCY = int(os.getenv("CM_BATCH_CONCURRENCY", "2"))
+
+RESULTS_FILENAME = "batch_results.jsonl"
+SUMMARY_FILENAME = "batch_summary.json"
+
+
+class BatchSpecError(ValueError):
+    """バッチファイルの形式・参照先が不正"""
+    pass
+
+
+def load_batch(path: str, output_root: str) -> List[Dict[str, Any]]:
+    """バッチファイルを読み込み、パスを解決した組のリストを返す"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        if path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            entries = json.loads(text)
+            if isinstance(entries, dict):
+                entries = entries.get("items")
+    except json.JSONDecodeError as e:
+        raise BatchSpecError(f"Invalid batch file {path}: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise BatchSpecError(f"Batch file {path} must contain a non-empty list of items")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    items = []
+    outputs = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise BatchSpecError(f"items[{index}] must be an object, got {type(entry).__name__}")
+        name = str(entry.get("name") or f"item_{index:03d}")
+        item = {"index": index, "name": name}
+        for field in ("storyboard", "direction"):
+            if not entry.get(field):
+                raise BatchSpecError(f"items[{index}] ({name}) is missing '{field}'")
+            item[field] = os.path.join(base_dir, entry[field])
+            if not os.path.exists(item[field]):
+                raise BatchSpecError(f"items[{index}] ({name}): {field} not found: {item[field]}")
+        item["output"] = os.path.abspath(entry.get("output") or os.path.join(output_root, name))
+        # 同じ出力先の組はジャーナルと素材を上書きし合う
+        if item["output"] in outputs:
+            raise BatchSpecError(f"items[{index}] ({name}) shares its output directory with another item")
+        outputs.add(item["output"])
+        inputs = entry.get("inputs") or {}
+        if not isinstance(inputs, dict):
+            raise BatchSpecError(f"items[{index}] ({name}): inputs must be an object")
+        item["inputs"] = inputs
+        items.append(item)
+    return items
+
+
+def run_batch_item(item: Dict[str, Any], resume: bool = False) -> Dict[str, Any]:
+    """1組を生成する（ProcessPoolExecutorの子プロセスで呼ばれる）。LLM呼び出しの使用量とコストを返す"""
+    from main import run_cm_generator
+    from usage_accounting import UsageTracker, active_handlers, install_llm_hooks
+
+    install_llm_hooks()
+    tracker = UsageTracker()
+    started = time.perf_counter()
+    with active_handlers(tracker):
+        result = run_cm_generator(item["storyboard"], item["direction"], item["output"],
+                                  resume=resume, inputs=item["inputs"])
+    return {
+        "elapsed": round(time.perf_counter() - started, 3),
+        "usage": tracker.summary()["totals"],
+        "result": str(result) if result is not None else None,
+    }
+
+
+def _append_result(path: str, record: Dict[str, Any]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def run_batch(items: List[Dict[str, Any]], output_root: str, resume: bool = False,
+              max_parallel: int = BATCH_CONCURRENCY) -> Dict[str, Any]:
+    """
+    組を最大max_parallel個ずつ並行して生成する
+    完了した組から <出力先>/batch_results.jsonl に1行ずつ結果を追記し、最後に件数・スループット・コストの集計を
+    <出力先>/batch_summary.json に書き出す
+    """
+    os.makedirs(output_root, exist_ok=True)
+    results_path = os.path.join(output_root, RESULTS_FILENAME)
+    open(results_path, "w").close()
+
+    print(f"📦 バッチ: {len(items)}組（同時実行 {max_parallel}）")
+    run_started = time.perf_counter()
+    records: Dict[int, Dict[str, Any]] = {}
+
+    # 子プロセスでCrewAI/LLMクライアントを確実に初期化し直すためspawnで起動
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, max_parallel), mp_context=context) as executor:
+        futures = {executor.submit(run_batch_item, item, resume): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            record = {"index": item["index"], "name": item["name"], "output": item["output"]}
+            try:
+                record.update(future.result())
+                record["status"] = "completed"
+                print(f"✅ {item['name']} 完了（{record['elapsed']:.1f}秒 / ${record['usage']['cost']:.4f}）")
+            except Exception as e:
+                record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+                print(f"❌ {item['name']} 失敗: {e}")
+            record["finished_at"] = round(time.perf_counter() - run_started, 3)
+            records[item["index"]] = record
+            _append_result(results_path, record)
+
+    wall = time.perf_counter() - run_started
+    ordered = [records[item["index"]] for item in items]
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+    for record in ordered:
+        for name in totals:
+            totals[name] += (record.get("usage") or {}).get(name, 0)
+    totals["cost"] = round(totals["cost"], 6)
+    succeeded = sum(1 for record in ordered if record["status"] == "completed")
+
+    summary = {
+        "success": succeeded == len(items),
+        "items": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "concurrency": max_parallel,
+        "wall_clock": round(wall, 3),
+        "items_per_hour": round(len(items) * 3600 / wall, 2) if wall > 0 else None,
+        "usage": totals,
+        "results": ordered,
+        "completed_at": datetime.now().isoformat(),
+    }
+    summary_path = os.path.join(output_root, SUMMARY_FILENAME)
+    with atomic_writer(summary_path) as f:
+        f.write(json.dumps(summary, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    print(f"\n📦 バッチ完了: 成功 {succeeded} / 失敗 {len(items) - succeeded}"
+          f"（{wall:.1f}秒、{summary['items_per_hour']}組/時）")
+    print(f"💰 {totals['total_tokens']}トークン / ${totals['cost']:.4f}")
+    print(f"📊 レポート: {summary_path}")
+    return summary
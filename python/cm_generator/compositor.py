@@ -0,0 +1,318 @@
+"""
+シーンフレームの合成（compose_frames）
+sequences/timeline.json の各シーンについて、背景（bg）・キャラクター（char）・エフェクト連番（fx）を
+レイアウトに従って配置し、乗算済みアルファでアルファブレンドしたFHDフレームを frames/scene_XX/ に書き出す
+
+- 背景とキャラクターはシーンごとに1回だけ合成し、エフェクト連番の各フレームをその上に重ねる
+- シーンはプロセスプールで並列に合成し、各プロセスはデコード・リサイズ済みのレイヤーをLRUキャッシュに保持する
+  （同じキャラクターPNGは多くのシーンに登場する）
+
+レイアウトはシーンの layout で素材パスごとに上書きできる:
+    {"layout": {"characters/protagonist/happy.png": {"x": 0.3, "y": 0.95, "height": 0.7, "anchor": "bottom", "flip": true}}}
+    x, y はフレームに対する比率、height はフレームの高さに対するレイヤーの高さ、opacity は不透明度
+"""
+
+import os
+import json
+import time
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from imaging import read_rgba, image_size, to_uint8, write_png, list_sequence
+
+# FHD（ReadmeGeneratorTool の素材仕様）
+FRAME_SIZE = (1920, 1080)
+
+# 背景がない・透明な場合の地の色（背景美術のクリーム色）
+BACKGROUND_COLOR = (255, 248, 231)
+
+# シーンを合成するプロセス数（0でCPUコア数）
+COMPOSE_WORKERS = int(os.getenv("CM_COMPOSE_WORKERS", "0"))
+
+# プロセスごとのデコード済みレイヤーキャッシュの上限（MB）
+LAYER_CACHE_MB = float(os.getenv("CM_LAYER_CACHE_MB", "512"))
+
+ANCHORS = ("bottom", "center", "top")
+
+
+class LayoutError(ValueError):
+    """タイムライン・レイアウトの指定が不正"""
+    pass
+
+
+# ===============================================
+# デコード済みレイヤーのキャッシュ
+# ===============================================
+
+class LayerCache:
+    """(パス, 更新時刻, サイズ, 反転) をキーにした、乗算済みアルファのレイヤー配列のLRUキャッシュ"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+    def get(self, path: str, size: Tuple[int, int], flip: bool = False, cover: bool = False) -> np.ndarray:
+        key = (os.path.realpath(path), os.stat(path).st_mtime_ns, tuple(size), flip, cover)
+        layer = self._entries.get(key)
+        if layer is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return layer
+
+        self.misses += 1
+        layer = _decode_cover(path, size) if cover else read_rgba(path, size, flip)
+        # 合成中に書き換えないよう読み取り専用にする
+        layer.flags.writeable = False
+        if layer.nbytes <= self.max_bytes:
+            self._entries[key] = layer
+            self.bytes += layer.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+        return layer
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self.bytes}
+
+
+# プロセスごとのキャッシュ（プールのワーカープロセスはシーン間で再利用する）
+LAYER_CACHE = LayerCache(int(LAYER_CACHE_MB * 1024 * 1024))
+
+
+def _decode_cover(path: str, size: Tuple[int, int]) -> np.ndarray:
+    """フレームを覆うように拡大縮小して中央を切り出した背景（透明部分は地の色で埋めたRGB）"""
+    width, height = size
+    src_width, src_height = image_size(path)
+    scale = max(width / src_width, height / src_height)
+    scaled = (max(width, round(src_width * scale)), max(height, round(src_height * scale)))
+    layer = read_rgba(path, scaled)
+    top, left = (scaled[1] - height) // 2, (scaled[0] - width) // 2
+    layer = layer[top:top + height, left:left + width]
+    canvas = solid_background(size)
+    blend(canvas, layer, 0, 0)
+    return canvas
+
+
+# ===============================================
+# 合成
+# ===============================================
+
+def solid_background(size: Tuple[int, int], color: Tuple[int, int, int] = BACKGROUND_COLOR) -> np.ndarray:
+    width, height = size
+    canvas = np.empty((height, width, 3), dtype=np.float32)
+    canvas[...] = np.asarray(color, dtype=np.float32) / 255.0
+    return canvas
+
+
+def blend(canvas: np.ndarray, layer: np.ndarray, x: int, y: int, opacity: float = 1.0) -> bool:
+    """
+    乗算済みアルファのRGBAレイヤーを canvas（RGB）の (x, y) に重ねる（dst = src + dst × (1 - src_a)）
+    フレームからはみ出す部分は切り取り、重なりがなければFalse
+    """
+    height, width = canvas.shape[:2]
+    layer_height, layer_width = layer.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + layer_width, width), min(y + layer_height, height)
+    if x0 >= x1 or y0 >= y1:
+        return False
+
+    src = layer[y0 - y:y1 - y, x0 - x:x1 - x]
+    if opacity < 1.0:
+        src = src * np.float32(opacity)
+    dst = canvas[y0:y1, x0:x1]
+    dst *= 1.0 - src[..., 3:4]
+    dst += src[..., :3]
+    return True
+
+
+def layer_origin(layer_size: Tuple[int, int], spec: Dict[str, Any], frame_size: Tuple[int, int]) -> Tuple[int, int]:
+    """レイヤーの左上座標（x, y はアンカー位置のフレーム比率）"""
+    layer_width, layer_height = layer_size
+    width, height = frame_size
+    x = round(spec["x"] * width - layer_width / 2)
+    anchor_y = spec["y"] * height
+    if spec["anchor"] == "bottom":
+        y = round(anchor_y - layer_height)
+    elif spec["anchor"] == "top":
+        y = round(anchor_y)
+    else:
+        y = round(anchor_y - layer_height / 2)
+    return x, y
+
+
+def layer_size(path: str, spec: Dict[str, Any], frame_size: Tuple[int, int]) -> Tuple[int, int]:
+    """heightの比率からレイヤーの (幅, 高さ) を求める（縦横比は元画像のまま）"""
+    src_width, src_height = image_size(path)
+    height = max(1, round(spec["height"] * frame_size[1]))
+    return max(1, round(src_width * height / src_height)), height
+
+
+def _layer_spec(path: str, default: Dict[str, Any], overrides: Dict[str, Any], name: str) -> Dict[str, Any]:
+    spec = {"path": path, "anchor": "bottom", "opacity": 1.0, "flip": False, **default, **overrides}
+    for field in ("x", "y", "height", "opacity"):
+        if not isinstance(spec[field], (int, float)) or isinstance(spec[field], bool):
+            raise LayoutError(f"{name}.{field} must be a number, got {spec[field]!r}")
+    if spec["height"] <= 0:
+        raise LayoutError(f"{name}.height must be positive")
+    if spec["anchor"] not in ANCHORS:
+        raise LayoutError(f"{name}.anchor must be one of {', '.join(ANCHORS)}")
+    return spec
+
+
+def scene_layers(scene: Dict[str, Any], assets_dir: str) -> Dict[str, Any]:
+    """
+    シーンの素材から合成するレイヤーを解決
+    キャラクターは下端揃えで横に等間隔、エフェクトは中央に配置する（layoutで上書き）
+    存在しない素材は missing に入れて合成から除く
+    """
+    assets = scene.get("assets") or {}
+    layout = scene.get("layout") or {}
+    if not isinstance(layout, dict):
+        raise LayoutError(f"scene {scene.get('id')}: layout must be an object")
+    missing = []
+
+    def resolve(path: str) -> str:
+        return os.path.join(assets_dir, path)
+
+    background = None
+    if assets.get("bg"):
+        background = resolve(assets["bg"])
+        if not os.path.isfile(background):
+            missing.append(assets["bg"])
+            background = None
+
+    static = []
+    characters = assets.get("char") or []
+    for index, path in enumerate(characters):
+        default = {"x": (index + 1) / (len(characters) + 1), "y": 0.95, "height": 0.6 if len(characters) <= 2 else 0.42}
+        spec = _layer_spec(resolve(path), default, layout.get(path) or {}, f"scene {scene.get('id')} {path}")
+        if os.path.isfile(spec["path"]):
+            static.append(spec)
+        else:
+            missing.append(path)
+
+    effects = []
+    for path in assets.get("fx") or []:
+        default = {"x": 0.5, "y": 0.5, "height": 0.6, "anchor": "center"}
+        spec = _layer_spec(resolve(path), default, layout.get(path) or {}, f"scene {scene.get('id')} {path}")
+        frames = list_sequence(spec["path"]) if os.path.isdir(spec["path"]) else (
+            [spec["path"]] if os.path.isfile(spec["path"]) else [])
+        if frames:
+            effects.append({**spec, "frames": frames})
+        else:
+            missing.append(path)
+
+    return {"background": background, "static": static, "effects": effects, "missing": missing}
+
+
+def render_scene(job: Dict[str, Any]) -> Dict[str, Any]:
+    """1シーンのフレームを合成して書き出す（プールのワーカープロセスで呼ばれる）"""
+    started = time.perf_counter()
+    cache_before = LAYER_CACHE.stats()
+    size = tuple(job["size"])
+    layers = job["layers"]
+
+    if layers["background"] is not None:
+        base = LAYER_CACHE.get(layers["background"], size, cover=True).copy()
+    else:
+        base = solid_background(size)
+    for spec in layers["static"]:
+        layer_dims = layer_size(spec["path"], spec, size)
+        layer = LAYER_CACHE.get(spec["path"], layer_dims, flip=spec["flip"])
+        blend(base, layer, *layer_origin(layer_dims, spec, size), opacity=spec["opacity"])
+
+    # エフェクト連番の長さ（frames_per_scene 指定時はその枚数、エフェクトは繰り返す）
+    count = job["frames"] or max((len(effect["frames"]) for effect in layers["effects"]), default=1)
+    os.makedirs(job["output_dir"], exist_ok=True)
+    written = 0
+    for index in range(count):
+        frame = base
+        if layers["effects"]:
+            frame = base.copy()
+            for effect in layers["effects"]:
+                path = effect["frames"][index % len(effect["frames"])]
+                layer_dims = layer_size(path, effect, size)
+                layer = LAYER_CACHE.get(path, layer_dims, flip=effect["flip"])
+                blend(frame, layer, *layer_origin(layer_dims, effect, size), opacity=effect["opacity"])
+        written += write_png(os.path.join(job["output_dir"], f"frame_{index + 1:04d}.png"), to_uint8(frame))
+
+    cache_after = LAYER_CACHE.stats()
+    return {
+        "id": job["id"],
+        "output_dir": job["output_dir"],
+        "frames": count,
+        "bytes": written,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "missing": layers["missing"],
+        "cache_hits": cache_after["hits"] - cache_before["hits"],
+        "cache_misses": cache_after["misses"] - cache_before["misses"],
+        "pid": os.getpid(),
+    }
+
+
+def scene_dirname(scene_id: Any) -> str:
+    return f"scene_{scene_id:02d}" if isinstance(scene_id, int) else f"scene_{scene_id}"
+
+
+def compose_timeline(timeline_path: str, assets_dir: str, output_dir: Optional[str] = None,
+                     scene_ids: Optional[List[int]] = None, frames_per_scene: int = 0,
+                     workers: Optional[int] = None, size: Tuple[int, int] = FRAME_SIZE) -> Dict[str, Any]:
+    """
+    タイムラインの各シーンを合成して <output_dir>/scene_XX/frame_NNNN.png に書き出し、シーンごとの結果と
+    全体のフレームレート（fps）・レイヤーキャッシュのヒット数を返す
+    workers は並列プロセス数（省略時は CM_COMPOSE_WORKERS、0でCPUコア数）。1ならこのプロセスで合成する
+    """
+    with open(timeline_path, "r", encoding="utf-8") as f:
+        timeline = json.load(f)
+    scenes = timeline.get("scenes")
+    if not isinstance(scenes, list):
+        raise LayoutError(f"{timeline_path} has no scenes list")
+    if scene_ids:
+        scenes = [scene for scene in scenes if scene.get("id") in set(scene_ids)]
+    output_dir = output_dir or os.path.join(assets_dir, "frames")
+
+    jobs = [
+        {
+            "id": scene.get("id", index + 1),
+            "layers": scene_layers(scene, assets_dir),
+            "output_dir": os.path.join(output_dir, scene_dirname(scene.get("id", index + 1))),
+            "frames": frames_per_scene,
+            "size": size,
+        }
+        for index, scene in enumerate(scenes)
+    ]
+
+    workers = workers if workers is not None else COMPOSE_WORKERS
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    started = time.perf_counter()
+    if workers == 1:
+        results = [render_scene(job) for job in jobs]
+    else:
+        # CrewAIのスレッドを持つプロセスからforkしないようspawnで起動
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = list(executor.map(render_scene, jobs))
+    elapsed = time.perf_counter() - started
+
+    frames = sum(result["frames"] for result in results)
+    return {
+        "scenes": results,
+        "frames": frames,
+        "size": list(size),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed > 0 else None,
+        "cache": {
+            "hits": sum(result["cache_hits"] for result in results),
+            "misses": sum(result["cache_misses"] for result in results),
+        },
+        "missing": sorted({path for result in results for path in result["missing"]}),
+        "output_dir": output_dir,
+    }
@@ -0,0 +1,454 @@
+"""
+パーティクルエフェクト連番のローカル生成（generate_effects）
+エフェクトごとに粒子の位置・速度・経過時間・寿命をNumPy配列で持ってまとめてシミュレーションし、
+各フレームを透明背景のPNG連番として effects/<name>/frame_NNNN.png に書き出す
+
+- シミュレーションは呼び出し元のプロセスで全フレーム分を先に行い（乱数シードで再現可能）、
+  フレームのラスタライズとPNGのエンコードはプロセスプールでコアごとに並列に行う
+- 座標・大きさ・速度はキャンバスの一辺に対する比率で指定するため、解像度を変えても同じ見た目になる
+- ループするエフェクト（sparkles, glow_pulse）は粒子の寿命をシーケンスの長さの約数にして継ぎ目をなくす
+
+パラメータ（EFFECTS の既定値を上書き）:
+    {"name": "sparkles", "frames": 12, "size": 512, "count": 30, "colors": ["#FFE066", "#FFFFFF"], "seed": 0, "fps": 24}
+"""
+
+import os
+import re
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from imaging import to_uint8, write_png, clear_sequence
+
+# フレームをラスタライズ・エンコードするプロセス数（0でCPUコア数）
+EFFECT_WORKERS = int(os.getenv("CM_EFFECT_WORKERS", "0"))
+
+DEFAULT_FPS = 24
+MAX_FRAMES = 240
+SIZE_RANGE = (64, 2048)
+SHAPES = ("soft", "disc", "star", "rect")
+
+# 生成できるエフェクトと既定のパラメータ（frames は tasks.yaml の generate_effects の枚数）
+EFFECTS: Dict[str, Dict[str, Any]] = {
+    "energy_wave": {"frames": 8, "size": 512, "count": 360, "colors": ["#FFE066", "#FFFFFF", "#7EC8FF"],
+                    "description": "中心から広がる同心円のエネルギー波"},
+    "pop_smoke": {"frames": 6, "size": 512, "count": 28, "colors": ["#FFFFFF", "#F2F2F2", "#DADADA"],
+                  "description": "キャラクター登場用のポップな煙"},
+    "sparkles": {"frames": 12, "size": 512, "count": 30, "colors": ["#FFE066", "#FFFFFF", "#FFB3E6"],
+                 "description": "またたくキラキラ（ループ）"},
+    "confetti": {"frames": 8, "size": 512, "count": 90,
+                 "colors": ["#FF6B6B", "#FFD93D", "#6BCB77", "#4D96FF", "#C77DFF"],
+                 "description": "舞い落ちる紙吹雪"},
+    "progress_bar": {"frames": 24, "size": 512, "count": 40, "colors": ["#4D96FF", "#FFFFFF", "#FFE066"],
+                     "description": "左から満ちていくプログレスバー（先端に火花）"},
+    "glow_pulse": {"frames": 4, "size": 512, "count": 2, "colors": ["#FFF3B0", "#FFFFFF"],
+                   "description": "明滅する光のパルス（ループ）"},
+}
+
+
+class EffectSpecError(ValueError):
+    """エフェクトのパラメータが不正"""
+    pass
+
+
+def _parse_color(value: str) -> Tuple[float, float, float]:
+    if not isinstance(value, str) or not re.fullmatch(r"#?[0-9a-fA-F]{6}", value):
+        raise EffectSpecError(f"color must be #RRGGBB, got {value!r}")
+    value = value.lstrip("#")
+    return tuple(int(value[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+
+
+def effect_spec(name: str, **overrides: Any) -> Dict[str, Any]:
+    """エフェクト名と上書きするパラメータから、検証済みの仕様を返す（0や空の値は既定値のまま）"""
+    if name not in EFFECTS:
+        raise EffectSpecError(f"unknown effect {name!r} (choose from {', '.join(EFFECTS)})")
+    spec = {"name": name, "seed": 0, "fps": DEFAULT_FPS, **EFFECTS[name]}
+    spec.pop("description")
+    spec.update({key: value for key, value in overrides.items() if value not in (None, 0, "", [])})
+
+    for field in ("frames", "size", "count", "fps", "seed"):
+        if not isinstance(spec[field], int) or isinstance(spec[field], bool):
+            raise EffectSpecError(f"{name}.{field} must be an integer, got {spec[field]!r}")
+    if not 1 <= spec["frames"] <= MAX_FRAMES:
+        raise EffectSpecError(f"{name}.frames must be between 1 and {MAX_FRAMES}")
+    if not SIZE_RANGE[0] <= spec["size"] <= SIZE_RANGE[1]:
+        raise EffectSpecError(f"{name}.size must be between {SIZE_RANGE[0]} and {SIZE_RANGE[1]}")
+    if spec["count"] < 1 or spec["fps"] < 1:
+        raise EffectSpecError(f"{name}.count and {name}.fps must be positive")
+    spec["colors"] = [_parse_color(color) for color in spec["colors"]]
+    if not spec["colors"]:
+        raise EffectSpecError(f"{name}.colors must not be empty")
+    return spec
+
+
+# ===============================================
+# 粒子のシミュレーション
+# ===============================================
+
+class ParticleSystem:
+    """
+    同じ形・エンベロープを持つ粒子の集合
+    位置・速度・経過時間・寿命などを (N,) / (N, 2) の配列で持ち、step() で全粒子を一度に進める
+    経過時間が負の粒子はまだ出現しておらず、寿命を過ぎた粒子は描画しない（loop=True では寿命で巻き戻す）
+
+    envelope（経過時間 / 寿命 に対する不透明度と大きさの変化）:
+        fade     不透明度が1から0へ
+        twinkle  不透明度・大きさが sin で0→1→0
+        pulse    不透明度が 0.35〜1 の間で cos で1周期
+        constant 変化しない
+    """
+
+    ENVELOPES = ("fade", "twinkle", "pulse", "constant")
+
+    def __init__(self, shape: str, position: np.ndarray, velocity: np.ndarray, life: np.ndarray,
+                 size: np.ndarray, color: np.ndarray, age: Optional[np.ndarray] = None,
+                 end_size: Optional[np.ndarray] = None, alpha: Optional[np.ndarray] = None,
+                 aspect: Optional[np.ndarray] = None, height: Optional[np.ndarray] = None,
+                 angle: Optional[np.ndarray] = None, spin: Optional[np.ndarray] = None, gravity: Tuple[float, float] = (0.0, 0.0),
+                 drag: float = 0.0, envelope: str = "fade", loop: bool = False, flutter: float = 0.0):
+        if shape not in SHAPES:
+            raise EffectSpecError(f"shape must be one of {', '.join(SHAPES)}")
+        if envelope not in self.ENVELOPES:
+            raise EffectSpecError(f"envelope must be one of {', '.join(self.ENVELOPES)}")
+        count = len(position)
+        self.shape = shape
+        self.position = np.asarray(position, dtype=np.float64).reshape(count, 2).copy()
+        self.velocity = np.asarray(velocity, dtype=np.float64).reshape(count, 2).copy()
+        self.life = np.broadcast_to(np.asarray(life, dtype=np.float64), (count,)).copy()
+        self.age = np.zeros(count) if age is None else np.asarray(age, dtype=np.float64).copy()
+        self.size = np.broadcast_to(np.asarray(size, dtype=np.float64), (count,)).copy()
+        self.end_size = self.size.copy() if end_size is None else np.broadcast_to(end_size, (count,)).astype(np.float64)
+        self.color = np.asarray(color, dtype=np.float64).reshape(count, 3)
+        self.alpha = np.ones(count) if alpha is None else np.broadcast_to(alpha, (count,)).astype(np.float64)
+        self.aspect = np.ones(count) if aspect is None else np.broadcast_to(aspect, (count,)).astype(np.float64)
+        # rect の縦の半幅（省略時は 大きさ × aspect）。大きさだけを変えたいときに固定する
+        self.height = None if height is None else np.broadcast_to(height, (count,)).astype(np.float64)
+        self.angle = np.zeros(count) if angle is None else np.asarray(angle, dtype=np.float64).copy()
+        self.spin = np.zeros(count) if spin is None else np.asarray(spin, dtype=np.float64).copy()
+        self.gravity = np.asarray(gravity, dtype=np.float64)
+        self.drag = drag
+        self.envelope = envelope
+        self.loop = loop
+        self.flutter = flutter
+
+    def step(self, dt: float) -> None:
+        """dt 秒進める（出現前の粒子は経過時間だけ進める）"""
+        alive = self.age >= 0
+        if self.drag:
+            self.velocity[alive] *= np.exp(-self.drag * dt)
+        self.velocity[alive] += self.gravity * dt
+        self.position[alive] += self.velocity[alive] * dt
+        self.angle[alive] += self.spin[alive] * dt
+        self.age += dt
+        if self.loop:
+            np.mod(self.age, self.life, out=self.age, where=self.age >= 0)
+
+    def snapshot(self, canvas: int) -> Dict[str, Any]:
+        """現在の状態を、キャンバスのピクセル単位の描画データ（見えている粒子のみ）にする"""
+        t = np.clip(self.age / self.life, 0.0, 1.0)
+        visible = (self.age >= 0) & (self.loop | (self.age <= self.life))
+        size = self.size + (self.end_size - self.size) * t
+        if self.envelope == "fade":
+            opacity = 1.0 - t
+        elif self.envelope == "twinkle":
+            opacity = np.sin(np.pi * t)
+            size = size * opacity
+        elif self.envelope == "pulse":
+            opacity = 0.675 + 0.325 * np.cos(2 * np.pi * t)
+        else:
+            opacity = np.ones_like(t)
+        height = size * self.aspect if self.height is None else self.height
+        if self.flutter:
+            # 紙吹雪の裏返り（回転に合わせて見かけの縦幅が変わる）
+            height = height * np.maximum(np.abs(np.cos(self.angle * self.flutter)), 0.15)
+        alpha = self.alpha * opacity
+        visible &= (alpha > 1e-3) & (size > 0)
+        return {
+            "shape": self.shape,
+            "x": (self.position[visible, 0] * canvas).astype(np.float32),
+            "y": (self.position[visible, 1] * canvas).astype(np.float32),
+            "size": (size[visible] * canvas).astype(np.float32),
+            "height": (height[visible] * canvas).astype(np.float32),
+            "angle": self.angle[visible].astype(np.float32),
+            "color": self.color[visible].astype(np.float32),
+            "alpha": alpha[visible].astype(np.float32),
+        }
+
+
+def _palette(rng: np.random.Generator, colors: List[Tuple[float, float, float]], count: int) -> np.ndarray:
+    return np.asarray(colors)[rng.integers(0, len(colors), count)]
+
+
+def _directions(angles: np.ndarray) -> np.ndarray:
+    return np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+
+def _energy_wave(spec: Dict[str, Any], rng: np.random.Generator, duration: float) -> List[ParticleSystem]:
+    # 2重のリングを少しずらして放ち、シーケンスの終わりにキャンバスの端近くまで広げる
+    rings = 2
+    systems = []
+    for ring in range(rings):
+        count = max(8, spec["count"] // rings)
+        delay = duration * 0.3 * ring
+        angles = np.linspace(0, 2 * np.pi, count, endpoint=False) + rng.uniform(0, 0.02, count)
+        speed = 0.46 / duration * rng.uniform(0.97, 1.03, count)
+        systems.append(ParticleSystem(
+            "soft", np.full((count, 2), 0.5), _directions(angles) * speed[:, None],
+            life=duration - delay, age=np.full(count, -delay),
+            size=0.035 - 0.01 * ring, end_size=0.012, color=_palette(rng, spec["colors"], count),
+            alpha=0.9, envelope="fade",
+        ))
+    return systems
+
+
+def _pop_smoke(spec: Dict[str, Any], rng: np.random.Generator, duration: float) -> List[ParticleSystem]:
+    count = spec["count"]
+    angles = rng.uniform(np.pi * 0.95, np.pi * 2.05, count)  # 上向きと横向き
+    # 強い空気抵抗で、はじけた直後に減速して膨らむ（到達距離はおよそ 速さ / drag）
+    speed = rng.uniform(1.0, 2.0, count) / duration
+    return [ParticleSystem(
+        "disc", np.full((count, 2), (0.5, 0.62)) + rng.normal(0, 0.02, (count, 2)),
+        _directions(angles) * speed[:, None], life=duration * rng.uniform(0.9, 1.2, count),
+        size=rng.uniform(0.05, 0.08, count), end_size=rng.uniform(0.12, 0.18, count),
+        color=_palette(rng, spec["colors"], count), alpha=0.95, drag=5.0 / duration,
+        gravity=(0.0, -0.3 / duration), envelope="fade",
+    )]
+
+
+def _sparkles(spec: Dict[str, Any], rng: np.random.Generator, duration: float) -> List[ParticleSystem]:
+    count = spec["count"]
+    # 寿命をシーケンスの長さの 1/1〜1/3 にすると、最後のフレームの次が最初のフレームにつながる
+    life = duration / rng.integers(1, 4, count)
+    return [ParticleSystem(
+        "star", rng.uniform(0.1, 0.9, (count, 2)), np.zeros((count, 2)), life=life,
+        age=rng.uniform(0, 1, count) * life, size=rng.uniform(0.02, 0.05, count),
+        color=_palette(rng, spec["colors"], count), angle=rng.uniform(0, np.pi / 4, count),
+        envelope="twinkle", loop=True,
+    )]
+
+
+def _confetti(spec: Dict[str, Any], rng: np.random.Generator, duration: float) -> List[ParticleSystem]:
+    count = spec["count"]
+    position = np.stack([rng.uniform(0.0, 1.0, count), rng.uniform(-0.35, 0.6, count)], axis=-1)
+    velocity = np.stack([rng.normal(0, 0.15, count), rng.uniform(0.4, 0.8, count)], axis=-1) / (duration * 2)
+    return [ParticleSystem(
+        "rect", position, velocity, life=duration * 10, size=rng.uniform(0.012, 0.02, count),
+        color=_palette(rng, spec["colors"], count), aspect=rng.uniform(0.4, 0.7, count),
+        angle=rng.uniform(0, 2 * np.pi, count), spin=rng.uniform(-3, 3, count) * np.pi / duration,
+        gravity=(0.0, 0.5 / duration), drag=0.5 / duration, envelope="constant", flutter=1.7,
+    )]
+
+
+def _progress_bar(spec: Dict[str, Any], rng: np.random.Generator, duration: float) -> List[ParticleSystem]:
+    fill, track, spark = (spec["colors"] * 3)[:3]
+    left, width, height, y = 0.1, 0.8, 0.035, 0.5
+    # 最後のフレームで満タンになるよう、1フレーム短い時間で伸ばす
+    fill_time = max(duration - 1.0 / spec["fps"], 1e-6)
+    # 地のバーと、左端を固定して幅が広がるバー（中心を幅の半分の速さで動かす）
+    track_bar = ParticleSystem("rect", [[0.5, y]], [[0.0, 0.0]], life=duration, size=width / 2 + 0.01,
+                               color=[track], height=height / 2 + 0.01, alpha=0.55, envelope="constant")
+    fill_bar = ParticleSystem("rect", [[left, y]], [[width / 2 / fill_time, 0.0]], life=fill_time,
+                              size=0.0, end_size=width / 2, color=[fill], height=height / 2,
+                              envelope="constant")
+    # 先端から後ろへ飛ぶ火花（出現を時間方向にずらす）
+    count = spec["count"]
+    birth = rng.uniform(0, duration, count)
+    sparks = ParticleSystem(
+        "star", np.stack([left + width * birth / duration, np.full(count, y)], axis=-1),
+        _directions(rng.uniform(np.pi * 0.6, np.pi * 1.4, count)) * rng.uniform(0.1, 0.3, (count, 1)) / duration,
+        life=duration * 0.25, age=-birth, size=rng.uniform(0.01, 0.02, count),
+        color=np.asarray([spark] * count), envelope="fade",
+    )
+    return [track_bar, fill_bar, sparks]
+
+
+def _glow_pulse(spec: Dict[str, Any], rng: np.random.Generator, duration: float) -> List[ParticleSystem]:
+    count = spec["count"]
+    # 外側ほど大きく淡い光を重ね、シーケンスの長さで1周期明滅させる
+    scale = np.linspace(1.0, 0.35, count)
+    return [ParticleSystem(
+        "soft", np.full((count, 2), 0.5), np.zeros((count, 2)), life=duration, age=np.zeros(count),
+        size=0.45 * scale, color=np.asarray((spec["colors"] * count)[:count]),
+        alpha=np.linspace(0.7, 1.0, count), envelope="pulse", loop=True,
+    )]
+
+
+BUILDERS = {
+    "energy_wave": _energy_wave,
+    "pop_smoke": _pop_smoke,
+    "sparkles": _sparkles,
+    "confetti": _confetti,
+    "progress_bar": _progress_bar,
+    "glow_pulse": _glow_pulse,
+}
+
+
+def simulate(spec: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+    """仕様のエフェクトを frames 枚分シミュレーションし、フレームごとの描画データ（粒子の集合のリスト）を返す"""
+    rng = np.random.default_rng(spec["seed"])
+    dt = 1.0 / spec["fps"]
+    systems = BUILDERS[spec["name"]](spec, rng, spec["frames"] * dt)
+    frames = []
+    for _ in range(spec["frames"]):
+        frames.append([system.snapshot(spec["size"]) for system in systems])
+        for system in systems:
+            system.step(dt)
+    return frames
+
+
+# ===============================================
+# ラスタライズ
+# ===============================================
+
+def _coverage(shape: str, dx: np.ndarray, dy: np.ndarray, size: np.ndarray, height: np.ndarray,
+              angle: np.ndarray) -> np.ndarray:
+    """粒子中心からのオフセット（dx: (N, 1, kx), dy: (N, ky, 1)）に対する各粒子の被覆率 (N, ky, kx) [0, 1]"""
+    size = size[:, None, None]
+    if shape == "rect":
+        cos, sin = np.cos(angle)[:, None, None], np.sin(angle)[:, None, None]
+        u = dx * cos + dy * sin
+        v = -dx * sin + dy * cos
+        # 辺の1pxをアンチエイリアス
+        return (np.clip(size - np.abs(u) + 0.5, 0, 1)
+                * np.clip(height[:, None, None] - np.abs(v) + 0.5, 0, 1))
+    distance2 = dx * dx + dy * dy
+    if shape == "disc":
+        return np.clip(size - np.sqrt(distance2) + 0.5, 0, 1)
+    sigma = np.maximum(size / 2.5, 0.5)
+    core = np.exp(-distance2 / (2 * sigma * sigma))
+    if shape == "soft":
+        return core
+    # star: 芯と十字の光条
+    cos, sin = np.cos(angle)[:, None, None], np.sin(angle)[:, None, None]
+    u = np.abs(dx * cos + dy * sin)
+    v = np.abs(-dx * sin + dy * cos)
+    width = np.maximum(size / 12, 0.6)
+    rays = (np.exp(-(v / width) ** 2) * np.clip(1 - u / (size * 2.5), 0, 1)
+            + np.exp(-(u / width) ** 2) * np.clip(1 - v / (size * 2.5), 0, 1))
+    return np.clip(core + rays, 0, 1)
+
+
+def _extent(layer: Dict[str, Any]) -> Tuple[int, int]:
+    """粒子を描く矩形の横・縦の半径（px）。soft はガウスの裾が消えるところまで、rect は回転後の外接矩形"""
+    size = layer["size"]
+    if layer["shape"] == "rect":
+        cos, sin = np.abs(np.cos(layer["angle"])), np.abs(np.sin(layer["angle"]))
+        reach_x = (size * cos + layer["height"] * sin).max()
+        reach_y = (size * sin + layer["height"] * cos).max()
+    else:
+        reach_x = reach_y = size.max() * {"star": 2.5, "soft": 1.3}.get(layer["shape"], 1.0)
+    return int(np.ceil(reach_x)) + 1, int(np.ceil(reach_y)) + 1
+
+
+def rasterize(layers: List[Dict[str, Any]], canvas: int) -> np.ndarray:
+    """
+    粒子の集合を順に重ねた乗算済みアルファのRGBA（float32）を返す
+    集合の中の粒子は加算（不透明度1で頭打ち）し、集合どうしはアルファブレンドで重ねる
+    """
+    out = np.zeros((canvas, canvas, 4), dtype=np.float32)
+    for layer in layers:
+        count = len(layer["x"])
+        if count == 0:
+            continue
+        reach_x, reach_y = _extent(layer)
+        offsets_x = np.arange(-reach_x, reach_x + 1)
+        offsets_y = np.arange(-reach_y, reach_y + 1)
+        # 各粒子の中心ピクセルからの (N, ky, kx) 格子で、被覆率をまとめて計算する
+        cx = np.floor(layer["x"]).astype(np.int64)
+        cy = np.floor(layer["y"]).astype(np.int64)
+        dx = offsets_x.astype(np.float32)[None, None, :] - (layer["x"] - cx - 0.5).astype(np.float32)[:, None, None]
+        dy = offsets_y.astype(np.float32)[None, :, None] - (layer["y"] - cy - 0.5).astype(np.float32)[:, None, None]
+        weight = _coverage(layer["shape"], dx, dy, layer["size"], layer["height"], layer["angle"])
+        weight = weight * layer["alpha"][:, None, None]
+
+        # 粒子が届く範囲（キャンバス内）だけに集計・合成する
+        x0, x1 = max(int(cx.min()) - reach_x, 0), min(int(cx.max()) + reach_x + 1, canvas)
+        y0, y1 = max(int(cy.min()) - reach_y, 0), min(int(cy.max()) + reach_y + 1, canvas)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        width, height = x1 - x0, y1 - y0
+        px = (cx - x0)[:, None, None] + offsets_x[None, None, :]
+        py = (cy - y0)[:, None, None] + offsets_y[None, :, None]
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height) & (weight > 1e-4)
+        index = (py * width + px)[inside]
+        weight_in = weight[inside]
+        colors = layer["color"][np.broadcast_to(np.arange(count)[:, None, None], inside.shape)[inside]]
+
+        pixels = width * height
+        alpha = np.bincount(index, weights=weight_in, minlength=pixels)
+        layer_rgba = np.empty((pixels, 4), dtype=np.float32)
+        for channel in range(3):
+            layer_rgba[:, channel] = np.bincount(
+                index, weights=weight_in * colors[:, channel], minlength=pixels)
+        # 不透明度の合計が1を超えた画素は色を加重平均にする（乗算済みアルファのまま）
+        scale = 1.0 / np.maximum(alpha, 1.0)
+        layer_rgba[:, :3] *= scale[:, None]
+        layer_rgba[:, 3] = np.minimum(alpha, 1.0)
+        layer_rgba = layer_rgba.reshape(height, width, 4)
+        region = out[y0:y1, x0:x1]
+        region *= 1.0 - layer_rgba[..., 3:4]
+        region += layer_rgba
+    return out
+
+
+def render_frame(job: Dict[str, Any]) -> int:
+    """1フレームをラスタライズしてPNGに書き出し、書き込んだバイト数を返す（プロセスプールで実行）"""
+    pixels = rasterize(job["layers"], job["size"])
+    return write_png(job["path"], to_uint8(pixels, straight_alpha=True))
+
+
+# ===============================================
+# 連番の書き出し
+# ===============================================
+
+def render_effects(specs: List[Dict[str, Any]], output_dir: str,
+                   workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    エフェクトの仕様（effect_spec の戻り値）ごとに <output_dir>/<name>/frame_NNNN.png を書き出し、
+    エフェクトごとのフレーム数・バイト数と全体のフレームレート（fps）を返す
+    workers は並列プロセス数（省略時は CM_EFFECT_WORKERS、0でCPUコア数）。1ならこのプロセスで書き出す
+    """
+    started = time.perf_counter()
+    jobs = []
+    effects = []
+    for spec in specs:
+        directory = os.path.join(output_dir, spec["name"])
+        os.makedirs(directory, exist_ok=True)
+        clear_sequence(directory)
+        frames = simulate(spec)
+        effects.append({"name": spec["name"], "output_dir": directory, "frames": len(frames),
+                        "size": [spec["size"], spec["size"]], "fps": spec["fps"], "seed": spec["seed"]})
+        jobs.extend(
+            {"path": os.path.join(directory, f"frame_{index + 1:04d}.png"), "layers": layers, "size": spec["size"],
+             "effect": len(effects) - 1}
+            for index, layers in enumerate(frames)
+        )
+    simulated = time.perf_counter() - started
+
+    workers = workers if workers is not None else EFFECT_WORKERS
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    if workers == 1:
+        written = [render_frame(job) for job in jobs]
+    else:
+        # CrewAIのスレッドを持つプロセスからforkしないようspawnで起動
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            written = list(executor.map(render_frame, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    elapsed = time.perf_counter() - started
+
+    for effect in effects:
+        effect["bytes"] = 0
+    for job, size in zip(jobs, written):
+        effects[job["effect"]]["bytes"] += size
+    return {
+        "effects": effects,
+        "frames": len(jobs),
+        "workers": workers,
+        "simulate_seconds": round(simulated, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "fps": round(len(jobs) / elapsed, 2) if elapsed > 0 else None,
+        "output_dir": output_dir,
+    }
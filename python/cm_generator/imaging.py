@@ -0,0 +1,101 @@
+"""
+画像素材の読み書きユーティリティ（合成・エフェクト・トランジションで共通）
+画素は float32 の乗算済みアルファ（premultiplied）RGBA [0, 1] で扱い、PNGの入出力だけ uint8 に変換する
+PNGのデコード・エンコードには Pillow を使用する（使用する関数の中でimport）
+"""
+
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from streaming import atomic_writer
+
+# 出力PNGのzlib圧縮レベル（連番の書き出しはエンコードが律速になるため低めにする）
+PNG_COMPRESS_LEVEL = int(os.getenv("CM_PNG_COMPRESS_LEVEL", "1"))
+
+PNG_EXTENSIONS = (".png",)
+
+
+def premultiply(rgba: np.ndarray) -> np.ndarray:
+    """uint8 のストレートアルファRGBAを float32 の乗算済みアルファに変換"""
+    layer = rgba.astype(np.float32)
+    layer *= 1.0 / 255.0
+    layer[..., :3] *= layer[..., 3:4]
+    return layer
+
+
+def to_uint8(pixels: np.ndarray, straight_alpha: bool = False) -> np.ndarray:
+    """
+    float32 の画素を uint8 に変換
+    straight_alpha=True ではRGBAの乗算済みアルファをPNG用のストレートアルファに戻す
+    """
+    if straight_alpha:
+        alpha = pixels[..., 3:4]
+        rgb = np.divide(pixels[..., :3], alpha, out=np.zeros_like(pixels[..., :3]), where=alpha > 0)
+        pixels = np.concatenate([rgb, alpha], axis=-1)
+    out = np.clip(pixels, 0.0, 1.0)
+    out *= 255.0
+    out += 0.5
+    return out.astype(np.uint8)
+
+
+def read_rgba(path: str, size: Optional[Tuple[int, int]] = None, flip: bool = False) -> np.ndarray:
+    """PNGを読み込み、size（幅, 高さ）へリサイズした乗算済みアルファのRGBAを返す"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert("RGBA")
+        if size is not None and image.size != tuple(size):
+            # PillowはRGBAのリサイズを内部で乗算済みアルファにして行うため、縁に色がにじまない
+            image = image.resize(tuple(size), Image.BILINEAR)
+        if flip:
+            image = image.transpose(Image.FLIP_LEFT_RIGHT)
+        return premultiply(np.asarray(image))
+
+
+def read_rgb(path: str, size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """PNGを読み込み、size（幅, 高さ）へリサイズした uint8 のRGBを返す（アルファは捨てる）"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        if size is not None and image.size != tuple(size):
+            image = image.resize(tuple(size), Image.BILINEAR)
+        return np.asarray(image)
+
+
+def image_size(path: str) -> Tuple[int, int]:
+    """PNGのヘッダーだけを読んで (幅, 高さ) を返す"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return image.size
+
+
+def write_png(path: str, pixels: np.ndarray, compress_level: int = PNG_COMPRESS_LEVEL) -> int:
+    """uint8 のRGB/RGBA配列をPNGとしてアトミックに書き込み、書き込んだバイト数を返す"""
+    from PIL import Image
+
+    with atomic_writer(path) as f:
+        Image.fromarray(pixels).save(f, format="PNG", compress_level=compress_level)
+        return f.tell()
+
+
+def list_sequence(directory: str) -> List[str]:
+    """連番ディレクトリのPNGをファイル名順に返す（ディレクトリがなければ空）"""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name) for name in sorted(os.listdir(directory))
+        if name.lower().endswith(PNG_EXTENSIONS) and not name.startswith(".")
+    ]
+
+
+def clear_sequence(directory: str) -> None:
+    """前回の書き出しの連番を消す（フレーム数を減らしたときに古いフレームが残らないように）"""
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if re.fullmatch(r"frame_\d+\.png", name):
+                os.remove(os.path.join(directory, name))
@@ -0,0 +1,167 @@
+"""
+CM生成の実行ジャーナル
+タスクごとの出力と入力ハッシュ、生成素材ごとの内容ハッシュと仕様を出力ディレクトリに記録し、
+--resume で入力が変わっていないタスク・素材をスキップできるようにする
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+
+from streaming import atomic_writer
+
+JOURNAL_DIRNAME = "_journal"
+JOURNAL_VERSION = 1
+
+
+def stable_hash(value: Any) -> str:
+    """キー順序に依存しない安定したハッシュ"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str) -> Optional[str]:
+    """ファイル内容のSHA-256（存在しなければNone）"""
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_task_hashes(tasks_config: dict, agents_config: dict, input_hashes: Dict[str, str]) -> Dict[str, str]:
+    """
+    各タスクの入力ハッシュを計算
+    タスク定義・担当エージェント定義・入力ファイル（ストーリーボード/演出指示書）のハッシュに加え、
+    依存タスクの入力ハッシュを含めるため、上流の変更は下流へ伝播する
+    """
+    hashes: Dict[str, str] = {}
+    for task_id, config in tasks_config.items():
+        if task_id in ['name', 'description']:
+            continue
+        hashes[task_id] = stable_hash({
+            "task": config,
+            "agent": agents_config.get(config.get('agent'), {}),
+            "inputs": input_hashes,
+            "upstream": {ctx: hashes.get(ctx) for ctx in config.get('context', [])},
+        })
+    return hashes
+
+
+def downstream_tasks(tasks_config: dict, roots: Iterable[str]) -> List[str]:
+    """指定タスクとそれに（推移的に）依存する全タスク"""
+    selected = set(roots)
+    for task_id, config in tasks_config.items():
+        if task_id in ['name', 'description']:
+            continue
+        if any(ctx in selected for ctx in config.get('context', [])):
+            selected.add(task_id)
+    return [t for t in tasks_config if t in selected]
+
+
+class RunJournal:
+    """出力ディレクトリ配下の _journal/journal.json に実行状況を記録する"""
+
+    def __init__(self, output_path: str, resume: bool = False, name: str = "journal"):
+        # サブクルーを別プロセスで並列実行する場合はクルーごとに別ファイル（name）へ記録する
+        self.path = os.path.join(output_path, JOURNAL_DIRNAME, f"{name}.json")
+        self.current_task: Optional[str] = None
+        self.pending_tasks: List[str] = []
+        self._lock = threading.Lock()
+        self.data = {"version": JOURNAL_VERSION, "inputs": {}, "tasks": {}, "assets": {}}
+
+        if resume and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if loaded.get("version") == JOURNAL_VERSION:
+                self.data = loaded
+
+    def save(self) -> None:
+        with self._lock:
+            payload = json.dumps(self.data, ensure_ascii=False, indent=2).encode("utf-8")
+        with atomic_writer(self.path) as f:
+            f.write(payload)
+
+    # ---------- タスク ----------
+
+    def set_inputs(self, input_hashes: Dict[str, str]) -> None:
+        with self._lock:
+            self.data["inputs"] = input_hashes
+
+    def is_task_current(self, task_id: str, input_hash: str) -> bool:
+        entry = self.data["tasks"].get(task_id)
+        return bool(entry) and entry.get("status") == "completed" and entry.get("input_hash") == input_hash
+
+    def task_output(self, task_id: str) -> Optional[str]:
+        entry = self.data["tasks"].get(task_id)
+        return entry.get("output") if entry else None
+
+    def set_pending_tasks(self, task_ids: List[str]) -> None:
+        """実行順の未完了タスクを設定し、先頭を実行中タスクにする"""
+        self.pending_tasks = list(task_ids)
+        self.current_task = self.pending_tasks[0] if self.pending_tasks else None
+
+    def record_task(self, task_id: str, input_hash: str, output: str, agent: Optional[str] = None) -> None:
+        """タスクの完了を記録し、実行中タスクを次の未完了タスクへ進める"""
+        with self._lock:
+            self.data["tasks"][task_id] = {
+                "status": "completed",
+                "input_hash": input_hash,
+                "output": output,
+                "agent": agent,
+                "completed_at": datetime.now().isoformat(),
+            }
+            if task_id in self.pending_tasks:
+                index = self.pending_tasks.index(task_id) + 1
+                self.current_task = self.pending_tasks[index] if index < len(self.pending_tasks) else None
+        self.save()
+
+    def invalidate_task(self, task_id: str) -> int:
+        """タスクの記録と、そのタスク中に生成された素材の記録を削除。削除した素材数を返す"""
+        with self._lock:
+            self.data["tasks"].pop(task_id, None)
+            stale = [path for path, entry in self.data["assets"].items() if entry.get("task") == task_id]
+            for path in stale:
+                del self.data["assets"][path]
+        return len(stale)
+
+    # ---------- 素材 ----------
+
+    def asset_is_current(self, output_path: str, spec: Dict[str, Any]) -> bool:
+        """同じ仕様で生成済み、かつファイル内容が記録時から変わっていなければTrue"""
+        entry = self.data["assets"].get(os.path.abspath(output_path))
+        if not entry or entry.get("spec_hash") != stable_hash(spec):
+            return False
+        return file_hash(output_path) == entry.get("content_hash")
+
+    def record_asset(self, output_path: str, spec: Dict[str, Any]) -> None:
+        content_hash = file_hash(output_path)
+        if content_hash is None:
+            return
+        with self._lock:
+            self.data["assets"][os.path.abspath(output_path)] = {
+                "spec": spec,
+                "spec_hash": stable_hash(spec),
+                "content_hash": content_hash,
+                "task": self.current_task,
+                "generated_at": datetime.now().isoformat(),
+            }
+        self.save()
+
+
+_active_journal: Optional[RunJournal] = None
+
+
+def set_active_journal(journal: Optional[RunJournal]) -> None:
+    """ツールから参照する実行中のジャーナルを設定"""
+    global _active_journal
+    _active_journal = journal
+
+
+def active_journal() -> Optional[RunJournal]:
+    return _active_journal
@@ -4,22 +4,43 @@ CM素材自動生成クルー - メイン実行スクリプト
 使用方法:
     python main.py --storyboard input/storyboard.md --direction input/direction_spec.md
 
+    # 前回の実行を再開（入力が変わっていないタスク・素材はスキップ）
+    python main.py -s input/storyboard.md -d input/direction_spec.md --resume
+
+    # 特定タスクとその下流タスクだけを再実行
+    python main.py -s input/storyboard.md -d input/direction_spec.md --resume --rerun generate_backgrounds
+
+    # crew.yaml のサブクルー単位で実行（独立したクルーは別プロセスで並列実行）
+    python main.py -s input/storyboard.md -d input/direction_spec.md --orchestrate
+
+    # 複数のストーリーボード・演出指示書の組をまとめて生成（batch.py を参照）
+    python main.py --batch input/batch.json --batch-concurrency 4 -o ./cm_batch
+
 出力:
     ./cm_assets/ フォルダに全素材が生成される
 """
 
 import os
+import sys
 import argparse
-import yaml
-from pathlib import Path
 from datetime import datetime
 
-from crewai import Agent, Task, Crew, Process
-from tools import get_all_tools
+# crewai・ツール（各プロバイダーのSDK）・yamlは使用する関数の中でimportし、
+# 起動時間を短縮する（プランのキャッシュヒット時はyamlも読み込まない）
+from plan import load_plan
+from tool_registry import TOOL_REGISTRY, ToolRegistry, ToolLease
+from journal import (
+    RunJournal, set_active_journal, compute_task_hashes, downstream_tasks, file_hash
+)
+
+# LLMのプールは実行エンジン（python/）と共通のものを使う
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_pool import LLMPool
 
 
 def load_yaml(filepath: str) -> dict:
     """YAMLファイルを読み込む"""
+    import yaml
     with open(filepath, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
@@ -55,22 +76,59 @@ def create_output_structure(base_path: str) -> None:
     print(f"✅ 出力フォルダ構造を作成しました: {base_path}")
 
 
-def create_agents(agents_config: dict) -> dict:
-    """設定からエージェントを作成"""
-    tools = get_all_tools()
-    tool_map = {tool.name: tool for tool in tools}
+def _create_llm(**params):
+    from crewai import LLM
+    from crewai.utilities.llm_utils import create_llm
+    if params.get('model'):
+        return LLM(**params)
+    # モデルの指定がなければCrewAIの既定（環境変数 MODEL など）
+    return create_llm(None)
+
+
+# 正規化したLLM設定 → 共有するLLMインスタンス（LRUで上限付き）
+LLM_POOL = LLMPool(_create_llm)
+
+
+def shared_llm(llm_config=None):
+    """
+    同じ設定のエージェントで共有するLLMを取得
+    llm_config はモデル名の文字列、model / temperature / max_tokens / base_url の辞書、
+    またはNone（CrewAIの既定モデル）
+    """
+    if isinstance(llm_config, dict):
+        params = {k: v for k, v in llm_config.items() if v is not None}
+    else:
+        params = {'model': llm_config} if llm_config else {}
+    return LLM_POOL.get(params)
+
+
+def create_agents(agents_config: dict, tools: ToolLease = None) -> dict:
+    """
+    設定からエージェントを作成
+    ツールはレジストリのリースから、LLMは設定ごとの共有インスタンスから取得するため、
+    同じツール・同じLLM設定を使うエージェントは同じインスタンスを共有する
+    エージェントは context_budget のあるタスクでcontextを圧縮できるクラスで作成する（create_tasks を参照）
+    """
+    from context_compaction import compacting_agent_class
+    
+    Agent = compacting_agent_class()
+    
+    if tools is None:
+        # リースが渡されなければ、この呼び出し専用のインスタンスを作成
+        tools = ToolRegistry().lease()
     
     agents = {}
     for agent_id, config in agents_config.items():
         if agent_id in ['name', 'description']:
             continue
-            
-        agent_tools = [tool_map[t] for t in config.get('tools', []) if t in tool_map]
+        
+        agent_tools = [tool for tool in (tools.get(t) for t in config.get('tools', [])) if tool is not None]
         
         agents[agent_id] = Agent(
             role=config['role'],
             goal=config['goal'],
             backstory=config['backstory'],
+            llm=shared_llm(config.get('llm')),
             tools=agent_tools,
             verbose=config.get('verbose', True),
             allow_delegation=config.get('allow_delegation', False),
@@ -80,8 +138,18 @@ def create_agents(agents_config: dict) -> dict:
     return agents
 
 
-def create_tasks(tasks_config: dict, agents: dict) -> list:
-    """設定からタスクを作成"""
+def create_tasks(tasks_config: dict, agents: dict, journal: RunJournal = None,
+                 task_hashes: dict = None, compactor=None) -> list:
+    """
+    設定からタスクを作成
+    ジャーナルに同じ入力ハッシュで完了済みと記録されたタスクは、前回の出力を持った
+    完了済みタスクとして作成し、下流タスクのコンテキストとしてのみ使用する
+    compactor を渡すと、context_budget のあるタスクは上流タスクの出力を予算内に圧縮して受け取る
+    """
+    from crewai import Task
+    from crewai.tasks.task_output import TaskOutput
+    from context_compaction import resolve_context_budget
+    
     tasks = []
     task_map = {}
     
@@ -95,12 +163,34 @@ def create_tasks(tasks_config: dict, agents: dict) -> list:
             if ctx_id in task_map:
                 context_tasks.append(task_map[ctx_id])
         
-        task = Task(
-            description=config['description'],
-            expected_output=config['expected_output'],
-            agent=agents.get(config['agent']),
-            context=context_tasks if context_tasks else None,
-        )
+        agent = agents.get(config['agent'])
+        task_params = {
+            "name": task_id,
+            "description": config['description'],
+            "expected_output": config['expected_output'],
+            "agent": agent,
+            "context": context_tasks if context_tasks else None,
+        }
+        
+        if journal is not None:
+            input_hash = task_hashes[task_id]
+            # 完了時にタスク出力をジャーナルへチェックポイント
+            task_params["callback"] = _checkpoint_callback(journal, task_id, input_hash)
+        
+        task = Task(**task_params)
+        
+        budget = resolve_context_budget(config.get('context_budget'), name=f"{task_id}.context_budget")
+        if compactor is not None and budget is not None and agent is not None:
+            compactor.set_budget(task, task_id, budget)
+            agent._context_compactor = compactor
+        
+        if journal is not None and journal.is_task_current(task_id, task_hashes[task_id]):
+            task.output = TaskOutput(
+                name=task_id,
+                description=config['description'],
+                raw=journal.task_output(task_id) or "",
+                agent=agent.role if agent else "",
+            )
         
         tasks.append(task)
         task_map[task_id] = task
@@ -108,8 +198,34 @@ def create_tasks(tasks_config: dict, agents: dict) -> list:
     return tasks
 
 
-def run_cm_generator(storyboard_path: str, direction_path: str, output_path: str) -> None:
-    """CM素材生成を実行"""
+def _checkpoint_callback(journal: RunJournal, task_id: str, input_hash: str):
+    """タスク完了時に出力をジャーナルへ記録するコールバック"""
+    def on_complete(output):
+        journal.record_task(task_id, input_hash, str(output), agent=getattr(output, "agent", None))
+    return on_complete
+
+
+def load_knowledge(storyboard_path: str, direction_path: str, output_path: str):
+    """
+    ストーリーボードと演出指示書を出力先の _knowledge/ に取り込み、knowledge_search ツールから検索できるようにする
+    取り込み済みのチャンクは内容ハッシュで判定して埋め込み直さない（--resume・サブクルーでの再読み込み）
+    """
+    from knowledge_ingest import open_knowledge, ingest_files, set_active_knowledge
+
+    knowledge = open_knowledge(os.path.join(output_path, "_knowledge"))
+    stats = ingest_files([storyboard_path, direction_path], knowledge)
+    print(f"📚 ナレッジ: {stats['chunks']}チャンク（新規 {stats['embedded']} / 重複 {stats['duplicates']}"
+          f" / 取り込み済み {stats['existing']}）{stats['elapsed_seconds']:.2f}秒")
+    set_active_knowledge(knowledge)
+    return knowledge
+
+
+def run_cm_generator(storyboard_path: str, direction_path: str, output_path: str,
+                     resume: bool = False, rerun: list = None, inputs: dict = None) -> None:
+    """
+    CM素材生成を実行
+    inputs はタスク・エージェントの {変数} に追加で埋め込む値（バッチのA/Bバリエーションなど）
+    """
     
     print("=" * 60)
     print("🎬 CM素材自動生成クルー")
@@ -119,11 +235,15 @@ def run_cm_generator(storyboard_path: str, direction_path: str, output_path: str
     print(f"📁 出力先: {output_path}")
     print("=" * 60)
     
-    # 設定ファイルの読み込み
-    base_dir = Path(__file__).parent
-    agents_config = load_yaml(base_dir / "agents.yaml")
-    tasks_config = load_yaml(base_dir / "tasks.yaml")
-    crew_config = load_yaml(base_dir / "crew.yaml")
+    from crewai import Crew, Process
+    from transport import transport_metrics
+    from knowledge_ingest import set_active_knowledge
+    from context_compaction import ContextCompactor
+    
+    # 設定ファイルの読み込み（検証済みプランのキャッシュを使用）
+    plan = load_plan()
+    agents_config = plan["agents"]
+    tasks_config = plan["tasks"]
     
     # 出力フォルダ構造の作成
     create_output_structure(output_path)
@@ -132,14 +252,52 @@ def run_cm_generator(storyboard_path: str, direction_path: str, output_path: str
     input_dir = os.path.join(output_path, "_input")
     os.makedirs(input_dir, exist_ok=True)
     
+    # 実行ジャーナル（--resume時は前回の記録を引き継ぐ）
+    journal = RunJournal(output_path, resume=resume)
+    input_hashes = {
+        "storyboard": file_hash(storyboard_path),
+        "direction": file_hash(direction_path),
+    }
+    journal.set_inputs(input_hashes)
+    task_hashes = compute_task_hashes(tasks_config, agents_config, input_hashes)
+    
+    # 指定タスクとその下流を無効化
+    if rerun:
+        unknown = [t for t in rerun if t not in task_hashes]
+        if unknown:
+            print(f"⚠️  不明なタスクを無視します: {', '.join(unknown)}")
+        for task_id in downstream_tasks(tasks_config, [t for t in rerun if t in task_hashes]):
+            removed = journal.invalidate_task(task_id)
+            print(f"🔁 再実行対象: {task_id}（素材記録 {removed}件を無効化）")
+    journal.save()
+    set_active_journal(journal)
+    
+    # 入力文書をナレッジとして取り込み（エージェントは knowledge_search で必要な箇所だけを参照する）
+    load_knowledge(storyboard_path, direction_path, output_path)
+    
     # エージェントとタスクの作成
     print("\n🤖 エージェントを初期化中...")
-    agents = create_agents(agents_config)
+    tools = TOOL_REGISTRY.lease()
+    agents = create_agents(agents_config, tools)
     print(f"   {len(agents)}体のエージェントを作成しました")
     
     print("\n📋 タスクを初期化中...")
-    tasks = create_tasks(tasks_config, agents)
-    print(f"   {len(tasks)}個のタスクを作成しました")
+    compactor = ContextCompactor()
+    all_tasks = create_tasks(tasks_config, agents, journal=journal, task_hashes=task_hashes, compactor=compactor)
+    tasks = [task for task in all_tasks if task.output is None]
+    print(f"   {len(all_tasks)}個のタスクを作成しました")
+    if len(tasks) < len(all_tasks):
+        print(f"   ⏭️  {len(all_tasks) - len(tasks)}個のタスクは前回の出力を再利用します")
+    
+    if not tasks:
+        print("\n✅ すべてのタスクが完了済みです（入力に変更なし）")
+        set_active_journal(None)
+        set_active_knowledge(None)
+        tools.release()
+        return None
+    
+    # 素材の記録に使用する実行中タスク（sequentialのため先頭の未完了タスクから順に進む）
+    journal.set_pending_tasks([task.name for task in tasks])
     
     # クルーの作成
     print("\n🚀 クルーを起動中...")
@@ -157,18 +315,41 @@ def run_cm_generator(storyboard_path: str, direction_path: str, output_path: str
     print("=" * 60)
     
     inputs = {
+        **(inputs or {}),
         "storyboard_path": storyboard_path,
         "direction_path": direction_path,
         "output_path": output_path,
     }
     
-    result = crew.kickoff(inputs=inputs)
+    try:
+        result = crew.kickoff(inputs=inputs)
+    finally:
+        set_active_journal(None)
+        set_active_knowledge(None)
+        tools.release()
     
     # 完了
     print("\n" + "=" * 60)
     print("✅ 素材生成が完了しました！")
     print("=" * 60)
     print(f"📁 出力先: {output_path}")
+    
+    # 共有インスタンス数（15体のエージェントでもツール・LLMは設定ごとに1つ）
+    tool_stats = TOOL_REGISTRY.stats()
+    print(f"🧰 ツール: {tool_stats['instances']}インスタンス / LLM: {LLM_POOL.stats()['clients']}インスタンス")
+    
+    # 接続再利用率（プロバイダー別）
+    for provider, metrics in transport_metrics().items():
+        if metrics["requests"]:
+            print(f"🔌 {provider}: {metrics['requests']}リクエスト / {metrics['connections']}接続"
+                  f"（再利用率 {metrics['reuse_rate']:.0%}）")
+    
+    # context_budget のあるタスクに渡した上流出力の圧縮結果
+    if compactor.records:
+        totals = compactor.report()["totals"]
+        print(f"✂️  context: {totals['before_tokens']} → {totals['after_tokens']}トークン"
+              f"（推定短縮 {totals['estimated_latency_saved_s']:.1f}秒）")
+    
     print("\n次のステップ:")
     print("1. 動画編集ソフトでフォルダをインポート")
     print("2. sequences/timeline.json を参照してタイムラインを構築")
@@ -182,14 +363,14 @@ def main():
     parser.add_argument(
         "--storyboard", "-s",
         type=str,
-        required=True,
-        help="ストーリーボードファイルのパス"
+        default=None,
+        help="ストーリーボードファイルのパス（--batch 以外では必須）"
     )
     parser.add_argument(
         "--direction", "-d",
         type=str,
-        required=True,
-        help="演出指示書ファイルのパス"
+        default=None,
+        help="演出指示書ファイルのパス（--batch 以外では必須）"
     )
     parser.add_argument(
         "--output", "-o",
@@ -198,8 +379,61 @@ def main():
         help="出力ディレクトリ（デフォルト: ./cm_assets）"
     )
     
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="前回の実行ジャーナルから再開（入力が変わっていないタスク・素材をスキップ）"
+    )
+    parser.add_argument(
+        "--rerun",
+        type=str,
+        action="append",
+        default=[],
+        metavar="TASK_ID",
+        help="指定タスクとその下流タスクを再実行（複数指定可）"
+    )
+    parser.add_argument(
+        "--orchestrate",
+        action="store_true",
+        help="crew.yaml のサブクルーを依存関係に従って実行（独立したクルーは並列）"
+    )
+    parser.add_argument(
+        "--max-parallel-crews",
+        type=int,
+        default=None,
+        help="--orchestrate時に同時実行するサブクルー数（デフォルト: CM_MAX_PARALLEL_CREWS または 3）"
+    )
+    
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="ストーリーボード・演出指示書の組を並べたJSON/JSONLファイル（組ごとに <出力先>/<name>/ へ生成）"
+    )
+    parser.add_argument(
+        "--batch-concurrency",
+        type=int,
+        default=None,
+        help="--batch時に同時に生成する組数（デフォルト: CM_BATCH_CONCURRENCY または 2）"
+    )
+    
     args = parser.parse_args()
     
+    if args.batch:
+        from batch import load_batch, run_batch, BatchSpecError, BATCH_CONCURRENCY
+        try:
+            items = load_batch(args.batch, args.output)
+        except (OSError, BatchSpecError) as e:
+            print(f"❌ バッチファイルを読み込めません: {e}")
+            return
+        run_batch(items, args.output, resume=args.resume,
+                  max_parallel=args.batch_concurrency or BATCH_CONCURRENCY)
+        return
+    
+    if not args.storyboard or not args.direction:
+        parser.error("--storyboard と --direction を指定してください（または --batch）")
+    
     # ファイル存在チェック
     if not os.path.exists(args.storyboard):
         print(f"❌ ストーリーボードが見つかりません: {args.storyboard}")
@@ -209,8 +443,18 @@ def main():
         print(f"❌ 演出指示書が見つかりません: {args.direction}")
         return
     
+    if args.orchestrate:
+        # orchestratorはmainの関数を使うため、循環importを避けてここで読み込む
+        from orchestrator import run_orchestrated, MAX_PARALLEL_CREWS
+        create_output_structure(args.output)
+        run_orchestrated(args.storyboard, args.direction, args.output,
+                         resume=args.resume, rerun=args.rerun,
+                         max_parallel=args.max_parallel_crews or MAX_PARALLEL_CREWS)
+        return
+    
     # 実行
-    run_cm_generator(args.storyboard, args.direction, args.output)
+    run_cm_generator(args.storyboard, args.direction, args.output,
+                     resume=args.resume, rerun=args.rerun)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,334 @@
+"""
+マルチクルー・オーケストレーター
+crew.yaml のサブクルーを個別のCrewとして構築し、タスクのcontextから導いたクルー間の依存関係に従って
+独立したサブクルー（アート・オーディオ・タイポグラフィなど）を別プロセスで並列実行する
+
+クルー間の出力の受け渡しは出力ディレクトリ配下の共有アーティファクトストア（_artifacts/）を経由し、
+下流クルーは上流タスクの出力を完了済みタスクのコンテキストとして受け取る
+"""
+
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+from streaming import atomic_writer
+from journal import RunJournal, compute_task_hashes, downstream_tasks, file_hash
+
+ARTIFACTS_DIRNAME = "_artifacts"
+
+# 同時に実行するサブクルー数の上限
+MAX_PARALLEL_CREWS = int(os.getenv("CM_MAX_PARALLEL_CREWS", "3"))
+
+BASE_DIR = Path(__file__).parent
+
+
+class CrewGraphError(ValueError):
+    """crew.yaml と tasks.yaml の組み合わせからクルーの依存関係を構築できない"""
+    pass
+
+
+# ===============================================
+# アーティファクトストア
+# ===============================================
+
+class ArtifactStore:
+    """タスク出力を _artifacts/<task_id>.json として保存し、プロセス間で共有する"""
+
+    def __init__(self, output_path: str):
+        self.root = os.path.join(output_path, ARTIFACTS_DIRNAME)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.root, f"{task_id}.json")
+
+    def put(self, task_id: str, crew_id: str, raw: str, input_hash: str, agent: Optional[str] = None) -> None:
+        payload = {
+            "task": task_id,
+            "crew": crew_id,
+            "agent": agent,
+            "input_hash": input_hash,
+            "raw": raw,
+            "stored_at": datetime.now().isoformat(),
+        }
+        with atomic_writer(self._path(task_id)) as f:
+            f.write(json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(task_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def remove(self, task_id: str) -> None:
+        try:
+            os.unlink(self._path(task_id))
+        except FileNotFoundError:
+            pass
+
+    def write_report(self, report: Dict[str, Any]) -> str:
+        path = os.path.join(self.root, "orchestration.json")
+        with atomic_writer(path) as f:
+            f.write(json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8"))
+        return path
+
+
+# ===============================================
+# クルー間の依存関係
+# ===============================================
+
+def task_owners(crew_config: dict, tasks_config: dict) -> Dict[str, str]:
+    """タスクID → 所属クルーID。未割り当てや重複割り当てのタスクがあればCrewGraphError"""
+    owners: Dict[str, str] = {}
+    for crew_id, config in crew_config.get("crews", {}).items():
+        for task_id in config.get("tasks", []):
+            if task_id not in tasks_config:
+                raise CrewGraphError(f"Crew '{crew_id}' references unknown task '{task_id}'")
+            if task_id in owners:
+                raise CrewGraphError(f"Task '{task_id}' is assigned to both '{owners[task_id]}' and '{crew_id}'")
+            owners[task_id] = crew_id
+
+    unassigned = [t for t in tasks_config if t not in ['name', 'description'] and t not in owners]
+    if unassigned:
+        raise CrewGraphError(f"Tasks not assigned to any crew: {', '.join(unassigned)}")
+    return owners
+
+
+def crew_dependencies(crew_config: dict, tasks_config: dict) -> Dict[str, Set[str]]:
+    """
+    クルーID → 依存する上流クルーIDの集合
+    他クルーのタスクをcontextに持つタスクがあればそのクルーに依存し、crew.yaml の depends_on も加える
+    """
+    owners = task_owners(crew_config, tasks_config)
+    crews = crew_config.get("crews", {})
+    deps: Dict[str, Set[str]] = {crew_id: set(config.get("depends_on", [])) for crew_id, config in crews.items()}
+
+    for task_id, crew_id in owners.items():
+        for ctx in tasks_config[task_id].get("context", []):
+            upstream = owners.get(ctx)
+            if upstream is not None and upstream != crew_id:
+                deps[crew_id].add(upstream)
+
+    for crew_id, upstream in deps.items():
+        unknown = upstream - set(crews)
+        if unknown:
+            raise CrewGraphError(f"Crew '{crew_id}' depends on unknown crews: {', '.join(sorted(unknown))}")
+
+    _check_acyclic(deps)
+    return deps
+
+
+def _check_acyclic(deps: Dict[str, Set[str]]) -> None:
+    remaining = {crew_id: set(upstream) for crew_id, upstream in deps.items()}
+    while remaining:
+        ready = [crew_id for crew_id, upstream in remaining.items() if not upstream]
+        if not ready:
+            raise CrewGraphError(f"Circular dependency between crews: {', '.join(sorted(remaining))}")
+        for crew_id in ready:
+            del remaining[crew_id]
+        for upstream in remaining.values():
+            upstream.difference_update(ready)
+
+
+# ===============================================
+# サブクルーの実行（子プロセス）
+# ===============================================
+
+def run_sub_crew(crew_id: str, storyboard_path: str, direction_path: str, output_path: str,
+                 resume: bool = False) -> Dict[str, Any]:
+    """
+    1つのサブクルーを実行する（ProcessPoolExecutorの子プロセスで呼ばれる）
+    上流クルーのタスク出力はアーティファクトストアから読み込み、完了済みタスクとしてcontextに渡す
+    """
+    from crewai import Crew, Process
+    from crewai.tasks.task_output import TaskOutput
+    from main import create_agents, create_tasks, load_knowledge
+    from knowledge_ingest import set_active_knowledge
+    from tool_registry import TOOL_REGISTRY
+    from journal import set_active_journal
+    from plan import load_plan
+    from context_compaction import ContextCompactor
+
+    started = time.perf_counter()
+    plan = load_plan()
+    agents_config = plan["agents"]
+    tasks_config = plan["tasks"]
+    config = plan["crew"]["crews"][crew_id]
+    own_tasks = set(config.get("tasks", []))
+
+    store = ArtifactStore(output_path)
+    input_hashes = {"storyboard": file_hash(storyboard_path), "direction": file_hash(direction_path)}
+    task_hashes = compute_task_hashes(tasks_config, agents_config, input_hashes)
+
+    # このクルーのタスクと、そのcontextに現れる上流タスクだけを定義順に構築する
+    upstream_tasks = {ctx for t in own_tasks for ctx in tasks_config[t].get("context", [])} - own_tasks
+    selected_tasks = {t: c for t, c in tasks_config.items() if t in own_tasks or t in upstream_tasks}
+    tools = TOOL_REGISTRY.lease()
+    agents = create_agents({a: c for a, c in agents_config.items() if a in config.get("agents", [])}, tools)
+
+    journal = RunJournal(output_path, resume=resume, name=crew_id)
+    journal.set_inputs(input_hashes)
+    compactor = ContextCompactor()
+    all_tasks = create_tasks(selected_tasks, agents, journal=journal, task_hashes=task_hashes, compactor=compactor)
+
+    for task in all_tasks:
+        if task.name in upstream_tasks:
+            artifact = store.get(task.name)
+            if artifact is None:
+                raise CrewGraphError(f"Missing artifact '{task.name}' required by crew '{crew_id}'")
+            task.output = TaskOutput(name=task.name, description=task.description,
+                                     raw=artifact["raw"], agent=artifact.get("agent") or "")
+
+    tasks = [task for task in all_tasks if task.name in own_tasks and task.output is None]
+    reused = len(own_tasks) - len(tasks)
+
+    try:
+        if tasks:
+            journal.set_pending_tasks([task.name for task in tasks])
+            load_knowledge(storyboard_path, direction_path, output_path)
+            set_active_journal(journal)
+            crew = Crew(
+                agents=list(agents.values()),
+                tasks=tasks,
+                process=Process.hierarchical if config.get("process") == "hierarchical" else Process.sequential,
+                verbose=config.get("verbose", True),
+                memory=config.get("memory", False),
+            )
+            try:
+                crew.kickoff(inputs={
+                    "storyboard_path": storyboard_path,
+                    "direction_path": direction_path,
+                    "output_path": output_path,
+                })
+            finally:
+                set_active_journal(None)
+                set_active_knowledge(None)
+    finally:
+        tools.release()
+
+    # 再利用したタスクを含め、このクルーの全出力を下流クルー向けに公開
+    for task in all_tasks:
+        if task.name in own_tasks and task.output is not None:
+            artifact = store.get(task.name)
+            if artifact is None or artifact.get("input_hash") != task_hashes[task.name]:
+                store.put(task.name, crew_id, task.output.raw, task_hashes[task.name],
+                          agent=getattr(task.output, "agent", None))
+
+    report = {
+        "crew": crew_id,
+        "tasks_run": len(tasks),
+        "tasks_reused": reused,
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
+    if compactor.records:
+        report["context"] = compactor.report()["totals"]
+    return report
+
+
+# ===============================================
+# オーケストレーション（親プロセス）
+# ===============================================
+
+def run_orchestrated(storyboard_path: str, direction_path: str, output_path: str,
+                     resume: bool = False, rerun: Optional[List[str]] = None,
+                     max_parallel: int = MAX_PARALLEL_CREWS) -> Dict[str, Any]:
+    """依存関係が解決したサブクルーから順に別プロセスで起動し、クルーごとの実行時間を返す"""
+    from plan import load_plan
+
+    plan = load_plan()
+    tasks_config = plan["tasks"]
+    deps = plan["crew_dependencies"]
+    owners = plan["task_owners"]
+    store = ArtifactStore(output_path)
+
+    # 指定タスクとその下流を、担当クルーのジャーナルとアーティファクトから削除
+    if rerun:
+        unknown = [t for t in rerun if t not in owners]
+        if unknown:
+            print(f"⚠️  不明なタスクを無視します: {', '.join(unknown)}")
+        targets = downstream_tasks(tasks_config, [t for t in rerun if t in owners])
+        for crew_id in sorted({owners[t] for t in targets}):
+            journal = RunJournal(output_path, resume=True, name=crew_id)
+            for task_id in targets:
+                if owners[task_id] == crew_id:
+                    removed = journal.invalidate_task(task_id)
+                    store.remove(task_id)
+                    print(f"🔁 再実行対象: {crew_id}/{task_id}（素材記録 {removed}件を無効化）")
+            journal.save()
+
+    print("\n🧭 クルー依存関係:")
+    for crew_id, upstream in deps.items():
+        print(f"   {crew_id} ← {', '.join(sorted(upstream)) if upstream else '(なし)'}")
+
+    run_started = time.perf_counter()
+    timings: Dict[str, Dict[str, Any]] = {}
+    pending = {crew_id: set(upstream) for crew_id, upstream in deps.items()}
+    done: Set[str] = set()
+    failed: Set[str] = set()
+    running = {}
+
+    # 子プロセスでCrewAI/LLMクライアントを確実に初期化し直すためspawnで起動
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, max_parallel), mp_context=context) as executor:
+        while pending or running:
+            ready = [crew_id for crew_id, upstream in pending.items() if upstream <= done]
+            for crew_id in ready:
+                del pending[crew_id]
+                print(f"▶️  {crew_id} を開始")
+                timings[crew_id] = {"start": round(time.perf_counter() - run_started, 3)}
+                future = executor.submit(run_sub_crew, crew_id, storyboard_path, direction_path,
+                                         output_path, resume)
+                running[future] = crew_id
+
+            # 上流が失敗したクルーは実行しない
+            for crew_id in [c for c, upstream in pending.items() if upstream & failed]:
+                del pending[crew_id]
+                failed.add(crew_id)
+                timings[crew_id] = {"status": "skipped", "blocked_by": sorted(deps[crew_id] & failed)}
+                print(f"⏭️  {crew_id} をスキップ（上流クルーが失敗）")
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                crew_id = running.pop(future)
+                timing = timings[crew_id]
+                timing["end"] = round(time.perf_counter() - run_started, 3)
+                timing["wall_clock"] = round(timing["end"] - timing["start"], 3)
+                try:
+                    timing.update(future.result())
+                    timing["status"] = "completed"
+                    done.add(crew_id)
+                    print(f"✅ {crew_id} 完了（{timing['wall_clock']:.1f}秒）")
+                except Exception as e:
+                    timing.update({"status": "failed", "error": str(e)})
+                    failed.add(crew_id)
+                    print(f"❌ {crew_id} 失敗: {e}")
+
+    total = round(time.perf_counter() - run_started, 3)
+    serial = sum(t.get("wall_clock", 0) for t in timings.values())
+    report = {
+        "success": not failed,
+        "wall_clock": total,
+        "serial_wall_clock": round(serial, 3),
+        "dependencies": {crew_id: sorted(upstream) for crew_id, upstream in deps.items()},
+        "crews": timings,
+        "completed_at": datetime.now().isoformat(),
+    }
+    report_path = store.write_report(report)
+
+    print("\n⏱️  クルー別実行時間:")
+    for crew_id, timing in timings.items():
+        if "wall_clock" in timing:
+            print(f"   {crew_id:<18} {timing['start']:>8.1f}s → {timing['end']:>8.1f}s  ({timing['wall_clock']:.1f}s)")
+        else:
+            print(f"   {crew_id:<18} {timing.get('status')}")
+    print(f"   合計 {total:.1f}s（直列換算 {serial:.1f}s）")
+    print(f"📊 レポート: {report_path}")
+    return report
@@ -0,0 +1,177 @@
+"""
+コンパイル済みクループラン
+agents.yaml / tasks.yaml / crew.yaml を読み込んで検証し、タスク順序とクルー間の依存関係まで解決した結果を
+JSONでキャッシュする。YAMLのmtime・サイズが変わっていなければファイルを読まずに、
+mtimeだけが変わった場合は内容ハッシュが一致すればパースと検証を省略する
+キャッシュはユーザーのキャッシュディレクトリ（~/.cache/crewai-japan/cm_plan/）に設定ディレクトリごとに置く。
+読み込み時にコードを実行しないよう pickle ではなく JSON を使い、形式が合わないファイルは無視して作り直す
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from streaming import atomic_writer
+
+PLAN_VERSION = 2
+CONFIG_FILES = ("agents.yaml", "tasks.yaml", "crew.yaml")
+
+BASE_DIR = Path(__file__).parent
+
+# CM_PLAN_CACHE=0 でキャッシュを無効化（毎回YAMLを読み込んで検証する）
+PLAN_CACHE_ENABLED = os.getenv("CM_PLAN_CACHE", "1") != "0"
+PLAN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "crewai-japan", "cm_plan")
+PLAN_CACHE_PATH = os.getenv("CM_PLAN_CACHE_PATH")
+
+# tasks.yaml / agents.yaml のトップレベルでタスク・エージェント以外のキー
+META_KEYS = ("name", "description")
+
+
+class PlanError(ValueError):
+    """YAML設定が不整合でクループランを構築できない"""
+    pass
+
+
+def _stat_key(base_dir: Path) -> List[list]:
+    key = []
+    for name in CONFIG_FILES:
+        st = os.stat(base_dir / name)
+        key.append([name, st.st_mtime_ns, st.st_size])
+    return key
+
+
+def default_cache_path(base_dir: Path) -> str:
+    """設定ディレクトリごとのキャッシュファイル（別のプロジェクトのプランと混ざらないようにする）"""
+    digest = hashlib.sha256(str(Path(base_dir).resolve()).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(PLAN_CACHE_DIR, f"{digest}.json")
+
+
+def _content_hash(base_dir: Path) -> str:
+    digest = hashlib.sha256()
+    for name in CONFIG_FILES:
+        digest.update(name.encode("utf-8"))
+        digest.update((base_dir / name).read_bytes())
+    return digest.hexdigest()
+
+
+def _entries(config: dict) -> Dict[str, dict]:
+    return {k: v for k, v in config.items() if k not in META_KEYS}
+
+
+def validate_config(agents_config: dict, tasks_config: dict) -> List[str]:
+    """タスク定義の検証。担当エージェントの存在と、contextが先に定義されたタスクを指すこと、context_budgetの形式を確認する"""
+    from context_compaction import resolve_context_budget, ContextBudgetError
+
+    errors = []
+    agents = _entries(agents_config)
+    defined = set()
+    for task_id, config in _entries(tasks_config).items():
+        for key in ("description", "expected_output", "agent"):
+            if not config.get(key):
+                errors.append(f"Task '{task_id}' is missing '{key}'")
+        if config.get("agent") and config["agent"] not in agents:
+            errors.append(f"Task '{task_id}' references unknown agent '{config['agent']}'")
+        for ctx in config.get("context", []):
+            if ctx not in defined:
+                # create_tasksは定義順に解決するため、後方参照は黙って無視されてしまう
+                errors.append(f"Task '{task_id}' has context '{ctx}' that is not defined before it")
+        try:
+            resolve_context_budget(config.get("context_budget"), name=f"{task_id}.context_budget")
+        except ContextBudgetError as e:
+            errors.append(f"Task '{task_id}': {e}")
+        defined.add(task_id)
+    return errors
+
+
+def compile_plan(base_dir: Path = BASE_DIR) -> Dict[str, Any]:
+    """YAMLを読み込んで検証し、実行に必要な情報をまとめたプランを作成"""
+    import yaml
+    from orchestrator import task_owners, crew_dependencies, CrewGraphError
+
+    configs = {}
+    for name in CONFIG_FILES:
+        with open(base_dir / name, "r", encoding="utf-8") as f:
+            configs[name] = yaml.safe_load(f)
+    agents_config = configs["agents.yaml"]
+    tasks_config = configs["tasks.yaml"]
+    crew_config = configs["crew.yaml"]
+
+    errors = validate_config(agents_config, tasks_config)
+    if errors:
+        raise PlanError("Invalid crew configuration:\n  " + "\n  ".join(errors))
+
+    try:
+        owners = task_owners(crew_config, tasks_config)
+        dependencies = crew_dependencies(crew_config, tasks_config)
+    except CrewGraphError as e:
+        raise PlanError(str(e)) from e
+
+    return {
+        "agents": agents_config,
+        "tasks": tasks_config,
+        "crew": crew_config,
+        "task_order": list(_entries(tasks_config)),
+        "task_owners": owners,
+        "crew_dependencies": dependencies,
+    }
+
+
+def _read_cache(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("version") != PLAN_VERSION:
+        return None
+    plan = cached.get("plan")
+    if not isinstance(plan, dict) or not isinstance(plan.get("crew_dependencies"), dict):
+        return None
+    # JSONでは集合を保存できないため、依存クルーはリストで保存して読み込み時に戻す
+    plan["crew_dependencies"] = {crew_id: set(upstream) for crew_id, upstream in plan["crew_dependencies"].items()}
+    return cached
+
+
+def _write_cache(path: str, entry: Dict[str, Any]) -> None:
+    plan = entry["plan"]
+    entry = {
+        **entry,
+        "plan": {**plan, "crew_dependencies": {k: sorted(v) for k, v in plan["crew_dependencies"].items()}},
+    }
+    # キャッシュは高速化のためだけなので、書き込めない環境では何もしない
+    try:
+        with atomic_writer(path) as f:
+            f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+    except OSError:
+        pass
+
+
+def load_plan(base_dir: Path = BASE_DIR, cache_path: Optional[str] = None) -> Dict[str, Any]:
+    """キャッシュ済みのプランを返し、YAMLが変わっていれば作り直す"""
+    base_dir = Path(base_dir)
+    if not PLAN_CACHE_ENABLED:
+        return compile_plan(base_dir)
+
+    cache_path = cache_path or PLAN_CACHE_PATH or default_cache_path(base_dir)
+    stat_key = _stat_key(base_dir)
+    cached = _read_cache(cache_path)
+    if cached is not None and cached.get("stat_key") == stat_key:
+        return cached["plan"]
+
+    content_hash = _content_hash(base_dir)
+    if cached is not None and cached.get("content_hash") == content_hash:
+        # touchやチェックアウトでmtimeだけが変わった場合
+        cached["stat_key"] = stat_key
+        _write_cache(cache_path, cached)
+        return cached["plan"]
+
+    plan = compile_plan(base_dir)
+    _write_cache(cache_path, {
+        "version": PLAN_VERSION,
+        "stat_key": stat_key,
+        "content_hash": content_hash,
+        "plan": plan,
+    })
+    return plan
@@ -0,0 +1,170 @@
+"""
+ストリーミングI/Oユーティリティ
+APIレスポンスをメモリに全展開せず、チャンク単位でデコードしてファイルへ書き込む
+requestsのレスポンスとhttpx.AsyncClientのレスポンス（a* 関数）の両方に対応する
+書き込みは一時ファイル → rename のアトミック方式で、途中失敗時に壊れたファイルを残さない
+"""
+
+import os
+import binascii
+import tempfile
+import contextlib
+from typing import AsyncIterable, BinaryIO, Iterable
+
+# レスポンス読み込みのチャンクサイズ
+CHUNK_SIZE = 64 * 1024
+
+
+@contextlib.contextmanager
+def atomic_writer(output_path: str):
+    """同じディレクトリの一時ファイルに書き込み、成功時のみ output_path へ置き換える"""
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(output_path)}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, output_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+
+
+def write_chunks(chunks: Iterable[bytes], output_path: str) -> int:
+    """バイト列のイテレータをアトミックにファイルへ書き込み、書き込んだバイト数を返す"""
+    written = 0
+    with atomic_writer(output_path) as f:
+        for chunk in chunks:
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
+def stream_to_file(response, output_path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """stream=Trueで取得したrequestsレスポンスの本文をそのままファイルへ書き込む"""
+    return write_chunks(response.iter_content(chunk_size=chunk_size), output_path)
+
+
+async def awrite_chunks(chunks: AsyncIterable[bytes], output_path: str) -> int:
+    """write_chunks の非同期イテレータ版（チャンクの受信を待つ間はイベントループを解放する）"""
+    written = 0
+    with atomic_writer(output_path) as f:
+        async for chunk in chunks:
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
+async def astream_to_file(response, output_path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """httpx.AsyncClient.stream() で取得したレスポンスの本文をそのままファイルへ書き込む"""
+    return await awrite_chunks(response.aiter_bytes(chunk_size=chunk_size), output_path)
+
+
+class Base64FieldDecoder:
+    """
+    JSONレスポンス中の1つの文字列フィールド（例: "b64_json"）を見つけ、
+    その値をbase64デコードしながら逐次書き出すインクリメンタルパーサ
+
+    base64の値には引用符が現れず、JSONエスケープは "\\/" のみなので、
+    完全なJSONパーサを使わずにバイト列の走査だけで値を取り出せる
+    """
+
+    def __init__(self, field: str, out: BinaryIO):
+        self.marker = f'"{field}"'.encode("ascii")
+        self.out = out
+        self.state = "search"
+        self.carry = b""
+        self.pending = b""
+        self.written = 0
+
+    @property
+    def done(self) -> bool:
+        return self.state == "done"
+
+    def feed(self, chunk: bytes) -> None:
+        data = self.carry + chunk
+        self.carry = b""
+        i = 0
+        while i < len(data) and self.state != "done":
+            if self.state == "search":
+                pos = data.find(self.marker, i)
+                if pos < 0:
+                    # チャンク境界をまたぐマーカーに備えて末尾を保持
+                    self.carry = data[max(i, len(data) - len(self.marker) + 1):]
+                    return
+                i = pos + len(self.marker)
+                self.state = "colon"
+            elif self.state in ("colon", "quote"):
+                c = data[i:i + 1]
+                i += 1
+                if c.isspace():
+                    continue
+                if self.state == "colon" and c == b":":
+                    self.state = "quote"
+                elif self.state == "quote" and c == b'"':
+                    self.state = "value"
+                else:
+                    # キー名ではなく別の値として現れた場合は検索を続ける
+                    self.state = "search"
+            else:
+                end = data.find(b'"', i)
+                self._decode(data[i:] if end < 0 else data[i:end])
+                if end < 0:
+                    return
+                i = end + 1
+                self._finish()
+
+    def _decode(self, segment: bytes) -> None:
+        # JSONエスケープ（\/）のバックスラッシュを除去し、4文字単位でデコード
+        data = self.pending + segment.replace(b"\\", b"")
+        usable = len(data) // 4 * 4
+        if usable:
+            decoded = binascii.a2b_base64(data[:usable])
+            self.out.write(decoded)
+            self.written += len(decoded)
+        self.pending = data[usable:]
+
+    def _finish(self) -> None:
+        if self.pending:
+            padded = self.pending + b"=" * (-len(self.pending) % 4)
+            decoded = binascii.a2b_base64(padded)
+            self.out.write(decoded)
+            self.written += len(decoded)
+            self.pending = b""
+        self.state = "done"
+
+
+def stream_b64_json_field(response, output_path: str, field: str = "b64_json",
+                          chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    JSONレスポンスのbase64フィールドをストリーミングでデコードしてファイルへ書き込む
+    最初に見つかったフィールドのみを対象とし、書き込んだバイト数を返す
+    """
+    with atomic_writer(output_path) as f:
+        decoder = Base64FieldDecoder(field, f)
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            decoder.feed(chunk)
+            if decoder.done:
+                break
+        if not decoder.done:
+            raise ValueError(f"レスポンスに {field} フィールドが見つかりません")
+    return decoder.written
+
+
+async def astream_b64_json_field(response, output_path: str, field: str = "b64_json",
+                                 chunk_size: int = CHUNK_SIZE) -> int:
+    """stream_b64_json_field のhttpx.AsyncClient版"""
+    with atomic_writer(output_path) as f:
+        decoder = Base64FieldDecoder(field, f)
+        async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+            decoder.feed(chunk)
+            if decoder.done:
+                break
+        if not decoder.done:
+            raise ValueError(f"レスポンスに {field} フィールドが見つかりません")
+    return decoder.written
@@ -0,0 +1,169 @@
+"""audio_mix のテスト（リサンプリング・配置・ゲインとダッキング・マスターWAVの書き出し）"""
+
+import os
+import sys
+import json
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import audio_mix
+from audio_mix import (
+    SAMPLE_RATE, AudioMixError, LinearResampler, build_schedule, duck_gain, mixdown, parse_time,
+)
+
+GAINS = {"bgm": 0.0, "se": 0.0, "voice": 0.0}
+
+
+def _wav(path, level, seconds, rate, channels=1, width=2):
+    """一定レベル（直流）のPCM WAVを作成"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    samples = np.full(int(seconds * rate) * channels, level, dtype=np.float64)
+    if width == 2:
+        data = np.rint(samples * 32767).astype("<i2").tobytes()
+    else:
+        data = np.rint(samples * 127 + 128).astype(np.uint8).tobytes()
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(width)
+        f.setframerate(rate)
+        f.writeframes(data)
+
+
+def _read_master(path):
+    with wave.open(str(path), "rb") as f:
+        assert (f.getnchannels(), f.getframerate()) == (2, SAMPLE_RATE)
+        width, data = f.getsampwidth(), f.readframes(f.getnframes())
+    if width == 2:
+        return np.frombuffer(data, dtype="<i2").reshape(-1, 2) / 32767.0
+    packed = np.zeros((len(data) // 3, 4), dtype=np.uint8)
+    packed[:, 1:] = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+    return (packed.view("<i4").reshape(-1) >> 8).reshape(-1, 2) / 8388607.0
+
+
+def test_parse_time():
+    assert parse_time("00:00:03") == 3.0
+    assert parse_time("01:02.5") == 62.5
+    assert parse_time(4) == 4.0
+    with pytest.raises(AudioMixError):
+        parse_time("3s")
+
+
+def test_resampler_is_continuous_across_blocks():
+    t = np.arange(22050, dtype=np.float32) / 22050
+    signal = np.stack([np.sin(2 * np.pi * 440 * t), np.cos(2 * np.pi * 440 * t)], axis=1).astype(np.float32)
+
+    whole = LinearResampler(22050).process(signal)
+    resampler = LinearResampler(22050)
+    blocks = np.concatenate([resampler.process(signal[i:i + 1000]) for i in range(0, len(signal), 1000)])
+
+    assert abs(len(whole) - SAMPLE_RATE) <= 3
+    np.testing.assert_allclose(blocks, whole, atol=1e-5)
+
+
+def test_duck_gain_ramps_around_voice():
+    voices = np.array([[1.0, 2.0]])
+    gain = duck_gain(0, 3 * SAMPLE_RATE, voices, -20.0)
+    assert gain[int(0.5 * SAMPLE_RATE)] == pytest.approx(1.0)
+    assert gain[int(1.5 * SAMPLE_RATE)] == pytest.approx(0.1, rel=1e-4)
+    assert 0.1 < gain[int((2.0 + audio_mix.DUCK_RELEASE / 2) * SAMPLE_RATE)] < 1.0
+    assert gain[int(2.9 * SAMPLE_RATE)] == pytest.approx(1.0)
+
+
+def test_schedule_holds_bgm_and_sequences_voices(tmp_path):
+    _wav(tmp_path / "audio" / "bgm" / "a.wav", 0.1, 10, 44100)
+    _wav(tmp_path / "audio" / "bgm" / "b.wav", 0.1, 10, 44100)
+    _wav(tmp_path / "audio" / "se" / "hum_loop.wav", 0.1, 0.5, 48000)
+    _wav(tmp_path / "audio" / "voice" / "1.wav", 0.1, 0.5, 24000)
+    _wav(tmp_path / "audio" / "voice" / "2.wav", 0.1, 0.5, 24000)
+    timeline = {"duration_seconds": 6, "scenes": [
+        {"id": 1, "start": "00:00:00", "end": "00:00:02", "assets": {"bgm": "audio/bgm/a.wav"}},
+        {"id": 2, "start": "00:00:02", "end": "00:00:04",
+         "assets": {"bgm": "audio/bgm/a.wav", "se": ["audio/se/hum_loop.wav"],
+                    "voice": ["audio/voice/1.wav", "audio/voice/2.wav", "audio/voice/none.wav"]}},
+        {"id": 3, "start": "00:00:04", "end": "00:00:06", "assets": {"bgm": "audio/bgm/b.wav"},
+         "mix": {"audio/bgm/b.wav": {"gain_db": -3}}},
+    ]}
+
+    schedule = build_schedule(timeline, str(tmp_path), GAINS)
+    spans = [(c["path"].split("/")[-1], c["start"], c["end"]) for c in schedule["clips"]]
+    assert spans == [("a.wav", 0.0, 4.0), ("hum_loop.wav", 2.0, 4.0), ("1.wav", 2.0, 2.5),
+                     ("2.wav", 2.5 + audio_mix.VOICE_GAP, 3.0 + audio_mix.VOICE_GAP), ("b.wav", 4.0, 6.0)]
+    assert schedule["clips"][-1]["gain_db"] == -3.0
+    assert schedule["missing"] == ["audio/voice/none.wav"]
+
+
+def test_mixdown_applies_gain_ducking_and_streams(tmp_path, monkeypatch):
+    # BGM は44.1kHzモノラル、ボイスは24kHz、SEは48kHz 8bitステレオ
+    _wav(tmp_path / "audio" / "bgm" / "main.wav", 0.5, 5, 44100)
+    _wav(tmp_path / "audio" / "voice" / "line.wav", 0.1, 0.4, 24000)
+    _wav(tmp_path / "audio" / "se" / "pop.wav", 0.2, 0.5, 48000, channels=2, width=1)
+    (tmp_path / "audio" / "voice" / "line.mp3").write_bytes(b"ID3")
+    timeline = {"duration_seconds": 3, "scenes": [
+        {"id": 1, "start": "00:00:00", "end": "00:00:02",
+         "assets": {"bgm": "audio/bgm/main.wav", "voice": ["audio/voice/line.wav"]},
+         "mix": {"audio/voice/line.wav": {"offset": 1.0}}},
+        {"id": 2, "start": "00:00:02", "end": "00:00:03",
+         "assets": {"se": ["audio/se/pop.wav", "audio/se/missing.wav"], "voice": ["audio/voice/line.mp3"]}},
+    ]}
+    (tmp_path / "timeline.json").write_text(json.dumps(timeline), encoding="utf-8")
+    monkeypatch.setattr(audio_mix, "_ffmpeg", lambda: None)
+    monkeypatch.setattr(audio_mix, "_ffprobe", lambda: None)
+
+    report = mixdown(str(tmp_path / "timeline.json"), str(tmp_path), gains=GAINS, duck_db=-6.0206,
+                     block_frames=5000)
+
+    master = _read_master(tmp_path / "audio" / "master.wav")
+    assert len(master) == 3 * SAMPLE_RATE
+    at = lambda seconds: master[int(seconds * SAMPLE_RATE)]
+    np.testing.assert_allclose(at(0.6), [0.5, 0.5], atol=2e-3)          # BGMのみ
+    np.testing.assert_allclose(at(1.2), [0.35, 0.35], atol=2e-3)        # BGM -6dB + ボイス
+    np.testing.assert_allclose(at(1.9), [0.5, 0.5], atol=2e-3)          # ダッキングから復帰
+    np.testing.assert_allclose(at(2.2), [0.7, 0.7], atol=1e-2)          # BGM + SE
+    assert abs(at(0.0)).max() < 1e-3 and abs(master[-1]).max() < 1e-2  # BGMの端はフェード
+
+    assert report["missing"] == ["audio/se/missing.wav"]
+    assert [u["path"] for u in report["unreadable"]] == ["audio/voice/line.mp3"]
+    assert report["clipped_samples"] == 0 and report["peak_dbfs"] < 0
+    assert report["bits"] == 24 and report["bytes"] == os.path.getsize(tmp_path / "audio" / "master.wav")
+    assert report["realtime_factor"] > 0
+    saved = json.loads((tmp_path / "audio" / "master.json").read_text(encoding="utf-8"))
+    assert len(saved["clips"]) == 3
+
+    # ブロックサイズを変えても同じ結果になる
+    mixdown(str(tmp_path / "timeline.json"), str(tmp_path), output_path=str(tmp_path / "other.wav"),
+            gains=GAINS, duck_db=-6.0206, block_frames=SAMPLE_RATE, bits=16)
+    np.testing.assert_allclose(_read_master(tmp_path / "other.wav"), master, atol=1e-4)
+
+    with pytest.raises(AudioMixError):
+        mixdown(str(tmp_path / "timeline.json"), str(tmp_path), gains={"music": 0})
+
+
+def test_mixdown_counts_clipping(tmp_path):
+    _wav(tmp_path / "a.wav", 0.8, 1, 48000)
+    _wav(tmp_path / "b.wav", 0.8, 1, 48000)
+    timeline = {"scenes": [{"id": 1, "start": 0, "end": 1, "assets": {"se": ["a.wav", "b.wav"]}}]}
+    (tmp_path / "timeline.json").write_text(json.dumps(timeline), encoding="utf-8")
+
+    report = mixdown(str(tmp_path / "timeline.json"), str(tmp_path), gains=GAINS)
+
+    assert report["clipped_samples"] > 0 and report["peak_dbfs"] > 0
+    assert np.abs(_read_master(tmp_path / "audio" / "master.wav")).max() <= 1.0
+
+
+def test_audio_mixer_tool(tmp_path):
+    pytest.importorskip("crewai")
+    from tools import AudioMixerTool
+
+    _wav(tmp_path / "audio" / "bgm" / "main.wav", 0.1, 1, 48000)
+    timeline = {"scenes": [{"id": 1, "start": "00:00:00", "end": "00:00:01", "assets": {"bgm": "audio/bgm/main.wav"}}]}
+    (tmp_path / "timeline.json").write_text(json.dumps(timeline), encoding="utf-8")
+
+    result = json.loads(AudioMixerTool()._run(str(tmp_path / "timeline.json"), str(tmp_path)))
+    assert result["duration_seconds"] == 1.0 and result["clips"][0]["layer"] == "bgm"
+    assert AudioMixerTool()._run(str(tmp_path / "timeline.json"), str(tmp_path),
+                                 gains={"music": 0}).startswith("音声ミックスエラー")
@@ -0,0 +1,45 @@
+"""batch のテスト（--batch のバッチファイルの読み込みと検証）"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch import load_batch, BatchSpecError
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    (tmp_path / "a.md").write_text("storyboard", encoding="utf-8")
+    (tmp_path / "d.md").write_text("direction", encoding="utf-8")
+    return tmp_path
+
+
+def test_paths_resolve_relative_to_batch_file(inputs):
+    path = inputs / "batch.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"name": "a", "storyboard": "a.md", "direction": "d.md"}),
+        json.dumps({"storyboard": "a.md", "direction": "d.md", "inputs": {"tone": "calm"}}),
+    ]), encoding="utf-8")
+
+    items = load_batch(str(path), str(inputs / "out"))
+    assert [item["name"] for item in items] == ["a", "item_001"]
+    assert items[0]["storyboard"] == str(inputs / "a.md")
+    assert items[1]["output"] == str(inputs / "out" / "item_001")
+    assert items[1]["inputs"] == {"tone": "calm"}
+
+
+@pytest.mark.parametrize("entries, message", [
+    ([], "non-empty list"),
+    ([{"storyboard": "a.md"}], "missing 'direction'"),
+    ([{"storyboard": "missing.md", "direction": "d.md"}], "storyboard not found"),
+    ([{"name": "x", "storyboard": "a.md", "direction": "d.md"}] * 2, "shares its output directory"),
+])
+def test_invalid_batches_are_rejected(inputs, entries, message):
+    path = inputs / "batch.json"
+    path.write_text(json.dumps({"items": entries}), encoding="utf-8")
+    with pytest.raises(BatchSpecError, match=message):
+        load_batch(str(path), str(inputs / "out"))
@@ -0,0 +1,93 @@
+"""compositor のテスト（乗算済みアルファの合成とタイムラインのシーン合成）"""
+
+import os
+import sys
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import compositor
+from compositor import blend, compose_timeline, LayoutError
+
+SIZE = (64, 36)
+
+
+def _png(path, rgba):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.fromarray(np.asarray(rgba, dtype=np.uint8)).save(path)
+
+
+@pytest.fixture
+def assets(tmp_path):
+    _png(tmp_path / "backgrounds" / "bg.png", np.full((18, 32, 4), (0, 0, 255, 255)))
+    # 上半分が不透明な赤、下半分が透明のキャラクター
+    char = np.zeros((20, 10, 4))
+    char[:10] = (255, 0, 0, 255)
+    _png(tmp_path / "characters" / "hero.png", char)
+    for i in range(3):
+        _png(tmp_path / "effects" / "glow" / f"glow_{i:02d}.png", np.full((8, 8, 4), (255, 255, 255, 80 * i)))
+    timeline = {"scenes": [
+        {"id": 1, "assets": {"bg": "backgrounds/bg.png", "char": ["characters/hero.png"], "fx": ["effects/glow/"]}},
+        {"id": 2, "assets": {"bg": "backgrounds/bg.png", "char": ["characters/hero.png", "characters/gone.png"]},
+         "layout": {"characters/hero.png": {"x": 0.25, "height": 0.5}}},
+    ]}
+    (tmp_path / "timeline.json").write_text(json.dumps(timeline), encoding="utf-8")
+    return tmp_path
+
+
+def test_blend_uses_premultiplied_alpha_and_clips():
+    canvas = np.zeros((4, 4, 3), dtype=np.float32)
+    canvas[..., 2] = 1.0
+    # 不透明度50%の赤（乗算済み）
+    layer = np.zeros((2, 2, 4), dtype=np.float32)
+    layer[...] = (0.5, 0.0, 0.0, 0.5)
+
+    assert blend(canvas, layer, -1, 3)
+    np.testing.assert_allclose(canvas[3, 0], (0.5, 0.0, 0.5))
+    np.testing.assert_allclose(canvas[2, 0], (0.0, 0.0, 1.0))
+    assert not blend(canvas, layer, 4, 0)
+
+
+def test_compose_timeline_reuses_decoded_layers(assets, monkeypatch):
+    monkeypatch.setattr(compositor, "LAYER_CACHE", compositor.LayerCache(64 * 1024 * 1024))
+    report = compose_timeline(str(assets / "timeline.json"), str(assets), workers=1, size=SIZE)
+
+    assert [scene["frames"] for scene in report["scenes"]] == [3, 1]
+    assert report["frames"] == 4 and report["fps"] > 0
+    assert report["missing"] == ["characters/gone.png"]
+    # 背景は両シーンで、エフェクトは2周目以降でキャッシュから取得する
+    assert report["cache"]["hits"] >= 1
+
+    frame = np.asarray(Image.open(assets / "frames" / "scene_01" / "frame_0001.png"))
+    assert frame.shape == (36, 64, 3)
+    # キャラクター（高さ0.6・下端0.95）の上半分は赤、背景は青
+    assert tuple(frame[14, 32]) == (255, 0, 0)
+    assert tuple(frame[2, 2]) == (0, 0, 255)
+    # layout の x: 0.25 で左に寄せる
+    moved = np.asarray(Image.open(assets / "frames" / "scene_02" / "frame_0001.png"))
+    assert tuple(moved[20, 16]) == (255, 0, 0) and tuple(moved[20, 32]) == (0, 0, 255)
+
+
+def test_process_pool_matches_in_process(assets):
+    compose_timeline(str(assets / "timeline.json"), str(assets), output_dir=str(assets / "a"), workers=1, size=SIZE)
+    report = compose_timeline(str(assets / "timeline.json"), str(assets), output_dir=str(assets / "b"),
+                              workers=2, size=SIZE)
+
+    assert report["workers"] == 2
+    for scene, frames in (("scene_01", 3), ("scene_02", 1)):
+        for i in range(1, frames + 1):
+            name = f"{scene}/frame_{i:04d}.png"
+            assert np.array_equal(np.asarray(Image.open(assets / "a" / name)), np.asarray(Image.open(assets / "b" / name)))
+
+
+def test_invalid_layout_is_rejected(assets):
+    timeline = {"scenes": [{"id": 1, "assets": {"char": ["characters/hero.png"]},
+                            "layout": {"characters/hero.png": {"anchor": "left"}}}]}
+    (assets / "bad.json").write_text(json.dumps(timeline), encoding="utf-8")
+    with pytest.raises(LayoutError, match="anchor"):
+        compose_timeline(str(assets / "bad.json"), str(assets), workers=1, size=SIZE)
@@ -0,0 +1,100 @@
+"""effects のテスト（パラメータの検証・粒子のシミュレーションとラスタライズ・連番の書き出し）"""
+
+import os
+import sys
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from effects import BUILDERS, EffectSpecError, effect_spec, rasterize, render_effects, simulate
+
+
+def test_effect_spec_applies_defaults_and_validates():
+    spec = effect_spec("sparkles", frames=0, size=128, colors=["#FF0000"])
+    assert spec["frames"] == 12 and spec["size"] == 128 and spec["fps"] == 24
+    assert spec["colors"] == [(1.0, 0.0, 0.0)]
+
+    with pytest.raises(EffectSpecError):
+        effect_spec("lightning")
+    with pytest.raises(EffectSpecError):
+        effect_spec("confetti", colors=["red"])
+    with pytest.raises(EffectSpecError):
+        effect_spec("confetti", frames=1000)
+
+
+def test_simulation_is_deterministic_and_loops_seamlessly():
+    spec = effect_spec("sparkles", size=64)
+    first, second = simulate(spec), simulate(spec)
+    np.testing.assert_array_equal(first[3][0]["x"], second[3][0]["x"])
+    assert not np.array_equal(simulate(effect_spec("sparkles", size=64, seed=1))[0][0]["x"], first[0][0]["x"])
+
+    # ループするエフェクトは frames 枚進めると最初のフレームに戻る
+    systems = BUILDERS["sparkles"](spec, np.random.default_rng(spec["seed"]), spec["frames"] / spec["fps"])
+    start = systems[0].snapshot(64)
+    for _ in range(spec["frames"]):
+        systems[0].step(1 / spec["fps"])
+    np.testing.assert_allclose(systems[0].snapshot(64)["alpha"], start["alpha"], atol=1e-5)
+
+
+def test_rasterize_disc_and_rect_coverage():
+    particles = {
+        "shape": "disc", "x": np.array([16.0], np.float32), "y": np.array([16.0], np.float32),
+        "size": np.array([4.0], np.float32), "height": np.array([4.0], np.float32),
+        "angle": np.zeros(1, np.float32), "color": np.array([[1.0, 0.5, 0.0]], np.float32),
+        "alpha": np.array([0.5], np.float32),
+    }
+    out = rasterize([particles], 32)
+    # 乗算済みアルファ: 中心は不透明度0.5のオレンジ、外側は透明
+    np.testing.assert_allclose(out[16, 16], (0.5, 0.25, 0.0, 0.5), atol=1e-6)
+    assert out[16, 24, 3] == 0 and out[0, 0, 3] == 0
+
+    bar = dict(particles, shape="rect", size=np.array([10.0], np.float32), height=np.array([2.0], np.float32),
+               alpha=np.array([1.0], np.float32))
+    out = rasterize([bar], 32)
+    assert out[16, 7, 3] == pytest.approx(1.0) and out[16, 25, 3] == pytest.approx(1.0)
+    assert out[12, 16, 3] == 0
+
+
+def test_render_effects_writes_transparent_sequences(tmp_path):
+    stale = tmp_path / "pop_smoke" / "frame_0099.png"
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(b"old")
+    specs = [effect_spec("pop_smoke", size=64), effect_spec("energy_wave", size=64, frames=3)]
+    report = render_effects(specs, str(tmp_path), workers=1)
+
+    assert report["frames"] == 9
+    assert [effect["frames"] for effect in report["effects"]] == [6, 3]
+    assert not stale.exists()
+    names = sorted(os.listdir(tmp_path / "pop_smoke"))
+    assert names == [f"frame_{i:04d}.png" for i in range(1, 7)]
+    with Image.open(tmp_path / "pop_smoke" / "frame_0001.png") as image:
+        assert image.mode == "RGBA" and image.size == (64, 64)
+        alpha = np.asarray(image)[..., 3]
+    assert alpha[0, 0] == 0 and alpha.max() > 200
+
+    # プロセスプールで書き出しても同じ連番になる
+    pooled = tmp_path / "pooled"
+    render_effects(specs, str(pooled), workers=2)
+    for effect in ("pop_smoke", "energy_wave"):
+        for name in os.listdir(tmp_path / effect):
+            a = np.asarray(Image.open(tmp_path / effect / name))
+            b = np.asarray(Image.open(pooled / effect / name))
+            np.testing.assert_array_equal(a, b)
+
+
+def test_effect_renderer_tool(tmp_path):
+    pytest.importorskip("crewai")
+    from tools import EffectRendererTool
+
+    result = json.loads(EffectRendererTool()._run(
+        effects=[{"name": "glow_pulse", "size": 64}], output_dir=str(tmp_path)))
+    assert result["effects"][0]["frames"] == 4
+    assert (tmp_path / "glow_pulse" / "frame_0004.png").exists()
+
+    assert EffectRendererTool()._run(effects=[{"name": "glow_pulse", "colors": ["nope"]}],
+                                     output_dir=str(tmp_path)).startswith("エフェクト生成エラー")
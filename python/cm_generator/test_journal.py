@@ -0,0 +1,91 @@
+"""journal のテスト（--resume / --rerun で使うジャーナルの保存と再読み込み）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from journal import RunJournal, compute_task_hashes, downstream_tasks
+
+TASKS = {
+    "name": "cm",
+    "research": {"agent": "planner", "description": "調査"},
+    "script": {"agent": "writer", "description": "脚本", "context": ["research"]},
+    "storyboard": {"agent": "writer", "description": "絵コンテ", "context": ["script"]},
+    "music": {"agent": "composer", "description": "音楽"},
+}
+AGENTS = {"planner": {"role": "P"}, "writer": {"role": "W"}, "composer": {"role": "C"}}
+
+
+def test_resume_skips_completed_tasks(tmp_path):
+    hashes = compute_task_hashes(TASKS, AGENTS, {"storyboard.md": "abc"})
+    journal = RunJournal(str(tmp_path))
+    journal.set_pending_tasks(["research", "script"])
+    journal.record_task("research", hashes["research"], "調査結果", agent="P")
+    assert journal.current_task == "script"
+
+    resumed = RunJournal(str(tmp_path), resume=True)
+    assert resumed.is_task_current("research", hashes["research"])
+    assert resumed.task_output("research") == "調査結果"
+    assert not resumed.is_task_current("script", hashes["script"])
+
+    # resumeしなければ前回の記録は使わない
+    assert not RunJournal(str(tmp_path)).is_task_current("research", hashes["research"])
+
+
+def test_upstream_changes_invalidate_downstream_hashes():
+    before = compute_task_hashes(TASKS, AGENTS, {})
+    changed = {**TASKS, "research": {**TASKS["research"], "description": "別の調査"}}
+    after = compute_task_hashes(changed, AGENTS, {})
+    assert before["research"] != after["research"]
+    assert before["script"] != after["script"]
+    assert before["storyboard"] != after["storyboard"]
+    assert before["music"] == after["music"]
+
+
+def test_input_changes_invalidate_every_task():
+    before = compute_task_hashes(TASKS, AGENTS, {"storyboard.md": "abc"})
+    after = compute_task_hashes(TASKS, AGENTS, {"storyboard.md": "def"})
+    assert all(before[task] != after[task] for task in before)
+
+
+def test_downstream_tasks():
+    assert downstream_tasks(TASKS, ["research"]) == ["research", "script", "storyboard"]
+    assert downstream_tasks(TASKS, ["music"]) == ["music"]
+
+
+def test_assets_are_tied_to_the_running_task(tmp_path):
+    asset = tmp_path / "image.png"
+    asset.write_bytes(b"png")
+    spec = {"prompt": "sunrise", "size": "1024x1024"}
+
+    journal = RunJournal(str(tmp_path))
+    journal.set_pending_tasks(["storyboard"])
+    journal.record_asset(str(asset), spec)
+
+    resumed = RunJournal(str(tmp_path), resume=True)
+    assert resumed.asset_is_current(str(asset), spec)
+    assert not resumed.asset_is_current(str(asset), {**spec, "size": "512x512"})
+
+    # ファイルが書き換えられていれば作り直す
+    asset.write_bytes(b"edited")
+    assert not resumed.asset_is_current(str(asset), spec)
+
+    asset.write_bytes(b"png")
+    assert resumed.invalidate_task("storyboard") == 1
+    assert not resumed.asset_is_current(str(asset), spec)
+
+
+def test_journal_with_another_version_is_ignored(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    journal.record_task("research", "h", "out")
+    journal.data["version"] = 0
+    journal.save()
+    assert RunJournal(str(tmp_path), resume=True).task_output("research") is None
+
+
+def test_crews_write_separate_journals(tmp_path):
+    RunJournal(str(tmp_path), name="crew_a").record_task("research", "h", "a")
+    RunJournal(str(tmp_path), name="crew_b").record_task("music", "h", "b")
+    assert RunJournal(str(tmp_path), resume=True, name="crew_a").task_output("music") is None
+    assert RunJournal(str(tmp_path), resume=True, name="crew_b").task_output("music") == "b"
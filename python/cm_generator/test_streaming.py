@@ -0,0 +1,105 @@
+"""streaming のテスト"""
+
+import io
+import os
+import sys
+import json
+import base64
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from streaming import Base64FieldDecoder, astream_b64_json_field, stream_b64_json_field, write_chunks
+
+PAYLOAD = bytes(range(256)) * 40 + b"tail"
+
+
+def _response_body(payload: bytes = PAYLOAD, escape_slashes: bool = True) -> bytes:
+    body = json.dumps({
+        "created": 1,
+        "data": [{"revised_prompt": "b64_json is not here", "b64_json": base64.b64encode(payload).decode("ascii")}],
+    })
+    if escape_slashes:
+        # JSONエンコーダによっては "/" を "\/" にエスケープする
+        body = body.replace("/", "\\/")
+    return body.encode("utf-8")
+
+
+def _decode(body: bytes, chunk_size: int) -> bytes:
+    out = io.BytesIO()
+    decoder = Base64FieldDecoder("b64_json", out)
+    for i in range(0, len(body), chunk_size):
+        decoder.feed(body[i:i + chunk_size])
+    assert decoder.done
+    assert decoder.written == len(out.getvalue())
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1 << 20])
+def test_decodes_across_chunk_boundaries(chunk_size):
+    assert _decode(_response_body(), chunk_size) == PAYLOAD
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5])
+def test_decodes_unpadded_tails(size):
+    payload = os.urandom(size)
+    body = json.dumps({"b64_json": base64.b64encode(payload).decode("ascii").rstrip("=")}).encode("utf-8")
+    assert _decode(body, 2) == payload
+
+
+def test_whitespace_around_colon():
+    body = b'{"b64_json" :\n  "' + base64.b64encode(b"hello") + b'"}'
+    assert _decode(body, 5) == b"hello"
+
+
+def test_field_name_inside_a_value_is_skipped():
+    body = b'{"note": "b64_json", "b64_json": "' + base64.b64encode(b"data") + b'"}'
+    assert _decode(body, 4) == b"data"
+
+
+class _Response:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    async def aiter_bytes(self, chunk_size):
+        for chunk in self.iter_content(chunk_size):
+            await asyncio.sleep(0)
+            yield chunk
+
+
+def test_stream_b64_json_field_writes_atomically(tmp_path):
+    output = tmp_path / "image.png"
+    assert stream_b64_json_field(_Response(_response_body()), str(output), chunk_size=100) == len(PAYLOAD)
+    assert output.read_bytes() == PAYLOAD
+
+
+def test_missing_field_leaves_no_file(tmp_path):
+    output = tmp_path / "image.png"
+    with pytest.raises(ValueError):
+        stream_b64_json_field(_Response(b'{"url": "https://example.com"}'), str(output))
+    assert not output.exists()
+    assert os.listdir(tmp_path) == []
+
+
+def test_write_chunks(tmp_path):
+    output = tmp_path / "out.bin"
+    assert write_chunks([b"ab", b"", b"cd"], str(output)) == 4
+    assert output.read_bytes() == b"abcd"
+
+
+def test_astream_b64_json_field(tmp_path):
+    output = tmp_path / "image.png"
+    written = asyncio.run(astream_b64_json_field(_Response(_response_body()), str(output), chunk_size=100))
+    assert written == len(PAYLOAD)
+    assert output.read_bytes() == PAYLOAD
+
+    missing = tmp_path / "missing.png"
+    with pytest.raises(ValueError):
+        asyncio.run(astream_b64_json_field(_Response(b'{"url": "https://example.com"}'), str(missing)))
+    assert not missing.exists()
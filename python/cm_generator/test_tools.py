@@ -0,0 +1,95 @@
+"""tools の非同期版（httpx.AsyncClient で生成する素材ツール）のテスト"""
+
+import os
+import sys
+import json
+import base64
+import asyncio
+
+import pytest
+
+pytest.importorskip("crewai")
+httpx = pytest.importorskip("httpx")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import tools
+
+PNG = b"\x89PNG" + bytes(range(256)) * 8
+
+
+def _mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_async_batch_retries_rate_limited_assets(tmp_path, monkeypatch):
+    calls = []
+
+    def handler(request):
+        prompt = json.loads(request.content)["prompt"]
+        calls.append(prompt)
+        # 1枚目の最初の試行だけレート制限される
+        if "first" in prompt and calls.count(prompt) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"data": [{"b64_json": base64.b64encode(PNG).decode("ascii")}]})
+
+    monkeypatch.setattr(tools, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(tools, "RETRY_BASE_DELAY", 0.0)
+
+    async def run():
+        client = _mock_client(handler)
+        monkeypatch.setattr(tools, "get_async_client", lambda provider: client)
+        try:
+            return await tools.BatchImageGeneratorTool().to_structured_tool().ainvoke({"assets": [
+                {"prompt": "first", "output_path": str(tmp_path / "first.png")},
+                {"prompt": "second", "output_path": str(tmp_path / "second.png")},
+            ]})
+        finally:
+            await client.aclose()
+
+    manifest = json.loads(asyncio.run(run()))
+    assert manifest["succeeded"] == 2
+    assert [asset["attempts"] for asset in manifest["assets"]] == [2, 1]
+    assert (tmp_path / "first.png").read_bytes() == PNG
+    assert (tmp_path / "second.png").read_bytes() == PNG
+
+
+def test_async_tool_reports_http_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools, "OPENAI_API_KEY", "test")
+
+    async def run():
+        client = _mock_client(lambda request: httpx.Response(400, json={"error": "bad prompt"}))
+        monkeypatch.setattr(tools, "get_async_client", lambda provider: client)
+        try:
+            return await tools.ImageGeneratorTool()._arun("x", "cartoon", 1024, 1024, str(tmp_path / "x.png"))
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()).startswith("画像生成エラー")
+    assert not (tmp_path / "x.png").exists()
+
+
+def test_async_music_downloads_generated_audio(tmp_path, monkeypatch):
+    def handler(request):
+        if request.url.path.endswith("text-to-music"):
+            return httpx.Response(200, json={"url": "https://cdn.example.com/track.mp3"})
+        return httpx.Response(200, content=b"ID3" + b"\x00" * 4096)
+
+    monkeypatch.setattr(tools, "MUBERT_API_KEY", "test")
+
+    async def run():
+        client = _mock_client(handler)
+        monkeypatch.setattr(tools, "get_async_client", lambda provider: client)
+        try:
+            return await tools.agenerate_music("calm", output_path=str(tmp_path / "bgm.mp3"))
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()).startswith("BGMを生成しました")
+    assert (tmp_path / "bgm.mp3").read_bytes().startswith(b"ID3")
+
+
+def test_sync_invoke_keeps_run(monkeypatch):
+    monkeypatch.setattr(tools, "OPENAI_API_KEY", "")
+    structured = tools.ImageGeneratorTool().to_structured_tool()
+    assert "OPENAI_API_KEY" in structured.invoke({"prompt": "x", "output_path": "/tmp/x.png"})
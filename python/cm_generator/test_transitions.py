@@ -0,0 +1,123 @@
+"""transitions のテスト（重みの計算・整数ブレンド・タイムラインのトランジション書き出し）"""
+
+import os
+import sys
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from transitions import (
+    KINDS, TransitionError, blend_chunk, render_timeline_transitions, transition_weights,
+)
+
+SIZE = (32, 18)
+
+
+def _frames(directory, colors):
+    directory.mkdir(parents=True, exist_ok=True)
+    for index, color in enumerate(colors):
+        Image.fromarray(np.full((SIZE[1], SIZE[0], 3), color, dtype=np.uint8)).save(
+            directory / f"frame_{index + 1:04d}.png")
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_weights_sum_to_255_and_end_on_incoming(kind):
+    progress = (np.arange(6, dtype=np.float32) + 1) / 6
+    weights = np.broadcast_arrays(*transition_weights(kind, progress, SIZE))
+    np.testing.assert_array_equal(sum(w.astype(np.int32) for w in weights), 255)
+    # 最後のフレームは次のシーンそのもの
+    assert (weights[1][-1] == 255).all()
+
+
+def test_wipe_and_iris_reveal_from_edge_and_center():
+    progress = np.array([0.4], dtype=np.float32)
+    _, wipe, _ = transition_weights("wipe", progress, SIZE)
+    assert wipe[0, 0, 0, 0] == 255 and wipe[0, 0, -1, 0] == 0
+    _, iris, _ = np.broadcast_arrays(*transition_weights("iris", progress, SIZE))
+    assert iris[0, 9, 16, 0] == 255 and iris[0, 0, 0, 0] == 0
+
+    with pytest.raises(TransitionError):
+        transition_weights("swish", progress, SIZE)
+
+
+def test_blend_chunk_rounds_integer_mix():
+    outgoing = np.zeros((2, 1, 1, 3), dtype=np.uint8)
+    incoming = np.full((2, 1, 1, 3), 255, dtype=np.uint8)
+    out = np.empty_like(outgoing)
+    weights = transition_weights("fade", np.array([0.5, 1.0], dtype=np.float32), (1, 1))
+    blend_chunk(outgoing, incoming, weights, out)
+    assert out[0, 0, 0, 0] == 128 and out[1, 0, 0, 0] == 255
+
+    # flash の中間は白
+    blend_chunk(outgoing, outgoing, transition_weights("flash", np.array([0.5, 0.5], dtype=np.float32), (1, 1)), out)
+    assert (out == 255).all()
+
+
+def test_render_timeline_transitions(tmp_path):
+    _frames(tmp_path / "frames" / "scene_01", [(200, 0, 0), (100, 0, 0)])
+    _frames(tmp_path / "frames" / "scene_02", [(0, 0, 200)])
+    _frames(tmp_path / "frames" / "scene_03", [(0, 200, 0)])
+    timeline = {"scenes": [
+        {"id": 1, "transition_out": "fade"},
+        {"id": 2, "transition_out": "cut"},
+        {"id": 3, "transition_out": "flash"},
+        {"id": 4},
+    ]}
+    (tmp_path / "timeline.json").write_text(json.dumps(timeline), encoding="utf-8")
+    stale = tmp_path / "transitions" / "scene_01-scene_02_fade" / "frame_0099.png"
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(b"old")
+
+    report = render_timeline_transitions(str(tmp_path / "timeline.json"), str(tmp_path), frames=5, workers=1)
+
+    assert [(t["from"], t["to"], t["kind"]) for t in report["transitions"]] == [(1, 2, "fade")]
+    assert report["skipped"] == [{"from": 3, "to": 4, "kind": "flash", "reason": "scene frames not found"}]
+    fade = report["transitions"][0]
+    assert fade["frames"] == 5 and fade["size"] == list(SIZE)
+    assert fade["buffer_bytes"] == 3 * 5 * SIZE[0] * SIZE[1] * 3
+    for field in ("load_seconds", "blend_seconds", "encode_seconds"):
+        assert fade[field] >= 0
+
+    directory = tmp_path / "transitions" / "scene_01-scene_02_fade"
+    assert sorted(os.listdir(directory)) == [f"frame_{i:04d}.png" for i in range(1, 6)]
+    first = np.asarray(Image.open(directory / "frame_0001.png"))
+    last = np.asarray(Image.open(directory / "frame_0005.png"))
+    # 前のシーンの連番は末尾をトランジションの終わりにそろえる（2枚しかないので最初は赤200のフレーム）
+    assert first[0, 0].tolist() == [160, 0, 40]
+    assert last[0, 0].tolist() == [0, 0, 200]
+
+    # memmap の一時バッファは残らず、レポートが保存される
+    assert not [name for name in os.listdir(tmp_path / "transitions") if name.startswith(".")]
+    saved = json.loads((tmp_path / "transitions" / "transitions.json").read_text(encoding="utf-8"))
+    assert saved["frames"] == 5
+
+    # プロセスプールでエンコードしても同じ連番になる
+    pooled = render_timeline_transitions(str(tmp_path / "timeline.json"), str(tmp_path), frames=5, workers=2,
+                                         output_dir=str(tmp_path / "pooled"))
+    assert pooled["transitions"][0]["workers"] == 2
+    for name in os.listdir(directory):
+        np.testing.assert_array_equal(np.asarray(Image.open(directory / name)),
+                                      np.asarray(Image.open(tmp_path / "pooled" / "scene_01-scene_02_fade" / name)))
+
+    with pytest.raises(TransitionError):
+        render_timeline_transitions(str(tmp_path / "timeline.json"), str(tmp_path), kind="swish")
+
+
+def test_transition_generator_tool(tmp_path):
+    pytest.importorskip("crewai")
+    from tools import TransitionGeneratorTool
+
+    _frames(tmp_path / "frames" / "scene_01", [(0, 0, 0)])
+    _frames(tmp_path / "frames" / "scene_02", [(255, 255, 255)])
+    (tmp_path / "timeline.json").write_text(json.dumps({"scenes": [{"id": 1}, {"id": 2}]}), encoding="utf-8")
+
+    result = json.loads(TransitionGeneratorTool()._run(str(tmp_path / "timeline.json"), str(tmp_path),
+                                                       frames=3, kind="iris"))
+    assert result["transitions"][0]["kind"] == "iris"
+    assert TransitionGeneratorTool()._run(str(tmp_path / "timeline.json"), str(tmp_path),
+                                          kind="swish").startswith("トランジション生成エラー")
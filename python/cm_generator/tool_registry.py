@@ -0,0 +1,133 @@
+"""
+ツールインスタンスのレジストリ
+同じツールのインスタンスをエージェント間・実行間で共有する。
+実行ごとにリース（ToolLease）を取得し、リースが参照している間はインスタンスを保持し、
+どのリースからも参照されずに一定時間が経ったインスタンスは破棄する
+"""
+
+import os
+import time
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+# どのリースからも参照されていないツールを保持する秒数
+TOOL_IDLE_TTL = float(os.getenv("CM_TOOL_IDLE_TTL", "600"))
+
+
+class _Entry:
+    __slots__ = ("tool", "refs", "last_used")
+
+    def __init__(self, tool: Any):
+        self.tool = tool
+        self.refs = 0
+        self.last_used = time.monotonic()
+
+
+class ToolRegistry:
+    """ツール名をキーにした参照カウント付きのインスタンスキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, factories: Optional[Dict[str, Callable[[], Any]]] = None,
+                 idle_ttl: float = TOOL_IDLE_TTL):
+        self._factories = factories
+        self.idle_ttl = idle_ttl
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def _factory(self, name: str) -> Optional[Callable[[], Any]]:
+        if self._factories is None:
+            # ツールモジュール（crewai・各SDK）は最初に必要になった時点で読み込む
+            from tools import get_tool_classes
+            self._factories = get_tool_classes()
+        return self._factories.get(name)
+
+    def acquire(self, name: str) -> Optional[Any]:
+        """ツールを取得して参照カウントを1増やす（未知のツール名ならNone）"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.refs += 1
+                entry.last_used = time.monotonic()
+                self.reused += 1
+                return entry.tool
+
+        factory = self._factory(name)
+        if factory is None:
+            return None
+        tool = factory()
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = _Entry(tool)
+                self.created += 1
+            else:
+                self.reused += 1
+            entry.refs += 1
+            entry.last_used = time.monotonic()
+            return entry.tool
+
+    def release(self, name: str) -> None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+                entry.last_used = time.monotonic()
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """参照がなく idle_ttl 秒以上使われていないツールを破棄し、破棄した名前を返す"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [name for name, entry in self._entries.items()
+                    if entry.refs == 0 and now - entry.last_used >= self.idle_ttl]
+            for name in idle:
+                del self._entries[name]
+            self.evicted += len(idle)
+        return idle
+
+    def lease(self) -> "ToolLease":
+        self.evict_idle()
+        return ToolLease(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "instances": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry.refs),
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+            }
+
+
+class ToolLease:
+    """1回の実行で使うツールの参照。同じツールを複数のエージェントで使っても参照は1つ"""
+
+    def __init__(self, registry: ToolRegistry):
+        self.registry = registry
+        self._tools: Dict[str, Any] = {}
+
+    def get(self, name: str) -> Optional[Any]:
+        if name not in self._tools:
+            tool = self.registry.acquire(name)
+            if tool is None:
+                return None
+            self._tools[name] = tool
+        return self._tools[name]
+
+    def release(self) -> None:
+        for name in self._tools:
+            self.registry.release(name)
+        self._tools = {}
+
+    def __enter__(self) -> "ToolLease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+# プロセス内で共有するレジストリ
+TOOL_REGISTRY = ToolRegistry()
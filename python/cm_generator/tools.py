@@ -2,23 +2,40 @@
 CM素材生成クルー用カスタムツール - 実装版
 
 ElevenLabs API（TTS/SE）とMubert API（音楽生成）を統合
+素材生成ツールは同期版（requests）と非同期版（httpx.AsyncClient、a* 関数・_arun）を持ち、
+akickoff で実行したクルーではイベントループをブロックせずに素材を生成する
+requests・httpx・各プロバイダーのSDKは、そのプロバイダーの素材を最初に生成する時点までimportしない
 """
 
 from crewai.tools import BaseTool
+from crewai.tools.structured_tool import CrewStructuredTool, ToolUsageLimitExceededError
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 import os
+import sys
 import json
-import requests
-import base64
+import time
+import asyncio
+import inspect
+import functools
+import importlib.util
+import random
+import threading
+import weakref
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-# ElevenLabs SDK
-try:
-    from elevenlabs import ElevenLabs
-    ELEVENLABS_AVAILABLE = True
-except ImportError:
-    ELEVENLABS_AVAILABLE = False
+from streaming import (
+    write_chunks, stream_to_file, stream_b64_json_field, awrite_chunks, astream_to_file, astream_b64_json_field,
+)
+from transport import (
+    get_session, get_elevenlabs_client, get_async_client, get_async_elevenlabs_client, transport_metrics,
+)
+from journal import active_journal
+
+# ElevenLabs SDK（インストール有無だけを確認し、importは最初の音声生成時まで遅延）
+ELEVENLABS_AVAILABLE = importlib.util.find_spec("elevenlabs") is not None
+if not ELEVENLABS_AVAILABLE:
     print("Warning: elevenlabs not installed. Run: pip install elevenlabs")
 
 
@@ -30,6 +47,260 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
 MUBERT_API_KEY = os.getenv("MUBERT_API_KEY", "")  # Mubert API用
 
+# プロバイダーごとの同時実行数（バッチツール用）
+PROVIDER_CONCURRENCY = {
+    "openai": int(os.getenv("CM_OPENAI_CONCURRENCY", "4")),
+    "elevenlabs": int(os.getenv("CM_ELEVENLABS_CONCURRENCY", "3")),
+    "mubert": int(os.getenv("CM_MUBERT_CONCURRENCY", "2")),
+}
+
+# リトライ設定（レート制限・一時的なサーバーエラー）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv("CM_MAX_RETRIES", "4"))
+RETRY_BASE_DELAY = float(os.getenv("CM_RETRY_BASE_DELAY", "2.0"))
+
+
+# ===============================================
+# バッチ実行ユーティリティ
+# ===============================================
+
+class AssetSkipped(Exception):
+    """APIキー未設定などで素材生成をスキップした場合"""
+
+
+class ProviderError(Exception):
+    """プロバイダーがエラーステータスを返した場合"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# プロセス内の全バッチツールで共有するプロバイダー別セマフォ
+_provider_semaphores = {
+    provider: threading.BoundedSemaphore(max(1, limit))
+    for provider, limit in PROVIDER_CONCURRENCY.items()
+}
+# 非同期版はイベントループごとのasyncio.Semaphore（ループ上の全クルーで共有）
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """
+    再試行する接続エラー（requests / httpx）か
+    importされていないライブラリの例外は起こり得ないため、判定のためにimportはしない
+    """
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """requests / ElevenLabs SDK / ProviderError からHTTPステータスを取り出す"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Retry-Afterヘッダー（秒）があれば返す"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """再試行までの待機秒数（ジッター付き）。再試行しないエラー・回数超過ならNone"""
+    if isinstance(error, AssetSkipped) or attempt > MAX_RETRIES:
+        return None
+    if _is_connection_error(error):
+        delay = RETRY_BASE_DELAY * (2 ** (attempt - 1))
+    elif _status_code(error) in RETRYABLE_STATUS_CODES:
+        delay = _retry_after(error) or RETRY_BASE_DELAY * (2 ** (attempt - 1))
+    else:
+        return None
+    return delay * random.uniform(0.8, 1.2)
+
+
+def call_with_retry(provider: str, func, *args, **kwargs):
+    """
+    プロバイダーの同時実行数制限内でfuncを実行し、
+    429/5xxの場合はRetry-Afterまたは指数バックオフ（ジッター付き）で再試行する
+    戻り値は (funcの戻り値, 試行回数)
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        with _provider_semaphores[provider]:
+            try:
+                return func(*args, **kwargs), attempt
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    raise
+        # 待機中はセマフォを解放して他の素材の生成を進める
+        time.sleep(delay)
+
+
+def _async_semaphore(provider: str) -> asyncio.Semaphore:
+    semaphores = _async_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(max(1, PROVIDER_CONCURRENCY[provider]))
+    return semaphores[provider]
+
+
+async def acall_with_retry(provider: str, func, *args, **kwargs):
+    """call_with_retry のコルーチン版（funcは async 関数。待機中はイベントループを解放する）"""
+    attempt = 0
+    while True:
+        attempt += 1
+        async with _async_semaphore(provider):
+            try:
+                return await func(*args, **kwargs), attempt
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    raise
+        await asyncio.sleep(delay)
+
+
+def journaled(func):
+    """
+    実行ジャーナルが有効な場合、同じ仕様で生成済みかつ内容が変わっていない素材は再生成しない
+    async 関数にも使える（同期版と非同期版は generator 名の a を除いた同じ仕様として記録する）
+    """
+    signature = inspect.signature(func)
+    generator = func.__name__.removeprefix("a") if inspect.iscoroutinefunction(func) else func.__name__
+
+    def lookup(args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        spec = {"generator": generator, **bound.arguments}
+        return bound.arguments["output_path"], spec
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            journal = active_journal()
+            if journal is None:
+                return await func(*args, **kwargs)
+
+            output_path, spec = lookup(args, kwargs)
+            if journal.asset_is_current(output_path, spec):
+                return f"既存素材を再利用しました（仕様・内容に変更なし）: {output_path}"
+
+            message = await func(*args, **kwargs)
+            journal.record_asset(output_path, spec)
+            return message
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        journal = active_journal()
+        if journal is None:
+            return func(*args, **kwargs)
+
+        output_path, spec = lookup(args, kwargs)
+        if journal.asset_is_current(output_path, spec):
+            return f"既存素材を再利用しました（仕様・内容に変更なし）: {output_path}"
+
+        message = func(*args, **kwargs)
+        journal.record_asset(output_path, spec)
+        return message
+
+    return wrapper
+
+
+def run_batch(provider: str, specs: List[BaseModel], func) -> str:
+    """素材仕様のリストを並列生成し、素材ごとのステータスマニフェスト（JSON）を返す"""
+    started = time.perf_counter()
+
+    def generate(spec: BaseModel) -> dict:
+        entry = {"output_path": spec.output_path}
+        asset_started = time.perf_counter()
+        try:
+            message, attempts = call_with_retry(provider, func, **spec.model_dump())
+            entry.update({"status": "ok", "attempts": attempts, "message": message})
+        except AssetSkipped as e:
+            entry.update({"status": "skipped", "attempts": 1, "message": str(e)})
+        except Exception as e:
+            entry.update({"status": "error", "error": str(e), "status_code": _status_code(e)})
+        entry["seconds"] = round(time.perf_counter() - asset_started, 2)
+        return entry
+
+    workers = max(1, min(len(specs), PROVIDER_CONCURRENCY[provider]))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        assets = list(executor.map(generate, specs))
+    return _batch_manifest(provider, assets, started)
+
+
+async def arun_batch(provider: str, specs: List[BaseModel], func) -> str:
+    """run_batch の非同期版（funcは async 関数。同時実行数はプロバイダー別セマフォで制限）"""
+    started = time.perf_counter()
+
+    async def generate(spec: BaseModel) -> dict:
+        entry = {"output_path": spec.output_path}
+        asset_started = time.perf_counter()
+        try:
+            message, attempts = await acall_with_retry(provider, func, **spec.model_dump())
+            entry.update({"status": "ok", "attempts": attempts, "message": message})
+        except AssetSkipped as e:
+            entry.update({"status": "skipped", "attempts": 1, "message": str(e)})
+        except Exception as e:
+            entry.update({"status": "error", "error": str(e), "status_code": _status_code(e)})
+        entry["seconds"] = round(time.perf_counter() - asset_started, 2)
+        return entry
+
+    assets = await asyncio.gather(*(generate(spec) for spec in specs))
+    return _batch_manifest(provider, list(assets), started)
+
+
+def _batch_manifest(provider: str, assets: List[dict], started: float) -> str:
+    manifest = {
+        "provider": provider,
+        "total": len(assets),
+        "succeeded": sum(1 for a in assets if a["status"] == "ok"),
+        "skipped": sum(1 for a in assets if a["status"] == "skipped"),
+        "failed": sum(1 for a in assets if a["status"] == "error"),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+        "transport": transport_metrics(provider),
+        "assets": assets,
+    }
+    return json.dumps(manifest, ensure_ascii=False, indent=2)
+
+
+class _AsyncStructuredTool(CrewStructuredTool):
+    """ainvoke では元ツールの _arun をイベントループ上で直接awaitする（invoke は従来どおり _run）"""
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        parsed_args = self._parse_args(input)
+        if self.has_reached_max_usage_count():
+            raise ToolUsageLimitExceededError(
+                f"Tool '{self.name}' has reached its maximum usage limit of {self.max_usage_count}. "
+                f"You should not use the {self.name} tool again."
+            )
+        self._increment_usage_count()
+        return await self._original_tool._arun(**parsed_args, **kwargs)
+
+
+class AsyncNativeTool(BaseTool):
+    """
+    _arun を持つツールの基底クラス
+    CrewAIは同期の _run をスレッドプールで実行するため、_arun を直接awaitする構造化ツールに差し替える
+    """
+
+    def to_structured_tool(self) -> CrewStructuredTool:
+        structured_tool = super().to_structured_tool()
+        structured_tool.__class__ = _AsyncStructuredTool
+        return structured_tool
+
 
 # ===============================================
 # 画像生成ツール（OpenAI DALL-E 3）
@@ -45,7 +316,7 @@ class ImageGeneratorInput(BaseModel):
     transparent_bg: bool = Field(default=False, description="透明背景にするか")
 
 
-class ImageGeneratorTool(BaseTool):
+class ImageGeneratorTool(AsyncNativeTool):
     name: str = "image_generator"
     description: str = """
     OpenAI DALL-E 3を使って画像を生成するツール。
@@ -56,70 +327,111 @@ class ImageGeneratorTool(BaseTool):
     def _run(self, prompt: str, style: str, width: int, height: int, 
              output_path: str, transparent_bg: bool = False) -> str:
         """画像生成を実行"""
-        
-        if not OPENAI_API_KEY:
-            return "エラー: OPENAI_API_KEYが設定されていません"
-        
-        # スタイル強化プロンプト
-        style_prompts = {
-            "cartoon": "modern cartoon style, rubber hose animation, vibrant colors, clean lines, Cuphead-inspired",
-            "anime": "anime style, cel-shaded, expressive",
-            "realistic": "photorealistic, high detail",
-        }
-        
-        style_suffix = style_prompts.get(style, style_prompts["cartoon"])
-        
-        enhanced_prompt = f"""
-        {prompt}
-        
-        Style: {style_suffix}
-        {'Transparent background, PNG with alpha channel' if transparent_bg else ''}
-        """
-        
-        # OpenAI API呼び出し
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # サイズの正規化（DALL-E 3は特定サイズのみサポート）
-        size = "1024x1024"
-        if width > height:
-            size = "1792x1024"
-        elif height > width:
-            size = "1024x1792"
-        
-        data = {
-            "model": "dall-e-3",
-            "prompt": enhanced_prompt,
-            "size": size,
-            "quality": "hd",
-            "n": 1,
-            "response_format": "b64_json"
-        }
-        
+        import requests
+
         try:
-            response = requests.post(
-                "https://api.openai.com/v1/images/generations",
-                headers=headers,
-                json=data,
-                timeout=120
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            image_b64 = result["data"][0]["b64_json"]
-            
-            # 画像を保存
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                f.write(base64.b64decode(image_b64))
-            
-            return f"画像を生成しました: {output_path}"
-            
+            return generate_image(prompt, style, width, height, output_path, transparent_bg)
+        except AssetSkipped as e:
+            return str(e)
         except requests.exceptions.RequestException as e:
             return f"画像生成エラー: {str(e)}"
 
+    async def _arun(self, prompt: str, style: str, width: int, height: int,
+                    output_path: str, transparent_bg: bool = False) -> str:
+        """画像生成を実行（非同期）"""
+        import httpx
+
+        try:
+            return await agenerate_image(prompt, style, width, height, output_path, transparent_bg)
+        except AssetSkipped as e:
+            return str(e)
+        except httpx.HTTPError as e:
+            return f"画像生成エラー: {str(e)}"
+
+
+IMAGE_API_URL = "https://api.openai.com/v1/images/generations"
+
+
+def _image_request(prompt: str, style: str, width: int, height: int, transparent_bg: bool):
+    """DALL-E 3へのリクエストヘッダーと本文"""
+    
+    if not OPENAI_API_KEY:
+        raise AssetSkipped("エラー: OPENAI_API_KEYが設定されていません")
+    
+    # スタイル強化プロンプト
+    style_prompts = {
+        "cartoon": "modern cartoon style, rubber hose animation, vibrant colors, clean lines, Cuphead-inspired",
+        "anime": "anime style, cel-shaded, expressive",
+        "realistic": "photorealistic, high detail",
+    }
+    
+    style_suffix = style_prompts.get(style, style_prompts["cartoon"])
+    
+    enhanced_prompt = f"""
+    {prompt}
+    
+    Style: {style_suffix}
+    {'Transparent background, PNG with alpha channel' if transparent_bg else ''}
+    """
+    
+    # OpenAI API呼び出し
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
+    # サイズの正規化（DALL-E 3は特定サイズのみサポート）
+    size = "1024x1024"
+    if width > height:
+        size = "1792x1024"
+    elif height > width:
+        size = "1024x1792"
+    
+    data = {
+        "model": "dall-e-3",
+        "prompt": enhanced_prompt,
+        "size": size,
+        "quality": "hd",
+        "n": 1,
+        "response_format": "b64_json"
+    }
+    return headers, data
+
+
+@journaled
+def generate_image(prompt: str, style: str = "cartoon", width: int = 1024, height: int = 1024,
+                   output_path: str = "", transparent_bg: bool = False) -> str:
+    """DALL-E 3で画像を1枚生成して保存（失敗時は例外を送出）"""
+    headers, data = _image_request(prompt, style, width, height, transparent_bg)
+    
+    with get_session("openai").post(
+        IMAGE_API_URL,
+        headers=headers,
+        json=data,
+        timeout=120,
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        
+        # b64_jsonフィールドをチャンク単位でデコードしながら保存（全体をメモリに展開しない）
+        stream_b64_json_field(response, output_path)
+    
+    return f"画像を生成しました: {output_path}"
+
+
+@journaled
+async def agenerate_image(prompt: str, style: str = "cartoon", width: int = 1024, height: int = 1024,
+                          output_path: str = "", transparent_bg: bool = False) -> str:
+    """generate_image の非同期版"""
+    headers, data = _image_request(prompt, style, width, height, transparent_bg)
+    
+    async with get_async_client("openai").stream("POST", IMAGE_API_URL, headers=headers, json=data,
+                                                  timeout=120) as response:
+        response.raise_for_status()
+        await astream_b64_json_field(response, output_path)
+    
+    return f"画像を生成しました: {output_path}"
+
 
 # ===============================================
 # 音楽生成ツール（Mubert API）
@@ -134,7 +446,7 @@ class MusicGeneratorInput(BaseModel):
     output_path: str = Field(..., description="出力ファイルパス")
 
 
-class MusicGeneratorTool(BaseTool):
+class MusicGeneratorTool(AsyncNativeTool):
     name: str = "music_generator"
     description: str = """
     Mubert APIを使ってBGMを生成するツール。
@@ -145,52 +457,102 @@ class MusicGeneratorTool(BaseTool):
     def _run(self, description: str, duration_seconds: int, 
              genre: str, mood: str, output_path: str) -> str:
         """音楽生成を実行"""
-        
-        if not MUBERT_API_KEY:
-            # Mubertがない場合はプレースホルダー
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            return f"注意: MUBERT_API_KEYが未設定。手動で音楽を配置してください: {output_path}"
-        
-        # Mubert Text-to-Music API
-        # 注: 実際のAPIエンドポイントはMubertの契約プランによって異なります
-        
-        headers = {
-            "Authorization": f"Bearer {MUBERT_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "prompt": f"{description}. Genre: {genre}. Mood: {mood}.",
-            "duration": duration_seconds,
-            "format": "mp3"
-        }
-        
+        import requests
+
         try:
-            # Mubert API エンドポイント（要確認）
-            response = requests.post(
-                "https://api.mubert.com/v2/text-to-music",
-                headers=headers,
-                json=data,
-                timeout=180
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                audio_url = result.get("url") or result.get("audio_url")
-                
-                if audio_url:
-                    # 音声ファイルをダウンロード
-                    audio_response = requests.get(audio_url, timeout=60)
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    with open(output_path, "wb") as f:
-                        f.write(audio_response.content)
-                    return f"BGMを生成しました: {output_path}"
-            
-            return f"Mubert APIエラー: {response.status_code}"
-            
+            return generate_music(description, duration_seconds, genre, mood, output_path)
+        except (AssetSkipped, ProviderError) as e:
+            return str(e)
         except requests.exceptions.RequestException as e:
             return f"音楽生成エラー: {str(e)}"
 
+    async def _arun(self, description: str, duration_seconds: int,
+                    genre: str, mood: str, output_path: str) -> str:
+        """音楽生成を実行（非同期）"""
+        import httpx
+
+        try:
+            return await agenerate_music(description, duration_seconds, genre, mood, output_path)
+        except (AssetSkipped, ProviderError) as e:
+            return str(e)
+        except httpx.HTTPError as e:
+            return f"音楽生成エラー: {str(e)}"
+
+
+# Mubert API エンドポイント（要確認）
+MUSIC_API_URL = "https://api.mubert.com/v2/text-to-music"
+
+
+def _music_request(description: str, duration_seconds: int, genre: str, mood: str, output_path: str):
+    """Mubert APIへのリクエストヘッダーと本文"""
+    
+    if not MUBERT_API_KEY:
+        # Mubertがない場合はプレースホルダー
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        raise AssetSkipped(f"注意: MUBERT_API_KEYが未設定。手動で音楽を配置してください: {output_path}")
+    
+    # Mubert Text-to-Music API
+    # 注: 実際のAPIエンドポイントはMubertの契約プランによって異なります
+    
+    headers = {
+        "Authorization": f"Bearer {MUBERT_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
+    data = {
+        "prompt": f"{description}. Genre: {genre}. Mood: {mood}.",
+        "duration": duration_seconds,
+        "format": "mp3"
+    }
+    return headers, data
+
+
+def _music_audio_url(response) -> Optional[str]:
+    """生成結果の音声URL（取得できなければProviderErrorを送出）"""
+    if response.status_code == 200:
+        result = response.json()
+        audio_url = result.get("url") or result.get("audio_url")
+        if audio_url:
+            return audio_url
+    raise ProviderError(f"Mubert APIエラー: {response.status_code}", status_code=response.status_code)
+
+
+@journaled
+def generate_music(description: str, duration_seconds: int = 30, genre: str = "electronic",
+                   mood: str = "upbeat", output_path: str = "") -> str:
+    """Mubert APIでBGMを1曲生成して保存（失敗時は例外を送出）"""
+    headers, data = _music_request(description, duration_seconds, genre, mood, output_path)
+    
+    response = get_session("mubert").post(
+        MUSIC_API_URL,
+        headers=headers,
+        json=data,
+        timeout=180
+    )
+    audio_url = _music_audio_url(response)
+    
+    # 音声ファイルをストリーミングでダウンロード
+    with get_session("mubert").get(audio_url, timeout=60, stream=True) as audio_response:
+        audio_response.raise_for_status()
+        stream_to_file(audio_response, output_path)
+    return f"BGMを生成しました: {output_path}"
+
+
+@journaled
+async def agenerate_music(description: str, duration_seconds: int = 30, genre: str = "electronic",
+                          mood: str = "upbeat", output_path: str = "") -> str:
+    """generate_music の非同期版"""
+    headers, data = _music_request(description, duration_seconds, genre, mood, output_path)
+    
+    client = get_async_client("mubert")
+    response = await client.post(MUSIC_API_URL, headers=headers, json=data, timeout=180)
+    audio_url = _music_audio_url(response)
+    
+    async with client.stream("GET", audio_url, timeout=60) as audio_response:
+        audio_response.raise_for_status()
+        await astream_to_file(audio_response, output_path)
+    return f"BGMを生成しました: {output_path}"
+
 
 # ===============================================
 # ElevenLabs TTS ツール
@@ -204,7 +566,7 @@ class TTSGeneratorInput(BaseModel):
     output_path: str = Field(..., description="出力ファイルパス")
 
 
-class TTSGeneratorTool(BaseTool):
+class TTSGeneratorTool(AsyncNativeTool):
     name: str = "tts_generator"
     description: str = """
     ElevenLabs APIを使ってテキストを音声に変換するツール。
@@ -214,37 +576,74 @@ class TTSGeneratorTool(BaseTool):
 
     def _run(self, text: str, voice_id: str, emotion: str, output_path: str) -> str:
         """TTS生成を実行"""
-        
-        if not ELEVENLABS_API_KEY:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            return f"注意: ELEVENLABS_API_KEYが未設定。手動で音声を配置してください: {output_path}"
-        
-        if not ELEVENLABS_AVAILABLE:
-            return "エラー: elevenlabs SDKがインストールされていません"
-        
         try:
-            client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-            
-            # 音声生成
-            audio = client.text_to_speech.convert(
-                voice_id=voice_id,
-                text=text,
-                model_id="eleven_multilingual_v2",
-                output_format="mp3_44100_128"
-            )
-            
-            # ファイル保存
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                for chunk in audio:
-                    f.write(chunk)
-            
-            return f"ボイスを生成しました: {output_path}"
-            
+            return generate_voice(text, voice_id, emotion, output_path)
+        except AssetSkipped as e:
+            return str(e)
+        except Exception as e:
+            return f"TTS生成エラー: {str(e)}"
+
+    async def _arun(self, text: str, voice_id: str, emotion: str, output_path: str) -> str:
+        """TTS生成を実行（非同期）"""
+        try:
+            return await agenerate_voice(text, voice_id, emotion, output_path)
+        except AssetSkipped as e:
+            return str(e)
         except Exception as e:
             return f"TTS生成エラー: {str(e)}"
 
 
+def _check_elevenlabs(output_path: str, asset: str) -> None:
+    """ElevenLabsのAPIキーとSDKがなければAssetSkippedを送出"""
+    
+    if not ELEVENLABS_API_KEY:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        raise AssetSkipped(f"注意: ELEVENLABS_API_KEYが未設定。手動で{asset}を配置してください: {output_path}")
+    
+    if not ELEVENLABS_AVAILABLE:
+        raise AssetSkipped("エラー: elevenlabs SDKがインストールされていません")
+
+
+@journaled
+def generate_voice(text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM", emotion: str = "neutral",
+                   output_path: str = "") -> str:
+    """ElevenLabsでボイスを1本生成して保存（失敗時は例外を送出）"""
+    _check_elevenlabs(output_path, "音声")
+    
+    client = get_elevenlabs_client(ELEVENLABS_API_KEY)
+    
+    # 音声生成
+    audio = client.text_to_speech.convert(
+        voice_id=voice_id,
+        text=text,
+        model_id="eleven_multilingual_v2",
+        output_format="mp3_44100_128"
+    )
+    
+    # ファイル保存（チャンクごとに一時ファイルへ書き込み、完了後にリネーム）
+    write_chunks(audio, output_path)
+    
+    return f"ボイスを生成しました: {output_path}"
+
+
+@journaled
+async def agenerate_voice(text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM", emotion: str = "neutral",
+                          output_path: str = "") -> str:
+    """generate_voice の非同期版（AsyncElevenLabsの音声チャンクを受信しながら書き込む）"""
+    _check_elevenlabs(output_path, "音声")
+    
+    client = get_async_elevenlabs_client(ELEVENLABS_API_KEY)
+    audio = client.text_to_speech.convert(
+        voice_id=voice_id,
+        text=text,
+        model_id="eleven_multilingual_v2",
+        output_format="mp3_44100_128"
+    )
+    await awrite_chunks(audio, output_path)
+    
+    return f"ボイスを生成しました: {output_path}"
+
+
 # ===============================================
 # ElevenLabs Sound Effects ツール
 # ===============================================
@@ -256,7 +655,7 @@ class SEGeneratorInput(BaseModel):
     output_path: str = Field(..., description="出力ファイルパス")
 
 
-class SEGeneratorTool(BaseTool):
+class SEGeneratorTool(AsyncNativeTool):
     name: str = "se_generator"
     description: str = """
     ElevenLabs Sound Effects APIを使って効果音を生成するツール。
@@ -266,36 +665,156 @@ class SEGeneratorTool(BaseTool):
 
     def _run(self, description: str, duration_seconds: float, output_path: str) -> str:
         """SE生成を実行"""
-        
-        if not ELEVENLABS_API_KEY:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            return f"注意: ELEVENLABS_API_KEYが未設定。手動でSEを配置してください: {output_path}"
-        
-        if not ELEVENLABS_AVAILABLE:
-            return "エラー: elevenlabs SDKがインストールされていません"
-        
         try:
-            client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-            
-            # Sound Effects生成
-            audio = client.text_to_sound_effects.convert(
-                text=description,
-                duration_seconds=duration_seconds,
-                prompt_influence=0.5
-            )
-            
-            # ファイル保存
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, "wb") as f:
-                for chunk in audio:
-                    f.write(chunk)
-            
-            return f"SEを生成しました: {output_path}"
-            
+            return generate_sound_effect(description, duration_seconds, output_path)
+        except AssetSkipped as e:
+            return str(e)
+        except Exception as e:
+            return f"SE生成エラー: {str(e)}"
+
+    async def _arun(self, description: str, duration_seconds: float, output_path: str) -> str:
+        """SE生成を実行（非同期）"""
+        try:
+            return await agenerate_sound_effect(description, duration_seconds, output_path)
+        except AssetSkipped as e:
+            return str(e)
         except Exception as e:
             return f"SE生成エラー: {str(e)}"
 
 
+@journaled
+def generate_sound_effect(description: str, duration_seconds: float = 2.0, output_path: str = "") -> str:
+    """ElevenLabsで効果音を1つ生成して保存（失敗時は例外を送出）"""
+    _check_elevenlabs(output_path, "SE")
+    
+    client = get_elevenlabs_client(ELEVENLABS_API_KEY)
+    
+    # Sound Effects生成
+    audio = client.text_to_sound_effects.convert(
+        text=description,
+        duration_seconds=duration_seconds,
+        prompt_influence=0.5
+    )
+    
+    # ファイル保存（チャンクごとに一時ファイルへ書き込み、完了後にリネーム）
+    write_chunks(audio, output_path)
+    
+    return f"SEを生成しました: {output_path}"
+
+
+@journaled
+async def agenerate_sound_effect(description: str, duration_seconds: float = 2.0, output_path: str = "") -> str:
+    """generate_sound_effect の非同期版"""
+    _check_elevenlabs(output_path, "SE")
+    
+    client = get_async_elevenlabs_client(ELEVENLABS_API_KEY)
+    audio = client.text_to_sound_effects.convert(
+        text=description,
+        duration_seconds=duration_seconds,
+        prompt_influence=0.5
+    )
+    await awrite_chunks(audio, output_path)
+    
+    return f"SEを生成しました: {output_path}"
+
+
+# ===============================================
+# バッチ生成ツール（複数素材を並列生成）
+# ===============================================
+
+class BatchImageGeneratorInput(BaseModel):
+    """画像バッチ生成ツールの入力スキーマ"""
+    assets: List[ImageGeneratorInput] = Field(..., description="生成する画像の仕様リスト")
+
+
+class BatchImageGeneratorTool(AsyncNativeTool):
+    name: str = "batch_image_generator"
+    description: str = """
+    複数の画像をDALL-E 3で並列生成するツール。
+    characters/ や backgrounds/ フォルダ一式を1回の呼び出しで生成し、素材ごとの結果をJSONで返す。
+    """
+    args_schema: type[BaseModel] = BatchImageGeneratorInput
+
+    def _run(self, assets: List[ImageGeneratorInput]) -> str:
+        """画像バッチ生成を実行"""
+        return run_batch("openai", _as_specs(ImageGeneratorInput, assets), generate_image)
+
+    async def _arun(self, assets: List[ImageGeneratorInput]) -> str:
+        """画像バッチ生成を実行（非同期）"""
+        return await arun_batch("openai", _as_specs(ImageGeneratorInput, assets), agenerate_image)
+
+
+class BatchMusicGeneratorInput(BaseModel):
+    """BGMバッチ生成ツールの入力スキーマ"""
+    assets: List[MusicGeneratorInput] = Field(..., description="生成するBGMの仕様リスト")
+
+
+class BatchMusicGeneratorTool(AsyncNativeTool):
+    name: str = "batch_music_generator"
+    description: str = """
+    複数のBGMをMubert APIで並列生成するツール。
+    audio/bgm/ フォルダ一式を1回の呼び出しで生成し、素材ごとの結果をJSONで返す。
+    """
+    args_schema: type[BaseModel] = BatchMusicGeneratorInput
+
+    def _run(self, assets: List[MusicGeneratorInput]) -> str:
+        """BGMバッチ生成を実行"""
+        return run_batch("mubert", _as_specs(MusicGeneratorInput, assets), generate_music)
+
+    async def _arun(self, assets: List[MusicGeneratorInput]) -> str:
+        """BGMバッチ生成を実行（非同期）"""
+        return await arun_batch("mubert", _as_specs(MusicGeneratorInput, assets), agenerate_music)
+
+
+class BatchTTSGeneratorInput(BaseModel):
+    """ボイスバッチ生成ツールの入力スキーマ"""
+    assets: List[TTSGeneratorInput] = Field(..., description="生成するボイスの仕様リスト")
+
+
+class BatchTTSGeneratorTool(AsyncNativeTool):
+    name: str = "batch_tts_generator"
+    description: str = """
+    複数のセリフ音声をElevenLabsで並列生成するツール。
+    audio/voice/ フォルダ一式を1回の呼び出しで生成し、素材ごとの結果をJSONで返す。
+    """
+    args_schema: type[BaseModel] = BatchTTSGeneratorInput
+
+    def _run(self, assets: List[TTSGeneratorInput]) -> str:
+        """ボイスバッチ生成を実行"""
+        return run_batch("elevenlabs", _as_specs(TTSGeneratorInput, assets), generate_voice)
+
+    async def _arun(self, assets: List[TTSGeneratorInput]) -> str:
+        """ボイスバッチ生成を実行（非同期）"""
+        return await arun_batch("elevenlabs", _as_specs(TTSGeneratorInput, assets), agenerate_voice)
+
+
+class BatchSEGeneratorInput(BaseModel):
+    """SEバッチ生成ツールの入力スキーマ"""
+    assets: List[SEGeneratorInput] = Field(..., description="生成する効果音の仕様リスト")
+
+
+class BatchSEGeneratorTool(AsyncNativeTool):
+    name: str = "batch_se_generator"
+    description: str = """
+    複数の効果音をElevenLabsで並列生成するツール。
+    audio/se/ フォルダ一式を1回の呼び出しで生成し、素材ごとの結果をJSONで返す。
+    """
+    args_schema: type[BaseModel] = BatchSEGeneratorInput
+
+    def _run(self, assets: List[SEGeneratorInput]) -> str:
+        """SEバッチ生成を実行"""
+        return run_batch("elevenlabs", _as_specs(SEGeneratorInput, assets), generate_sound_effect)
+
+    async def _arun(self, assets: List[SEGeneratorInput]) -> str:
+        """SEバッチ生成を実行（非同期）"""
+        return await arun_batch("elevenlabs", _as_specs(SEGeneratorInput, assets), agenerate_sound_effect)
+
+
+def _as_specs(model: type[BaseModel], assets: list) -> List[BaseModel]:
+    """LLMから辞書で渡された素材仕様をスキーマに変換"""
+    return [a if isinstance(a, model) else model(**a) for a in assets]
+
+
 # ===============================================
 # ファイル整理ツール
 # ===============================================
@@ -536,21 +1055,225 @@ class SequenceGeneratorTool(BaseTool):
         return f"シーケンスを生成しました: {output_path}"
 
 
+# ===============================================
+# フレーム合成ツール
+# ===============================================
+
+class ImageComposerInput(BaseModel):
+    """フレーム合成ツールの入力スキーマ"""
+    timeline_path: str = Field(..., description="sequence_generator が出力したタイムラインJSONのパス")
+    assets_dir: str = Field(..., description="素材のルートディレクトリ（タイムラインの素材パスの基準）")
+    output_dir: str = Field(default="", description="出力先（省略時は <assets_dir>/frames）")
+    scene_ids: List[int] = Field(default_factory=list, description="合成するシーンID（省略時は全シーン）")
+    frames_per_scene: int = Field(default=0, description="シーンごとのフレーム数（0でエフェクト連番の長さ）")
+
+
+class ImageComposerTool(BaseTool):
+    name: str = "image_composer"
+    description: str = """
+    タイムラインの各シーンの背景・キャラクター・エフェクト連番をレイヤー合成し、
+    FHDのフレームを frames/scene_XX/ にPNGで書き出すツール（APIを使わずローカルで合成）。
+    シーンの layout で素材ごとの位置・大きさ・反転・不透明度を指定でき、結果をJSONで返す。
+    """
+    args_schema: type[BaseModel] = ImageComposerInput
+
+    def _run(self, timeline_path: str, assets_dir: str, output_dir: str = "",
+             scene_ids: Optional[List[int]] = None, frames_per_scene: int = 0) -> str:
+        """フレーム合成を実行"""
+        from compositor import compose_timeline
+
+        try:
+            report = compose_timeline(timeline_path, assets_dir, output_dir=output_dir or None,
+                                      scene_ids=scene_ids or None, frames_per_scene=frames_per_scene)
+        except (OSError, ValueError) as e:
+            return f"フレーム合成エラー: {str(e)}"
+        for scene in report["scenes"]:
+            scene.pop("pid", None)
+        return json.dumps(report, ensure_ascii=False, indent=2)
+
+
+# ===============================================
+# トランジション生成ツール
+# ===============================================
+
+class TransitionGeneratorInput(BaseModel):
+    """トランジション生成ツールの入力スキーマ"""
+    timeline_path: str = Field(..., description="sequence_generator が出力したタイムラインJSONのパス")
+    assets_dir: str = Field(..., description="素材のルートディレクトリ")
+    frames_dir: str = Field(default="", description="合成済みフレームのフォルダ（省略時は <assets_dir>/frames）")
+    output_dir: str = Field(default="", description="出力先（省略時は <assets_dir>/transitions）")
+    frames: int = Field(default=0, description="1トランジションのフレーム数（0で既定の12フレーム）")
+    kind: str = Field(default="", description="fade / flash / wipe / iris（省略時は各シーンの transition_out）")
+
+
+class TransitionGeneratorTool(BaseTool):
+    name: str = "transition_generator"
+    description: str = """
+    合成済みのシーンフレームから、隣り合うシーン間のトランジション（fade / flash / wipe / iris）の
+    PNG連番を transitions/ に書き出すツール（APIを使わずローカルで生成）。
+    トランジションごとのフレーム数と読み込み・ブレンド・エンコード時間をJSONで返す。
+    """
+    args_schema: type[BaseModel] = TransitionGeneratorInput
+
+    def _run(self, timeline_path: str, assets_dir: str, frames_dir: str = "", output_dir: str = "",
+             frames: int = 0, kind: str = "") -> str:
+        """トランジション生成を実行"""
+        from transitions import render_timeline_transitions
+
+        try:
+            report = render_timeline_transitions(timeline_path, assets_dir, frames_dir=frames_dir or None,
+                                                 output_dir=output_dir or None, frames=frames, kind=kind or None)
+        except (OSError, ValueError) as e:
+            return f"トランジション生成エラー: {str(e)}"
+        return json.dumps(report, ensure_ascii=False, indent=2)
+
+
+# ===============================================
+# エフェクト連番生成ツール
+# ===============================================
+
+class EffectParamsInput(BaseModel):
+    """エフェクト1種類のパラメータ（0や空の値はエフェクトの既定値）"""
+    name: str = Field(..., description="energy_wave / pop_smoke / sparkles / confetti / progress_bar / glow_pulse")
+    frames: int = Field(default=0, description="フレーム数（既定: energy_wave 8, pop_smoke 6, sparkles 12, confetti 8, "
+                                               "progress_bar 24, glow_pulse 4）")
+    size: int = Field(default=0, description="正方形の一辺（px、64〜2048、既定512）")
+    count: int = Field(default=0, description="粒子の数")
+    colors: List[str] = Field(default_factory=list, description="粒子の色（#RRGGBB のリスト）")
+    seed: int = Field(default=0, description="乱数シード（同じ値なら同じ連番になる）")
+    fps: int = Field(default=0, description="フレームレート（既定24）")
+
+
+class EffectRendererInput(BaseModel):
+    """エフェクト連番生成ツールの入力スキーマ"""
+    effects: List[EffectParamsInput] = Field(..., description="生成するエフェクトのリスト")
+    output_dir: str = Field(..., description="effects/ フォルダのパス（エフェクトごとにサブフォルダを作成）")
+
+
+class EffectRendererTool(BaseTool):
+    name: str = "effect_renderer"
+    description: str = """
+    パーティクルシミュレーションで透明背景のエフェクト連番PNGを生成するツール（APIを使わずローカルで数秒）。
+    effects/<name>/frame_NNNN.png に書き出し、エフェクトごとのフレーム数・ファイルサイズをJSONで返す。
+    同じパラメータ・シードなら毎回同じ連番になる。
+    """
+    args_schema: type[BaseModel] = EffectRendererInput
+
+    def _run(self, effects: List[EffectParamsInput], output_dir: str) -> str:
+        """エフェクト連番の生成を実行"""
+        from effects import effect_spec, render_effects
+
+        try:
+            specs = [effect_spec(**params.model_dump()) for params in _as_specs(EffectParamsInput, effects)]
+            report = render_effects(specs, output_dir)
+        except (OSError, ValueError) as e:
+            return f"エフェクト生成エラー: {str(e)}"
+        return json.dumps(report, ensure_ascii=False, indent=2)
+
+
+# ===============================================
+# 音声ミックスツール
+# ===============================================
+
+class AudioMixerInput(BaseModel):
+    """音声ミックスツールの入力スキーマ"""
+    timeline_path: str = Field(..., description="sequence_generator が出力したタイムラインJSONのパス")
+    assets_dir: str = Field(..., description="素材のルートディレクトリ（audio/ のパスはここからの相対パス）")
+    output_path: str = Field(default="", description="マスターWAVの出力先（省略時は <assets_dir>/audio/master.wav）")
+    gains: Dict[str, float] = Field(default_factory=dict,
+                                    description="レイヤーごとのゲイン（dB）の上書き（例: {\"bgm\": -10}、既定 bgm -8 / se -4 / voice 0）")
+    duck_db: Optional[float] = Field(default=None, description="ボイス中にBGMを下げる量（dB、既定-10、0でダッキングなし）")
+
+
+class AudioMixerTool(BaseTool):
+    name: str = "audio_mixer"
+    description: str = """
+    タイムラインのBGM・SE・ボイスを配置して48kHzステレオのマスターWAVに書き出すツール（APIを使わずローカルで処理）。
+    ボイスの間はBGMを自動で下げる。各素材を鳴らした区間・ピーク・クリップしたサンプル数・
+    見つからない素材をJSONで返す（タイミングの確認に使用）。
+    """
+    args_schema: type[BaseModel] = AudioMixerInput
+
+    def _run(self, timeline_path: str, assets_dir: str, output_path: str = "",
+             gains: Optional[Dict[str, float]] = None, duck_db: Optional[float] = None) -> str:
+        """ミックスダウンを実行"""
+        from audio_mix import mixdown
+
+        try:
+            report = mixdown(timeline_path, assets_dir, output_path=output_path or None, gains=gains or None,
+                             duck_db=duck_db)
+        except (OSError, ValueError) as e:
+            return f"音声ミックスエラー: {str(e)}"
+        return json.dumps(report, ensure_ascii=False, indent=2)
+
+
+# ===============================================
+# ナレッジ検索ツール
+# ===============================================
+
+class KnowledgeSearchInput(BaseModel):
+    """ナレッジ検索ツールの入力スキーマ"""
+    query: str = Field(..., description="検索したい内容（例: シーン3のBGMの指示）")
+    limit: int = Field(default=5, description="返す抜粋の数")
+
+
+class KnowledgeSearchTool(BaseTool):
+    name: str = "knowledge_search"
+    description: str = """
+    ストーリーボードと演出指示書から、質問に関係する箇所を検索するツール。
+    文書全体を読む代わりに、必要な抜粋だけを出典付きで返します。
+    """
+    args_schema: type[BaseModel] = KnowledgeSearchInput
+
+    def _run(self, query: str, limit: int = 5) -> str:
+        """取り込み済みのナレッジをベクトル検索"""
+        from knowledge_ingest import active_knowledge
+
+        knowledge = active_knowledge()
+        if knowledge is None:
+            return "ナレッジが読み込まれていません"
+        hits = knowledge.search(query, limit=max(1, limit))
+        if not hits:
+            return f"「{query}」に関係する記述は見つかりませんでした"
+        return "\n\n".join(
+            f"[{hit['metadata'].get('source', '')}:{hit['metadata'].get('offset', 0)}] "
+            f"(score {hit['score']:.2f})\n{hit['content']}"
+            for hit in hits
+        )
+
+
 # ===============================================
 # ツールリストのエクスポート
 # ===============================================
 
+TOOL_CLASSES = [
+    ImageGeneratorTool,
+    MusicGeneratorTool,
+    SEGeneratorTool,
+    TTSGeneratorTool,
+    FileOrganizerTool,
+    ReadmeGeneratorTool,
+    SequenceGeneratorTool,
+    ImageComposerTool,
+    EffectRendererTool,
+    TransitionGeneratorTool,
+    AudioMixerTool,
+    BatchImageGeneratorTool,
+    BatchMusicGeneratorTool,
+    BatchTTSGeneratorTool,
+    BatchSEGeneratorTool,
+    KnowledgeSearchTool,
+]
+
+
+def get_tool_classes() -> dict:
+    """ツール名 → ツールクラス（インスタンスを作らずにnameフィールドの既定値から取得）"""
+    return {cls.model_fields["name"].default: cls for cls in TOOL_CLASSES}
+
+
 def get_all_tools() -> List[BaseTool]:
     """すべてのカスタムツールを取得"""
-    return [
-        ImageGeneratorTool(),
-        MusicGeneratorTool(),
-        SEGeneratorTool(),
-        TTSGeneratorTool(),
-        FileOrganizerTool(),
-        ReadmeGeneratorTool(),
-        SequenceGeneratorTool(),
-    ]
+    return [cls() for cls in TOOL_CLASSES]
 
 
 # ===============================================
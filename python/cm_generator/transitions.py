@@ -0,0 +1,298 @@
+"""
+シーン間トランジションの生成（create_transitions）
+sequences/timeline.json の隣り合うシーンについて、前のシーンの transition_out（fade / flash / wipe / iris）で
+frames/scene_XX/ の終わりのフレームから次のシーンの始めのフレームへ切り替わる中間フレームを作り、
+transitions/scene_XX-scene_YY_<kind>/frame_NNNN.png に書き出す
+
+- 元フレームと中間フレームは np.memmap の uint8 バッファ（フレーム数, 高さ, 幅, 3）に置き、
+  数フレームずつ読み出して整数演算でまとめてブレンドする。長いFHDトランジションでも
+  全フレームをメモリに載せない（メモリ使用量は CM_TRANSITION_CHUNK_FRAMES フレーム分）
+- 各画素は 前のシーン・次のシーン・フラッシュ色 の重み（合計255）の加重平均:
+    fade   画面全体の重みを時間で入れ替える
+    flash  中間で白に飛ばしてから次のシーンへ
+    wipe   左から右へ境界（ぼかし幅あり）が移動する
+    iris   画面中央から円が開いて次のシーンが現れる
+- PNGのエンコードは、各ワーカープロセスが中間フレームの memmap をファイルから開き直して分担する
+- トランジションごとの読み込み・ブレンド・エンコード時間を transitions/transitions.json と戻り値に記録する
+"""
+
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from imaging import read_rgb, image_size, write_png, list_sequence, clear_sequence
+from streaming import atomic_writer
+from compositor import scene_dirname
+
+KINDS = ("fade", "flash", "wipe", "iris")
+
+# 何もしないで切り替える transition_out
+CUT_KINDS = ("cut", "none", "")
+
+# トランジションのフレーム数（既定は24fpsで0.5秒）
+TRANSITION_FRAMES = int(os.getenv("CM_TRANSITION_FRAMES", "12"))
+
+# 1回にブレンドするフレーム数（中間データのメモリはこのフレーム数に比例する。FHDでは1が最も速い）
+CHUNK_FRAMES = int(os.getenv("CM_TRANSITION_CHUNK_FRAMES", "1"))
+
+# 中間フレームをPNGにエンコードするプロセス数（0でCPUコア数）
+TRANSITION_WORKERS = int(os.getenv("CM_TRANSITION_WORKERS", "0"))
+
+# memmap バッファを置くディレクトリ（空なら出力先。/tmp がメモリ上のtmpfsの環境があるため）
+BUFFER_DIR = os.getenv("CM_TRANSITION_BUFFER_DIR", "")
+
+FLASH_COLOR = (255, 255, 255)
+
+# wipe / iris の境界のぼかし幅（画面の幅・対角線に対する比率）
+EDGE_SOFTNESS = 0.03
+
+
+class TransitionError(ValueError):
+    """トランジションの指定が不正"""
+    pass
+
+
+# ===============================================
+# 重み（前のシーン, 次のシーン, フラッシュ色）
+# ===============================================
+
+def _progress(start: int, stop: int, count: int) -> np.ndarray:
+    """各フレームの進み具合（最初のフレームは前のシーンから1歩進み、最後のフレームは次のシーンそのもの）"""
+    return (np.arange(start, stop, dtype=np.float32) + 1) / count
+
+
+def _mask_weights(reveal: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    incoming = np.rint(reveal * 255).astype(np.uint16)
+    return 255 - incoming, incoming, np.zeros((1, 1, 1, 1), dtype=np.uint16)
+
+
+def transition_weights(kind: str, progress: np.ndarray, size: Tuple[int, int]) -> Tuple[np.ndarray, ...]:
+    """
+    進み具合（k,）から、前のシーン・次のシーン・フラッシュ色の重み（uint16、合計255）を返す
+    重みは (k, 高さ, 幅, 1) にブロードキャストできる形（fade / flash は (k, 1, 1, 1)）
+    """
+    width, height = size
+    t = progress.reshape(-1, 1, 1, 1)
+    if kind == "fade":
+        return _mask_weights(t)
+    if kind == "flash":
+        # 前半で白に飛ばし、後半で白から次のシーンへ
+        flash = np.rint((1.0 - np.abs(2.0 * t - 1.0)) * 255).astype(np.uint16)
+        first_half = t < 0.5
+        outgoing = np.where(first_half, 255 - flash, 0).astype(np.uint16)
+        incoming = np.where(first_half, 0, 255 - flash).astype(np.uint16)
+        return outgoing, incoming, flash
+    if kind == "wipe":
+        soft = EDGE_SOFTNESS * width
+        x = np.arange(width, dtype=np.float32).reshape(1, 1, width, 1) + 0.5
+        # 境界は画面の左外から右外まで移動する
+        edge = t * (width + soft)
+        return _mask_weights(np.clip((edge - x) / soft, 0.0, 1.0))
+    if kind == "iris":
+        radius_max = float(np.hypot(width, height)) / 2
+        soft = EDGE_SOFTNESS * radius_max * 2
+        y, x = np.ogrid[0:height, 0:width]
+        distance = np.hypot(x + 0.5 - width / 2, y + 0.5 - height / 2).astype(np.float32)[None, :, :, None]
+        radius = t * (radius_max + soft)
+        return _mask_weights(np.clip((radius - distance) / soft, 0.0, 1.0))
+    raise TransitionError(f"transition must be one of {', '.join(KINDS)}, got {kind!r}")
+
+
+def blend_chunk(outgoing: np.ndarray, incoming: np.ndarray, weights: Tuple[np.ndarray, ...],
+                out: np.ndarray) -> None:
+    """uint8 のフレーム（k, 高さ, 幅, 3）を重みで加重平均して out に書き込む（整数演算、四捨五入）"""
+    weight_out, weight_in, weight_flash = weights
+    mixed = outgoing.astype(np.uint16) * weight_out
+    mixed += incoming.astype(np.uint16) * weight_in
+    if weight_flash.any():
+        mixed += weight_flash * np.asarray(FLASH_COLOR, dtype=np.uint16)
+    mixed += 127
+    mixed //= 255
+    out[...] = mixed
+
+
+# ===============================================
+# memmap バッファ
+# ===============================================
+
+def _source_frames(paths: List[str], count: int, tail: bool) -> List[str]:
+    """
+    トランジション中に使う元フレームのパス
+    前のシーンは最後の count 枚、次のシーンは最初の count 枚（足りなければ端のフレームで止める）
+    """
+    if tail:
+        return [paths[max(len(paths) - count + index, 0)] for index in range(count)]
+    return [paths[min(index, len(paths) - 1)] for index in range(count)]
+
+
+def _load_buffer(path: str, frames: List[str], size: Tuple[int, int]) -> np.memmap:
+    """フレームを1枚ずつデコードして memmap に書き込む（同じパスは1回だけデコード）"""
+    width, height = size
+    buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(len(frames), height, width, 3))
+    decoded: Dict[str, int] = {}
+    for index, frame in enumerate(frames):
+        if frame in decoded:
+            buffer[index] = buffer[decoded[frame]]
+        else:
+            buffer[index] = read_rgb(frame, size)
+            decoded[frame] = index
+    buffer.flush()
+    return buffer
+
+
+def encode_frames(job: Dict[str, Any]) -> int:
+    """memmap の中間フレームのうち job["indices"] をPNGに書き出し、バイト数を返す（プロセスプールで実行）"""
+    frames = np.memmap(job["buffer"], dtype=np.uint8, mode="r", shape=tuple(job["shape"]))
+    written = 0
+    for index in job["indices"]:
+        written += write_png(os.path.join(job["output_dir"], f"frame_{index + 1:04d}.png"), np.asarray(frames[index]))
+    del frames
+    return written
+
+
+def render_transition(outgoing_frames: List[str], incoming_frames: List[str], kind: str, count: int,
+                      output_dir: str, buffer_dir: str, chunk_frames: int = CHUNK_FRAMES,
+                      executor: Optional[ProcessPoolExecutor] = None, workers: int = 1) -> Dict[str, Any]:
+    """
+    前のシーンの連番から次のシーンの連番への count 枚のトランジションを output_dir に書き出し、
+    段階ごとの時間を返す。フレームの大きさは前のシーンに合わせる
+    executor を渡すと、中間フレームを workers 個に分けてそのプロセスプールでエンコードする
+    """
+    if kind not in KINDS:
+        raise TransitionError(f"transition must be one of {', '.join(KINDS)}, got {kind!r}")
+    started = time.perf_counter()
+    size = image_size(outgoing_frames[-1])
+    width, height = size
+    os.makedirs(output_dir, exist_ok=True)
+    clear_sequence(output_dir)
+
+    with tempfile.TemporaryDirectory(prefix=".transition-", dir=buffer_dir) as scratch:
+        outgoing = _load_buffer(os.path.join(scratch, "outgoing.u8"),
+                                _source_frames(outgoing_frames, count, tail=True), size)
+        incoming = _load_buffer(os.path.join(scratch, "incoming.u8"),
+                                _source_frames(incoming_frames, count, tail=False), size)
+        out_path = os.path.join(scratch, "out.u8")
+        out = np.memmap(out_path, dtype=np.uint8, mode="w+", shape=(count, height, width, 3))
+        loaded = time.perf_counter()
+
+        step = max(1, chunk_frames)
+        for start in range(0, count, step):
+            stop = min(start + step, count)
+            weights = transition_weights(kind, _progress(start, stop, count), size)
+            blend_chunk(outgoing[start:stop], incoming[start:stop], weights, out[start:stop])
+        out.flush()
+        blended = time.perf_counter()
+
+        buffer_bytes = outgoing.nbytes + incoming.nbytes + out.nbytes
+        shape = out.shape
+        # Windows では開いている memmap のファイルを消せないため、一時ディレクトリの削除前に閉じる
+        del outgoing, incoming, out
+
+        workers = max(1, min(workers, count)) if executor is not None else 1
+        jobs = [
+            {"buffer": out_path, "shape": shape, "output_dir": output_dir, "indices": list(range(i, count, workers))}
+            for i in range(workers)
+        ]
+        written = sum(executor.map(encode_frames, jobs)) if executor is not None else encode_frames(jobs[0])
+    finished = time.perf_counter()
+
+    return {
+        "kind": kind,
+        "frames": count,
+        "size": [width, height],
+        "output_dir": output_dir,
+        "bytes": written,
+        "buffer_bytes": buffer_bytes,
+        "load_seconds": round(loaded - started, 3),
+        "blend_seconds": round(blended - loaded, 3),
+        "encode_seconds": round(finished - blended, 3),
+        "elapsed_seconds": round(finished - started, 3),
+        "fps": round(count / (finished - started), 2),
+        "workers": workers,
+    }
+
+
+# ===============================================
+# タイムライン全体
+# ===============================================
+
+def render_timeline_transitions(timeline_path: str, assets_dir: str, frames_dir: Optional[str] = None,
+                                output_dir: Optional[str] = None, frames: int = 0,
+                                kind: Optional[str] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    タイムラインの隣り合うシーンの間のトランジションを書き出し、トランジションごとの時間を返す
+    種類は前のシーンの transition_out（kind を指定するとすべてその種類、cut / none は書き出さない）
+    frames は1トランジションのフレーム数（0で CM_TRANSITION_FRAMES）
+    workers はエンコードの並列プロセス数（省略時は CM_TRANSITION_WORKERS、0でCPUコア数）。1ならこのプロセスで書き出す
+    """
+    if kind and kind not in KINDS:
+        raise TransitionError(f"transition must be one of {', '.join(KINDS)}, got {kind!r}")
+    with open(timeline_path, "r", encoding="utf-8") as f:
+        timeline = json.load(f)
+    scenes = timeline.get("scenes")
+    if not isinstance(scenes, list):
+        raise TransitionError(f"{timeline_path} has no scenes list")
+    frames_dir = frames_dir or os.path.join(assets_dir, "frames")
+    output_dir = output_dir or os.path.join(assets_dir, "transitions")
+    count = frames or TRANSITION_FRAMES
+    if count < 1:
+        raise TransitionError("frames must be positive")
+    os.makedirs(output_dir, exist_ok=True)
+    buffer_dir = BUFFER_DIR or output_dir
+
+    started = time.perf_counter()
+    pending, skipped = [], []
+    for index in range(len(scenes) - 1):
+        current, following = scenes[index], scenes[index + 1]
+        current_id, following_id = current.get("id", index + 1), following.get("id", index + 2)
+        transition = kind or str(current.get("transition_out") or "").lower()
+        if transition in CUT_KINDS:
+            continue
+        if transition not in KINDS:
+            raise TransitionError(f"scene {current_id}: transition_out must be one of "
+                                  f"{', '.join(KINDS + CUT_KINDS[:2])}, got {transition!r}")
+
+        outgoing = list_sequence(os.path.join(frames_dir, scene_dirname(current_id)))
+        incoming = list_sequence(os.path.join(frames_dir, scene_dirname(following_id)))
+        if not outgoing or not incoming:
+            skipped.append({"from": current_id, "to": following_id, "kind": transition,
+                            "reason": "scene frames not found"})
+            continue
+        name = f"{scene_dirname(current_id)}-{scene_dirname(following_id)}_{transition}"
+        pending.append((current_id, following_id, transition, outgoing, incoming, os.path.join(output_dir, name)))
+
+    workers = workers if workers is not None else TRANSITION_WORKERS
+    workers = max(1, min(workers or os.cpu_count() or 1, count))
+    executor = None
+    if workers > 1 and pending:
+        # プールはトランジション間で使い回す。CrewAIのスレッドを持つプロセスからforkしないようspawnで起動
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    results = []
+    try:
+        for current_id, following_id, transition, outgoing, incoming, directory in pending:
+            result = render_transition(outgoing, incoming, transition, count, directory, buffer_dir,
+                                       executor=executor, workers=workers)
+            results.append({"from": current_id, "to": following_id, **result})
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - started
+
+    total_frames = sum(result["frames"] for result in results)
+    report = {
+        "transitions": results,
+        "skipped": skipped,
+        "frames": total_frames,
+        "elapsed_seconds": round(elapsed, 3),
+        "fps": round(total_frames / elapsed, 2) if elapsed > 0 and total_frames else None,
+        "output_dir": output_dir,
+    }
+    with atomic_writer(os.path.join(output_dir, "transitions.json")) as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8"))
+    return report
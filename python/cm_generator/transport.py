@@ -0,0 +1,205 @@
+"""
+共有HTTPトランスポート
+プロバイダーごとにKeep-Aliveの接続プールを持つSessionと、SDKクライアントのシングルトンを提供し、
+全ツールインスタンスで接続を使い回す（素材ごとのTLSハンドシェイクとクライアント初期化を省く）
+非同期ツール用のhttpx.AsyncClientはイベントループごとに1つ作成する（ループをまたいで接続を共有できないため）
+requests・httpx・各SDKは最初にSession・クライアントを作成する時点までimportしない
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+from typing import TYPE_CHECKING, Dict, Any, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+# プロバイダーごとの接続プールサイズ
+HTTP_POOL_SIZE = int(os.getenv("CM_HTTP_POOL_SIZE", "10"))
+
+_lock = threading.Lock()
+_sessions: Dict[str, "requests.Session"] = {}
+_sdk_clients: Dict[str, Any] = {}
+_sdk_stats: Dict[str, Dict[str, Any]] = {}
+# イベントループ → {名前: AsyncClient / 非同期SDKクライアント}（ループの終了とともに破棄）
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def get_session(provider: str) -> "requests.Session":
+    """プロバイダー専用のプール付きSessionを取得（初回のみ作成）"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _record_response(provider: str, response) -> None:
+    """レスポンスごとに接続の再利用とHTTPバージョンを記録"""
+    stream = response.extensions.get("network_stream")
+    version = response.http_version
+    with _lock:
+        stats = _sdk_stats.setdefault(provider, {"requests": 0, "connections": set(), "http_versions": {}})
+        stats["requests"] += 1
+        if stream is not None:
+            stats["connections"].add(id(stream))
+        stats["http_versions"][version] = stats["http_versions"].get(version, 0) + 1
+
+
+def _httpx_options() -> Dict[str, Any]:
+    import httpx
+
+    return {
+        "http2": _http2_available(),
+        "limits": httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        "timeout": httpx.Timeout(240.0),
+    }
+
+
+def _build_httpx_client(provider: str):
+    """
+    SDK用のhttpxクライアントを作成
+    h2がインストールされていればHTTP/2を有効化し、レスポンスごとに接続の再利用を記録する
+    """
+    import httpx
+
+    def on_response(response):
+        _record_response(provider, response)
+
+    return httpx.Client(**_httpx_options(), event_hooks={"response": [on_response]})
+
+
+def _build_async_httpx_client(provider: str):
+    """_build_httpx_client のAsyncClient版"""
+    import httpx
+
+    async def on_response(response):
+        _record_response(provider, response)
+
+    return httpx.AsyncClient(**_httpx_options(), event_hooks={"response": [on_response]})
+
+
+def get_async_client(provider: str):
+    """実行中のイベントループ専用の、プロバイダーごとのhttpx.AsyncClientを取得（初回のみ作成）"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(provider)
+        if client is None or client.is_closed:
+            client = clients[provider] = _build_async_httpx_client(provider)
+        return client
+
+
+def get_elevenlabs_client(api_key: str):
+    """ElevenLabsクライアントのシングルトンを取得（初回呼び出し時に作成）"""
+    with _lock:
+        client = _sdk_clients.get("elevenlabs")
+    if client is not None:
+        return client
+
+    from elevenlabs import ElevenLabs
+
+    try:
+        httpx_client = _build_httpx_client("elevenlabs")
+    except ImportError:
+        httpx_client = None
+
+    with _lock:
+        if "elevenlabs" not in _sdk_clients:
+            if httpx_client is not None:
+                _sdk_clients["elevenlabs"] = ElevenLabs(api_key=api_key, httpx_client=httpx_client)
+            else:
+                _sdk_clients["elevenlabs"] = ElevenLabs(api_key=api_key)
+        return _sdk_clients["elevenlabs"]
+
+
+def get_async_elevenlabs_client(api_key: str):
+    """実行中のイベントループ専用のAsyncElevenLabsクライアントを取得（初回呼び出し時に作成）"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop, {}).get("elevenlabs-sdk")
+    if client is not None:
+        return client
+
+    from elevenlabs import AsyncElevenLabs
+
+    client = AsyncElevenLabs(api_key=api_key, httpx_client=get_async_client("elevenlabs"))
+    with _lock:
+        return _async_clients.setdefault(loop, {}).setdefault("elevenlabs-sdk", client)
+
+
+async def close_async_clients() -> None:
+    """実行中のイベントループで作成したAsyncClientを閉じる（ループ終了前に呼ぶ）"""
+    import httpx
+
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+
+
+def _session_stats(session: "requests.Session") -> Dict[str, int]:
+    """urllib3のコネクションプールから累計リクエスト数と新規接続数を集計"""
+    requests_count = connections = 0
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_count += pool.num_requests
+            connections += pool.num_connections
+    return {"requests": requests_count, "connections": connections}
+
+
+def _reuse_rate(requests_count: int, connections: int) -> Optional[float]:
+    if not requests_count:
+        return None
+    return round(max(0.0, 1 - connections / requests_count), 3)
+
+
+def transport_metrics(provider: Optional[str] = None) -> Dict[str, Any]:
+    """プロバイダー別の接続再利用率（1 - 新規接続数 / リクエスト数）"""
+    with _lock:
+        sessions = dict(_sessions)
+        sdk_stats = {
+            name: {"requests": s["requests"], "connections": len(s["connections"]),
+                   "http_versions": dict(s["http_versions"])}
+            for name, s in _sdk_stats.items()
+        }
+
+    metrics = {}
+    for name, session in sessions.items():
+        stats = _session_stats(session)
+        metrics[name] = {**stats, "reuse_rate": _reuse_rate(stats["requests"], stats["connections"])}
+    for name, stats in sdk_stats.items():
+        # 同じプロバイダーをSessionとhttpx（非同期ツール）の両方で使った場合は合算する
+        session_stats = metrics.get(name, {})
+        stats["requests"] += session_stats.get("requests", 0)
+        stats["connections"] += session_stats.get("connections", 0)
+        metrics[name] = {**stats, "reuse_rate": _reuse_rate(stats["requests"], stats["connections"])}
+
+    if provider is not None:
+        return metrics.get(provider, {"requests": 0, "connections": 0, "reuse_rate": None})
+    return metrics
@@ -0,0 +1,353 @@
+"""
+タスクcontextの圧縮
+上流タスクの出力はCrewAIが区切り線（CONTEXT_DIVIDER）で連結し、そのまま下流タスクのプロンプトに入るため、
+依存の長いタスクほどプロンプトが大きくなる。タスクごとのトークン予算を超えるcontextを次のいずれかで圧縮する
+
+    truncate   上流出力ごとに予算を配分し、先頭と末尾を残して中略する
+    retrieve   上流出力をチャンクに分割し、タスクの説明に近いチャンクを予算内で選ぶ（元の順序で連結）
+    summarize  予算を超える上流出力をエージェントのLLMで要約する（要約も配分した予算で打ち切る）
+
+トークン数はモデルのtiktokenエンコーダで数える（使えない環境では usage_accounting.estimate_tokens と同じ概算）。
+圧縮前後のトークン数と、LLM呼び出しの実測レイテンシから推定した短縮時間を report() で返す
+
+    {"contextBudget": 2000}
+    {"contextBudget": {"maxTokens": 2000, "strategy": "retrieve"}}
+    タスクごとの上書き: {"tasks": [{"contextBudget": {"maxTokens": 500, "strategy": "summarize"}}, {"contextBudget": false}]}
+"""
+
+import io
+import os
+import asyncio
+import time
+import functools
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from usage_accounting import token_encoding, estimate_tokens, llm_scope
+
+# CrewAIが上流タスクの出力を連結する区切り（crewai.utilities.formatter.DIVIDERS と同じ）
+CONTEXT_DIVIDER = "\n\n----------\n\n"
+
+STRATEGIES = ("truncate", "retrieve", "summarize")
+DEFAULT_STRATEGY = "truncate"
+
+# retrieve で上流出力を分割する文字数
+RETRIEVE_CHUNK_CHARS = 400
+
+# LLM呼び出しが十分にない場合に使う、プロンプトの処理速度（トークン/秒）
+DEFAULT_PREFILL_TOKENS_PER_S = float(os.getenv("CREWAI_PREFILL_TOKENS_PER_S", "2000"))
+
+SUMMARY_PROMPT = """Summarize the following output of an earlier task so that it can be used as context for the next task.
+Keep every file path, number, name and decision that the next task may need. Answer in the language of the output.
+Use at most {max_tokens} tokens.
+
+Next task:
+{query}
+
+Output to summarize:
+{text}"""
+
+
+class ContextBudgetError(ValueError):
+    """contextBudget の形式が不正"""
+    pass
+
+
+def resolve_context_budget(setting: Any, default: Optional[Dict[str, Any]] = None,
+                           name: str = "contextBudget") -> Optional[Dict[str, Any]]:
+    """
+    contextBudget を {"max_tokens": int, "strategy": str} に正規化（None・false は予算なし）
+    タスクの設定で strategy を省略した場合はクルーの設定（default）を引き継ぐ
+    """
+    if setting is None:
+        return default
+    if setting is False:
+        return None
+    if isinstance(setting, bool) or not isinstance(setting, (int, dict)):
+        raise ContextBudgetError(f"{name} must be a number of tokens, an object or false, got {setting!r}")
+    if isinstance(setting, int):
+        setting = {"maxTokens": setting}
+    # YAMLのタスク定義（cm_generator）では max_tokens とも書ける
+    max_tokens = setting.get("maxTokens", setting.get("max_tokens", (default or {}).get("max_tokens")))
+    if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens <= 0:
+        raise ContextBudgetError(f"{name}.maxTokens must be a positive integer")
+    strategy = setting.get("strategy", (default or {}).get("strategy", DEFAULT_STRATEGY))
+    if strategy not in STRATEGIES:
+        raise ContextBudgetError(f"{name}.strategy must be one of {', '.join(STRATEGIES)}, got {strategy!r}")
+    return {"max_tokens": max_tokens, "strategy": strategy}
+
+
+# ===============================================
+# トークン数
+# ===============================================
+
+class TokenCounter:
+    """モデルのエンコーダでトークン数を数え、トークン単位で先頭・末尾を切り出す"""
+
+    def __init__(self, model: str = ""):
+        self.model = model
+        self.encoding = token_encoding(model)
+        self.name = self.encoding.name if self.encoding is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        return estimate_tokens(text, self.model)
+
+    def head(self, text: str, tokens: int) -> str:
+        if tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:tokens], errors="ignore")
+        return text[:self._fit_chars(text, tokens, self.count)]
+
+    def tail(self, text: str, tokens: int) -> str:
+        if tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[-tokens:], errors="ignore")
+        return text[len(text) - self._fit_chars(text, tokens, lambda s: self.count(s[::-1])):]
+
+    @staticmethod
+    def _fit_chars(text: str, tokens: int, count) -> int:
+        """概算のトークン数が tokens 以下になる最長の文字数（二分探索）"""
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count(text[:middle]) <= tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """先頭2/3と末尾1/3を残して中略する"""
+        total = self.count(text)
+        if total <= max_tokens:
+            return text
+        marker = f"\n[... {total - max_tokens} tokens omitted ...]\n"
+        keep = max(0, max_tokens - self.count(marker))
+        while True:
+            head = keep * 2 // 3
+            truncated = self.head(text, head) + marker + self.tail(text, keep - head)
+            # 連結部分でトークンの区切りが変わって予算を超えた分だけ減らす
+            excess = self.count(truncated) - max_tokens
+            if excess <= 0 or keep == 0:
+                return truncated
+            keep = max(0, keep - excess)
+
+
+@functools.lru_cache(maxsize=None)
+def token_counter(model: str = "") -> TokenCounter:
+    return TokenCounter(model)
+
+
+def _allocate(sizes: Sequence[int], budget: int) -> List[int]:
+    """予算を均等に配分し、配分より小さい出力の余りを大きい出力に回す"""
+    shares = [0] * len(sizes)
+    remaining = max(0, budget)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for position, index in enumerate(order):
+        share = min(sizes[index], remaining // (len(sizes) - position))
+        shares[index] = share
+        remaining -= share
+    return shares
+
+
+@functools.lru_cache(maxsize=None)
+def _embedder():
+    from vector_store import HashingEmbedder
+    return HashingEmbedder()
+
+
+# ===============================================
+# 圧縮
+# ===============================================
+
+class ContextCompactor:
+    """タスクごとのトークン予算に従ってcontextを圧縮し、圧縮前後のトークン数を記録する"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._budgets: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def set_budget(self, task: Any, label: str, budget: Optional[Dict[str, Any]]) -> None:
+        if budget is not None:
+            self._budgets[id(task)] = (label, budget)
+
+    def __bool__(self) -> bool:
+        return bool(self._budgets)
+
+    def compact(self, task: Any, context: Optional[str], llm: Any = None) -> Optional[str]:
+        """タスクの予算を超えるcontextを圧縮（予算のないタスクはそのまま返す）"""
+        entry = self._budgets.get(id(task))
+        if not context or entry is None:
+            return context
+        label, budget = entry
+        started = time.perf_counter()
+        counter = token_counter(getattr(llm, "model", "") or "")
+        sections = context.split(CONTEXT_DIVIDER)
+        before = counter.count(context)
+        query = f"{getattr(task, 'description', '')}\n{getattr(task, 'expected_output', '')}"
+
+        if before <= budget["max_tokens"]:
+            compacted = context
+        elif budget["strategy"] == "summarize" and llm is not None:
+            sizes = [counter.count(section) for section in sections]
+            with llm_scope(task=f"{label} (context)"):
+                compacted = self._summarize(sections, _allocate(sizes, self._available(budget, sections, counter)),
+                                            query, llm, counter)
+        else:
+            sizes = [counter.count(section) for section in sections]
+            available = self._available(budget, sections, counter)
+            while True:
+                if budget["strategy"] == "retrieve":
+                    compacted = self._retrieve(sections, query, available, counter)
+                else:
+                    compacted = CONTEXT_DIVIDER.join(
+                        counter.truncate(section, share) for section, share in zip(sections, _allocate(sizes, available)))
+                # 連結部分でトークンの区切りが変わって予算を超えた分だけ減らす
+                excess = counter.count(compacted) - budget["max_tokens"]
+                if excess <= 0 or available <= 0:
+                    break
+                available -= excess
+
+        record = {
+            "task": label,
+            "strategy": budget["strategy"],
+            "budget": budget["max_tokens"],
+            "upstream": len(sections),
+            "before_tokens": before,
+            "after_tokens": counter.count(compacted) if compacted is not context else before,
+            "tokenizer": counter.name,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+        with self._lock:
+            self.records.append(record)
+        return compacted
+
+    @staticmethod
+    def _available(budget: Dict[str, Any], sections: List[str], counter: TokenCounter) -> int:
+        """区切り線を除いて上流出力に配分できるトークン数"""
+        return budget["max_tokens"] - counter.count(CONTEXT_DIVIDER) * (len(sections) - 1)
+
+    @staticmethod
+    def _retrieve(sections: List[str], query: str, budget: int, counter: TokenCounter) -> str:
+        """タスクの説明との類似度が高いチャンクから予算内で選び、上流出力ごとに元の順序で連結"""
+        import numpy as np
+        from knowledge_ingest import iter_chunks
+
+        chunks = [(index, text) for index, section in enumerate(sections)
+                  for _, text in iter_chunks(io.StringIO(section), RETRIEVE_CHUNK_CHARS, 0)]
+        if not chunks:
+            return ""
+        embedder = _embedder()
+        scores = embedder.embed([text for _, text in chunks]) @ embedder.embed([query])[0]
+        selected = set()
+        used = 0
+        for position in np.argsort(-scores, kind="stable"):
+            tokens = counter.count(chunks[position][1])
+            if used + tokens <= budget:
+                selected.add(int(position))
+                used += tokens
+
+        parts: List[List[str]] = [[] for _ in sections]
+        for position, (index, text) in enumerate(chunks):
+            if position in selected:
+                skipped = bool(parts[index]) and position - 1 not in selected
+                parts[index].append(("[...]\n" if skipped else "") + text)
+        return CONTEXT_DIVIDER.join("\n".join(part) or "[...]" for part in parts)
+
+    @staticmethod
+    def _summarize(sections: List[str], shares: List[int], query: str, llm: Any,
+                   counter: TokenCounter) -> str:
+        """配分を超える上流出力だけを要約（失敗した場合は中略で代替）"""
+        results = []
+        for section, share in zip(sections, shares):
+            if counter.count(section) <= share:
+                results.append(section)
+                continue
+            try:
+                summary = str(llm.call([{"role": "user", "content": SUMMARY_PROMPT.format(
+                    max_tokens=share, query=query.strip(), text=section)}]))
+            except Exception as e:
+                print(f"[CrewAI] Context summary failed, truncating instead: {e}", flush=True)
+                summary = section
+            results.append(counter.truncate(summary, share))
+        return CONTEXT_DIVIDER.join(results)
+
+    def report(self, calls: Optional[Sequence[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        圧縮前後のトークン数と推定短縮時間
+        contextは同じタスクのLLM呼び出し（エージェントのループ）ごとに送り直されるため、
+        削減トークン数 × 呼び出し回数 × プロンプト1トークンあたりの処理時間を短縮時間とする
+        """
+        calls = list(calls or [])
+        seconds_per_token, basis = _seconds_per_prompt_token(calls)
+        with self._lock:
+            records = [dict(record) for record in self.records]
+
+        saved_total = 0
+        for record in records:
+            task_calls = [c for c in calls if c["task"] == record["task"]]
+            record["llm_calls"] = len(task_calls)
+            record["saved_prompt_tokens"] = (record["before_tokens"] - record["after_tokens"]) * max(1, len(task_calls))
+            if task_calls:
+                record["prompt_tokens_after"] = sum(c["prompt_tokens"] for c in task_calls)
+                record["prompt_tokens_before"] = record["prompt_tokens_after"] + record["saved_prompt_tokens"]
+            saved_total += record["saved_prompt_tokens"]
+
+        overhead = sum(record["seconds"] for record in records)
+        return {
+            "tasks": records,
+            "totals": {
+                "before_tokens": sum(r["before_tokens"] for r in records),
+                "after_tokens": sum(r["after_tokens"] for r in records),
+                "saved_prompt_tokens": saved_total,
+                "compaction_seconds": round(overhead, 3),
+                "seconds_per_prompt_token": round(seconds_per_token, 7),
+                "latency_basis": basis,
+                "estimated_latency_saved_s": round(saved_total * seconds_per_token - overhead, 3),
+            },
+        }
+
+
+def _seconds_per_prompt_token(calls: Sequence[Dict[str, Any]]) -> Tuple[float, str]:
+    """
+    レイテンシ ≈ a + b × プロンプトトークン + c × 完了トークン を呼び出しの実測値に当てはめたb
+    呼び出しが少ない場合や当てはまりが悪い場合（b <= 0）は DEFAULT_PREFILL_TOKENS_PER_S から求める
+    """
+    measured = [c for c in calls if c.get("prompt_tokens")]
+    if len(measured) >= 4:
+        import numpy as np
+        features = np.array([[1.0, c["prompt_tokens"], c["completion_tokens"]] for c in measured])
+        latencies = np.array([c["latency"] for c in measured])
+        coefficients = np.linalg.lstsq(features, latencies, rcond=None)[0]
+        if coefficients[1] > 0:
+            return float(coefficients[1]), "fitted"
+    return 1.0 / DEFAULT_PREFILL_TOKENS_PER_S, "default"
+
+
+@functools.lru_cache(maxsize=None)
+def compacting_agent_class():
+    """
+    execute_task / aexecute_task に渡されたcontextを _context_compactor で圧縮するAgentクラス（初回呼び出し時に定義）
+    compactorが設定されていなければCrewAIのAgentと同じ
+    """
+    from crewai import Agent
+    from pydantic import PrivateAttr
+
+    class CompactingAgent(Agent):
+        _context_compactor: Optional[ContextCompactor] = PrivateAttr(default=None)
+
+        def execute_task(self, task, context=None, tools=None):
+            if context and self._context_compactor is not None:
+                context = self._context_compactor.compact(task, context, llm=self.llm)
+            return super().execute_task(task, context=context, tools=tools)
+
+        async def aexecute_task(self, task, context=None, tools=None):
+            if context and self._context_compactor is not None:
+                # summarize はLLMを同期で呼ぶため、イベントループを止めないよう別スレッドで圧縮する
+                context = await asyncio.to_thread(self._context_compactor.compact, task, context, self.llm)
+            return await super().aexecute_task(task, context=context, tools=tools)
+
+    return CompactingAgent
@@ -5,46 +5,258 @@ Memory、Task Dependencies、Output Validation、Human-in-the-loop、
 Max Iterations、Callbacks、Planning、Training、Knowledge、Event Listenersをサポート
 """
 
+from __future__ import annotations
+
 import sys
 import json
 import os
-from typing import List, Dict, Any, Optional, Callable
+import io
+import time
+import asyncio
+import argparse
+import threading
+import contextlib
+import functools
+import socketserver
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Callable
 from datetime import datetime
-from pydantic import BaseModel, Field
 
-# CrewAI imports
-from crewai import Agent, Task, Crew, Process
-from crewai.tools import tool
-from langchain_openai import ChatOpenAI
+# CrewAI / LangChain は読み込みに時間がかかるため、クルーを構築する時点まで遅延させる
+# （クルーメモのキャッシュヒットや不正な入力ではimportせずに応答できる）
+if TYPE_CHECKING:
+    from crewai import Agent, Task, Crew
+
+from dag_scheduler import normalize_dependencies, run_dag, arun_dag, CycleError
+from usage_accounting import UsageTracker, llm_scope, active_handlers, install_llm_hooks
+from event_channel import EventChannel, JobEvents
+from result_stream import ResultStream
+from rate_limiter import RateLimiter, llm_deadline
+import profiling
+from profiling import Profiler, span
+from llm_pool import LLMPool
+from crewai_llm import create_tracked_llm
+from result_cache import (
+    LLMResultCache, CacheConfigError, get_disk_cache, resolve_cache_config, crew_fingerprint, CREW_NAMESPACE
+)
+from context_compaction import ContextCompactor, resolve_context_budget, compacting_agent_class
 
 # 環境変数からManusのLLM APIキーを取得
-MANUS_LLM_API_URL = os.getenv("BUILT_IN_FORGE_API_URL", "https://api.manus.im")
+# CREWAI_LLM_REPLAY_URL が設定されていれば記録・再生サーバー（llm_replay.py）に接続する
+MANUS_LLM_API_URL = os.getenv("CREWAI_LLM_REPLAY_URL") or os.getenv("BUILT_IN_FORGE_API_URL", "https://api.manus.im")
 MANUS_LLM_API_KEY = os.getenv("BUILT_IN_FORGE_API_KEY", "")
 
+# バッチ実行（crew_dataのbatch）で同時に実行する入力セット数の既定値
+BATCH_CONCURRENCY = int(os.getenv("CREWAI_BATCH_CONCURRENCY", "4"))
+
+
+def _task_label(task: Task) -> str:
+    """使用量集計用のタスク名（nameがなければ説明文の先頭）"""
+    name = getattr(task, "name", None)
+    if name:
+        return name
+    description = (getattr(task, "description", "") or "").strip().splitlines()
+    return description[0][:40] if description else "(task)"
+
+
+@functools.lru_cache(maxsize=None)
+def _tracked_agent_class():
+    """
+    実行中のLLM呼び出しにエージェント名・タスク名のスコープを付与するAgentクラス（初回呼び出し時に定義）
+    maxExecutionTimeはCrewAIのmax_execution_time（別スレッドで待つだけで実行中の呼び出しは止まらない）に加えて、
+    LLM呼び出しのデッドラインとしても適用する。contextBudgetのあるタスクのcontextはスコープ内で圧縮する
+    akickoff（aexecute_task）ではCrewAIが max_execution_time を asyncio.wait_for で適用するため、
+    期限切れやキャンセルは実行中のLLM呼び出しまで伝わる
+    """
+    import contextvars
+    import concurrent.futures
+    from pydantic import PrivateAttr
+    
+    class TrackedAgent(compacting_agent_class()):
+        _execution_deadline: Optional[float] = PrivateAttr(default=None)
+        
+        def execute_task(self, task, context=None, tools=None):
+            label = _task_label(task)
+            with llm_scope(agent=self.role, task=label), llm_deadline(self._execution_deadline), \
+                    span(label, "task", agent=self.role):
+                return super().execute_task(task, context=context, tools=tools)
+        
+        async def aexecute_task(self, task, context=None, tools=None):
+            label = _task_label(task)
+            with llm_scope(agent=self.role, task=label), llm_deadline(self._execution_deadline), \
+                    span(label, "task", agent=self.role):
+                return await super().aexecute_task(task, context=context, tools=tools)
+        
+        def _execute_with_timeout(self, task_prompt, task, timeout):
+            # CrewAIの実装と同じだが、別スレッドにスコープ・ハンドラ・デッドラインのコンテキストを引き継ぐ
+            # タイムアウト時はスレッドの終了を待たない（実行中のLLM呼び出しは同じデッドラインで打ち切られる）
+            context = contextvars.copy_context()
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            try:
+                future = executor.submit(context.run, self._execute_without_timeout, task_prompt, task)
+                return future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError as e:
+                raise TimeoutError(
+                    f"Task '{task.description}' execution timed out after {timeout} seconds."
+                ) from e
+            finally:
+                executor.shutdown(wait=False)
+    
+    return TrackedAgent
+
 
 class CrewAIEngine:
     """CrewAI完全機能実行エンジン"""
     
-    def __init__(self):
-        self.llm = self._create_llm()
+    def __init__(self, llm_pool: Optional[LLMPool] = None, event_channel: Optional[JobEvents] = None):
+        self.llm_cache = None
+        # 同じ設定のLLMクライアントはエージェント間・ジョブ間で共有
+        self.llm_pool = llm_pool or LLMPool(create_tracked_llm)
+        self._llm_caches = {}
+        self.event_callbacks = []
+        # memory: true のクルーの記憶領域（kickoff後に未書き込み分を書き込む）
+        self.memory_storages = []
+        self.job_id = None
+        self.result_stream = None
+        self.rate_limiter = RateLimiter()
+        self.profiler = None
+        # CREWAI_EVENT_FDが設定されていれば専用チャネルでイベントを送信（job_engine では親のチャネルを共有）
+        self.event_channel = event_channel or EventChannel.from_env()
+    
+    def job_engine(self) -> "CrewAIEngine":
+        """
+        同じイベントループで他のジョブと並行して実行する1ジョブ用のエンジン（execute_crew_async 用）
+        ジョブ単位の状態（結果ストリーム・レートリミッター・プロファイラなど）は分け、
+        LLMプール・LLMキャッシュ・イベントチャネルは共有する
+        """
+        channel = self.event_channel
+        if isinstance(channel, JobEvents):
+            channel = channel.channel
+        engine = CrewAIEngine(llm_pool=self.llm_pool, event_channel=channel.job_events() if channel else None)
+        engine._llm_caches = self._llm_caches
+        return engine
+    
+    @property
+    def llm(self):
+        """llmConfigのないエージェント用のデフォルトLLM（プールから取得）"""
+        return self._create_llm()
+    
+    def preload(self):
+        """常駐ワーカー用: 重いモジュールとデフォルトLLMを事前に読み込み、最初のジョブの待ち時間をなくす"""
+        import crewai  # noqa: F401
+        _tracked_agent_class()
+        install_llm_hooks()
+        return self.llm
+    
+    def _reset_job_state(self):
+        """ジョブ単位の状態を初期化（ワーカーモードでジョブ間の状態漏れを防ぐ）"""
         self.event_callbacks = []
-        self.memory_store = {}
+        self.memory_storages = []
+        self.llm_cache = None
+        self.job_id = None
+        self.result_stream = None
+        self.rate_limiter = RateLimiter()
+        self.profiler = None
         
     def _create_llm(self, config: Optional[Dict[str, Any]] = None):
-        """Manus Built-in LLM APIを使用したLLMインスタンスを作成"""
+        """Manus Built-in LLM APIを使用したLLMインスタンスを取得（同じ設定のインスタンスはプールで共有）"""
         if config is None:
             config = {}
         
-        return ChatOpenAI(
-            model=config.get("model", "gpt-4.1-mini"),
-            openai_api_base=f"{MANUS_LLM_API_URL}/v1",
-            openai_api_key=MANUS_LLM_API_KEY,
-            temperature=config.get("temperature", 0.7),
-            max_tokens=config.get("max_tokens"),
+        # AgentはLLMをcrewai.LLMとして使うため、crewai.LLMのサブクラス（crewai_llm.py）を作成する
+        params = {
+            "model": config.get("model", "gpt-4.1-mini"),
+            "base_url": f"{MANUS_LLM_API_URL}/v1",
+            "api_key": MANUS_LLM_API_KEY,
+            "temperature": config.get("temperature", 0.7),
+            "max_tokens": config.get("max_tokens"),
+        }
+        if self._streams_tokens():
+            # トークンはLLMStreamChunkEvent経由で結果ストリームへ送る（install_llm_hooks）
+            params["stream"] = True
+        if self.llm_cache is not None:
+            # キャッシュごとに別のインスタンスになる（プールのキーにキャッシュが含まれる）
+            params["cache"] = self.llm_cache
+        
+        return self.llm_pool.get(params)
+    
+    def _streams_tokens(self) -> bool:
+        return self.result_stream is not None and self.result_stream.tokens
+    
+    def _setup_rate_limits(self, crew_data: Dict[str, Any]):
+        """
+        エージェントのmaxRpm/maxTpm、crew_dataのrateLimits（モデル別・APIキー全体）からレートリミッターを作成
+        maxRpm/maxTpm はこのクルーの実行内（バッチでは全入力セット）のエージェントごと、rateLimits は同じマシンの全クルーで共有する
+        例: {"rateLimits": {"models": {"gpt-4.1-mini": {"rpm": 500, "tpm": 200000}}, "key": {"rpm": 1000}}}
+        """
+        agent_limits = {}
+        for agent_data in crew_data.get("agents", []):
+            if agent_data.get("maxRpm") or agent_data.get("maxTpm"):
+                agent_limits[agent_data.get("role", "Assistant")] = {
+                    "rpm": agent_data.get("maxRpm"),
+                    "tpm": agent_data.get("maxTpm"),
+                }
+        rate_limits = crew_data.get("rateLimits") or {}
+        self.rate_limiter = RateLimiter(
+            agent_limits=agent_limits,
+            model_limits=rate_limits.get("models"),
+            key_limits=rate_limits.get("key"),
+            api_key=MANUS_LLM_API_KEY,
         )
     
+    def _create_memory(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        memory: true のクルー用に、ローカルベクトルストア（vector_store.py）を使う短期記憶・エンティティ記憶を作成
+        保存先はクルー名とエージェント構成ごとで、同じクルーの実行間で記憶を引き継ぐ
+        例: {"memory": true, "memoryConfig": {"entity": false, "embedder": {"provider": "openai", "model": "text-embedding-3-small"}}}
+        """
+        from crewai.memory import ShortTermMemory, EntityMemory
+        import vector_store
+        
+        key = vector_store.crew_key(
+            crew_data.get("name", "Unnamed Crew"),
+            [agent_data.get("role", "Assistant") for agent_data in crew_data.get("agents", [])],
+        )
+        # memoryConfig の shortTerm / entity が false の領域は作らない（長期記憶はCrewAIの既定のまま）
+        config = crew_data.get("memoryConfig") or {}
+        params = {}
+        for kind, flag, field, memory_class in (
+            ("short_term", "shortTerm", "short_term_memory", ShortTermMemory),
+            ("entities", "entity", "entity_memory", EntityMemory),
+        ):
+            if config.get(flag, True) is False:
+                continue
+            storage = vector_store.open_storage(key, kind, config, f"{MANUS_LLM_API_URL}/v1", MANUS_LLM_API_KEY)
+            self.memory_storages.append(storage)
+            params[field] = memory_class(storage=storage)
+        return params
+    
+    def _flush_memory(self):
+        for storage in self.memory_storages:
+            storage.flush()
+    
+    def _job_handlers(self) -> List[Any]:
+        """ジョブ中のLLM呼び出しに追加で登録するハンドラ"""
+        handlers = []
+        if self.result_stream is not None:
+            handlers.append(self.result_stream)
+        if self.profiler is not None and self.profiler.detailed:
+            handlers.append(self.profiler)
+        return handlers
+    
+    def _stream_task_output(self, output):
+        """完了したタスクの出力を結果ストリームへ送信（Crewのtask_callbackとしても使用）"""
+        if self.result_stream is None:
+            return
+        label = getattr(output, "name", None) or (getattr(output, "description", "") or "").strip()[:40]
+        text = output.raw if hasattr(output, "raw") else str(output)
+        self.result_stream.task_output(label or "(task)", getattr(output, "agent", None), text)
+    
     def _emit_event(self, event_type: str, data: Dict[str, Any]):
-        """イベントを発行（標準エラー出力に出力してNode.js側で受信）"""
+        """イベントを発行（イベントチャネルがなければ標準エラー出力に出力してNode.js側で受信）"""
+        if self.event_channel is not None:
+            self.event_channel.emit(event_type, data)
+            return
+        
         event = {
             "type": event_type,
             "data": data,
@@ -56,7 +268,7 @@ class CrewAIEngine:
         """エージェントデータからCrewAI Agentを作成"""
         # LLM設定
         llm_config = agent_data.get("llmConfig")
-        llm = self._create_llm(llm_config) if llm_config else self.llm
+        llm = self._create_llm(llm_config)
         
         # Memory設定
         memory = agent_data.get("memory", False)
@@ -64,32 +276,37 @@ class CrewAIEngine:
         # Max Iterations設定
         max_iter = agent_data.get("maxIter", 15)
         
-        # Max RPM設定
+        # Max RPM設定（CrewAIのRPM制御に加えて、ジョブのレートリミッターでもプロセス間で共有して適用）
         max_rpm = agent_data.get("maxRpm")
         
         # Max Execution Time設定
         max_execution_time = agent_data.get("maxExecutionTime")
         
-        agent = Agent(
-            role=agent_data.get("role", "Assistant"),
-            goal=agent_data.get("goal", "Complete the assigned task"),
-            backstory=agent_data.get("backstory", "An experienced professional"),
-            verbose=agent_data.get("verbose", True),
-            allow_delegation=agent_data.get("allowDelegation", False),
-            llm=llm,
-            max_iter=max_iter,
-        )
-        
-        # Max RPMとMax Execution Timeは直接設定できないため、カスタム属性として保存
+        agent_params = {
+            "role": agent_data.get("role", "Assistant"),
+            "goal": agent_data.get("goal", "Complete the assigned task"),
+            "backstory": agent_data.get("backstory", "An experienced professional"),
+            "verbose": agent_data.get("verbose", True),
+            "allow_delegation": agent_data.get("allowDelegation", False),
+            "llm": llm,
+            "max_iter": max_iter,
+        }
         if max_rpm:
-            agent.max_rpm = max_rpm
+            agent_params["max_rpm"] = int(max_rpm)
+        if max_execution_time:
+            agent_params["max_execution_time"] = int(max_execution_time)
+        
+        agent = _tracked_agent_class()(**agent_params)
+        
         if max_execution_time:
-            agent.max_execution_time = max_execution_time
+            agent._execution_deadline = float(max_execution_time)
         
         return agent
     
     def _create_task(self, task_data: Dict[str, Any], agent: Agent, all_tasks: List[Task] = None) -> Task:
         """タスクデータからCrewAI Taskを作成"""
+        from crewai import Task
+        
         # Task Dependencies（context）
         context_tasks = []
         if all_tasks and task_data.get("context"):
@@ -110,6 +327,7 @@ class CrewAIEngine:
         async_execution = task_data.get("asyncExecution", False)
         
         task_params = {
+            "name": task_data.get("name"),
             "description": task_data.get("description", ""),
             "expected_output": task_data.get("expectedOutput", "A detailed response"),
             "agent": agent,
@@ -131,6 +349,29 @@ class CrewAIEngine:
         
         return Task(**task_params)
     
+    def _resolve_context_budgets(self, crew_data: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        """
+        タスクごとのcontextBudget（クルー全体の既定値とタスクごとの上書き）を正規化
+        例: {"contextBudget": {"maxTokens": 2000, "strategy": "retrieve"}, "tasks": [{"contextBudget": false}, ...]}
+        """
+        default = resolve_context_budget(crew_data.get("contextBudget"))
+        return [
+            resolve_context_budget(task_data.get("contextBudget"), default, name=f"tasks[{index}].contextBudget")
+            for index, task_data in enumerate(crew_data.get("tasks", []))
+        ]
+    
+    def _create_compactor(self, budgets: List[Optional[Dict[str, Any]]], tasks: List[Task]) -> Optional[ContextCompactor]:
+        """予算のあるタスクがあれば、上流タスクの出力を圧縮するcompactorをタスクの担当エージェントに設定"""
+        compactor = ContextCompactor()
+        for budget, task in zip(budgets, tasks):
+            compactor.set_budget(task, _task_label(task), budget)
+        if not compactor:
+            return None
+        for task in tasks:
+            if task.agent is not None:
+                task.agent._context_compactor = compactor
+        return compactor
+    
     def _setup_callbacks(self, crew_data: Dict[str, Any]):
         """Callbacksを設定"""
         callbacks = crew_data.get("callbacks", {})
@@ -162,27 +403,469 @@ class CrewAIEngine:
                 })
             self.event_callbacks.append(("agent_action", on_agent_action))
     
-    def execute_crew(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
-        """クルーを実行"""
+    def _usage_from_crew_metrics(self, crew: Crew, tracker: UsageTracker) -> Dict[str, Any]:
+        """
+        コールバックで呼び出しを捕捉できなかった場合のフォールバック
+        CrewAIが集計したusage_metricsからクルー全体の合計のみを返す
+        """
+        metrics = getattr(crew, "usage_metrics", None)
+        prompt_tokens = getattr(metrics, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(metrics, "completion_tokens", 0) or 0
+        model = getattr(self.llm, "model", "unknown")
+        price = tracker.price_for(model)
+        cost = 0.0
+        if price:
+            cost = (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1_000_000
+        return {
+            "source": "crew_usage_metrics",
+            "totals": {
+                "calls": getattr(metrics, "successful_requests", 0) or 0,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "cost": round(cost, 6),
+            },
+        }
+    
+    def _fire_callbacks(self, event_type: str, *args):
+        """登録済みのコールバックを呼び出す"""
+        for name, callback in self.event_callbacks:
+            if name == event_type:
+                callback(*args)
+    
+    def _start_dag(self, crew_data: Dict[str, Any]) -> Dict[int, List[int]]:
+        """DAG実行の開始を通知してタスクの依存関係を返す（循環は run_dag / arun_dag が CycleError で報告）"""
+        deps = normalize_dependencies(crew_data.get("tasks", []))
+        crew_name = crew_data.get("name", "Unnamed Crew")
+        
+        if crew_data.get("memory") or crew_data.get("planning"):
+            self._emit_event("warning", {"message": "memory/planning are not applied in dag process"})
+        
+        self._emit_event("crew_start", {"name": crew_name, "process": "dag"})
+        print(f"[CrewAI] Starting DAG crew execution: {crew_name}", file=sys.stderr)
+        return deps
+    
+    def _dag_task_done(self, task: Task, output) -> str:
+        self._stream_task_output(output)
+        self._fire_callbacks("task_complete", task, output)
+        return output.raw if hasattr(output, "raw") else str(output)
+    
+    def _dag_response(self, crew_data: Dict[str, Any], agents: List[Agent], tasks: List[Task],
+                      outputs: Dict[int, str], report: Dict[str, Any], tracker: UsageTracker,
+                      compactor: Optional[ContextCompactor]) -> Dict[str, Any]:
+        self._emit_event("crew_complete", {"name": crew_data.get("name", "Unnamed Crew"), "process": "dag"})
+        
+        # 結果はsequentialと同様に最後のタスクの出力
+        result_text = outputs[len(tasks) - 1]
+        usage = tracker.summary()
+        
+        result = {
+            "success": True,
+            "result": result_text,
+            "timestamp": datetime.now().isoformat(),
+            "agents_count": len(agents),
+            "tasks_count": len(tasks),
+            "token_usage": usage["totals"]["total_tokens"],
+            "cost": round(usage["totals"]["cost"], 4),
+            "usage": usage,
+            "task_outputs": [outputs[i] for i in range(len(tasks))],
+            "dag": report,
+        }
+        if compactor is not None:
+            result["context"] = compactor.report(tracker.calls)
+        return result
+    
+    def _execute_dag(self, crew_data: Dict[str, Any], agents: List[Agent], tasks: List[Task],
+                     compactor: Optional[ContextCompactor] = None) -> Dict[str, Any]:
+        """タスク依存グラフに従って独立タスクを並列実行する（process: "dag"）"""
+        deps = self._start_dag(crew_data)
+        
+        # 同じエージェントを共有するタスクは同時実行しない（Agentインスタンスはスレッドセーフでないため）
+        agent_locks = {id(agent): threading.Lock() for agent in agents}
+        
+        def run_task(index: int, upstream: Dict[int, str]) -> str:
+            task = tasks[index]
+            # 上流タスクの出力をCrewAIのcontextと同じ形式で連結
+            context = "\n\n----------\n\n".join(upstream[i] for i in deps[index]) or None
+            self._fire_callbacks("task_start", task)
+            with agent_locks[id(task.agent)]:
+                output = task.execute_sync(agent=task.agent, context=context)
+            return self._dag_task_done(task, output)
+        
+        tracker = UsageTracker(price_table=crew_data.get("priceTable"))
         try:
-            # Callbacksを設定
-            self._setup_callbacks(crew_data)
-            
-            # エージェントを作成
-            agents_data = crew_data.get("agents", [])
-            agents = [self._create_agent(agent_data) for agent_data in agents_data]
-            
-            if not agents:
+            # レート制限の待ち時間をレイテンシに含めないよう、リミッターを先に呼び出す
+            with active_handlers(self.rate_limiter, tracker, *self._job_handlers()), \
+                    span("kickoff"), profiling.sampling(self.profiler, threaded=True):
+                outputs, report = run_dag(deps, run_task, max_workers=crew_data.get("maxConcurrency", 4))
+        except CycleError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        return self._dag_response(crew_data, agents, tasks, outputs, report, tracker, compactor)
+    
+    async def _aexecute_dag(self, crew_data: Dict[str, Any], agents: List[Agent], tasks: List[Task],
+                            compactor: Optional[ContextCompactor] = None) -> Dict[str, Any]:
+        """_execute_dag と同じだが、独立タスクをイベントループ上のタスクとして並行実行する"""
+        deps = self._start_dag(crew_data)
+        agent_locks = {id(agent): asyncio.Lock() for agent in agents}
+        
+        async def run_task(index: int, upstream: Dict[int, str]) -> str:
+            task = tasks[index]
+            context = "\n\n----------\n\n".join(upstream[i] for i in deps[index]) or None
+            self._fire_callbacks("task_start", task)
+            async with agent_locks[id(task.agent)]:
+                output = await task.aexecute_sync(agent=task.agent, context=context)
+            return self._dag_task_done(task, output)
+        
+        tracker = UsageTracker(price_table=crew_data.get("priceTable"))
+        try:
+            with active_handlers(self.rate_limiter, tracker, *self._job_handlers()), \
+                    span("kickoff"), profiling.sampling(self.profiler, threaded=True):
+                outputs, report = await arun_dag(deps, run_task, max_concurrency=crew_data.get("maxConcurrency", 4))
+        except CycleError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        return self._dag_response(crew_data, agents, tasks, outputs, report, tracker, compactor)
+    
+    def execute_crew(
+        self,
+        crew_data: Dict[str, Any],
+        write_frame: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        クルーを実行
+        write_frameが渡され、crew_dataのstreamが有効な場合はタスク出力とトークンをチャンクフレームで逐次送信し、
+        戻り値のresultは本文の代わりにチャンク番号（result_chunks）を参照する
+        crew_dataにbatchがあれば入力セットごとに実行する（execute_batch_async）
+        """
+        if crew_data.get("batch") is not None:
+            return asyncio.run(self.execute_batch_async(crew_data, write_frame))
+        self._start_job(crew_data, write_frame)
+        with profiling.activate(self.profiler):
+            try:
+                result = self._execute_with_events(crew_data)
+            finally:
+                stream, self.result_stream = self.result_stream, None
+            return self._finish_job(result, stream)
+    
+    async def execute_crew_async(
+        self,
+        crew_data: Dict[str, Any],
+        write_frame: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        execute_crew と同じ結果を返すコルーチン
+        クルーは Crew.akickoff で実行し、LLM呼び出し・レート制限の待機・ツール（_arun を持つもの）を
+        イベントループ上で処理する。キャンセルすると実行中のLLM呼び出しも中断する
+        同じイベントループで複数のクルーを実行する場合は、ジョブごとに job_engine() のエンジンを使う
+        """
+        if crew_data.get("batch") is not None:
+            return await self.execute_batch_async(crew_data, write_frame)
+        self._start_job(crew_data, write_frame)
+        with profiling.activate(self.profiler):
+            try:
+                result = await self._aexecute_with_events(crew_data)
+            finally:
+                stream, self.result_stream = self.result_stream, None
+            return self._finish_job(result, stream)
+
+    async def execute_batch_async(
+        self,
+        crew_data: Dict[str, Any],
+        write_frame: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        1つのクルー定義をbatchの入力セットごとに実行し、全体の集計を返す
+        例: {"batch": [{"topic": "A"}, {"topic": "B"}], "batchConcurrency": 8, "agents": [...], "tasks": [...]}
+        入力セットはcrew_dataのinputsに重ねてタスク・エージェントの {変数} に埋め込み、最大batchConcurrency件を並行して実行する
+        LLMクライアント（プール）・レートリミッター・キャッシュは全件で共有し、使用量・コストは入力セットごとに集計する
+        write_frameが渡され、streamが有効な場合は完了した入力セットから batch_item フレームを送信する
+        """
+        try:
+            input_sets, concurrency = _resolve_batch(crew_data)
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+
+        # 入力セットの結果はbatch_itemフレームで送るため、タスク出力・トークンのストリーミングは行わない
+        self._start_job(crew_data, None)
+        send = write_frame if crew_data.get("stream") else None
+        template = {k: v for k, v in crew_data.items() if k not in ("batch", "batchConcurrency", "stream")}
+        if template.get("memory"):
+            # 同時に実行する入力セット間で記憶が混ざらないよう、バッチでは記憶を使わない
+            self._emit_event("warning", {"message": "memory is not applied in batch execution"})
+            template["memory"] = False
+        base_inputs = template.get("inputs") or {}
+        slots = asyncio.Semaphore(concurrency)
+
+        async def run_item(index: int, inputs: Dict[str, Any]) -> Dict[str, Any]:
+            # 入力セットごとにエージェント・タスクを作り、レートリミッターはバッチ全体で共有する
+            item = self.job_engine()
+            item.job_id = self.job_id
+            item.rate_limiter = self.rate_limiter
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    result = await item._aexecute_with_events({**template, "inputs": {**base_inputs, **inputs}})
+                except Exception as e:
+                    result = item._crew_error(e)
+                result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+            self._emit_event("batch_item", {"index": index, "success": result["success"], "error": result.get("error")})
+            if send is not None:
+                send({"type": "batch_item", "id": self.job_id, "index": index, "inputs": inputs, "result": result})
+            return result
+
+        crew_name = crew_data.get("name", "Unnamed Crew")
+        self._emit_event("batch_start", {"name": crew_name, "items": len(input_sets), "concurrency": concurrency})
+        with profiling.activate(self.profiler):
+            started = time.perf_counter()
+            with span("kickoff"):
+                results = await asyncio.gather(*(run_item(i, inputs) for i, inputs in enumerate(input_sets)))
+            wall = time.perf_counter() - started
+            response = _batch_response(results, concurrency, wall, streamed=send is not None)
+            self._emit_event("batch_complete", {"name": crew_name, **response["batch"]})
+            return self._finish_job(response, None)
+
+    def _start_job(self, crew_data: Dict[str, Any], write_frame: Optional[Callable[[Dict[str, Any]], None]]):
+        """ジョブごとの結果ストリーム・レートリミッター・プロファイラを作成"""
+        stream_config = crew_data.get("stream")
+        if stream_config and write_frame is not None:
+            tokens = stream_config.get("tokens", True) if isinstance(stream_config, dict) else True
+            self.result_stream = ResultStream(write_frame, job_id=self.job_id, tokens=tokens)
+        
+        self._setup_rate_limits(crew_data)
+        self.profiler = Profiler(crew_data.get("name", "Unnamed Crew"), crew_data.get("profile"), job_id=self.job_id)
+    
+    def _finish_job(self, result: Dict[str, Any], stream: Optional[ResultStream]) -> Dict[str, Any]:
+        """結果ストリームの終端・LLMクライアントとレート制限の統計・フェーズ別の時間を結果に追加"""
+        with span("finalize"):
+            if stream is not None:
+                result = stream.finalize(result)
+            result["llm_clients"] = self.llm_pool.stats()
+            if self.rate_limiter.enabled:
+                result["rate_limits"] = self.rate_limiter.summary()
+        
+        if self.profiler.detailed:
+            # 結果の書き出しは呼び出し元で行うため、同じ内容を一度シリアライズして計測する
+            with span("serialize"):
+                json.dumps(result, ensure_ascii=False)
+        
+        result["timings"] = self.profiler.timings()
+        if self.profiler.detailed:
+            result["profile"] = self.profiler.report()
+        return result
+    
+    def _execute_with_events(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        """イベントチャネルがあればジョブ用に設定してからクルーを実行"""
+        if self.event_channel is None:
+            return self._execute_cached(crew_data)
+        
+        # ジョブごとのサンプリング設定（例: {"agent_action": 0.1}）
+        self.event_channel.configure(sampling=crew_data.get("eventSampling"), job=self.job_id)
+        try:
+            result = self._execute_cached(crew_data)
+        finally:
+            self.event_channel.flush()
+        result["events"] = self.event_channel.stats()
+        return result
+    
+    async def _aexecute_with_events(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.event_channel is None:
+            return await self._aexecute_cached(crew_data)
+        
+        self.event_channel.configure(sampling=crew_data.get("eventSampling"), job=self.job_id)
+        try:
+            result = await self._aexecute_cached(crew_data)
+        finally:
+            # 書き込みスレッドが追いつくまでの待機でイベントループを止めない
+            await asyncio.to_thread(self.event_channel.flush)
+        result["events"] = self.event_channel.stats()
+        return result
+    
+    def _execute_cached(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        """cache設定があればLLMキャッシュとクルー単位のメモを使用してクルーを実行"""
+        response, cache = self._open_cache(crew_data)
+        if response is not None:
+            return response
+        if cache is None:
+            return self._run_crew(crew_data)
+        try:
+            result = self._run_crew(crew_data)
+        finally:
+            llm_cache, self.llm_cache = self.llm_cache, None
+        return self._store_cache(cache, result, llm_cache)
+    
+    async def _aexecute_cached(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        response, cache = self._open_cache(crew_data)
+        if response is not None:
+            return response
+        if cache is None:
+            return await self._arun_crew(crew_data)
+        try:
+            result = await self._arun_crew(crew_data)
+        finally:
+            llm_cache, self.llm_cache = self.llm_cache, None
+        return self._store_cache(cache, result, llm_cache)
+    
+    def _open_cache(self, crew_data: Dict[str, Any]):
+        """
+        cache設定を解決し、(すぐに返すレスポンス, 実行後に _store_cache へ渡す状態) を返す
+        設定が不正ならエラー、クルーのメモがヒットすればその結果をレスポンスとして返す。cache設定がなければ (None, None)
+        LLMキャッシュが有効ならジョブの間 self.llm_cache に設定する
+        """
+        try:
+            cache_config = resolve_cache_config(crew_data)
+        except CacheConfigError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }, None
+        if not cache_config:
+            return None, None
+        
+        disk_cache = get_disk_cache(
+            cache_config["path"],
+            ttl_seconds=cache_config["ttl_seconds"],
+            max_entries=cache_config["max_entries"],
+            max_bytes=cache_config["max_bytes"],
+        )
+        
+        # クルー定義が前回の成功実行と一致すればkickoffせずに結果を返す
+        crew_key = crew_fingerprint(crew_data) if cache_config["crew"] else None
+        if crew_key:
+            with span("cache_lookup"):
+                cached = disk_cache.get(CREW_NAMESPACE, crew_key)
+            if cached is not None:
+                result = json.loads(cached.decode("utf-8"))
+                self._emit_event("cache_hit", {"name": crew_data.get("name", "Unnamed Crew"), "key": crew_key})
+                # LLMを呼んでいないため使用量は0（元の実行の使用量は cache.original_usage に残す）
                 return {
-                    "success": False,
-                    "error": "No agents provided",
-                    "timestamp": datetime.now().isoformat()
-                }
+                    **result,
+                    "timestamp": datetime.now().isoformat(),
+                    "token_usage": 0,
+                    "cost": 0,
+                    "usage": {**UsageTracker().summary(), "source": "crew_cache"},
+                    "cache": {
+                        "crew_hit": True,
+                        "key": crew_key,
+                        "original_timestamp": result.get("timestamp"),
+                        "original_usage": result.get("usage"),
+                    },
+                }, None
+        
+        if cache_config["llm"]:
+            # ディスクキャッシュごとに1つだけ作成し、プール内のLLMクライアントをジョブ間で再利用できるようにする
+            if id(disk_cache) not in self._llm_caches:
+                self._llm_caches[id(disk_cache)] = LLMResultCache(disk_cache)
+            self.llm_cache = self._llm_caches[id(disk_cache)]
+        llm_before = self.llm_cache.stats() if self.llm_cache is not None else None
+        return None, {"disk_cache": disk_cache, "crew_key": crew_key, "llm_before": llm_before}
+    
+    def _store_cache(self, cache: Dict[str, Any], result: Dict[str, Any], llm_cache: Optional[LLMResultCache]) -> Dict[str, Any]:
+        """成功した結果をクルーのメモに保存し、キャッシュの統計を結果に追加"""
+        disk_cache, crew_key = cache["disk_cache"], cache["crew_key"]
+        if crew_key and result.get("success"):
+            disk_cache.set(CREW_NAMESPACE, crew_key, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+        
+        result["cache"] = {"crew_hit": False, "key": crew_key, **disk_cache.stats()}
+        if llm_cache is not None:
+            # このジョブでのLLMキャッシュのヒット・ミス数（キャッシュはジョブ間で共有されるため差分を取る）
+            llm_after = llm_cache.stats()
+            result["cache"]["llm"] = {name: llm_after[name] - cache["llm_before"][name] for name in llm_after}
+        return result
+    
+    def _run_crew(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        """クルーを構築して実行"""
+        self._load_crewai()
+        try:
+            run = self._build_crew(crew_data)
+            if run.get("success") is False:
+                return run
+            if run["process"] == "dag":
+                return self._execute_dag(crew_data, run["agents"], run["tasks"], run["compactor"])
             
-            # タスクを作成（2パスで作成：まず全タスクを作成してからcontextを設定）
-            tasks_data = crew_data.get("tasks", [])
-            tasks = []
+            # maxExecutionTimeのあるエージェントはタスクを別スレッドで実行する（TrackedAgent）
+            with active_handlers(self.rate_limiter, run["tracker"], *self._job_handlers()), \
+                    span("kickoff"), profiling.sampling(self.profiler, threaded=run["threaded"]):
+                result = run["crew"].kickoff(inputs=crew_data.get("inputs"))
+            self._flush_memory()
+            return self._crew_response(run, result)
+        except Exception as e:
+            return self._crew_error(e)
+    
+    async def _arun_crew(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        _run_crew と同じだが、Crew.akickoff（タスク・LLM・メモリ・ツールの呼び出しがネイティブのasync）で実行する
+        （CrewAIの kickoff_async は同期のkickoffを別スレッドで実行するだけのため使わない）
+        キャンセル（asyncio.CancelledError）はエラー結果にせず呼び出し元へ伝える
+        """
+        self._load_crewai()
+        try:
+            run = self._build_crew(crew_data)
+            if run.get("success") is False:
+                return run
+            if run["process"] == "dag":
+                return await self._aexecute_dag(crew_data, run["agents"], run["tasks"], run["compactor"])
             
+            # 同期のツールはCrewAIがスレッドプールで実行する
+            with active_handlers(self.rate_limiter, run["tracker"], *self._job_handlers()), \
+                    span("kickoff"), profiling.sampling(self.profiler, threaded=True):
+                result = await run["crew"].akickoff(inputs=crew_data.get("inputs"))
+            await asyncio.to_thread(self._flush_memory)
+            return self._crew_response(run, result)
+        except Exception as e:
+            return self._crew_error(e)
+    
+    def _load_crewai(self):
+        with span("import_crewai"):
+            import crewai  # noqa: F401
+        install_llm_hooks()
+        if self.profiler is not None and self.profiler.detailed:
+            profiling.install_tool_hooks()
+    
+    def _build_crew(self, crew_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        エージェント・タスク・クルーを作成
+        process が dag の場合は agents / tasks / compactor を、それ以外は crew と使用量の tracker などを返す
+        実行できない定義の場合は success: false のレスポンスを返す
+        """
+        from crewai import Crew, Process
+        
+        # エージェントを作る前に設定を検証する
+        context_budgets = self._resolve_context_budgets(crew_data)
+        
+        # Callbacksを設定
+        self._setup_callbacks(crew_data)
+        
+        # エージェントを作成
+        agents_data = crew_data.get("agents", [])
+        with span("build_agents"):
+            agents = [self._create_agent(agent_data) for agent_data in agents_data]
+        
+        if not agents:
+            return {
+                "success": False,
+                "error": "No agents provided",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        # タスクを作成（2パスで作成：まず全タスクを作成してからcontextを設定）
+        tasks_data = crew_data.get("tasks", [])
+        tasks = []
+        
+        with span("build_tasks"):
             # 第1パス：基本的なタスクを作成
             for i, task_data in enumerate(tasks_data):
                 agent_index = min(i, len(agents) - 1)
@@ -198,92 +881,417 @@ class CrewAIEngine:
                             context_tasks.append(tasks[ctx_idx])
                     if context_tasks:
                         tasks[i].context = context_tasks
-            
-            if not tasks:
-                return {
-                    "success": False,
-                    "error": "No tasks provided",
-                    "timestamp": datetime.now().isoformat()
-                }
-            
-            # プロセスタイプを決定
-            process_type = crew_data.get("process", "sequential")
-            if process_type == "sequential":
-                process = Process.sequential
-            elif process_type == "hierarchical":
-                process = Process.hierarchical
-            elif process_type == "consensual":
-                # Consensual Processは将来のCrewAIバージョンでサポート予定
-                process = Process.sequential
-                self._emit_event("warning", {"message": "Consensual process not yet supported, using sequential"})
-            else:
-                process = Process.sequential
-            
-            # Memory設定
-            memory = crew_data.get("memory", False)
-            
-            # Planning設定
-            planning = crew_data.get("planning", False)
-            
-            # Manager LLM設定（Hierarchicalプロセス用）
-            manager_llm = None
-            if process == Process.hierarchical and crew_data.get("managerLlmConfig"):
-                manager_llm = self._create_llm(crew_data.get("managerLlmConfig"))
-            
-            # クルーを作成
-            crew_params = {
-                "agents": agents,
-                "tasks": tasks,
-                "process": process,
-                "verbose": crew_data.get("verbose", True),
-                "memory": memory,
-            }
-            
-            if manager_llm:
-                crew_params["manager_llm"] = manager_llm
-            
-            if planning:
-                crew_params["planning"] = planning
-            
-            crew = Crew(**crew_params)
-            
-            # クルーを実行
-            crew_name = crew_data.get("name", "Unnamed Crew")
-            self._emit_event("crew_start", {"name": crew_name})
-            print(f"[CrewAI] Starting crew execution: {crew_name}", file=sys.stderr)
-            
-            result = crew.kickoff()
-            
-            self._emit_event("crew_complete", {"name": crew_name})
-            
-            # トークン数とコストを計算（簡易的な推定）
-            result_text = str(result)
-            estimated_tokens = len(result_text.split()) * 1.3
-            estimated_cost = estimated_tokens * 0.00002
-            
-            # 結果を返す
-            return {
-                "success": True,
-                "result": result_text,
-                "timestamp": datetime.now().isoformat(),
-                "agents_count": len(agents),
-                "tasks_count": len(tasks),
-                "token_usage": int(estimated_tokens),
-                "cost": round(estimated_cost, 4),
-            }
-            
-        except Exception as e:
-            print(f"[CrewAI] Error: {str(e)}", file=sys.stderr)
-            self._emit_event("error", {"message": str(e)})
+        
+        if not tasks:
             return {
                 "success": False,
-                "error": str(e),
+                "error": "No tasks provided",
                 "timestamp": datetime.now().isoformat()
             }
+        
+        # 上流タスクの出力をタスクごとのトークン予算に収める
+        compactor = self._create_compactor(context_budgets, tasks)
+        
+        # プロセスタイプを決定
+        process_type = crew_data.get("process", "sequential")
+        if process_type == "dag":
+            if crew_data.get("inputs"):
+                # Crew.kickoff と同じく、タスクとエージェントの {変数} に入力を埋め込む
+                for task in tasks:
+                    task.interpolate_inputs_and_add_conversation_history(crew_data["inputs"])
+                for agent in agents:
+                    agent.interpolate_inputs(crew_data["inputs"])
+            return {"process": "dag", "agents": agents, "tasks": tasks, "compactor": compactor}
+        elif process_type == "sequential":
+            process = Process.sequential
+        elif process_type == "hierarchical":
+            process = Process.hierarchical
+        elif process_type == "consensual":
+            # Consensual Processは将来のCrewAIバージョンでサポート予定
+            process = Process.sequential
+            self._emit_event("warning", {"message": "Consensual process not yet supported, using sequential"})
+        else:
+            process = Process.sequential
+        
+        # Memory設定
+        memory = crew_data.get("memory", False)
+        
+        # Planning設定
+        planning = crew_data.get("planning", False)
+        
+        # Manager LLM設定（Hierarchicalプロセス用）
+        manager_llm = None
+        if process == Process.hierarchical and crew_data.get("managerLlmConfig"):
+            manager_llm = self._create_llm(crew_data.get("managerLlmConfig"))
+        
+        # クルーを作成
+        crew_params = {
+            "agents": agents,
+            "tasks": tasks,
+            "process": process,
+            "verbose": crew_data.get("verbose", True),
+            "memory": memory,
+        }
+        
+        if manager_llm:
+            crew_params["manager_llm"] = manager_llm
+        
+        if memory:
+            crew_params.update(self._create_memory(crew_data))
+        
+        if planning:
+            crew_params["planning"] = planning
+        
+        if self.result_stream is not None:
+            crew_params["task_callback"] = self._stream_task_output
+        
+        with span("build_crew"):
+            crew = Crew(**crew_params)
+        
+        # クルーを実行
+        crew_name = crew_data.get("name", "Unnamed Crew")
+        self._emit_event("crew_start", {"name": crew_name})
+        print(f"[CrewAI] Starting crew execution: {crew_name}", file=sys.stderr)
+        
+        # 階層型プロセスのマネージャーはTrackedAgentではないため、スコープ外の呼び出しとして集計
+        tracker = UsageTracker(
+            price_table=crew_data.get("priceTable"),
+            default_agent="manager" if process == Process.hierarchical else "(unscoped)",
+        )
+        return {
+            "process": process_type,
+            "crew": crew,
+            "crew_name": crew_name,
+            "agents": agents,
+            "tasks": tasks,
+            "compactor": compactor,
+            "tracker": tracker,
+            "cache_hits": self.llm_cache.hits if self.llm_cache is not None else 0,
+            "threaded": any(agent_data.get("maxExecutionTime") for agent_data in agents_data),
+        }
+    
+    def _crew_response(self, run: Dict[str, Any], result) -> Dict[str, Any]:
+        """kickoffの結果と、LLM呼び出しごとの実使用量から集計した使用量"""
+        self._emit_event("crew_complete", {"name": run["crew_name"]})
+        
+        tracker = run["tracker"]
+        result_text = str(result)
+        usage = tracker.summary()
+        # すべてLLMキャッシュから返した場合はAPIを呼んでいないため使用量0のまま
+        served_from_cache = self.llm_cache is not None and self.llm_cache.hits > run["cache_hits"]
+        if not tracker.calls and not served_from_cache:
+            usage = self._usage_from_crew_metrics(run["crew"], tracker)
+        
+        # 結果を返す
+        response = {
+            "success": True,
+            "result": result_text,
+            "timestamp": datetime.now().isoformat(),
+            "agents_count": len(run["agents"]),
+            "tasks_count": len(run["tasks"]),
+            "token_usage": usage["totals"]["total_tokens"],
+            "cost": round(usage["totals"]["cost"], 4),
+            "usage": usage,
+        }
+        if run["compactor"] is not None:
+            response["context"] = run["compactor"].report(tracker.calls)
+        return response
+    
+    def _crew_error(self, error: Exception) -> Dict[str, Any]:
+        print(f"[CrewAI] Error: {str(error)}", file=sys.stderr)
+        self._emit_event("error", {"message": str(error)})
+        return {
+            "success": False,
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+# ===============================================
+# バッチ実行
+# ===============================================
+
+def _resolve_batch(crew_data: Dict[str, Any]) -> tuple:
+    """crew_dataのbatchとbatchConcurrencyを検証して (入力セットのリスト, 同時実行数) を返す"""
+    input_sets = crew_data.get("batch")
+    if not isinstance(input_sets, list) or not input_sets:
+        raise ValueError("batch must be a non-empty list of input objects")
+    for index, inputs in enumerate(input_sets):
+        if not isinstance(inputs, dict):
+            raise ValueError(f"batch[{index}] must be an object, got {type(inputs).__name__}")
+    concurrency = crew_data.get("batchConcurrency", BATCH_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise ValueError(f"batchConcurrency must be a positive integer, got {concurrency!r}")
+    return input_sets, min(concurrency, len(input_sets))
+
+
+def _batch_response(results: List[Dict[str, Any]], concurrency: int, wall: float, streamed: bool) -> Dict[str, Any]:
+    """
+    入力セットごとの結果から、件数・スループット・使用量とコストの合計を集計
+    入力セットの結果をbatch_itemフレームで送信済みの場合、itemsには成否とエラーのみを残す
+    """
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+    for result in results:
+        for name, value in ((result.get("usage") or {}).get("totals") or {}).items():
+            if name in totals:
+                totals[name] += value
+    totals["cost"] = round(totals["cost"], 6)
+
+    succeeded = sum(1 for result in results if result.get("success"))
+    items = results
+    if streamed:
+        items = [
+            {"index": index, "success": result.get("success", False),
+             **({"error": result["error"]} if result.get("error") else {})}
+            for index, result in enumerate(results)
+        ]
+    return {
+        "success": True,
+        "result": f"{succeeded}/{len(results)} input sets succeeded",
+        "timestamp": datetime.now().isoformat(),
+        "token_usage": totals["total_tokens"],
+        "cost": round(totals["cost"], 4),
+        "usage": {"source": "batch", "totals": totals},
+        "batch": {
+            "items": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "concurrency": concurrency,
+            "wall_seconds": round(wall, 3),
+            "items_per_second": round(len(results) / wall, 3) if wall > 0 else None,
+            "tokens_per_second": round(totals["total_tokens"] / wall, 1) if wall > 0 else None,
+        },
+        "items": items,
+    }
+
+
+# ===============================================
+# ワーカーモード（常駐プロセス）
+# ===============================================
+
+def _error_frame(job_id: Any, error: str) -> Dict[str, Any]:
+    return {
+        "type": "error",
+        "id": job_id,
+        "error": error,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def _parse_frame(line: str) -> tuple:
+    """改行区切りの1行を (フレーム, エラーフレーム) に変換（空行は (None, None)）"""
+    line = line.strip()
+    if not line:
+        return None, None
+    try:
+        frame = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, _error_frame(None, f"Invalid JSON frame: {str(e)}")
+    if not isinstance(frame, dict):
+        return None, _error_frame(None, "Invalid frame: expected a JSON object")
+    return frame, None
+
+
+def _handle_frame(
+    engine: CrewAIEngine,
+    frame: Dict[str, Any],
+    send: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    1つのジョブフレームを処理してレスポンスフレームを返す
+    sendが渡されていれば、ストリーミング有効なジョブのチャンクフレームを結果フレームより先に書き出す
+    """
+    frame_type = frame.get("type", "job")
+    job_id = frame.get("id")
+    
+    if frame_type == "ping":
+        return {"type": "pong", "id": job_id, "pid": os.getpid()}
+    
+    if frame_type == "shutdown":
+        return None
+    
+    if frame_type != "job":
+        return _error_frame(job_id, f"Unknown frame type: {frame_type}")
+    
+    crew_data = frame.get("crew", {})
+    if not isinstance(crew_data, dict):
+        return _error_frame(job_id, f"Job crew must be an object, got {type(crew_data).__name__}")
+    
+    # ジョブごとにコールバックとメモリを分離
+    engine._reset_job_state()
+    engine.job_id = job_id
+    try:
+        # CrewAIのverbose出力がフレームを壊さないよう、実行中のstdoutはstderrへ退避
+        with contextlib.redirect_stdout(sys.stderr):
+            result = engine.execute_crew(crew_data, write_frame=send)
+    finally:
+        engine._reset_job_state()
+    
+    return {"type": "result", "id": job_id, "result": result}
+
+
+def serve_worker(engine: CrewAIEngine, reader, writer, lock: Optional[threading.Lock] = None) -> None:
+    """改行区切りJSONのジョブフレームを読み続け、結果フレームを書き出す"""
+    def send(response: Dict[str, Any]) -> None:
+        writer.write(json.dumps(response, ensure_ascii=False) + "\n")
+        writer.flush()
+    
+    for line in reader:
+        frame, response = _parse_frame(line)
+        if frame is not None:
+            try:
+                if lock is not None:
+                    with lock:
+                        response = _handle_frame(engine, frame, send)
+                else:
+                    response = _handle_frame(engine, frame, send)
+            except Exception as e:
+                # 不正なクルー定義などでワーカーを終了させず、このジョブだけをエラーにする
+                print(f"[CrewAI] Job {frame.get('id')} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                response = _error_frame(frame.get("id"), f"{type(e).__name__}: {e}")
+            if response is None:
+                break
+        
+        if response is not None:
+            send(response)
+
+
+async def serve_worker_async(engine: CrewAIEngine, reader, writer, max_jobs: int = 8) -> None:
+    """
+    serve_worker の非同期版: 1つのイベントループで最大max_jobs件のジョブを並行して実行する
+    各ジョブは job_engine() のエンジンで execute_crew_async を実行し、結果は完了順に書き出す
+    {"type": "cancel", "id": ...} を受け取ると該当ジョブのタスクをキャンセルし、"Job cancelled" のエラーフレームを返す
+    """
+    write_lock = threading.Lock()
+    
+    def send(response: Dict[str, Any]) -> None:
+        # ジョブのフレームはイベントループ以外のスレッド（ツール・メモリの書き込み）からも届く
+        with write_lock:
+            writer.write(json.dumps(response, ensure_ascii=False) + "\n")
+            writer.flush()
+    
+    slots = asyncio.Semaphore(max(1, max_jobs))
+    jobs: Dict[Any, asyncio.Task] = {}
+    
+    async def run_job(job_id: Any, crew_data: Dict[str, Any]) -> None:
+        job = engine.job_engine()
+        job.job_id = job_id
+        try:
+            async with slots:
+                result = await job.execute_crew_async(crew_data, write_frame=send)
+            response = {"type": "result", "id": job_id, "result": result}
+        except asyncio.CancelledError:
+            response = _error_frame(job_id, "Job cancelled")
+        except Exception as e:
+            print(f"[CrewAI] Job {job_id} failed: {type(e).__name__}: {e}", file=sys.stderr)
+            response = _error_frame(job_id, f"{type(e).__name__}: {e}")
+        finally:
+            jobs.pop(job_id, None)
+        send(response)
+    
+    # 標準入力の読み込みはブロックするため、ループを止めないよう別スレッドで待つ
+    while True:
+        line = await asyncio.to_thread(reader.readline)
+        if not line:
+            break
+        frame, response = _parse_frame(line)
+        if frame is not None:
+            frame_type = frame.get("type", "job")
+            job_id = frame.get("id")
+            if frame_type == "cancel":
+                # 完了済みのジョブへのキャンセルは無視する
+                task = jobs.get(job_id)
+                if task is not None:
+                    task.cancel()
+                continue
+            if frame_type == "job" and isinstance(frame.get("crew", {}), dict):
+                if job_id in jobs:
+                    response = _error_frame(job_id, f"Job {job_id} is already running")
+                else:
+                    jobs[job_id] = asyncio.ensure_future(run_job(job_id, frame.get("crew", {})))
+                    continue
+            else:
+                response = _handle_frame(engine, frame)
+                if response is None:
+                    break
+        if response is not None:
+            send(response)
+    
+    # 入力が閉じられても実行中のジョブは最後まで実行する
+    if jobs:
+        await asyncio.gather(*jobs.values(), return_exceptions=True)
+
+
+def serve_socket(engine: CrewAIEngine, socket_path: str) -> None:
+    """Unixソケットでジョブを受け付ける（接続ごとにスレッド、実行はエンジン単位で直列化）"""
+    lock = threading.Lock()
+    
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = io.TextIOWrapper(self.rfile, encoding="utf-8")
+            writer = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+            serve_worker(engine, reader, writer, lock=lock)
+    
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    
+    with socketserver.ThreadingUnixStreamServer(socket_path, _Handler) as server:
+        print(f"[CrewAI] Worker listening on {socket_path}", file=sys.stderr, flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def run_worker(socket_path: Optional[str] = None, async_jobs: int = 0) -> None:
+    """
+    ウォームなエンジンを1つ作成し、複数のクルー実行を受け付ける
+    async_jobs > 0 では標準入出力のジョブを1つのイベントループで最大async_jobs件まで並行実行する
+    """
+    engine = CrewAIEngine()
+    engine.preload()
+    print(f"[CrewAI] Worker ready (pid={os.getpid()})", file=sys.stderr, flush=True)
+    
+    if socket_path:
+        serve_socket(engine, socket_path)
+    elif async_jobs > 0:
+        out = sys.stdout
+        # CrewAIのverbose出力がフレームを壊さないよう、ワーカーの実行中はstdoutをstderrへ退避
+        with contextlib.redirect_stdout(sys.stderr):
+            asyncio.run(serve_worker_async(engine, sys.stdin, out, max_jobs=async_jobs))
+    else:
+        serve_worker(engine, sys.stdin, sys.stdout)
 
 
 def main():
     """メイン関数：標準入力からJSONを受け取り、実行結果を標準出力に返す"""
+    parser = argparse.ArgumentParser(description="CrewAI実行エンジン")
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="常駐ワーカーモード（改行区切りJSONのジョブを繰り返し処理）"
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="ワーカーモードで使用するUnixソケットのパス（省略時は標準入出力）"
+    )
+    parser.add_argument(
+        "--async-jobs",
+        type=int,
+        default=0,
+        help="ワーカーモードで1プロセスが並行して実行するジョブ数（asyncio、0で1ジョブずつ同期実行）"
+    )
+    args = parser.parse_args()
+    
+    if args.async_jobs and args.socket:
+        parser.error("--async-jobs は標準入出力のワーカーでのみ使用できます")
+    
+    if args.worker:
+        run_worker(args.socket, args.async_jobs)
+        return
+    
     try:
         # 標準入力からJSONを読み込む
         input_data = sys.stdin.read()
@@ -292,8 +1300,25 @@ def main():
         # エンジンを初期化
         engine = CrewAIEngine()
         
+        if request.get("stream"):
+            # ストリーミング時はstdoutを改行区切りのフレーム専用にし、verbose出力はstderrへ退避
+            out = sys.stdout
+            
+            def send(frame: Dict[str, Any]) -> None:
+                out.write(json.dumps(frame, ensure_ascii=False) + "\n")
+                out.flush()
+            
+            with contextlib.redirect_stdout(sys.stderr):
+                result = engine.execute_crew(request, write_frame=send)
+            if engine.event_channel is not None:
+                engine.event_channel.close()
+            send({"type": "result", "id": None, "result": result})
+            return
+        
         # クルーを実行
         result = engine.execute_crew(request)
+        if engine.event_channel is not None:
+            engine.event_channel.close()
         
         # 結果をJSON形式で標準出力に書き込む
         print(json.dumps(result, ensure_ascii=False))
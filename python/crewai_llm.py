@@ -0,0 +1,89 @@
+"""
+エンジン用のcrewai.LLM
+CrewAI 1.8のAgentはcrewai.LLM以外のLLM（LangChainのChatOpenAIなど）をcreate_llmで作り直し、
+モデル名・温度・max_tokens・タイムアウト・APIキー・ベースURL以外の設定（コールバックなど）を捨てる。
+そのためエンジンのLLMはcrewai.LLMのOpenAI互換ネイティブ実装のサブクラスとして作成し、
+呼び出しごとに現在のコンテキストのハンドラ（使用量集計・レートリミッター・プロファイラ・結果ストリーム）へ
+呼び出し元のスレッドで開始・終了を通知する（レートリミッターはここで呼び出しを待たせる）
+cache（result_cache.LLMResultCache）を渡した場合、ツール・構造化出力を使わない呼び出しの結果を再利用する
+（キャッシュヒットはAPIを呼ばないため、ハンドラへは通知しない）
+"""
+
+import functools
+from typing import Any
+
+from usage_accounting import TrackedCall, current_tracked_call
+from rate_limiter import deadline_interceptor
+
+
+@functools.lru_cache(maxsize=None)
+def tracked_llm_class():
+    """呼び出しをハンドラへ通知するcrewai.LLMのクラス（初回呼び出し時に定義）"""
+    from crewai.llms.providers.openai.completion import OpenAICompletion
+
+    class TrackedLLM(OpenAICompletion):
+        def __init__(self, **kwargs: Any):
+            # maxExecutionTimeのデッドラインをHTTP通信（ストリーミングの読み込みを含む）に適用する
+            kwargs.setdefault("interceptor", deadline_interceptor())
+            result_cache = kwargs.pop("cache", None)
+            super().__init__(**kwargs)
+            self._result_cache = result_cache
+
+        def _invocation_params(self) -> dict:
+            return {"temperature": self.temperature, "max_tokens": self.max_tokens}
+
+        def _cache_key(self, messages, tools, available_functions, response_model):
+            """キャッシュ可能な呼び出しならキャッシュキー、そうでなければNone"""
+            if self._result_cache is None or tools or available_functions or response_model is not None:
+                return None
+            params = {"model": self.model, "stop": list(self.stop or []), **self._invocation_params()}
+            return self._result_cache.key(params, messages)
+
+        def _track_token_usage_internal(self, usage_data: dict) -> None:
+            # APIのレスポンス（ストリーミングでは最後のチャンク）の使用量を呼び出しごとに記録
+            super()._track_token_usage_internal(usage_data)
+            call = current_tracked_call()
+            if call is not None:
+                call.usage = dict(usage_data)
+
+        def call(self, messages, tools=None, callbacks=None, available_functions=None,
+                 from_task=None, from_agent=None, response_model=None) -> Any:
+            key = self._cache_key(messages, tools, available_functions, response_model)
+            if key is not None:
+                cached = self._result_cache.lookup(key)
+                if cached is not None:
+                    return cached
+            with TrackedCall(self.model, messages, self._invocation_params()) as call:
+                result = super().call(
+                    messages, tools=tools, callbacks=callbacks, available_functions=available_functions,
+                    from_task=from_task, from_agent=from_agent, response_model=response_model,
+                )
+                call.finish(result)
+            if key is not None and isinstance(result, str):
+                self._result_cache.update(key, result)
+            return result
+
+        async def acall(self, messages, tools=None, callbacks=None, available_functions=None,
+                        from_task=None, from_agent=None, response_model=None) -> Any:
+            key = self._cache_key(messages, tools, available_functions, response_model)
+            if key is not None:
+                cached = self._result_cache.lookup(key)
+                if cached is not None:
+                    return cached
+            # レートリミッターの待機はイベントループ上で行う（TrackedCall.__aenter__）
+            async with TrackedCall(self.model, messages, self._invocation_params()) as call:
+                result = await super().acall(
+                    messages, tools=tools, callbacks=callbacks, available_functions=available_functions,
+                    from_task=from_task, from_agent=from_agent, response_model=response_model,
+                )
+                call.finish(result)
+            if key is not None and isinstance(result, str):
+                self._result_cache.update(key, result)
+            return result
+
+    return TrackedLLM
+
+
+def create_tracked_llm(**params: Any):
+    """LLMPoolのファクトリ（params は model / base_url / api_key / temperature / max_tokens / cache など）"""
+    return tracked_llm_class()(**params)
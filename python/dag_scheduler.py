@@ -0,0 +1,248 @@
+"""
+タスク依存グラフ（DAG）スケジューラ
+タスクの context 依存関係をトポロジカルソートし、
+依存が解決したタスクから順に有限サイズのワーカープール（arun_dag ではイベントループ上のタスク）で並列実行する
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Awaitable, Callable, Tuple
+
+
+class CycleError(ValueError):
+    """タスク依存グラフに循環がある場合のエラー"""
+
+    def __init__(self, cycle: List[int]):
+        self.cycle = cycle
+        super().__init__(f"Task dependency cycle detected: {' -> '.join(str(i) for i in cycle)}")
+
+
+def normalize_dependencies(tasks_data: List[Dict[str, Any]]) -> Dict[int, List[int]]:
+    """タスク定義の context インデックスから依存関係を作成（範囲外・自己参照・重複は除外）"""
+    deps = {}
+    for i, task_data in enumerate(tasks_data):
+        seen = []
+        for idx in task_data.get("context") or []:
+            if isinstance(idx, int) and 0 <= idx < len(tasks_data) and idx != i and idx not in seen:
+                seen.append(idx)
+        deps[i] = seen
+    return deps
+
+
+def _find_cycle(deps: Dict[int, List[int]], remaining: List[int]) -> List[int]:
+    """未処理ノードの中から循環を1つ探して返す"""
+    remaining_set = set(remaining)
+    visiting: List[int] = []
+    state: Dict[int, int] = {}
+
+    def visit(node: int) -> List[int]:
+        state[node] = 1
+        visiting.append(node)
+        for dep in deps.get(node, []):
+            if dep not in remaining_set:
+                continue
+            if state.get(dep) == 1:
+                return visiting[visiting.index(dep):] + [dep]
+            if dep not in state:
+                found = visit(dep)
+                if found:
+                    return found
+        visiting.pop()
+        state[node] = 2
+        return []
+
+    for node in remaining:
+        if node not in state:
+            found = visit(node)
+            if found:
+                return found
+    return remaining
+
+
+def topological_levels(deps: Dict[int, List[int]]) -> List[List[int]]:
+    """Kahn法でトポロジカルソートし、同時実行可能なフロンティアごとに返す"""
+    indegree = {node: len(parents) for node, parents in deps.items()}
+    children: Dict[int, List[int]] = {node: [] for node in deps}
+    for node, parents in deps.items():
+        for parent in parents:
+            children[parent].append(node)
+
+    levels = []
+    frontier = sorted(node for node, degree in indegree.items() if degree == 0)
+    visited = 0
+    while frontier:
+        levels.append(frontier)
+        visited += len(frontier)
+        next_frontier = []
+        for node in frontier:
+            for child in children[node]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    next_frontier.append(child)
+        frontier = sorted(next_frontier)
+
+    if visited != len(deps):
+        remaining = [node for node, degree in indegree.items() if degree > 0]
+        raise CycleError(_find_cycle(deps, remaining))
+
+    return levels
+
+
+def critical_path(deps: Dict[int, List[int]], durations: Dict[int, float]) -> Tuple[List[int], float]:
+    """各タスクの実行時間から最長経路（クリティカルパス）を求める"""
+    finish: Dict[int, float] = {}
+    previous: Dict[int, int] = {}
+    for level in topological_levels(deps):
+        for node in level:
+            best_parent, best_time = None, 0.0
+            for parent in deps[node]:
+                if finish[parent] > best_time:
+                    best_parent, best_time = parent, finish[parent]
+            finish[node] = best_time + durations.get(node, 0.0)
+            if best_parent is not None:
+                previous[node] = best_parent
+
+    if not finish:
+        return [], 0.0
+
+    node = max(finish, key=lambda n: finish[n])
+    total = finish[node]
+    path = [node]
+    while node in previous:
+        node = previous[node]
+        path.append(node)
+    return list(reversed(path)), total
+
+
+def run_dag(
+    deps: Dict[int, List[int]],
+    run_task: Callable[[int, Dict[int, Any]], Any],
+    max_workers: int = 4,
+) -> Tuple[Dict[int, Any], Dict[str, Any]]:
+    """
+    依存関係に従ってタスクを並列実行する
+
+    run_task(index, upstream_outputs) は依存タスクの出力を受け取ってタスクを実行する。
+    依存が全て完了したタスクから順次投入するため、フロンティア全体の完了を待たずに下流へ進む。
+    いずれかのタスクが失敗した場合は未着手のタスクを投入せずに例外を送出する。
+    """
+    levels = topological_levels(deps)
+    remaining = {node: set(parents) for node, parents in deps.items()}
+    outputs: Dict[int, Any] = {}
+    timings: Dict[int, Dict[str, float]] = {}
+    lock = threading.Lock()
+    run_start = time.perf_counter()
+
+    def execute(node: int) -> Any:
+        upstream = {parent: outputs[parent] for parent in deps[node]}
+        start = time.perf_counter()
+        try:
+            return run_task(node, upstream)
+        finally:
+            end = time.perf_counter()
+            with lock:
+                timings[node] = {"start": start - run_start, "end": end - run_start}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+
+        def submit_ready():
+            for node in sorted(remaining):
+                if not remaining[node] and node not in running.values() and node not in outputs:
+                    # 呼び出し元のコンテキスト（使用量集計のハンドラ等）をワーカースレッドへ引き継ぐ
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, execute, node)] = node
+
+        submit_ready()
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for pending in running:
+                        pending.cancel()
+                    raise error
+                outputs[node] = future.result()
+                del remaining[node]
+                for other in remaining.values():
+                    other.discard(node)
+            submit_ready()
+
+    return outputs, _report(deps, levels, max_workers, run_start, timings)
+
+
+async def arun_dag(
+    deps: Dict[int, List[int]],
+    run_task: Callable[[int, Dict[int, Any]], Awaitable[Any]],
+    max_concurrency: int = 4,
+) -> Tuple[Dict[int, Any], Dict[str, Any]]:
+    """
+    run_dag と同じ順序・同じレポートで、コルーチンの run_task をイベントループ上で並行実行する
+    いずれかのタスクが失敗した場合（またはこのコルーチンがキャンセルされた場合）は実行中のタスクをキャンセルする
+    """
+    levels = topological_levels(deps)
+    remaining = {node: set(parents) for node, parents in deps.items()}
+    outputs: Dict[int, Any] = {}
+    timings: Dict[int, Dict[str, float]] = {}
+    slots = asyncio.Semaphore(max(1, max_concurrency))
+    run_start = time.perf_counter()
+
+    async def execute(node: int) -> Any:
+        upstream = {parent: outputs[parent] for parent in deps[node]}
+        async with slots:
+            start = time.perf_counter()
+            try:
+                return await run_task(node, upstream)
+            finally:
+                timings[node] = {"start": start - run_start, "end": time.perf_counter() - run_start}
+
+    running: Dict[asyncio.Task, int] = {}
+
+    def submit_ready():
+        for node in sorted(remaining):
+            if not remaining[node] and node not in running.values() and node not in outputs:
+                # asyncio.Task は作成時のコンテキスト（使用量集計のハンドラ等）を引き継ぐ
+                running[asyncio.ensure_future(execute(node))] = node
+
+    try:
+        submit_ready()
+        while running:
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                outputs[node] = future.result()
+                del remaining[node]
+                for other in remaining.values():
+                    other.discard(node)
+            submit_ready()
+    finally:
+        for pending in running:
+            pending.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return outputs, _report(deps, levels, max_concurrency, run_start, timings)
+
+
+def _report(deps: Dict[int, List[int]], levels: List[List[int]], max_workers: int, run_start: float,
+            timings: Dict[int, Dict[str, float]]) -> Dict[str, Any]:
+    wall_clock = time.perf_counter() - run_start
+    durations = {node: t["end"] - t["start"] for node, t in timings.items()}
+    path, path_seconds = critical_path(deps, durations)
+
+    return {
+        "levels": levels,
+        "max_workers": max_workers,
+        "wall_clock_seconds": round(wall_clock, 3),
+        "critical_path": path,
+        "critical_path_seconds": round(path_seconds, 3),
+        "serial_seconds": round(sum(durations.values()), 3),
+        "task_timings": {
+            str(node): {key: round(value, 3) for key, value in t.items()}
+            for node, t in sorted(timings.items())
+        },
+    }
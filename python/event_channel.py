@@ -0,0 +1,273 @@
+"""
+構造化イベントチャネル
+Node.js側と共有するファイルディスクリプタ（CREWAI_EVENT_FD）にNDJSONフレームを書き出す
+イベントはキューに積んでバックグラウンドスレッドがまとめて書き込むため、実行スレッドをブロックしない
+書き込みに失敗した場合（読み手の終了・fdのクローズなど）はチャネルを停止し、以降のイベントは破棄する
+複数のジョブを同時に実行するワーカーでは、ジョブごとの JobEvents（job_events()）がサンプリングとjobを持つ
+
+フレーム形式（shared/crewaiEvents.ts の CrewAIEventFrame と対応）:
+    {"v": 1, "seq": 12, "type": "task_complete", "data": {...}, "timestamp": "...", "job": "job-3"}
+"""
+
+import os
+import sys
+import json
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+EVENT_SCHEMA_VERSION = 1
+
+# サンプリング・破棄の対象にしないイベント
+CRITICAL_EVENTS = {"crew_start", "crew_complete", "error"}
+
+# キューが満杯のときに重要イベントが待機する最大秒数
+CRITICAL_PUT_TIMEOUT = 5.0
+
+
+def _count(counts: Dict[str, int], event_type: str) -> None:
+    counts[event_type] = counts.get(event_type, 0) + 1
+
+
+def _should_send(sampling: Dict[str, float], counters: Dict[str, int], event_type: str) -> bool:
+    """決定的サンプリング: 率rなら約1/r件ごとに1件送る"""
+    rate = sampling.get(event_type, sampling.get("*", 1.0))
+    if event_type in CRITICAL_EVENTS or rate >= 1.0:
+        return True
+    if rate <= 0:
+        return False
+    count = counters.get(event_type, 0)
+    counters[event_type] = count + 1
+    return count % max(1, round(1 / rate)) == 0
+
+
+class EventChannel:
+    """バッチ書き込み・バックプレッシャー・イベント種別ごとのサンプリングを備えたイベント送信チャネル"""
+
+    def __init__(self, fd: int, max_queue: int = 1000, batch_size: int = 64):
+        self.fd = fd
+        self.batch_size = batch_size
+        self.sampling: Dict[str, float] = {}
+        self.context: Dict[str, Any] = {}
+        self.dropped: Dict[str, int] = {}
+        self.sampled_out: Dict[str, int] = {}
+        # 書き込みを終えたフレーム数（seq はプロセス内の連番のため、キュー投入後に破棄されたフレームも含む）
+        self.sent = 0
+        self._counters: Dict[str, int] = {}
+        self._seq = 0
+        # 書き込みエラーで停止した場合のエラー内容
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        # キューの要素は (フレーム, イベント種別, 送信元の JobEvents または None)
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._run, name="crewai-event-writer", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["EventChannel"]:
+        """CREWAI_EVENT_FD が設定されていればチャネルを作成"""
+        fd = os.getenv("CREWAI_EVENT_FD")
+        if not fd:
+            return None
+        try:
+            fd = int(fd)
+            # 親プロセスがfdを渡していない場合はチャネルを作らない
+            os.fstat(fd)
+        except (ValueError, OSError):
+            return None
+        return cls(fd)
+
+    def configure(self, sampling: Optional[Dict[str, float]] = None, **context: Any) -> None:
+        """ジョブごとのサンプリング率（0〜1）とフレームに付与するコンテキストを設定し、統計を0に戻す"""
+        with self._lock:
+            self.sampling = dict(sampling or {})
+            self.context = {k: v for k, v in context.items() if v is not None}
+            self._counters = {}
+            self.sent = 0
+            self.dropped = {}
+            self.sampled_out = {}
+
+    def _should_send(self, event_type: str) -> bool:
+        return _should_send(self.sampling, self._counters, event_type)
+
+    def emit(self, event_type: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            if self.error is not None:
+                _count(self.dropped, event_type)
+                return
+            if not self._should_send(event_type):
+                _count(self.sampled_out, event_type)
+                return
+            context = self.context
+        self._send(event_type, data, context)
+
+    def _send(self, event_type: str, data: Dict[str, Any], context: Dict[str, Any],
+              owner: Optional["JobEvents"] = None) -> None:
+        """フレームに連番を付けてキューに積む（停止後・キューが満杯の場合は破棄して数える）"""
+        with self._lock:
+            if self.error is not None:
+                self._dropped([(None, event_type, owner)])
+                return
+            self._seq += 1
+            frame = {
+                "v": EVENT_SCHEMA_VERSION,
+                "seq": self._seq,
+                "type": event_type,
+                "data": data,
+                "timestamp": datetime.now().isoformat(),
+                **context,
+            }
+        payload = (json.dumps(frame, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+        item = (payload, event_type, owner)
+        try:
+            if event_type in CRITICAL_EVENTS:
+                # 重要イベントは読み手が追いつくまで待つ（バックプレッシャー）
+                self._queue.put(item, timeout=CRITICAL_PUT_TIMEOUT)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._dropped([item])
+
+    def job_events(self) -> "JobEvents":
+        """このチャネルに書き込む1ジョブ用の送信口（サンプリング・job・統計はジョブごと）"""
+        return JobEvents(self)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = []
+            stop = item is None
+            if item is not None:
+                batch.append(item)
+            # 溜まっているフレームをまとめて1回で書き込む
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            try:
+                # 停止後に残っていたフレームは書き込まずに破棄する
+                written = self._write(b"".join(payload for payload, _, _ in batch)) if batch and self.error is None else 0
+                # 途中で失敗した場合は、最後まで書き込めたフレームだけを送信済みとする
+                done = 0
+                for payload, _, _ in batch:
+                    if written < len(payload):
+                        break
+                    written -= len(payload)
+                    done += 1
+                with self._lock:
+                    self._written(batch[:done])
+                    self._dropped(batch[done:])
+            finally:
+                # flush() が待ち続けないよう、書き込みに失敗してもキューの完了を通知する
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, data: bytes) -> int:
+        """書き込んだバイト数を返す（失敗した場合はチャネルを停止し、それまでのバイト数を返す）"""
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.fd, view)
+            except OSError as e:
+                with self._lock:
+                    self.error = f"{type(e).__name__}: {e}"
+                print(f"[CrewAI] Event channel closed: {self.error}", file=sys.stderr)
+                return len(data) - len(view)
+            view = view[written:]
+        return len(data)
+
+    def _written(self, items) -> None:
+        """書き込みを終えたフレームを数える（self._lock を保持して呼ぶ）"""
+        self.sent += len(items)
+        for _, _, owner in items:
+            if owner is not None:
+                owner._count("sent")
+
+    def _dropped(self, items) -> None:
+        """破棄したフレームを数える（self._lock を保持して呼ぶ）"""
+        for _, event_type, owner in items:
+            _count(self.dropped, event_type)
+            if owner is not None:
+                owner._count("dropped", event_type)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {"sent": self.sent, "dropped": dict(self.dropped), "sampled_out": dict(self.sampled_out)}
+            if self.error is not None:
+                stats["error"] = self.error
+            return stats
+
+    def flush(self) -> None:
+        """キューに積まれたフレームがすべて書き込まれるまで待つ"""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join(timeout=CRITICAL_PUT_TIMEOUT)
+
+
+class JobEvents:
+    """
+    EventChannel を共有する1ジョブ分の送信口（EventChannel と同じ configure / emit / flush / stats を持つ）
+    同じイベントループで並行実行するジョブのフレームに、それぞれのjobとサンプリングを適用する
+    """
+
+    def __init__(self, channel: EventChannel):
+        self.channel = channel
+        self.sampling: Dict[str, float] = {}
+        self.context: Dict[str, Any] = {}
+        self.dropped: Dict[str, int] = {}
+        self.sampled_out: Dict[str, int] = {}
+        self.sent = 0
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, sampling: Optional[Dict[str, float]] = None, **context: Any) -> None:
+        with self._lock:
+            self.sampling = dict(sampling or {})
+            self.context = {k: v for k, v in context.items() if v is not None}
+            self._counters = {}
+            self.sent = 0
+            self.dropped = {}
+            self.sampled_out = {}
+
+    def emit(self, event_type: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            if not _should_send(self.sampling, self._counters, event_type):
+                _count(self.sampled_out, event_type)
+                return
+            context = dict(self.context)
+        # 送信済み・破棄の数はチャネルが書き込み（または破棄）の時点で _count に通知する
+        self.channel._send(event_type, data, context, owner=self)
+
+    def _count(self, kind: str, event_type: str = "") -> None:
+        with self._lock:
+            if kind == "sent":
+                self.sent += 1
+            else:
+                _count(self.dropped, event_type)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {"sent": self.sent, "dropped": dict(self.dropped), "sampled_out": dict(self.sampled_out)}
+        if self.channel.error is not None:
+            stats["error"] = self.channel.error
+        return stats
+
+    def flush(self) -> None:
+        self.channel.flush()
+
+    def close(self) -> None:
+        # チャネルはワーカーが閉じる
+        pass
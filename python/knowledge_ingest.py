@@ -0,0 +1,206 @@
+"""
+ナレッジの取り込み（チャンク分割 → 重複除去 → バッチ埋め込み → ベクトルインデックス）
+ストーリーボード・演出指示書などの文書を少しずつ読みながらチャンクに分割し、
+内容ハッシュで重複を除いたチャンクだけを batch_size 件ずつ埋め込んで vector_store.VectorIndex に書き込む。
+文書全体・コーパス全体をメモリに載せることはなく、保持するのは読み込み中のバッファと1バッチ分のチャンク、
+取り込み済みチャンクのハッシュのみ
+
+    knowledge = open_knowledge("cm_assets/_knowledge")
+    stats = ingest_files(["input/storyboard.md", "input/direction_spec.md"], knowledge)
+    hits = knowledge.search("シーン3のBGM", limit=5)
+
+埋め込みは既定でオフラインの HashingEmbedder を使う（config.embedder で OpenAI 互換APIに変更可能）
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional, Iterable, Iterator, TextIO, Tuple
+
+from vector_store import (
+    VectorIndex, HashingEmbedder, create_embedder, open_index, EMBED_BATCH, DEFAULT_MAX_ENTRIES,
+)
+
+# 1チャンクの最大文字数と、前のチャンクと重ねる文字数
+CHUNK_CHARS = int(os.getenv("CREWAI_KNOWLEDGE_CHUNK_CHARS", "800"))
+CHUNK_OVERLAP = int(os.getenv("CREWAI_KNOWLEDGE_CHUNK_OVERLAP", "100"))
+
+# ファイルから1回に読み込む文字数
+READ_SIZE = 64 * 1024
+
+# チャンクの区切りとして優先する位置（段落 → 文末 → 行末）
+_BOUNDARIES = ("\n\n", "。", "．", ". ", "！", "？", "!", "?", "\n")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class KnowledgeError(ValueError):
+    """ナレッジの取り込み設定が不正"""
+    pass
+
+
+def _cut_position(buffer: str, chunk_chars: int, min_chars: int) -> int:
+    """buffer[:chunk_chars] の中で、min_chars 以降の最も後ろにある区切りの直後（なければ chunk_chars）"""
+    window = buffer[:chunk_chars]
+    for boundary in _BOUNDARIES:
+        pos = window.rfind(boundary, min_chars)
+        if pos >= 0:
+            return pos + len(boundary)
+    return chunk_chars
+
+
+def iter_chunks(stream: TextIO, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP,
+                read_size: int = READ_SIZE) -> Iterator[Tuple[int, str]]:
+    """
+    テキストストリームを (文書内の開始位置, チャンク) に分割するジェネレータ
+    区切りは段落・文末を優先し、隣り合うチャンクは overlap 文字だけ重ねる
+    """
+    if chunk_chars <= 0 or not 0 <= overlap < chunk_chars // 2:
+        raise KnowledgeError("chunk_chars must be positive and overlap less than half of it")
+    min_chars = chunk_chars // 2
+    buffer = ""
+    offset = 0
+    # buffer の先頭のうち前のチャンクと重なっている文字数
+    carried = 0
+    eof = False
+    while not eof:
+        block = stream.read(read_size)
+        eof = not block
+        buffer += block
+        while len(buffer) > chunk_chars or (eof and len(buffer) > carried):
+            cut = len(buffer) if len(buffer) <= chunk_chars else _cut_position(buffer, chunk_chars, min_chars)
+            text = buffer[:cut].strip()
+            if text:
+                yield offset, text
+            if cut >= len(buffer):
+                buffer = ""
+                break
+            keep = cut - overlap
+            offset += keep
+            buffer = buffer[keep:]
+            carried = overlap
+
+
+def chunk_id(text: str) -> str:
+    """空白の違いを無視したチャンクの内容ハッシュ（インデックスのIDとして使い、重複を除く）"""
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class KnowledgeBase:
+    """取り込んだチャンクのインデックスと、検索に使う埋め込み"""
+
+    def __init__(self, index: VectorIndex, embedder, score_threshold: float = 0.0):
+        self.index = index
+        self.embedder = embedder
+        self.score_threshold = score_threshold
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """クエリとのコサイン類似度の上位limit件（content・metadata・score）"""
+        return self.index.search(self.embedder.embed([query])[0], limit=limit,
+                                 score_threshold=self.score_threshold)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+def open_knowledge(directory: str, config: Optional[Dict[str, Any]] = None,
+                   base_url: str = "", api_key: str = "") -> KnowledgeBase:
+    """
+    ナレッジのインデックスを開く
+    config は {"embedder": {...}, "maxEntries": 100000, "scoreThreshold": 0.05}
+    """
+    config = config or {}
+    embedder = create_embedder(config.get("embedder"), base_url, api_key)
+    if embedder.dim is None:
+        embedder.dim = embedder.embed(["dimension probe"]).shape[1]
+    index = open_index(directory, embedder.dim, embedder.name, config.get("maxEntries", DEFAULT_MAX_ENTRIES))
+    threshold = config.get("scoreThreshold", 0.05 if isinstance(embedder, HashingEmbedder) else 0.0)
+    return KnowledgeBase(index, embedder, score_threshold=threshold)
+
+
+def ingest_stream(stream: TextIO, knowledge: KnowledgeBase, source: str = "",
+                  batch_size: int = EMBED_BATCH, chunk_chars: int = CHUNK_CHARS,
+                  overlap: int = CHUNK_OVERLAP, seen: Optional[set] = None) -> Dict[str, Any]:
+    """
+    1つのストリームを取り込む
+    seen は取り込み済みチャンクIDの集合（複数の文書をまたいで重複を除く場合に共有する）
+    """
+    if batch_size <= 0:
+        raise KnowledgeError("batch_size must be positive")
+    seen = set() if seen is None else seen
+    stats = {"chunks": 0, "duplicates": 0, "existing": 0, "embedded": 0, "batches": 0, "chars": 0,
+             "embed_seconds": 0.0}
+    batch: List[Tuple[str, str, Dict[str, Any]]] = []
+
+    def flush() -> None:
+        # 前回までに取り込み済みのチャンクは埋め込まない（--resume などで同じ文書を再度取り込む場合）
+        existing = knowledge.index.contains([item_id for item_id, _, _ in batch])
+        fresh = [item for item in batch if item[0] not in existing]
+        stats["existing"] += len(batch) - len(fresh)
+        batch.clear()
+        if not fresh:
+            return
+        ids, texts, metadatas = zip(*fresh)
+        start = time.perf_counter()
+        vectors = knowledge.embedder.embed(texts)
+        stats["embed_seconds"] += time.perf_counter() - start
+        knowledge.index.upsert(ids, vectors, texts, metadatas)
+        stats["embedded"] += len(fresh)
+        stats["batches"] += 1
+
+    for offset, text in iter_chunks(stream, chunk_chars, overlap):
+        stats["chunks"] += 1
+        stats["chars"] += len(text)
+        item_id = chunk_id(text)
+        if item_id in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(item_id)
+        batch.append((item_id, text, {"source": source, "offset": offset}))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    stats["embed_seconds"] = round(stats["embed_seconds"], 3)
+    return stats
+
+
+def ingest_files(paths: Iterable[str], knowledge: KnowledgeBase, batch_size: int = EMBED_BATCH,
+                 chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> Dict[str, Any]:
+    """複数のファイルを順に取り込み、合計の件数と処理時間を返す"""
+    started = time.perf_counter()
+    seen: set = set()
+    totals: Dict[str, Any] = {"files": 0}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            stats = ingest_stream(f, knowledge, source=os.path.basename(path), batch_size=batch_size,
+                                  chunk_chars=chunk_chars, overlap=overlap, seen=seen)
+        totals["files"] += 1
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    elapsed = time.perf_counter() - started
+    totals["embed_seconds"] = round(totals.get("embed_seconds", 0.0), 3)
+    totals["elapsed_seconds"] = round(elapsed, 3)
+    totals["entries"] = len(knowledge)
+    return totals
+
+
+# ===============================================
+# ツールから参照する実行中のナレッジ
+# ===============================================
+
+_active_knowledge: Optional[KnowledgeBase] = None
+_active_lock = threading.Lock()
+
+
+def set_active_knowledge(knowledge: Optional[KnowledgeBase]) -> None:
+    global _active_knowledge
+    with _active_lock:
+        _active_knowledge = knowledge
+
+
+def active_knowledge() -> Optional[KnowledgeBase]:
+    return _active_knowledge
@@ -0,0 +1,83 @@
+"""
+LLMクライアントプール
+同じ設定（正規化したモデル名・温度・max_tokens・ベースURLなど）のcrewai.LLMを1つだけ作成して
+エージェント間・ジョブ間で共有し、エージェントごとのHTTPクライアント生成を避ける
+（crewai.LLMのインスタンスはAgentがそのまま使うため、プールした1つを全エージェントが共有する）
+
+ジョブごとの使用量集計やイベント送信はCALLBACK_ROUTERがコンテキスト単位で振り分けるため、
+同じクライアントを複数のエージェント・ジョブで共有しても集計は混ざらない
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Callable
+
+# 常駐ワーカーで設定が増え続けても保持するクライアント数の上限（LRUで破棄）
+DEFAULT_MAX_CLIENTS = 32
+
+
+def normalize_llm_config(params: Dict[str, Any]) -> Tuple:
+    """
+    プールのキー
+    モデル名は大文字小文字と前後の空白、温度は浮動小数点の表記揺れ（0.7 と "0.70"）、
+    ベースURLは末尾のスラッシュを無視する
+    """
+    model = str(params.get("model") or "").strip().lower()
+    temperature = params.get("temperature")
+    temperature = None if temperature is None else round(float(temperature), 4)
+    max_tokens = params.get("max_tokens")
+    max_tokens = None if max_tokens in (None, "", 0) else int(max_tokens)
+    base_url = str(params.get("base_url") or "").rstrip("/")
+    # キャッシュはプロセス内で共有されるディスクキャッシュ単位で区別する
+    cache = params.get("cache")
+    cache_id = id(getattr(cache, "disk_cache", cache)) if cache is not None else None
+    return (model, temperature, max_tokens, base_url, cache_id, bool(params.get("stream")))
+
+
+class LLMPool:
+    """正規化した設定をキーにしたLLMのLRUプール（スレッドセーフ）"""
+
+    def __init__(self, factory: Callable[..., Any], max_clients: int = DEFAULT_MAX_CLIENTS):
+        self.factory = factory
+        self.max_clients = max_clients
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clients: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, params: Dict[str, Any]) -> Any:
+        key = normalize_llm_config(params)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+            self.misses += 1
+
+        client = self.factory(**params)
+
+        with self._lock:
+            # 同時に作成された場合は先に登録されたものを使う
+            existing = self._clients.get(key)
+            if existing is not None:
+                return existing
+            self._clients[key] = client
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
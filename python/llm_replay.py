@@ -0,0 +1,411 @@
+"""
+LLM記録・再生サーバー
+OpenAI互換の /v1/chat/completions を提供するローカルサーバー。実行エンジンのLLM接続先
+（CREWAI_LLM_REPLAY_URL）をこのサーバーに向けると、ライブAPIなしでクルーを実行できる
+
+    record: 上流APIへ転送し、リクエストキーとレスポンスをカセット（JSON Lines、.gzなら圧縮）に追記する
+    replay: カセットから同じリクエストのレスポンスを記録順に返す。見つからない場合は
+            --on-miss synthetic で決定的な合成レスポンス、error で404を返す
+
+レイテンシは「基本遅延 + 出力トークンあたりの遅延 ± ジッター」で模擬する。ジッターの乱数は
+シードとリクエストキー・出現回数から決めるため、並列実行でも同じ入力には同じ遅延を返す
+
+使用方法:
+    python llm_replay.py record --cassette session.jsonl.gz --upstream https://api.manus.im --api-key $KEY
+    python llm_replay.py replay --cassette session.jsonl.gz --latency 0.3 --jitter 0.05
+    CREWAI_LLM_REPLAY_URL=http://127.0.0.1:8765 python crewai_engine.py < crew.json
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Tuple
+
+CASSETTE_VERSION = 1
+
+# リクエストキーに含めるフィールド（stream・userなど結果に影響しないものは除く）
+KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "temperature", "max_tokens", "stop", "response_format")
+
+# CrewAIのエージェントがそのまま完了できる形式の合成レスポンス
+SYNTHETIC_TEMPLATE = "Thought: I now can give a great answer\nFinal Answer: {text}"
+
+
+def request_key(body: Dict[str, Any]) -> str:
+    """リクエスト本文の正規化ハッシュ"""
+    canonical = json.dumps({k: body.get(k) for k in KEY_FIELDS}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:24]
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+# ===============================================
+# カセット
+# ===============================================
+
+class Cassette:
+    """
+    記録したレスポンスの集合
+    同じキーのリクエストが複数回記録されていれば記録順に返し、使い切ったら最後のものを繰り返す
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        with _open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if entry.get("v") != CASSETTE_VERSION:
+                    continue
+                self.entries.setdefault(entry["key"], []).append(entry)
+
+    def next(self, key: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """キーに対応する次の記録と、そのキーの出現回数（0始まり）"""
+        with self._lock:
+            occurrence = self._cursors.get(key, 0)
+            self._cursors[key] = occurrence + 1
+            recorded = self.entries.get(key)
+            if not recorded:
+                return None, occurrence
+            return recorded[min(occurrence, len(recorded) - 1)], occurrence
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._cursors = {}
+
+    def append(self, key: str, response: Dict[str, Any], latency: float) -> None:
+        entry = {"v": CASSETTE_VERSION, "key": key, "latency": round(latency, 4), "response": response}
+        with self._lock:
+            self.entries.setdefault(key, []).append(entry)
+            if self.path:
+                # gzipは追記ごとに別メンバーになるが、読み込み時には連結して展開される
+                with _open(self.path, "a") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.entries.values())
+
+
+# ===============================================
+# レスポンス生成
+# ===============================================
+
+def synthetic_response(body: Dict[str, Any], key: str, tokens: int = 64) -> Dict[str, Any]:
+    """リクエストキーから決まる合成レスポンス（同じリクエストには同じ本文）"""
+    rng = random.Random(key)
+    words = " ".join(f"w{rng.randrange(10000)}" for _ in range(tokens))
+    text = SYNTHETIC_TEMPLATE.format(text=words)
+    prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages") or []) // 4
+    return {
+        "id": f"chatcmpl-replay-{key}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body.get("model", "replay"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens},
+    }
+
+
+def _stream_chunks(response: Dict[str, Any], include_usage: bool) -> List[Dict[str, Any]]:
+    """記録した完了レスポンスをストリーミング形式（chat.completion.chunk）に分割"""
+    message = response["choices"][0]["message"]
+    base = {"id": response.get("id"), "object": "chat.completion.chunk", "created": response.get("created", 0),
+            "model": response.get("model")}
+    first_delta: Dict[str, Any] = {"role": "assistant", "content": ""}
+    if message.get("tool_calls"):
+        first_delta["tool_calls"] = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+    chunks = [{**base, "choices": [{"index": 0, "delta": first_delta, "finish_reason": None}]}]
+
+    content = message.get("content") or ""
+    pieces = content.split(" ")
+    for i, piece in enumerate(pieces):
+        text = piece if i == len(pieces) - 1 else piece + " "
+        if text:
+            chunks.append({**base, "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]})
+
+    finish = response["choices"][0].get("finish_reason", "stop")
+    chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+    if include_usage and response.get("usage"):
+        chunks.append({**base, "choices": [], "usage": response["usage"]})
+    return chunks
+
+
+class LatencyModel:
+    """基本遅延 + 出力トークンあたりの遅延 ± ジッター（recorded=Trueなら記録時のレイテンシ × scale）"""
+
+    def __init__(self, base: float = 0.0, per_token: float = 0.0, jitter: float = 0.0,
+                 seed: int = 0, recorded: bool = False, scale: float = 1.0):
+        self.base = base
+        self.per_token = per_token
+        self.jitter = jitter
+        self.seed = seed
+        self.recorded = recorded
+        self.scale = scale
+
+    def delay(self, key: str, occurrence: int, completion_tokens: int, recorded: Optional[float] = None) -> float:
+        if self.recorded and recorded is not None:
+            value = recorded * self.scale
+        else:
+            value = self.base + self.per_token * completion_tokens
+        if self.jitter:
+            rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+            value += rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, value)
+
+
+# ===============================================
+# サーバー
+# ===============================================
+
+class ReplayServer:
+    """
+    記録・再生サーバー（スレッドで起動）
+    stats() はリクエスト数・ヒット数・応答中の時間の和集合（並列リクエストの重なりは1回分）を返す
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        mode: str = "replay",
+        latency: Optional[LatencyModel] = None,
+        on_miss: str = "synthetic",
+        synthetic_tokens: int = 64,
+        upstream: Optional[str] = None,
+        api_key: str = "",
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Unknown mode: {mode}")
+        if mode == "record" and not upstream:
+            raise ValueError("record mode requires an upstream URL")
+        self.cassette = cassette
+        self.mode = mode
+        self.latency = latency or LatencyModel()
+        self.on_miss = on_miss
+        self.synthetic_tokens = synthetic_tokens
+        self.upstream = (upstream or "").rstrip("/")
+        self.api_key = api_key
+        self._stats_lock = threading.Lock()
+        self._intervals: List[Tuple[float, float]] = []
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="llm-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._intervals = []
+            self.requests = self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            intervals = sorted(self._intervals)
+            requests, hits, misses = self.requests, self.hits, self.misses
+        busy = 0.0
+        current_start = current_end = None
+        for start, end in intervals:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            busy += current_end - current_start
+        return {"requests": requests, "hits": hits, "misses": misses, "busy_seconds": round(busy, 4)}
+
+    def _record_interval(self, start: float, end: float, hit: Optional[bool]) -> None:
+        with self._stats_lock:
+            self._intervals.append((start, end))
+            self.requests += 1
+            if hit is True:
+                self.hits += 1
+            elif hit is False:
+                self.misses += 1
+
+    def _forward(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """上流APIへ非ストリーミングで転送（ストリーミングは再生時に分割する）"""
+        payload = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        request = urllib.request.Request(
+            f"{self.upstream}/v1/chat/completions",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+            method="POST",
+        )
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=600) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        return data, time.perf_counter() - start
+
+    def _respond(self, body: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], float, Optional[bool]]:
+        """(レスポンス, 模擬遅延, カセットにヒットしたか)"""
+        key = request_key(body)
+        if self.mode == "record":
+            response, elapsed = self._forward(body)
+            self.cassette.append(key, response, elapsed)
+            return response, 0.0, None
+
+        entry, occurrence = self.cassette.next(key)
+        if entry is not None:
+            response = entry["response"]
+            tokens = (response.get("usage") or {}).get("completion_tokens") or 0
+            return response, self.latency.delay(key, occurrence, tokens, entry.get("latency")), True
+        if self.on_miss != "synthetic":
+            return None, 0.0, False
+        response = synthetic_response(body, key, self.synthetic_tokens)
+        return response, self.latency.delay(key, occurrence, self.synthetic_tokens), False
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") == "/v1/models":
+                    self._send_json(200, {"object": "list", "data": [{"id": "replay", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+                    return
+                start = time.perf_counter()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                hit = None
+                try:
+                    response, delay, hit = server._respond(body)
+                    if response is None:
+                        self._send_json(404, {"error": {"message": "No recorded response for request",
+                                                        "key": request_key(body)}})
+                    elif body.get("stream"):
+                        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+                        self._send_stream(_stream_chunks(response, include_usage), delay)
+                    else:
+                        time.sleep(delay)
+                        self._send_json(200, response)
+                except urllib.error.HTTPError as e:
+                    self._send_json(e.code, {"error": {"message": e.read().decode("utf-8", "replace")}})
+                finally:
+                    server._record_interval(start, time.perf_counter(), hit)
+
+            def _send_json(self, status: int, data: Dict[str, Any]):
+                payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, chunks: List[Dict[str, Any]], delay: float):
+                # 遅延の半分を最初のチャンクまで、残りをチャンク間に均等に配分する
+                first_delay = delay / 2
+                per_chunk = (delay - first_delay) / max(1, len(chunks) - 1)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                time.sleep(first_delay)
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        time.sleep(per_chunk)
+                    self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI互換のLLM記録・再生サーバー")
+    parser.add_argument("mode", choices=["record", "replay"], help="記録（上流へ転送）または再生")
+    parser.add_argument("--cassette", type=str, default=None, help="カセットファイル（.gzなら圧縮）")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--upstream", type=str, default=os.getenv("BUILT_IN_FORGE_API_URL"), help="記録時の転送先")
+    parser.add_argument("--api-key", type=str, default=os.getenv("BUILT_IN_FORGE_API_KEY", ""), help="記録時のAPIキー")
+    parser.add_argument("--latency", type=float, default=0.0, help="基本遅延（秒）")
+    parser.add_argument("--per-token", type=float, default=0.0, help="出力トークンあたりの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のジッター幅（±秒）")
+    parser.add_argument("--recorded-latency", action="store_true", help="記録時のレイテンシで再生する")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="記録時のレイテンシに掛ける係数")
+    parser.add_argument("--seed", type=int, default=0, help="ジッターの乱数シード")
+    parser.add_argument("--on-miss", choices=["synthetic", "error"], default="synthetic", help="カセットにないリクエストの扱い")
+    parser.add_argument("--synthetic-tokens", type=int, default=64, help="合成レスポンスの出力トークン数")
+    args = parser.parse_args()
+
+    if args.mode == "record" and not args.cassette:
+        parser.error("record mode requires --cassette")
+
+    server = ReplayServer(
+        Cassette(args.cassette),
+        mode=args.mode,
+        latency=LatencyModel(args.latency, args.per_token, args.jitter, args.seed,
+                             recorded=args.recorded_latency, scale=args.latency_scale),
+        on_miss=args.on_miss,
+        synthetic_tokens=args.synthetic_tokens,
+        upstream=args.upstream,
+        api_key=args.api_key,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"[Replay] {args.mode} server listening on {server.url} ({len(server.cassette)} recorded responses)",
+          file=sys.stderr, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"[Replay] {json.dumps(server.stats())}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
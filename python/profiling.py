@@ -0,0 +1,502 @@
+"""
+実行プロファイル
+ジョブの各フェーズ（エージェント・タスク・クルーの構築、kickoff、結果の整形）、タスク実行、
+エージェントの反復（LLM呼び出し）、ツール呼び出しをスパンとして記録する
+
+    with profiling.span("build_agents", "phase"):
+        ...
+
+プロファイラが有効でない場合 span() は何もしない。フェーズ別の合計は常に結果の timings に、
+スパンの一覧は crew_data の profile が有効な場合のみ結果の profile に含める。
+profile の export に "chrome" / "otel" を指定すると、Chrome トレース（chrome://tracing・Perfetto）や
+OpenTelemetry（OTLP/JSON）形式で CREWAI_PROFILE_DIR にファイルを書き出す
+
+profile の sampler に "cprofile" または "stack" を指定すると、kickoff 中のスタックを記録し、
+実行時間が slowThresholdMs 以上だった場合のみ結果とファイルに残す
+    cprofile  実行スレッドのみ。関数別の累積時間（pstats）
+    stack     全スレッドを一定間隔でサンプリング。py-spy の --format raw と同じ折りたたみ形式
+cProfile は有効にしたスレッドしか計測しないため、タスクを別スレッドで実行する場合（DAG実行・maxExecutionTime）は
+cprofile を指定しても stack に切り替え、結果の sampler.requested_mode に元の指定を残す
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextlib
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional
+
+from usage_accounting import LLMCallHandler, current_scope
+
+# エクスポート先のディレクトリ
+PROFILE_DIR = os.getenv("CREWAI_PROFILE_DIR", os.path.join("/tmp", "crewai-profiles"))
+
+# 1ジョブで保持するスパンの上限（超えた分は件数のみ数える）
+MAX_SPANS = 10000
+
+# サンプラーの既定値
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_SLOW_THRESHOLD_MS = 0
+SAMPLER_TOP = 50
+
+_profiler: ContextVar[Optional["Profiler"]] = ContextVar("crewai_profiler", default=None)
+_parent: ContextVar[Optional[int]] = ContextVar("crewai_profiler_span", default=None)
+
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def _parse_options(option: Any) -> Dict[str, Any]:
+    if not option:
+        return {}
+    if option is True:
+        return {"spans": True}
+    if isinstance(option, str):
+        return {"spans": True, "export": option}
+    return {"spans": True, **option}
+
+
+class Profiler(LLMCallHandler):
+    """1ジョブ分のスパンを記録する（スレッドセーフ）"""
+
+    def __init__(self, name: str = "crew", options: Any = None, job_id: Optional[str] = None):
+        self.name = name
+        self.job_id = job_id
+        self.options = _parse_options(options)
+        self.trace_id = uuid.uuid4().hex
+        # perf_counterの値をUNIX時刻に変換するための基準
+        self.origin = time.perf_counter()
+        self.origin_epoch = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._next_id = 0
+        self._open_llm: Dict[Any, Dict[str, Any]] = {}
+        self._iterations: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self.sampler = None
+
+    @property
+    def detailed(self) -> bool:
+        return bool(self.options.get("spans"))
+
+    def _new_span(self, name: str, category: str, start: float, attrs: Dict[str, Any],
+                  parent: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            self._next_id += 1
+            return {
+                "id": self._next_id,
+                "parent": parent,
+                "name": name,
+                "cat": category,
+                "start": start,
+                "end": None,
+                "thread": threading.get_ident(),
+                "attrs": {k: v for k, v in attrs.items() if v is not None},
+            }
+
+    def _finish(self, record: Dict[str, Any], end: float) -> None:
+        record["end"] = end
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+
+    def add_span(self, name: str, category: str, start: float, end: float, **attrs: Any) -> None:
+        """開始・終了時刻（perf_counter）が分かっている区間を記録"""
+        record = self._new_span(name, category, start, attrs, parent=_parent.get())
+        self._finish(record, end)
+
+    def add_epoch_span(self, name: str, category: str, start_epoch: float, end_epoch: float, **attrs: Any) -> None:
+        """UNIX時刻で与えられた区間を記録（親スパンは付けない）"""
+        offset = self.origin - self.origin_epoch
+        record = self._new_span(name, category, start_epoch + offset, attrs)
+        self._finish(record, end_epoch + offset)
+
+    # --- LLM呼び出し（エージェントの反復）---
+
+    def on_llm_start(self, run_id, prompts, invocation_params):
+        scope = current_scope()
+        key = (scope.get("agent"), scope.get("task"))
+        with self._lock:
+            iteration = self._iterations.get(key, 0) + 1
+            self._iterations[key] = iteration
+        record = self._new_span(
+            "llm", "llm", time.perf_counter(),
+            {"agent": key[0], "task": key[1], "iteration": iteration,
+             "model": invocation_params.get("model") or invocation_params.get("model_name")},
+            parent=_parent.get(),
+        )
+        with self._lock:
+            self._open_llm[run_id] = record
+
+    def on_llm_end(self, run_id, response):
+        with self._lock:
+            record = self._open_llm.pop(run_id, None)
+        if record is not None:
+            self._finish(record, time.perf_counter())
+
+    def on_llm_error(self, run_id, error):
+        with self._lock:
+            record = self._open_llm.pop(run_id, None)
+        if record is not None:
+            record["attrs"]["error"] = type(error).__name__
+            self._finish(record, time.perf_counter())
+
+    # --- 集計・エクスポート ---
+
+    def _completed(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s["start"])
+
+    def timings(self) -> Dict[str, Any]:
+        """フェーズ別の時間と、タスク・LLM・ツールの合計（ミリ秒）"""
+        phases: Dict[str, float] = {}
+        totals: Dict[str, Dict[str, float]] = {}
+        for record in self._completed():
+            duration = (record["end"] - record["start"]) * 1000
+            if record["cat"] == "phase":
+                phases[record["name"]] = round(phases.get(record["name"], 0.0) + duration, 3)
+            elif record["cat"] in ("task", "llm", "tool"):
+                bucket = totals.setdefault(record["cat"], {"count": 0, "ms": 0.0})
+                bucket["count"] += 1
+                bucket["ms"] += duration
+        for bucket in totals.values():
+            bucket["ms"] = round(bucket["ms"], 3)
+        return {"phases_ms": phases, **totals}
+
+    def _relative(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": record["id"],
+            "parent": record["parent"],
+            "name": record["name"],
+            "cat": record["cat"],
+            "start_ms": round((record["start"] - self.origin) * 1000, 3),
+            "duration_ms": round((record["end"] - record["start"]) * 1000, 3),
+            "thread": record["thread"],
+            **({"attrs": record["attrs"]} if record["attrs"] else {}),
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Chromeトレースイベント形式（完了イベント ph=X、マイクロ秒）"""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": self.name}}]
+        for record in self._completed():
+            events.append({
+                "name": record["name"] if record["cat"] == "phase" else f"{record['cat']}:{record['name']}",
+                "cat": record["cat"],
+                "ph": "X",
+                "ts": round((record["start"] - self.origin) * 1_000_000, 1),
+                "dur": round((record["end"] - record["start"]) * 1_000_000, 1),
+                "pid": pid,
+                "tid": record["thread"],
+                "args": record["attrs"],
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"job": self.job_id}}
+
+    def otel_trace(self) -> Dict[str, Any]:
+        """OpenTelemetryのOTLP/JSON形式（ExportTraceServiceRequest）"""
+        def span_id(value: int) -> str:
+            return f"{value:016x}"
+
+        def nanos(t: float) -> str:
+            return str(int((self.origin_epoch + t - self.origin) * 1_000_000_000))
+
+        def attributes(attrs: Dict[str, Any]) -> List[Dict[str, Any]]:
+            result = []
+            for key, value in attrs.items():
+                if isinstance(value, bool):
+                    typed = {"boolValue": value}
+                elif isinstance(value, int):
+                    typed = {"intValue": str(value)}
+                elif isinstance(value, float):
+                    typed = {"doubleValue": value}
+                else:
+                    typed = {"stringValue": str(value)}
+                result.append({"key": key, "value": typed})
+            return result
+
+        spans = []
+        for record in self._completed():
+            span = {
+                "traceId": self.trace_id,
+                "spanId": span_id(record["id"]),
+                "name": record["name"],
+                "kind": 1,
+                "startTimeUnixNano": nanos(record["start"]),
+                "endTimeUnixNano": nanos(record["end"]),
+                "attributes": attributes({"crewai.category": record["cat"], "thread.id": record["thread"],
+                                          **record["attrs"]}),
+            }
+            if record["parent"] is not None:
+                span["parentSpanId"] = span_id(record["parent"])
+            spans.append(span)
+
+        resource = {"service.name": "crewai-engine", "crewai.crew": self.name}
+        if self.job_id:
+            resource["crewai.job"] = self.job_id
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": attributes(resource)},
+                "scopeSpans": [{"scope": {"name": "crewai_engine.profiling"}, "spans": spans}],
+            }]
+        }
+
+    def export(self) -> Dict[str, str]:
+        """profile.export に指定された形式でファイルに書き出し、形式 → パスを返す"""
+        formats = self.options.get("export") or []
+        if isinstance(formats, str):
+            formats = [formats]
+        if not formats and not (self.sampler and self.sampler.kept):
+            return {}
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.join(PROFILE_DIR, f"{_safe_name(self.job_id or self.name)}-{int(self.origin_epoch * 1000)}")
+        paths = {}
+        for fmt in formats:
+            if fmt == "chrome":
+                data, path = self.chrome_trace(), stem + ".trace.json"
+            elif fmt == "otel":
+                data, path = self.otel_trace(), stem + ".otel.json"
+            else:
+                continue
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            paths[fmt] = path
+        if self.sampler is not None and self.sampler.kept:
+            paths["sampler"] = self.sampler.write(stem)
+        return paths
+
+    def report(self) -> Dict[str, Any]:
+        """結果JSONの profile"""
+        report: Dict[str, Any] = {
+            "spans": [self._relative(record) for record in self._completed()],
+            "dropped_spans": self.dropped,
+        }
+        if self.sampler is not None:
+            report["sampler"] = self.sampler.summary()
+        try:
+            exported = self.export()
+        except OSError as e:
+            report["export_error"] = str(e)
+        else:
+            if exported:
+                report["files"] = exported
+        return report
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(name))[:64]
+
+
+# ===============================================
+# スパンの記録
+# ===============================================
+
+@contextlib.contextmanager
+def activate(profiler: Profiler):
+    """このブロック内のスパン（別スレッドで実行されるCrewAIのツールイベントを含む）をprofilerに記録"""
+    token = _profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _profiler.reset(token)
+
+
+def active_profiler() -> Optional[Profiler]:
+    return _profiler.get()
+
+
+@contextlib.contextmanager
+def span(name: str, category: str = "phase", **attrs: Any):
+    """区間をスパンとして記録（フェーズ以外のスパンはprofileが有効な場合のみ）"""
+    profiler = _profiler.get()
+    if profiler is None or (category != "phase" and not profiler.detailed):
+        yield
+        return
+    record = profiler._new_span(name, category, time.perf_counter(), attrs, parent=_parent.get())
+    token = _parent.set(record["id"])
+    try:
+        yield
+    finally:
+        _parent.reset(token)
+        profiler._finish(record, time.perf_counter())
+
+
+def install_tool_hooks() -> None:
+    """
+    CrewAIのツール使用イベントからツール呼び出しのスパンを記録する（初回のみ登録）
+    イベントバスは同期ハンドラを発行元のコンテキストのコピーで実行するため、同じプロセスで並行して動くジョブでも
+    スパンはツールを呼び出したジョブのプロファイラ（activate() で設定したもの）に記録される
+    """
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        _hooks_installed = True
+    try:
+        from crewai.events import crewai_event_bus, ToolUsageFinishedEvent, ToolUsageErrorEvent
+    except ImportError:
+        return
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def _on_tool_finished(source, event):
+        profiler = _profiler.get()
+        if profiler is None or not profiler.detailed:
+            return
+        profiler.add_epoch_span(
+            event.tool_name, "tool", event.started_at.timestamp(), event.finished_at.timestamp(),
+            agent=event.agent_role, from_cache=event.from_cache,
+        )
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def _on_tool_error(source, event):
+        profiler = _profiler.get()
+        if profiler is None or not profiler.detailed:
+            return
+        now = time.time()
+        profiler.add_epoch_span(event.tool_name, "tool", now, now, agent=event.agent_role, error=str(event.error)[:200])
+
+
+# ===============================================
+# サンプリングプロファイラ
+# ===============================================
+
+class StackSampler:
+    """
+    kickoff中のスタックを記録する
+    stop() 時点で実行時間が閾値未満なら結果を破棄する（遅い実行のみ残す）
+    """
+
+    def __init__(self, mode: str = "stack", interval: float = DEFAULT_SAMPLE_INTERVAL,
+                 slow_threshold_ms: float = DEFAULT_SLOW_THRESHOLD_MS):
+        if mode not in ("stack", "cprofile"):
+            raise ValueError(f"Unknown sampler: {mode}")
+        self.mode = mode
+        self.requested_mode = mode
+        self.interval = interval
+        self.slow_threshold_ms = slow_threshold_ms
+        self.kept = False
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Dict[str, int] = {}
+        self._profile = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start = 0.0
+
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> Optional["StackSampler"]:
+        mode = options.get("sampler")
+        if not mode:
+            return None
+        return cls(
+            mode="stack" if mode is True else mode,
+            interval=float(options.get("sampleInterval", DEFAULT_SAMPLE_INTERVAL)),
+            slow_threshold_ms=float(options.get("slowThresholdMs", DEFAULT_SLOW_THRESHOLD_MS)),
+        )
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            return
+        self._thread = threading.Thread(target=self._run, name="crewai-stack-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                folded = ";".join(reversed(stack))
+                self.stacks[folded] = self.stacks.get(folded, 0) + 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if self._profile is not None:
+            self._profile.disable()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        self.kept = self.duration_ms >= self.slow_threshold_ms
+        if not self.kept:
+            self.stacks = {}
+            self._profile = None
+
+    def _top_functions(self) -> List[Dict[str, Any]]:
+        import pstats
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                "function": f"{function} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            })
+        rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+        return rows[:SAMPLER_TOP]
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            "mode": self.mode,
+            **({"requested_mode": self.requested_mode} if self.requested_mode != self.mode else {}),
+            "duration_ms": round(self.duration_ms, 3),
+            "threshold_ms": self.slow_threshold_ms,
+            "kept": self.kept,
+        }
+        if not self.kept:
+            return summary
+        if self.mode == "cprofile":
+            summary["top_functions"] = self._top_functions()
+        else:
+            summary["samples"] = self.samples
+            top = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)[:SAMPLER_TOP]
+            summary["top_stacks"] = [{"stack": stack, "count": count} for stack, count in top]
+        return summary
+
+    def write(self, stem: str) -> str:
+        """cProfileは.prof（pstats / snakeviz）、stackは.folded（flamegraph.pl / speedscope）で保存"""
+        if self.mode == "cprofile":
+            path = stem + ".prof"
+            self._profile.dump_stats(path)
+            return path
+        path = stem + ".folded"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+@contextlib.contextmanager
+def sampling(profiler: Optional[Profiler], threaded: bool = False):
+    """
+    profile.sampler が指定されていればブロック内のスタックを記録
+    threaded はブロック内の処理が別スレッドで実行される場合にTrue（cprofile を stack に切り替える）
+    """
+    sampler = StackSampler.from_options(profiler.options) if profiler is not None else None
+    if sampler is None:
+        yield
+        return
+    if threaded and sampler.mode == "cprofile":
+        print("[CrewAI] cprofile only instruments the calling thread; using the stack sampler", file=sys.stderr)
+        sampler.mode = "stack"
+    profiler.sampler = sampler
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
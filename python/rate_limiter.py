@@ -0,0 +1,431 @@
+"""
+クライアント側レートリミッター
+エージェント別・モデル別・APIキー別のトークンバケットで、1分あたりのリクエスト数（RPM）と
+トークン数（TPM）を制限する。モデル別・APIキー別のバケットの状態はファイルロック付きの共有ディレクトリに置き、
+同じマシン上のスレッド・ワーカープロセス・並列クルーの間で共有する
+エージェント別（maxRpm / maxTpm）のバケットはそのクルーの実行（RateLimiter）内だけのもので、
+同じroleのエージェントを持つ別のクルー・プロセスとは共有しない
+
+あわせて、エージェントの maxExecutionTime を実行期限（デッドライン）として扱い、
+期限を過ぎたLLM呼び出しはレート制限の待機中でも通信中でも打ち切る
+"""
+
+import os
+import time
+import asyncio
+import struct
+import hashlib
+import threading
+import contextlib
+import functools
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from usage_accounting import LLMCallHandler, UsageTracker, current_scope, estimate_tokens
+
+# 共有バケットの保存先（CREWAI_RATE_LIMIT_DIR=memory でプロセス内のみ）
+RATE_LIMIT_DIR = os.getenv(
+    "CREWAI_RATE_LIMIT_DIR",
+    os.path.join("/tmp", f"crewai-ratelimit-{os.getuid() if hasattr(os, 'getuid') else 'user'}"),
+)
+
+# APIキー単位の既定の上限（未設定なら制限しない）
+DEFAULT_KEY_RPM = int(os.getenv("CREWAI_RPM_LIMIT", "0")) or None
+DEFAULT_KEY_TPM = int(os.getenv("CREWAI_TPM_LIMIT", "0")) or None
+
+# 1回の待機の上限（他プロセスの消費状況を見直すため）
+MAX_WAIT_SLICE = 1.0
+
+
+# ===============================================
+# デッドライン
+# ===============================================
+
+class DeadlineExceeded(TimeoutError):
+    """maxExecutionTime で指定された実行期限を過ぎた"""
+    pass
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+@contextlib.contextmanager
+def llm_deadline(seconds: Optional[float]):
+    """このブロック内のLLM呼び出しに実行期限を設定（外側の期限より延ばすことはない）"""
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + float(seconds)
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """現在の期限までの残り秒数（期限がなければNone）"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("maxExecutionTime exceeded")
+
+
+def _clamp_timeout(request) -> Optional[float]:
+    """現在の期限の残り時間をリクエストのタイムアウトに反映し、期限（なければNone）を返す"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("maxExecutionTime exceeded")
+    timeout = dict(request.extensions.get("timeout") or {})
+    for name in ("connect", "read", "write", "pool"):
+        current = timeout.get(name)
+        timeout[name] = remaining if current is None else min(current, remaining)
+    request.extensions["timeout"] = timeout
+    return deadline
+
+
+@functools.lru_cache(maxsize=None)
+def deadline_interceptor():
+    """
+    crewai.LLM の interceptor として設定し、現在の期限を残り時間としてリクエストごとのタイムアウトに反映する
+    レスポンス本文（ストリーミングを含む）の読み込み中に期限を過ぎた場合も打ち切る
+    """
+    import httpx
+    from crewai.llms.hooks.base import BaseInterceptor
+
+    class _DeadlineStream(httpx.SyncByteStream):
+        def __init__(self, stream, deadline: float):
+            self._stream = stream
+            self._deadline = deadline
+
+        def __iter__(self):
+            for chunk in self._stream:
+                if time.monotonic() > self._deadline:
+                    raise DeadlineExceeded("maxExecutionTime exceeded while reading response")
+                yield chunk
+
+        def close(self):
+            self._stream.close()
+
+    class _AsyncDeadlineStream(httpx.AsyncByteStream):
+        def __init__(self, stream, deadline: float):
+            self._stream = stream
+            self._deadline = deadline
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                if time.monotonic() > self._deadline:
+                    raise DeadlineExceeded("maxExecutionTime exceeded while reading response")
+                yield chunk
+
+        async def aclose(self):
+            await self._stream.aclose()
+
+    class DeadlineInterceptor(BaseInterceptor):
+        # 送信時の期限をレスポンスに引き継ぐ（on_inbound は同じスレッド・タスクで呼ばれる）
+        def on_outbound(self, message):
+            _clamp_timeout(message)
+            return message
+
+        def on_inbound(self, message):
+            deadline = _deadline.get()
+            if deadline is not None:
+                message.stream = _DeadlineStream(message.stream, deadline)
+            return message
+
+        async def aon_outbound(self, message):
+            _clamp_timeout(message)
+            return message
+
+        async def aon_inbound(self, message):
+            deadline = _deadline.get()
+            if deadline is not None:
+                message.stream = _AsyncDeadlineStream(message.stream, deadline)
+            return message
+
+    return DeadlineInterceptor()
+
+
+# ===============================================
+# トークンバケット
+# ===============================================
+
+def _refill(tokens: float, updated: float, capacity: float, per_second: float, now: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * per_second)
+
+
+class MemoryBucketStore:
+    """プロセス内のみで共有するバケット"""
+
+    def __init__(self):
+        self._state: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, per_second: float, cost: float, now: float) -> float:
+        """cost分を消費できれば消費して0を、できなければ必要な待ち秒数を返す"""
+        with self._lock:
+            tokens, updated = self._state.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, capacity, per_second, now)
+            # 1回の消費量が容量を超える場合は満杯になるまで待ってから（負の残高で）通す
+            needed = min(cost, capacity)
+            if tokens >= needed:
+                self._state[key] = (tokens - cost, now)
+                return 0.0
+            self._state[key] = (tokens, now)
+            return (needed - tokens) / per_second
+
+    def adjust(self, key: str, capacity: float, per_second: float, delta: float, now: float) -> None:
+        """見積もりと実績の差を精算（deltaが正なら返却）"""
+        with self._lock:
+            tokens, updated = self._state.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, capacity, per_second, now)
+            self._state[key] = (min(capacity, tokens + delta), now)
+
+
+class FileBucketStore:
+    """
+    バケットごとのファイル（残量と更新時刻の2つのdouble）をflockで排他して読み書きする
+    同じディレクトリを使う全プロセスで上限を共有できる
+    """
+
+    _FORMAT = "<dd"
+
+    def __init__(self, directory: str = RATE_LIMIT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+
+    @contextlib.contextmanager
+    def _locked(self, key: str):
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _read(self, fd: int, capacity: float, now: float) -> Tuple[float, float]:
+        data = os.pread(fd, struct.calcsize(self._FORMAT), 0)
+        if len(data) != struct.calcsize(self._FORMAT):
+            return capacity, now
+        return struct.unpack(self._FORMAT, data)
+
+    def _write(self, fd: int, tokens: float, now: float) -> None:
+        os.pwrite(fd, struct.pack(self._FORMAT, tokens, now), 0)
+
+    def take(self, key: str, capacity: float, per_second: float, cost: float, now: float) -> float:
+        with self._locked(key) as fd:
+            tokens, updated = self._read(fd, capacity, now)
+            tokens = _refill(tokens, updated, capacity, per_second, now)
+            needed = min(cost, capacity)
+            if tokens >= needed:
+                self._write(fd, tokens - cost, now)
+                return 0.0
+            self._write(fd, tokens, now)
+            return (needed - tokens) / per_second
+
+    def adjust(self, key: str, capacity: float, per_second: float, delta: float, now: float) -> None:
+        with self._locked(key) as fd:
+            tokens, updated = self._read(fd, capacity, now)
+            tokens = _refill(tokens, updated, capacity, per_second, now)
+            self._write(fd, min(capacity, tokens + delta), now)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_bucket_store():
+    """共有ディレクトリのバケット（使えない環境ではプロセス内のみ）"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            if fcntl is None or RATE_LIMIT_DIR == "memory":
+                _default_store = MemoryBucketStore()
+            else:
+                try:
+                    _default_store = FileBucketStore(RATE_LIMIT_DIR)
+                except OSError:
+                    _default_store = MemoryBucketStore()
+        return _default_store
+
+
+# ===============================================
+# LLM呼び出しのレート制限
+# ===============================================
+
+def _limits(config: Optional[Dict[str, Any]]) -> Tuple[Optional[float], Optional[float]]:
+    config = config or {}
+    return config.get("rpm") or None, config.get("tpm") or None
+
+
+class RateLimiter(LLMCallHandler):
+    """
+    LLM呼び出しの直前（on_llm_start）に該当する全バケットから消費し、上限に達していれば待機する
+    TPMはプロンプトの推定トークン数とmax_tokensで予約し、完了時に実際の使用量との差を精算する
+    """
+
+    def __init__(
+        self,
+        agent_limits: Optional[Dict[str, Dict[str, Any]]] = None,
+        model_limits: Optional[Dict[str, Dict[str, Any]]] = None,
+        key_limits: Optional[Dict[str, Any]] = None,
+        api_key: str = "",
+        store=None,
+    ):
+        self.agent_limits = agent_limits or {}
+        self.model_limits = model_limits or {}
+        self.key_limits = key_limits if key_limits is not None else {"rpm": DEFAULT_KEY_RPM, "tpm": DEFAULT_KEY_TPM}
+        self.key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        self.store = store or default_bucket_store()
+        # エージェント別のバケットはこのリミッター内のみ（role名が同じ別クルーのエージェントと上限を分け合わない）
+        self.agent_store = MemoryBucketStore()
+        self.waits: Dict[str, Dict[str, float]] = {}
+        self._reserved: Dict[Any, Tuple[List[Tuple[str, float]], int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return any(any(_limits(c)) for c in [self.key_limits, *self.agent_limits.values(), *self.model_limits.values()])
+
+    def _buckets(self, model: str, agent: Optional[str]) -> List[Tuple[str, str, float]]:
+        """(バケットキー, 種別, 1分あたりの上限) の一覧"""
+        scopes = [(f"key:{self.key_id}", self.key_limits)]
+        if model in self.model_limits:
+            scopes.append((f"key:{self.key_id}:model:{model}", self.model_limits[model]))
+        if agent in self.agent_limits:
+            scopes.append((f"agent:{agent}", self.agent_limits[agent]))
+
+        buckets = []
+        for prefix, config in scopes:
+            rpm, tpm = _limits(config)
+            if rpm:
+                buckets.append((f"{prefix}:rpm", "rpm", float(rpm)))
+            if tpm:
+                buckets.append((f"{prefix}:tpm", "tpm", float(tpm)))
+        return buckets
+
+    def _store_for(self, key: str):
+        return self.agent_store if key.startswith("agent:") else self.store
+
+    def _next_wait(self, key: str, per_minute: float, cost: float) -> float:
+        """バケットから消費を試み、消費できなければ次に試すまでの待ち時間を返す（0なら消費済み）"""
+        check_deadline()
+        wait = self._store_for(key).take(key, per_minute, per_minute / 60.0, cost, time.time())
+        if wait <= 0:
+            return 0.0
+        remaining = remaining_time()
+        if remaining is not None and wait > remaining:
+            raise DeadlineExceeded(f"rate limit wait ({wait:.1f}s) exceeds maxExecutionTime")
+        return min(wait, MAX_WAIT_SLICE)
+
+    def _acquire(self, key: str, per_minute: float, cost: float) -> float:
+        """バケットから消費できるまで待機し、待った秒数を返す"""
+        waited = 0.0
+        while True:
+            wait = self._next_wait(key, per_minute, cost)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def _aacquire(self, key: str, per_minute: float, cost: float) -> float:
+        """_acquire と同じだが、イベントループを止めずに待機する"""
+        waited = 0.0
+        while True:
+            wait = self._next_wait(key, per_minute, cost)
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _requests(self, prompts, invocation_params) -> Optional[Tuple[List[Tuple[str, str, float, float]], int]]:
+        """この呼び出しで消費するバケット (キー, 種別, 1分あたりの上限, 消費量) と推定トークン数"""
+        # イベントバスで観測しただけの呼び出し（CrewAIが内部で作成したLLM）は待たせられない
+        if invocation_params.get("observed"):
+            return None
+        check_deadline()
+        model = invocation_params.get("model") or invocation_params.get("model_name") or "unknown"
+        agent = current_scope().get("agent")
+        buckets = self._buckets(model, agent)
+        if not buckets:
+            return None
+
+        estimate = sum(estimate_tokens(p) for p in prompts) + (invocation_params.get("max_tokens") or 0)
+        return [(key, kind, per_minute, 1 if kind == "rpm" else estimate)
+                for key, kind, per_minute in buckets], estimate
+
+    def _acquired(self, key: str, kind: str, per_minute: float, waited: float,
+                  tpm_buckets: List[Tuple[str, float]]) -> None:
+        """消費したバケットを記録（TPMは完了時の精算用、待機時間は集計用）"""
+        if kind == "tpm":
+            tpm_buckets.append((key, per_minute))
+        if waited:
+            with self._lock:
+                stats = self.waits.setdefault(key, {"count": 0, "seconds": 0.0})
+                stats["count"] += 1
+                stats["seconds"] += waited
+
+    def on_llm_start(self, run_id, prompts, invocation_params):
+        requests = self._requests(prompts, invocation_params)
+        if requests is None:
+            return
+        buckets, estimate = requests
+        tpm_buckets: List[Tuple[str, float]] = []
+        for key, kind, per_minute, cost in buckets:
+            self._acquired(key, kind, per_minute, self._acquire(key, per_minute, cost), tpm_buckets)
+        with self._lock:
+            self._reserved[run_id] = (tpm_buckets, estimate)
+
+    async def aon_llm_start(self, run_id, prompts, invocation_params):
+        requests = self._requests(prompts, invocation_params)
+        if requests is None:
+            return
+        buckets, estimate = requests
+        tpm_buckets: List[Tuple[str, float]] = []
+        for key, kind, per_minute, cost in buckets:
+            self._acquired(key, kind, per_minute, await self._aacquire(key, per_minute, cost), tpm_buckets)
+        with self._lock:
+            self._reserved[run_id] = (tpm_buckets, estimate)
+
+    def on_llm_end(self, run_id, response):
+        with self._lock:
+            reserved = self._reserved.pop(run_id, None)
+        if not reserved or not reserved[0]:
+            return
+        tpm_buckets, estimate = reserved
+        prompt_tokens, completion_tokens, estimated = UsageTracker._extract_usage(response, [])
+        if estimated:
+            # 実使用量が返らない場合は予約した見積もりのまま
+            return
+        actual = prompt_tokens + completion_tokens
+        now = time.time()
+        for key, per_minute in tpm_buckets:
+            self._store_for(key).adjust(key, per_minute, per_minute / 60.0, estimate - actual, now)
+
+    def on_llm_error(self, run_id, error):
+        with self._lock:
+            self._reserved.pop(run_id, None)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = {key: {"count": s["count"], "seconds": round(s["seconds"], 3)} for key, s in self.waits.items()}
+        return {
+            "waits": waits,
+            "total_wait_seconds": round(sum(s["seconds"] for s in waits.values()), 3),
+        }
@@ -0,0 +1,245 @@
+"""
+コンテンツアドレス型の結果キャッシュ
+LLM呼び出し（モデル・温度・メッセージ・ツールのハッシュ）とクルー実行全体の結果を
+SQLiteに保存し、TTLとサイズ上限付きLRUで破棄する
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "CREWAI_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "crewai-japan", "cache.sqlite3"),
+)
+
+# 名前空間
+LLM_NAMESPACE = "llm"
+CREW_NAMESPACE = "crew"
+
+
+class CacheConfigError(ValueError):
+    """クルー定義の cache 設定の形式が不正"""
+    pass
+
+
+def stable_hash(value: Any) -> str:
+    """キー順序に依存しない安定したハッシュ"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """TTLとLRU破棄付きのSQLiteキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """値を取得（期限切れの場合は削除してNone）"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+            self.hits += 1
+            return value
+
+    def set(self, namespace: str, key: str, value: bytes) -> None:
+        """値を保存し、上限を超えた分を古い順に破棄"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, len(value), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        if self.max_entries is not None:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE rowid IN "
+                    "(SELECT rowid FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+        if self.max_bytes is not None:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # アクセスが古い順に累積サイズを計算し、超過分をまとめて削除
+                excess = total - self.max_bytes
+                freed = 0
+                victims = []
+                for rowid, size in self._conn.execute("SELECT rowid, size FROM entries ORDER BY accessed_at ASC"):
+                    if freed >= excess:
+                        break
+                    victims.append((rowid,))
+                    freed += size
+                self._conn.executemany("DELETE FROM entries WHERE rowid = ?", victims)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+_caches: Dict[tuple, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_disk_cache(path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = None,
+                   max_entries: Optional[int] = None, max_bytes: Optional[int] = None) -> DiskCache:
+    """同じ設定のキャッシュはプロセス内で共有（ワーカーモードで接続を使い回す）"""
+    key = (os.path.abspath(path), ttl_seconds, max_entries, max_bytes)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DiskCache(path, ttl_seconds, max_entries, max_bytes)
+        return _caches[key]
+
+
+class LLMResultCache:
+    """
+    LLM呼び出し結果のキャッシュ（crewai_llm.TrackedLLM がツールを使わない呼び出しで使用）
+    モデル名・温度・max_tokens・停止語などの設定と、メッセージ列を合わせてハッシュ化したものをキーにする
+    """
+
+    def __init__(self, disk_cache: DiskCache):
+        self.disk_cache = disk_cache
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(params: Dict[str, Any], messages: Any) -> str:
+        return stable_hash([params, messages])
+
+    def lookup(self, key: str) -> Optional[str]:
+        value = self.disk_cache.get(LLM_NAMESPACE, key)
+        text = None
+        if value is not None:
+            try:
+                text = json.loads(value.decode("utf-8"))["text"]
+            except (ValueError, KeyError, TypeError):
+                # 互換性のない形式で保存されたエントリはミス扱い
+                text = None
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def update(self, key: str, text: str) -> None:
+        self.disk_cache.set(LLM_NAMESPACE, key, json.dumps({"text": text}, ensure_ascii=False).encode("utf-8"))
+
+    def clear(self) -> None:
+        self.disk_cache.clear(LLM_NAMESPACE)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+# クルーのハッシュに含めるフィールド（ID・タイムスタンプ等の揮発的な値は除外）
+_AGENT_KEYS = ["role", "goal", "backstory", "llmConfig", "allowDelegation", "maxIter", "tools", "memory"]
+_TASK_KEYS = ["name", "description", "expectedOutput", "context", "outputFile", "outputPydantic", "humanInput",
+              "contextBudget"]
+_CREW_KEYS = ["process", "memory", "planning", "managerLlmConfig", "inputs", "maxConcurrency", "contextBudget"]
+
+
+def crew_fingerprint(crew_data: Dict[str, Any]) -> str:
+    """エージェント・タスク・プロセス設定を正規化したクルー定義のハッシュ"""
+    normalized = {
+        "agents": [{k: a.get(k) for k in _AGENT_KEYS} for a in crew_data.get("agents", [])],
+        "tasks": [{k: t.get(k) for k in _TASK_KEYS} for t in crew_data.get("tasks", [])],
+        **{k: crew_data.get(k) for k in _CREW_KEYS},
+    }
+    return stable_hash(normalized)
+
+
+def resolve_cache_config(crew_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    クルー定義の cache 設定を正規化
+    true の場合はLLMキャッシュとクルーメモの両方を既定値で有効化する
+    例: {"cache": {"llm": true, "crew": false, "ttlSeconds": 86400, "maxBytes": 104857600}}
+    """
+    setting = crew_data.get("cache")
+    if not setting:
+        return None
+    if setting is True:
+        setting = {}
+    if not isinstance(setting, dict):
+        raise CacheConfigError(f"cache must be true/false or an object, got {setting!r}")
+    for name in ("llm", "crew"):
+        if not isinstance(setting.get(name, True), bool):
+            raise CacheConfigError(f"cache.{name} must be a boolean")
+    if not isinstance(setting.get("path", DEFAULT_CACHE_PATH), str):
+        raise CacheConfigError("cache.path must be a string")
+    for name in ("ttlSeconds", "maxEntries", "maxBytes"):
+        value = setting.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            raise CacheConfigError(f"cache.{name} must be a positive number")
+    return {
+        "llm": setting.get("llm", True),
+        "crew": setting.get("crew", True),
+        "path": setting.get("path", DEFAULT_CACHE_PATH),
+        "ttl_seconds": setting.get("ttlSeconds"),
+        "max_entries": setting.get("maxEntries"),
+        "max_bytes": setting.get("maxBytes"),
+    }
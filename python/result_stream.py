@@ -0,0 +1,145 @@
+"""
+結果ストリーミング
+タスク出力を完了した時点で、LLMのトークンを生成された時点で、それぞれチャンクフレームとして書き出す
+最終結果フレームは本文を繰り返さず、送信済みチャンクの番号を参照する
+
+フレーム形式（1行1フレームのNDJSON）:
+    {"type": "chunk", "id": "job-3", "chunk": 7, "kind": "task_output", "task": "research", "agent": "Researcher", "text": "..."}
+    {"type": "chunk", "id": "job-3", "chunk": 8, "kind": "token", "task": "write", "agent": "Writer", "text": "..."}
+"""
+
+import time
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+from usage_accounting import LLMCallHandler, current_scope
+
+# 1フレームに載せるタスク出力の最大文字数（大きな出力は複数チャンクに分割）
+RESULT_CHUNK_CHARS = 16 * 1024
+
+# トークンはこの文字数または間隔ごとにまとめて送る
+TOKEN_FLUSH_CHARS = 64
+TOKEN_FLUSH_INTERVAL = 0.1
+
+
+def split_text(text: str, size: int = RESULT_CHUNK_CHARS) -> List[str]:
+    """テキストを最大size文字ずつに分割（空文字列も1チャンクとして扱う）"""
+    if not text:
+        return [""]
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultStream(LLMCallHandler):
+    """タスク出力とLLMトークンをチャンクフレームとして送信するハンドラ"""
+
+    def __init__(
+        self,
+        write_frame: Callable[[Dict[str, Any]], None],
+        job_id: Optional[str] = None,
+        tokens: bool = True,
+        chunk_chars: int = RESULT_CHUNK_CHARS,
+    ):
+        self.write_frame = write_frame
+        self.job_id = job_id
+        self.tokens = tokens
+        self.chunk_chars = chunk_chars
+        self.task_outputs: List[Dict[str, Any]] = []
+        self.token_chunks = 0
+        self._next_chunk = 0
+        self._buffers: Dict[Any, Dict[str, Any]] = {}
+        self._sent_outputs: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def _send(self, kind: str, text: str, **labels: Optional[str]) -> int:
+        # チャンク番号の採番と書き込みを同じロックで行い、番号順にフレームを出力する
+        with self._lock:
+            self._next_chunk += 1
+            chunk_id = self._next_chunk
+            frame = {"type": "chunk", "id": self.job_id, "chunk": chunk_id, "kind": kind, "text": text}
+            frame.update({k: v for k, v in labels.items() if v is not None})
+            self.write_frame(frame)
+        return chunk_id
+
+    # ---------- タスク出力 ----------
+
+    def task_output(self, task: str, agent: Optional[str], text: str) -> List[int]:
+        """完了したタスクの出力を送信し、送信したチャンク番号を返す"""
+        chunks = [self._send("task_output", piece, task=task, agent=agent)
+                  for piece in split_text(text, self.chunk_chars)]
+        with self._lock:
+            self.task_outputs.append({"task": task, "agent": agent, "chunks": chunks, "chars": len(text)})
+            self._sent_outputs[_digest(text)] = chunks
+        return chunks
+
+    def chunks_for(self, text: str) -> Optional[List[int]]:
+        """同じ本文を送信済みのタスク出力があればそのチャンク番号（最後に完了したものを優先）"""
+        with self._lock:
+            return self._sent_outputs.get(_digest(text))
+
+    # ---------- トークン ----------
+
+    def on_llm_start(self, run_id: Any, prompts: List[str], invocation_params: Dict[str, Any]) -> None:
+        if not self.tokens:
+            return
+        scope = current_scope()
+        with self._lock:
+            self._buffers[run_id] = {
+                "text": [], "size": 0, "flushed_at": time.monotonic(),
+                "task": scope.get("task"), "agent": scope.get("agent"),
+            }
+
+    def on_llm_new_token(self, run_id: Any, token: str) -> None:
+        with self._lock:
+            buffer = self._buffers.get(run_id)
+            if buffer is None or not token:
+                return
+            buffer["text"].append(token)
+            buffer["size"] += len(token)
+            due = (buffer["size"] >= TOKEN_FLUSH_CHARS
+                   or time.monotonic() - buffer["flushed_at"] >= TOKEN_FLUSH_INTERVAL)
+        if due:
+            self._flush_tokens(run_id)
+
+    def _flush_tokens(self, run_id: Any, final: bool = False) -> None:
+        with self._lock:
+            buffer = self._buffers.pop(run_id, None) if final else self._buffers.get(run_id)
+            if buffer is None or not buffer["text"]:
+                return
+            text = "".join(buffer["text"])
+            buffer["text"], buffer["size"], buffer["flushed_at"] = [], 0, time.monotonic()
+            self.token_chunks += 1
+        self._send("token", text, task=buffer["task"], agent=buffer["agent"], run=str(run_id))
+
+    def on_llm_end(self, run_id: Any, response: Any) -> None:
+        self._flush_tokens(run_id, final=True)
+
+    def on_llm_error(self, run_id: Any, error: BaseException) -> None:
+        self._flush_tokens(run_id, final=True)
+
+    # ---------- 最終結果 ----------
+
+    def finalize(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        最終結果から本文を取り除き、チャンク番号の参照に置き換える
+        最終出力がどのタスク出力とも一致しなければ、ここで最終出力をチャンクとして送信する
+        """
+        text = result.get("result")
+        if isinstance(text, str):
+            chunks = self.chunks_for(text)
+            if chunks is None:
+                chunks = [self._send("result", piece) for piece in split_text(text, self.chunk_chars)]
+            result["result"] = None
+            result["result_chunks"] = chunks
+        # DAG実行のtask_outputsは送信済みチャンクと重複するため参照のみ残す
+        result.pop("task_outputs", None)
+        result["stream"] = {
+            "chunks": self._next_chunk,
+            "token_chunks": self.token_chunks,
+            "task_outputs": list(self.task_outputs),
+        }
+        return result
@@ -0,0 +1,197 @@
+"""context_compaction のテスト"""
+
+import os
+
+import pytest
+
+from context_compaction import (
+    CONTEXT_DIVIDER, ContextBudgetError, ContextCompactor, TokenCounter, resolve_context_budget, _allocate,
+)
+
+
+class FakeTask:
+    def __init__(self, description="Check the background files.", expected_output="A QA report", name="qa"):
+        self.description = description
+        self.expected_output = expected_output
+        self.name = name
+
+
+class FakeLLM:
+    model = "gpt-4.1-mini"
+
+    def __init__(self, reply="short summary"):
+        self.reply = reply
+        self.prompts = []
+
+    def call(self, messages):
+        self.prompts.append(messages[0]["content"])
+        return self.reply
+
+
+def _section(topic: str, sentences: int) -> str:
+    return "\n\n".join(f"{topic} item {i}: the file {topic}_{i}.png was generated at 1024x1024." for i in range(sentences))
+
+
+def _compact(strategy, context, max_tokens=120, llm=None, task=None):
+    task = task or FakeTask()
+    compactor = ContextCompactor()
+    compactor.set_budget(task, task.name, resolve_context_budget({"maxTokens": max_tokens, "strategy": strategy}))
+    return compactor, compactor.compact(task, context, llm=llm)
+
+
+def test_resolve_context_budget():
+    assert resolve_context_budget(None) is None
+    assert resolve_context_budget(500) == {"max_tokens": 500, "strategy": "truncate"}
+    default = resolve_context_budget({"maxTokens": 800, "strategy": "retrieve"})
+    # タスクの設定は省略した項目をクルーの設定から引き継ぐ
+    assert resolve_context_budget({"maxTokens": 100}, default) == {"max_tokens": 100, "strategy": "retrieve"}
+    assert resolve_context_budget(None, default) == default
+    assert resolve_context_budget(False, default) is None
+    for invalid in (0, True, "100", {"maxTokens": -1}, {"maxTokens": 10, "strategy": "drop"}):
+        with pytest.raises(ContextBudgetError):
+            resolve_context_budget(invalid)
+
+
+def test_allocate_gives_leftover_to_large_outputs():
+    assert _allocate([10, 500, 1000], 300) == [10, 145, 145]
+    assert _allocate([10, 20], 300) == [10, 20]
+    assert sum(_allocate([400, 400, 400], 100)) <= 100
+
+
+def test_truncate_fits_budget_and_keeps_both_ends():
+    counter = TokenCounter()
+    text = _section("bg", 60)
+    truncated = counter.truncate(text, 100)
+    assert counter.count(truncated) <= 100
+    assert truncated.startswith("bg item 0")
+    assert truncated.endswith(text[-10:])
+    assert "tokens omitted" in truncated
+    assert counter.truncate("short", 100) == "short"
+
+
+def test_context_within_budget_is_unchanged():
+    context = "small output" + CONTEXT_DIVIDER + "another small output"
+    compactor, compacted = _compact("truncate", context, max_tokens=1000)
+    assert compacted is context
+    assert compactor.records[0]["before_tokens"] == compactor.records[0]["after_tokens"]
+
+
+def test_tasks_without_budget_are_not_touched():
+    compactor = ContextCompactor()
+    assert not compactor
+    context = _section("bg", 100)
+    assert compactor.compact(FakeTask(), context) is context
+    assert compactor.records == []
+
+
+def test_truncate_keeps_every_upstream_output():
+    context = _section("art", 2) + CONTEXT_DIVIDER + _section("timing", 80)
+    compactor, compacted = _compact("truncate", context)
+    record = compactor.records[0]
+    assert record["after_tokens"] <= 120 < record["before_tokens"]
+    sections = compacted.split(CONTEXT_DIVIDER)
+    # 小さい上流出力はそのまま残り、大きい出力だけが中略される
+    assert sections[0] == _section("art", 2)
+    assert "tokens omitted" in sections[1]
+
+
+def test_retrieve_selects_relevant_chunks_in_order():
+    filler = "\n\n".join(f"Scene {i} uses a calm ukulele loop for the background music." for i in range(40))
+    relevant = "The background image background_scene3.png is missing its transparent layer."
+    context = filler + "\n\n" + relevant + "\n\n" + filler
+    task = FakeTask(description="Check the background image files for missing layers.")
+    compactor, compacted = _compact("retrieve", context, max_tokens=150, task=task)
+    assert relevant in compacted
+    assert compactor.records[0]["after_tokens"] <= 150
+
+
+def test_summarize_uses_llm_for_outputs_over_their_share():
+    llm = FakeLLM()
+    context = _section("small", 2) + CONTEXT_DIVIDER + _section("large", 80)
+    compactor, compacted = _compact("summarize", context, llm=llm)
+    assert len(llm.prompts) == 1
+    assert "large item 0" in llm.prompts[0] and "Check the background files." in llm.prompts[0]
+    assert compacted == _section("small", 2) + CONTEXT_DIVIDER + "short summary"
+
+
+def test_summarize_truncates_when_llm_fails():
+    class FailingLLM(FakeLLM):
+        def call(self, messages):
+            raise RuntimeError("boom")
+
+    compactor, compacted = _compact("summarize", _section("large", 80), llm=FailingLLM())
+    assert "tokens omitted" in compacted
+    assert compactor.records[0]["after_tokens"] <= 120
+
+
+def test_report_estimates_saved_latency_from_calls():
+    compactor, _ = _compact("truncate", _section("large", 80))
+    record = compactor.records[0]
+    # プロンプト1000トークンあたり0.5秒で増えるレイテンシ
+    calls = [{"task": "qa" if i % 2 else "other", "prompt_tokens": p, "completion_tokens": 50,
+              "latency": 0.2 + p * 0.0005} for i, p in enumerate([400, 800, 1200, 1600, 2000, 2400])]
+    report = compactor.report(calls)
+    task = report["tasks"][0]
+    assert task["llm_calls"] == 3
+    assert task["saved_prompt_tokens"] == (record["before_tokens"] - record["after_tokens"]) * 3
+    assert task["prompt_tokens_before"] == task["prompt_tokens_after"] + task["saved_prompt_tokens"]
+    totals = report["totals"]
+    assert totals["latency_basis"] == "fitted"
+    assert totals["seconds_per_prompt_token"] == pytest.approx(0.0005, rel=1e-3)
+    assert totals["estimated_latency_saved_s"] == pytest.approx(
+        task["saved_prompt_tokens"] * 0.0005 - totals["compaction_seconds"], abs=1e-3)
+
+    assert compactor.report()["totals"]["latency_basis"] == "default"
+
+
+def test_engine_reports_compacted_context(monkeypatch):
+    pytest.importorskip("crewai")
+    os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    import crewai_engine
+    from llm_replay import Cassette, ReplayServer
+
+    def crew(budget):
+        return {
+            "name": "compaction",
+            "verbose": False,
+            "contextBudget": budget,
+            "agents": [{"role": "Writer", "goal": "Write", "backstory": "A writer", "verbose": False}] * 3,
+            "tasks": [
+                {"name": "draft_a", "description": "Write part A.", "expectedOutput": "Text"},
+                {"name": "draft_b", "description": "Write part B.", "expectedOutput": "Text"},
+                {"name": "review", "description": "Review parts A and B.", "expectedOutput": "Review",
+                 "context": [0, 1]},
+            ],
+        }
+
+    with ReplayServer(Cassette(None), synthetic_tokens=1500) as server:
+        monkeypatch.setattr(crewai_engine, "MANUS_LLM_API_URL", server.url)
+        monkeypatch.setattr(crewai_engine, "MANUS_LLM_API_KEY", "test")
+        full = crewai_engine.CrewAIEngine().execute_crew(crew(None))
+        compacted = crewai_engine.CrewAIEngine().execute_crew(crew({"maxTokens": 300}))
+
+    assert full["success"] and compacted["success"]
+    assert "context" not in full
+    # sequentialではcontextのないタスクにも直前のタスクの出力が渡される
+    records = {record["task"]: record for record in compacted["context"]["tasks"]}
+    assert set(records) == {"draft_b", "review"}
+    record = records["review"]
+    assert record["upstream"] == 2
+    assert record["after_tokens"] <= 300 < record["before_tokens"]
+    prompt = {name: usage["prompt_tokens"] for name, usage in compacted["usage"]["by_task"].items()}
+    full_prompt = {name: usage["prompt_tokens"] for name, usage in full["usage"]["by_task"].items()}
+    assert prompt["review"] < full_prompt["review"]
+    assert compacted["context"]["totals"]["saved_prompt_tokens"] > 0
+
+
+def test_engine_rejects_invalid_budget():
+    pytest.importorskip("crewai")
+    import crewai_engine
+
+    result = crewai_engine.CrewAIEngine().execute_crew({
+        "agents": [{"role": "Writer"}],
+        "tasks": [{"description": "Write.", "contextBudget": {"maxTokens": "many"}}],
+    })
+    assert not result["success"]
+    assert "maxTokens" in result["error"]
@@ -0,0 +1,226 @@
+"""crewai_engine の非同期実行（execute_crew_async・--async-jobs ワーカー）のテスト"""
+
+import io
+import os
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("crewai")
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import crewai_engine
+from llm_replay import Cassette, LatencyModel, ReplayServer
+
+
+def _crew(name, process="sequential"):
+    return {
+        "name": name,
+        "verbose": False,
+        "process": process,
+        "agents": [{"role": f"Writer {i}", "goal": "Write", "backstory": "A writer", "verbose": False}
+                   for i in range(2)],
+        "tasks": [
+            {"name": "draft", "description": "Write a draft.", "expectedOutput": "Text"},
+            {"name": "review", "description": "Review the draft.", "expectedOutput": "Review", "context": [0]},
+        ],
+    }
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with ReplayServer(Cassette(None), synthetic_tokens=20, latency=LatencyModel(base=0.2)) as server:
+        monkeypatch.setattr(crewai_engine, "MANUS_LLM_API_URL", server.url)
+        monkeypatch.setattr(crewai_engine, "MANUS_LLM_API_KEY", "test")
+        yield server
+
+
+def test_async_result_matches_sync(server):
+    engine = crewai_engine.CrewAIEngine()
+    expected = engine.execute_crew(_crew("sync"))
+    result = asyncio.run(engine.job_engine().execute_crew_async(_crew("async")))
+
+    assert expected["success"] and result["success"]
+    assert set(result) == set(expected)
+    assert result["usage"]["totals"]["calls"] == expected["usage"]["totals"]["calls"] == 2
+    assert set(result["usage"]["by_task"]) == {"draft", "review"}
+
+
+def test_crews_share_one_event_loop(server):
+    engine = crewai_engine.CrewAIEngine()
+
+    async def run():
+        crews = [_crew(f"c{i}", "dag" if i % 2 else "sequential") for i in range(4)]
+        return await asyncio.gather(*(engine.job_engine().execute_crew_async(crew) for crew in crews))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    assert all(result["success"] for result in results), [result.get("error") for result in results]
+    assert results[1]["dag"]["levels"] == [[0], [1]]
+    # 4クルー × 2回のLLM呼び出し（各0.2秒）が重なって実行される
+    assert server.stats()["requests"] == 8
+    assert elapsed < 8 * 0.2
+
+
+def test_cancel_stops_running_crew(server):
+    engine = crewai_engine.CrewAIEngine()
+
+    async def run():
+        job = asyncio.ensure_future(engine.job_engine().execute_crew_async(_crew("cancelled")))
+        await asyncio.sleep(0.1)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+
+    asyncio.run(run())
+    time.sleep(0.3)
+    # 最初のLLM呼び出しの途中で止まり、2つ目のタスクは実行されない
+    assert server.stats()["requests"] == 1
+
+
+class _Pipe:
+    """serve_worker_async に渡す、行単位で書き込める標準入力"""
+
+    def __init__(self):
+        self._lines = []
+        self._ready = threading.Condition()
+
+    def send(self, frame):
+        with self._ready:
+            self._lines.append(json.dumps(frame) + "\n")
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self._lines.append("")
+            self._ready.notify()
+
+    def readline(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._lines)
+            return self._lines.pop(0)
+
+
+def test_async_worker_runs_and_cancels_jobs(server):
+    engine = crewai_engine.CrewAIEngine()
+    reader, writer = _Pipe(), io.StringIO()
+
+    async def run():
+        worker = asyncio.ensure_future(crewai_engine.serve_worker_async(engine, reader, writer, max_jobs=4))
+        reader.send({"type": "job", "id": "a", "crew": _crew("a")})
+        reader.send({"type": "job", "id": "b", "crew": _crew("b")})
+        reader.send({"type": "job", "id": "c", "crew": "not a crew"})
+        reader.send({"type": "ping", "id": "p"})
+        await asyncio.sleep(0.1)
+        reader.send({"type": "cancel", "id": "b"})
+        reader.send({"type": "cancel", "id": "unknown"})
+        reader.close()
+        await worker
+
+    asyncio.run(run())
+    frames = {frame["id"]: frame for frame in map(json.loads, writer.getvalue().splitlines())}
+    assert frames["a"]["type"] == "result" and frames["a"]["result"]["success"]
+    assert frames["b"] == {**frames["b"], "type": "error", "error": "Job cancelled"}
+    assert frames["c"]["type"] == "error" and "must be an object" in frames["c"]["error"]
+    assert frames["p"]["type"] == "pong"
+    assert "unknown" not in frames
+
+
+def test_tool_spans_follow_the_job_that_called_the_tool():
+    from datetime import datetime
+    from crewai.events import crewai_event_bus, ToolUsageFinishedEvent
+    import profiling
+
+    profiling.install_tool_hooks()
+
+    def tool_used(name):
+        now = datetime.now()
+        event = ToolUsageFinishedEvent(tool_name=name, tool_args={}, started_at=now, finished_at=now, output="")
+        future = crewai_event_bus.emit(None, event)
+        if future is not None:
+            future.result(timeout=5)
+
+    async def job(profiler, steps):
+        # ジョブごとのタスクで activate し、別のジョブと交互にツールを呼ぶ
+        with profiling.activate(profiler):
+            for name, delay in steps:
+                await asyncio.sleep(delay)
+                tool_used(name)
+
+    first, second = profiling.Profiler("a", True), profiling.Profiler("b", True)
+
+    async def run():
+        await asyncio.gather(job(first, [("a1", 0.01), ("a2", 0.04)]),
+                             job(second, [("b1", 0.02), ("b2", 0.08)]))
+
+    asyncio.run(run())
+    assert [s["name"] for s in first.spans if s["cat"] == "tool"] == ["a1", "a2"]
+    # 先に終わったジョブのプロファイラに、後のジョブのツール呼び出しが記録されない
+    assert [s["name"] for s in second.spans if s["cat"] == "tool"] == ["b1", "b2"]
+    tool_used("outside")
+    assert len(first.spans) == len(second.spans) == 2
+
+
+def _batch_crew(process="sequential", **options):
+    crew = _crew("batch", process)
+    crew["tasks"][0]["description"] = "Write a draft about {topic} for {audience}."
+    return {**crew, "inputs": {"audience": "kids"}, **options}
+
+
+@pytest.mark.parametrize("process", ["sequential", "dag"])
+def test_batch_runs_input_sets_concurrently(server, monkeypatch, process):
+    prompts = []
+    respond = server._respond
+
+    def recording(body):
+        prompts.append(json.dumps(body["messages"]))
+        return respond(body)
+
+    monkeypatch.setattr(server, "_respond", recording)
+    engine = crewai_engine.CrewAIEngine()
+    frames = []
+    crew = _batch_crew(process, batch=[{"topic": f"topic-{i}"} for i in range(4)], batchConcurrency=4, stream=True)
+
+    started = time.perf_counter()
+    result = engine.execute_crew(crew, write_frame=frames.append)
+    elapsed = time.perf_counter() - started
+
+    assert result["success"] and result["batch"]["succeeded"] == 4 and result["batch"]["failed"] == 0
+    assert result["usage"]["totals"]["calls"] == 8
+    assert result["batch"]["items_per_second"] > 0
+    # 入力セットは完了順に送信され、最終結果には成否のみが残る
+    assert sorted(frame["index"] for frame in frames) == [0, 1, 2, 3]
+    assert all(frame["type"] == "batch_item" and frame["result"]["success"] for frame in frames)
+    assert result["items"] == [{"index": i, "success": True} for i in range(4)]
+    # 各入力セットはcrew_dataのinputsに重ねて埋め込まれる
+    for i in range(4):
+        assert any(f"topic-{i} for kids" in prompt for prompt in prompts)
+    # 4件 × 2回のLLM呼び出し（各0.2秒）が重なって実行される
+    assert elapsed < 8 * 0.2
+
+
+def test_batch_reports_item_failures(server):
+    engine = crewai_engine.CrewAIEngine()
+    # 2件目は {topic} がなく埋め込みに失敗する
+    result = engine.execute_crew(_batch_crew(batch=[{"topic": "ok"}, {"other": "x"}], batchConcurrency=1))
+
+    assert result["success"]
+    assert result["batch"]["succeeded"] == 1 and result["batch"]["failed"] == 1
+    assert result["items"][0]["success"] and result["items"][0]["result"]
+    assert not result["items"][1]["success"] and "topic" in result["items"][1]["error"]
+    assert result["usage"]["totals"]["calls"] == 2
+
+
+@pytest.mark.parametrize("batch, message", [
+    ([], "non-empty list"),
+    (["x"], "batch[0] must be an object"),
+])
+def test_batch_rejects_invalid_input_sets(batch, message):
+    result = crewai_engine.CrewAIEngine().execute_crew(_batch_crew(batch=batch))
+    assert not result["success"] and message in result["error"]
@@ -0,0 +1,127 @@
+"""dag_scheduler のテスト"""
+
+import time
+import asyncio
+import threading
+import contextvars
+
+import pytest
+
+from dag_scheduler import CycleError, normalize_dependencies, topological_levels, critical_path, run_dag, arun_dag
+
+
+def test_normalize_dependencies_drops_invalid_references():
+    tasks = [{}, {"context": [0, 0, 1, 5, -1, "0"]}, {"context": [0, 1]}]
+    assert normalize_dependencies(tasks) == {0: [], 1: [0], 2: [0, 1]}
+
+
+def test_topological_levels_groups_independent_tasks():
+    deps = {0: [], 1: [], 2: [0, 1], 3: [0], 4: [2, 3]}
+    assert topological_levels(deps) == [[0, 1], [2, 3], [4]]
+
+
+def test_cycle_is_reported_with_its_path():
+    deps = {0: [], 1: [0, 3], 2: [1], 3: [2]}
+    with pytest.raises(CycleError) as excinfo:
+        topological_levels(deps)
+    cycle = excinfo.value.cycle
+    assert cycle[0] == cycle[-1]
+    assert set(cycle) == {1, 2, 3}
+
+
+def test_run_dag_rejects_cycles_before_running_anything():
+    calls = []
+    with pytest.raises(CycleError):
+        run_dag({0: [1], 1: [0]}, lambda node, upstream: calls.append(node))
+    assert calls == []
+
+
+def test_run_dag_passes_upstream_outputs():
+    deps = {0: [], 1: [], 2: [0, 1]}
+    outputs, report = run_dag(deps, lambda node, upstream: f"{node}<{','.join(sorted(upstream.values()))}>")
+    assert outputs[2] == "2<0<>,1<>>"
+    assert report["levels"] == [[0, 1], [2]]
+    assert set(report["task_timings"]) == {"0", "1", "2"}
+
+
+def test_run_dag_runs_independent_tasks_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def run_task(node, upstream):
+        # 3つのタスクが同時に実行されていなければタイムアウトする
+        barrier.wait()
+        return node
+
+    outputs, report = run_dag({0: [], 1: [], 2: []}, run_task, max_workers=3)
+    assert outputs == {0: 0, 1: 1, 2: 2}
+
+
+def test_run_dag_critical_path():
+    durations = {0: 0.05, 1: 0.0, 2: 0.05}
+
+    def run_task(node, upstream):
+        time.sleep(durations[node])
+        return node
+
+    _, report = run_dag({0: [], 1: [], 2: [0, 1]}, run_task, max_workers=2)
+    assert report["critical_path"] == [0, 2]
+    assert critical_path({0: [], 1: [0]}, {0: 1.0, 1: 2.0}) == ([0, 1], 3.0)
+
+
+def test_failure_stops_downstream_tasks():
+    started = []
+
+    def run_task(node, upstream):
+        started.append(node)
+        if node == 1:
+            raise RuntimeError("task 1 failed")
+        return node
+
+    with pytest.raises(RuntimeError, match="task 1 failed"):
+        run_dag({0: [], 1: [0], 2: [1], 3: [2]}, run_task, max_workers=2)
+    assert 2 not in started and 3 not in started
+
+
+def test_context_variables_reach_worker_threads():
+    scope = contextvars.ContextVar("scope", default=None)
+    token = scope.set("job-1")
+    try:
+        outputs, _ = run_dag({0: [], 1: [0]}, lambda node, upstream: (scope.get(), threading.current_thread().name))
+    finally:
+        scope.reset(token)
+    assert [value for value, _ in outputs.values()] == ["job-1", "job-1"]
+    assert all(name != threading.main_thread().name for _, name in outputs.values())
+
+
+def test_arun_dag_runs_coroutines_concurrently():
+    deps = {0: [], 1: [], 2: [0, 1]}
+    running = []
+
+    async def run_task(node, upstream):
+        running.append(node)
+        await asyncio.sleep(0.05)
+        return f"{node}<{','.join(sorted(upstream.values()))}>"
+
+    started = time.perf_counter()
+    outputs, report = asyncio.run(arun_dag(deps, run_task, max_concurrency=2))
+    assert outputs[2] == "2<0<>,1<>>"
+    assert report["levels"] == [[0, 1], [2]]
+    # 独立した0と1は同時に待機する
+    assert time.perf_counter() - started < 0.14
+
+
+def test_arun_dag_cancels_running_tasks_on_failure():
+    cancelled = []
+
+    async def run_task(node, upstream):
+        if node == 0:
+            raise RuntimeError("boom")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(node)
+            raise
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(arun_dag({0: [], 1: [], 2: [1]}, run_task))
+    assert cancelled == [1]
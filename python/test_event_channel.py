@@ -0,0 +1,150 @@
+"""event_channel のテスト"""
+
+import os
+import json
+import threading
+
+from event_channel import EventChannel
+
+
+def _read_frames(fd):
+    data = b""
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        data += chunk
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+def _read_available(fd):
+    """書き込み済みのフレームを読む（書き込み側を閉じずに読めるだけ読む）"""
+    os.set_blocking(fd, False)
+    try:
+        data = os.read(fd, 1 << 20)
+    except BlockingIOError:
+        data = b""
+    finally:
+        os.set_blocking(fd, True)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+def test_frames_are_written_in_order():
+    read_fd, write_fd = os.pipe()
+    channel = EventChannel(write_fd)
+    channel.configure(job="job-1")
+    for i in range(10):
+        channel.emit("agent_action", {"i": i})
+    channel.flush()
+    channel.close()
+    os.close(write_fd)
+
+    frames = _read_frames(read_fd)
+    os.close(read_fd)
+    assert [f["data"]["i"] for f in frames] == list(range(10))
+    assert [f["seq"] for f in frames] == list(range(1, 11))
+    assert all(f["job"] == "job-1" for f in frames)
+
+
+def test_sampling_is_deterministic():
+    read_fd, write_fd = os.pipe()
+    channel = EventChannel(write_fd)
+    channel.configure(sampling={"agent_action": 0.25})
+    for i in range(8):
+        channel.emit("agent_action", {"i": i})
+    channel.emit("crew_complete", {})
+    channel.flush()
+    assert channel.stats()["sent"] == 3
+    assert channel.stats()["sampled_out"] == {"agent_action": 6}
+    channel.close()
+    os.close(write_fd)
+    os.close(read_fd)
+
+
+def test_job_events_share_the_channel_with_their_own_job():
+    read_fd, write_fd = os.pipe()
+    channel = EventChannel(write_fd)
+    jobs = [channel.job_events(), channel.job_events()]
+    jobs[0].configure(job="job-1")
+    jobs[1].configure(sampling={"agent_action": 0.5}, job="job-2")
+    for i in range(4):
+        for job in jobs:
+            job.emit("agent_action", {"i": i})
+    channel.flush()
+    channel.close()
+    os.close(write_fd)
+
+    frames = _read_frames(read_fd)
+    os.close(read_fd)
+    # seqはチャネル全体で連番、サンプリングと統計はジョブごと
+    assert [f["seq"] for f in frames] == list(range(1, 7))
+    assert [f["job"] for f in frames].count("job-1") == 4
+    assert jobs[0].stats()["sent"] == 4
+    assert jobs[1].stats() == {"sent": 2, "dropped": {}, "sampled_out": {"agent_action": 2}}
+
+
+def test_stats_count_written_frames_per_job():
+    read_fd, write_fd = os.pipe()
+    channel = EventChannel(write_fd, max_queue=1)
+    job = channel.job_events()
+    job.configure(job="job-1")
+    # 書き込みスレッドを止めてキューを溢れさせる
+    release = threading.Event()
+    write = channel._write
+    channel._write = lambda data: (release.wait(5), write(data))[1]
+    for i in range(5):
+        job.emit("agent_action", {"i": i})
+    release.set()
+    channel.flush()
+
+    stats = channel.stats()
+    assert stats["sent"] + stats["dropped"]["agent_action"] == 5
+    assert stats["sent"] == len(_read_available(read_fd)) < 5
+    assert job.stats()["sent"] == stats["sent"]
+    assert job.stats()["dropped"] == stats["dropped"]
+
+    # 常駐ワーカーの次のジョブでは統計が0から数え直される
+    channel.configure(job="job-2")
+    channel.emit("crew_start", {})
+    channel.flush()
+    assert channel.stats() == {"sent": 1, "dropped": {}, "sampled_out": {}}
+    frames = _read_available(read_fd)
+    assert frames[0]["job"] == "job-2" and frames[0]["seq"] == 6
+    channel.close()
+    os.close(write_fd)
+    os.close(read_fd)
+
+
+def test_write_error_stops_channel_without_hanging_flush():
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    os.close(write_fd)
+    # 閉じたfdへの書き込みはEBADF（BrokenPipeError以外のOSError）
+    channel = EventChannel(write_fd)
+    channel.emit("task_complete", {})
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (channel.flush(), done.set()), daemon=True).start()
+    assert done.wait(5), "flush() hung after a write error"
+
+    channel.emit("crew_complete", {})
+    channel.flush()
+    stats = channel.stats()
+    assert "error" in stats
+    # 書き込めなかったフレームは送信済みに数えない
+    assert stats["sent"] == 0
+    assert stats["dropped"] == {"task_complete": 1, "crew_complete": 1}
+    assert channel._writer.is_alive()
+    channel.close()
+
+
+def test_from_env_ignores_invalid_fd(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    os.close(write_fd)
+    monkeypatch.setenv("CREWAI_EVENT_FD", str(write_fd))
+    assert EventChannel.from_env() is None
+    monkeypatch.setenv("CREWAI_EVENT_FD", "not-a-number")
+    assert EventChannel.from_env() is None
+    monkeypatch.delenv("CREWAI_EVENT_FD")
+    assert EventChannel.from_env() is None
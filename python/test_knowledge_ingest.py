@@ -0,0 +1,84 @@
+"""knowledge_ingest のテスト"""
+
+import io
+
+import pytest
+
+from knowledge_ingest import (
+    KnowledgeError, iter_chunks, chunk_id, open_knowledge, ingest_stream, ingest_files,
+)
+
+
+def _text(paragraphs: int) -> str:
+    return "\n\n".join(f"シーン{i}: 背景は夕焼けの街並み。BGMはアップテンポ{i}番。" * 3 for i in range(paragraphs))
+
+
+def test_chunks_cover_text_in_bounded_pieces():
+    text = _text(40)
+    chunks = list(iter_chunks(io.StringIO(text), chunk_chars=200, overlap=20, read_size=64))
+    assert all(len(chunk) <= 200 for _, chunk in chunks)
+    # 各チャンクは開始位置から元の文書の該当箇所と一致する
+    for offset, chunk in chunks:
+        assert text[offset:].lstrip().startswith(chunk)
+    # 段落の区切りを優先する
+    assert chunks[0][1].endswith("番。")
+    assert chunks[-1][1] == text[chunks[-1][0]:].strip()
+
+
+def test_chunks_do_not_depend_on_read_size():
+    text = _text(25)
+    expected = list(iter_chunks(io.StringIO(text), chunk_chars=150, overlap=10, read_size=len(text)))
+    for read_size in (1, 7, 100):
+        assert list(iter_chunks(io.StringIO(text), chunk_chars=150, overlap=10, read_size=read_size)) == expected
+
+
+def test_short_and_empty_documents():
+    assert list(iter_chunks(io.StringIO(""))) == []
+    assert list(iter_chunks(io.StringIO("  短い文書  "))) == [(0, "短い文書")]
+
+
+def test_invalid_chunk_settings():
+    with pytest.raises(KnowledgeError):
+        list(iter_chunks(io.StringIO("x"), chunk_chars=100, overlap=60))
+
+
+def test_chunk_id_ignores_whitespace():
+    assert chunk_id("a  b\nc") == chunk_id("a b c")
+    assert chunk_id("a b c") != chunk_id("a b d")
+
+
+def test_ingest_deduplicates_and_batches(tmp_path):
+    knowledge = open_knowledge(str(tmp_path / "kb"))
+    paragraph = "テロップは白文字に黒縁。ロゴは最後の3秒で表示する。"
+    text = "\n\n".join([paragraph] * 5 + [f"シーン{i}の小道具は{i}個です。" for i in range(10)])
+    # 段落ごとに1チャンクになる長さで分割し、繰り返した段落を重複として数える
+    stats = ingest_stream(io.StringIO(text), knowledge, source="direction.md", batch_size=4,
+                          chunk_chars=40, overlap=0)
+    assert stats["duplicates"] == 4
+    assert stats["embedded"] == stats["chunks"] - stats["duplicates"] == len(knowledge)
+    assert stats["batches"] == -(-stats["embedded"] // 4)
+
+
+def test_reingest_skips_existing_chunks(tmp_path):
+    path = tmp_path / "storyboard.md"
+    path.write_text(_text(20), encoding="utf-8")
+    knowledge = open_knowledge(str(tmp_path / "kb"))
+    first = ingest_files([str(path)], knowledge, chunk_chars=200, overlap=20)
+    second = ingest_files([str(path)], knowledge, chunk_chars=200, overlap=20)
+    assert first["embedded"] > 0
+    assert second["embedded"] == 0
+    assert second["existing"] == first["embedded"]
+    assert second["entries"] == first["entries"]
+
+
+def test_search_returns_source_and_offset(tmp_path):
+    story = tmp_path / "storyboard.md"
+    story.write_text("シーン1: 主人公が朝の教室で目を覚ます。\n\nシーン2: 魔法の光が爆発する。", encoding="utf-8")
+    direction = tmp_path / "direction.md"
+    direction.write_text("音楽は明るいウクレレ。効果音はポップな破裂音。", encoding="utf-8")
+    knowledge = open_knowledge(str(tmp_path / "kb"))
+    ingest_files([str(story), str(direction)], knowledge, chunk_chars=30, overlap=0)
+
+    hits = knowledge.search("ウクレレの音楽", limit=1)
+    assert hits[0]["metadata"] == {"source": "direction.md", "offset": 0}
+    assert "ウクレレ" in hits[0]["content"]
@@ -0,0 +1,168 @@
+"""rate_limiter のテスト"""
+
+import time
+import asyncio
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    MemoryBucketStore, FileBucketStore, RateLimiter, DeadlineExceeded, llm_deadline, remaining_time,
+)
+from usage_accounting import LLMResponse, llm_scope
+
+
+class FakeClock:
+    """time.time / time.sleep の代わり（sleepで時計を進める）"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "time", clock.time)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.mark.parametrize("store_factory", [MemoryBucketStore, "file"])
+def test_bucket_take_and_refill(store_factory, tmp_path):
+    store = FileBucketStore(str(tmp_path)) if store_factory == "file" else store_factory()
+    # 容量2、1秒に1回復
+    assert store.take("k", 2, 1.0, 1, now=0.0) == 0.0
+    assert store.take("k", 2, 1.0, 1, now=0.0) == 0.0
+    assert store.take("k", 2, 1.0, 1, now=0.0) == pytest.approx(1.0)
+    assert store.take("k", 2, 1.0, 1, now=0.5) == pytest.approx(0.5)
+    assert store.take("k", 2, 1.0, 1, now=1.0) == 0.0
+
+
+def test_oversized_cost_waits_for_a_full_bucket():
+    store = MemoryBucketStore()
+    assert store.take("k", 10, 1.0, 5, now=0.0) == 0.0
+    # 容量を超える消費は満杯まで待ってから負の残高で通す
+    assert store.take("k", 10, 1.0, 25, now=0.0) == pytest.approx(5.0)
+    assert store.take("k", 10, 1.0, 25, now=5.0) == 0.0
+    assert store.take("k", 10, 1.0, 1, now=5.0) == pytest.approx(16.0)
+
+
+def test_adjust_returns_unused_reservation():
+    store = MemoryBucketStore()
+    store.take("k", 100, 1.0, 80, now=0.0)
+    store.adjust("k", 100, 1.0, 50, now=0.0)
+    assert store.take("k", 100, 1.0, 70, now=0.0) == 0.0
+    # 容量を超えて返却されない
+    store.adjust("k", 100, 1.0, 1000, now=0.0)
+    assert store.take("k", 100, 1.0, 100, now=0.0) == 0.0
+    assert store.take("k", 100, 1.0, 1, now=0.0) > 0
+
+
+def test_file_buckets_are_shared_between_stores(tmp_path):
+    first = FileBucketStore(str(tmp_path))
+    second = FileBucketStore(str(tmp_path))
+    assert first.take("k", 1, 1.0, 1, now=0.0) == 0.0
+    assert second.take("k", 1, 1.0, 1, now=0.0) == pytest.approx(1.0)
+
+
+def test_rpm_limit_waits_per_agent(clock):
+    limiter = RateLimiter(agent_limits={"Writer": {"rpm": 60}}, key_limits={}, store=MemoryBucketStore())
+    assert limiter.enabled
+    with llm_scope(agent="Writer"):
+        for i in range(3):
+            limiter.on_llm_start(i, ["hi"], {"model": "m"})
+            limiter.on_llm_end(i, LLMResponse("ok"))
+    # 60rpm = 1秒に1回、容量60なので待たない
+    assert clock.slept == 0
+
+    limiter = RateLimiter(agent_limits={"Writer": {"rpm": 1}}, key_limits={}, store=MemoryBucketStore())
+    with llm_scope(agent="Writer"):
+        limiter.on_llm_start(1, ["hi"], {"model": "m"})
+        limiter.on_llm_start(2, ["hi"], {"model": "m"})
+    assert clock.slept == pytest.approx(60.0)
+    assert limiter.summary()["waits"]["agent:Writer:rpm"]["count"] == 1
+
+    # 他のエージェントには適用しない
+    with llm_scope(agent="Reviewer"):
+        limiter.on_llm_start(3, ["hi"], {"model": "m"})
+    assert clock.slept == pytest.approx(60.0)
+
+
+def test_agent_buckets_are_not_shared_between_crews(clock, tmp_path):
+    # 同じ共有ディレクトリ・同じroleでも、別のクルーのエージェントとは上限を分け合わない
+    store = FileBucketStore(str(tmp_path))
+    crews = [RateLimiter(agent_limits={"Assistant": {"rpm": 1}}, key_limits={"rpm": 60}, store=store)
+             for _ in range(2)]
+    with llm_scope(agent="Assistant"):
+        for limiter in crews:
+            limiter.on_llm_start("run", ["hi"], {"model": "m"})
+    assert clock.slept == 0
+
+    # APIキー全体の上限はクルー間で共有する
+    shared = [RateLimiter(key_limits={"rpm": 1}, store=store) for _ in range(2)]
+    for limiter in shared:
+        limiter.on_llm_start("run", ["hi"], {"model": "m"})
+    assert clock.slept == pytest.approx(60)
+    assert list(shared[1].summary()["waits"]) == [f"key:{shared[1].key_id}:rpm"]
+
+
+def test_async_wait_does_not_block_the_event_loop(clock, monkeypatch):
+    async def fake_sleep(seconds):
+        clock.now += seconds
+        clock.slept += seconds
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    limiter = RateLimiter(agent_limits={"Writer": {"rpm": 1}}, key_limits={}, store=MemoryBucketStore())
+
+    async def run():
+        with llm_scope(agent="Writer"):
+            await limiter.aon_llm_start(1, ["hi"], {"model": "m"})
+            await limiter.aon_llm_start(2, ["hi"], {"model": "m"})
+
+    asyncio.run(run())
+    assert clock.slept == pytest.approx(60.0)
+    assert limiter.summary()["waits"]["agent:Writer:rpm"]["count"] == 1
+
+
+def test_tpm_reservation_is_settled_with_actual_usage(clock):
+    store = MemoryBucketStore()
+    limiter = RateLimiter(model_limits={"m": {"tpm": 1000}}, key_limits={}, store=store)
+    limiter.on_llm_start("a", ["x" * 400], {"model": "m", "max_tokens": 500})
+    limiter.on_llm_end("a", LLMResponse("ok", usage={"prompt_tokens": 100, "completion_tokens": 50}))
+    key = f"key:{limiter.key_id}:model:m:tpm"
+    # 見積もり（プロンプト + max_tokens）との差が返却され、実使用量150だけが消費された状態
+    assert store.take(key, 1000, 1000 / 60, 850, clock.now) == 0.0
+
+
+def test_observed_calls_are_not_limited(clock):
+    limiter = RateLimiter(key_limits={"rpm": 1}, store=MemoryBucketStore())
+    for i in range(3):
+        limiter.on_llm_start(i, ["hi"], {"model": "m", "observed": True})
+    assert clock.slept == 0
+
+
+def test_wait_beyond_deadline_raises(clock):
+    limiter = RateLimiter(key_limits={"rpm": 1}, store=MemoryBucketStore())
+    limiter.on_llm_start(1, ["hi"], {"model": "m"})
+    with llm_deadline(5), pytest.raises(DeadlineExceeded):
+        limiter.on_llm_start(2, ["hi"], {"model": "m"})
+    assert clock.slept == 0
+
+
+def test_nested_deadline_never_extends_outer():
+    with llm_deadline(1):
+        with llm_deadline(100):
+            assert remaining_time() <= 1
+    assert remaining_time() is None
+    with llm_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            rate_limiter.check_deadline()
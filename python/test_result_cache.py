@@ -0,0 +1,121 @@
+"""result_cache のテスト"""
+
+import pytest
+
+import result_cache
+from result_cache import (
+    DiskCache, LLMResultCache, CacheConfigError, resolve_cache_config, crew_fingerprint, LLM_NAMESPACE,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """呼び出しごとに1秒進む時計（アクセス順を確定させる）"""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(result_cache.time, "time", tick)
+    return now
+
+
+def _cache(tmp_path, **limits):
+    return DiskCache(str(tmp_path / "cache.sqlite3"), **limits)
+
+
+def test_get_and_set(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.get("ns", "a") is None
+    cache.set("ns", "a", b"value")
+    assert cache.get("ns", "a") == b"value"
+    assert cache.get("other", "a") is None
+    assert cache.stats() == {"entries": 1, "bytes": 5, "hits": 1, "misses": 2}
+
+
+def test_ttl_expires_entries(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_seconds=10)
+    cache.set("ns", "a", b"1")
+    assert cache.get("ns", "a") == b"1"
+    clock[0] += 60
+    assert cache.get("ns", "a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_max_entries_evicts_least_recently_used(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.set("ns", "a", b"1")
+    cache.set("ns", "b", b"2")
+    # aを参照してbより新しくする
+    assert cache.get("ns", "a") == b"1"
+    cache.set("ns", "c", b"3")
+    assert cache.get("ns", "b") is None
+    assert cache.get("ns", "a") == b"1"
+    assert cache.get("ns", "c") == b"3"
+
+
+def test_max_bytes_evicts_until_under_limit(tmp_path, clock):
+    cache = _cache(tmp_path, max_bytes=10)
+    cache.set("ns", "a", b"x" * 4)
+    cache.set("ns", "b", b"x" * 4)
+    cache.set("ns", "c", b"x" * 4)
+    stats = cache.stats()
+    assert stats["bytes"] <= 10
+    assert cache.get("ns", "a") is None
+    assert cache.get("ns", "c") == b"x" * 4
+
+
+def test_clear_namespace(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("llm", "a", b"1")
+    cache.set("crew", "a", b"1")
+    cache.clear("llm")
+    assert cache.get("llm", "a") is None
+    assert cache.get("crew", "a") == b"1"
+
+
+def test_llm_result_cache_round_trip(tmp_path):
+    disk = _cache(tmp_path)
+    cache = LLMResultCache(disk)
+    key = cache.key({"model": "m", "temperature": 0}, [{"role": "user", "content": "hi"}])
+    assert key != cache.key({"model": "m", "temperature": 0.7}, [{"role": "user", "content": "hi"}])
+    assert cache.lookup(key) is None
+    cache.update(key, "こんにちは")
+    assert cache.lookup(key) == "こんにちは"
+    # 旧形式などで読めないエントリはミス扱い
+    disk.set(LLM_NAMESPACE, "broken", b"\x80not json")
+    assert cache.lookup("broken") is None
+    assert cache.stats() == {"hits": 1, "misses": 2}
+
+
+def test_crew_fingerprint_ignores_volatile_fields():
+    crew = {"agents": [{"role": "Writer", "id": 1}], "tasks": [{"description": "d", "id": 2}], "process": "dag"}
+    same = {"agents": [{"role": "Writer", "id": 9}], "tasks": [{"description": "d", "id": 8}], "process": "dag"}
+    changed = {**crew, "tasks": [{"description": "other"}]}
+    assert crew_fingerprint(crew) == crew_fingerprint(same)
+    assert crew_fingerprint(crew) != crew_fingerprint(changed)
+
+
+def test_resolve_cache_config():
+    assert resolve_cache_config({}) is None
+    assert resolve_cache_config({"cache": False}) is None
+    config = resolve_cache_config({"cache": True})
+    assert config["llm"] and config["crew"]
+    config = resolve_cache_config({"cache": {"crew": False, "ttlSeconds": 60}})
+    assert config["llm"] and not config["crew"]
+    assert config["ttl_seconds"] == 60
+
+
+@pytest.mark.parametrize("setting", [
+    "on",
+    [1],
+    {"llm": "yes"},
+    {"path": 3},
+    {"ttlSeconds": "1d"},
+    {"maxEntries": 0},
+    {"maxBytes": True},
+])
+def test_resolve_cache_config_rejects_invalid_settings(setting):
+    with pytest.raises(CacheConfigError):
+        resolve_cache_config({"cache": setting})
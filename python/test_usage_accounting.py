@@ -0,0 +1,132 @@
+"""usage_accounting / crewai_llm のテスト（記録・再生サーバーを相手に実際のCrewAI Agentを実行する）"""
+
+import os
+import time
+
+import pytest
+
+pytest.importorskip("crewai")
+
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from llm_replay import Cassette, ReplayServer
+from usage_accounting import UsageTracker, active_handlers, llm_scope, install_llm_hooks
+from crewai_llm import create_tracked_llm
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ReplayServer(Cassette(None), synthetic_tokens=16).start()
+    yield server
+    server.stop()
+
+
+def _llm(server):
+    return create_tracked_llm(model="gpt-4.1-mini", base_url=f"{server.url}/v1", api_key="test", temperature=0)
+
+
+def test_agent_calls_are_tracked_per_scope(server):
+    from crewai import Agent, Task, Crew
+
+    llm = _llm(server)
+    agent = Agent(role="Writer", goal="Write", backstory="A writer", llm=llm, verbose=False)
+    # Agentに渡したLLMが作り直されていないこと（作り直されるとコールバックが失われる）
+    assert agent.llm is llm
+
+    task = Task(description="Write one sentence.", expected_output="A sentence", agent=agent)
+    tracker = UsageTracker()
+    server.reset_stats()
+    with active_handlers(tracker), llm_scope(agent="Writer", task="draft"):
+        Crew(agents=[agent], tasks=[task], verbose=False).kickoff()
+
+    assert server.stats()["requests"] >= 1
+    assert len(tracker.calls) == server.stats()["requests"]
+    call = tracker.calls[0]
+    assert call["agent"] == "Writer" and call["task"] == "draft"
+    assert call["model"] == "gpt-4.1-mini"
+    # 再生サーバーが返した使用量（推定値ではない）
+    assert call["completion_tokens"] == 16
+    assert not call["estimated"]
+    assert tracker.summary()["totals"]["cost"] > 0
+
+
+def test_calls_outside_active_handlers_are_not_recorded(server):
+    tracker = UsageTracker()
+    _llm(server).call("hello")
+    assert tracker.calls == []
+
+
+def test_untracked_llm_is_observed_through_event_bus(server):
+    from crewai import LLM
+
+    install_llm_hooks()
+    llm = LLM(model="gpt-4.1-mini", base_url=f"{server.url}/v1", api_key="test")
+    tracker = UsageTracker(default_agent="planner")
+    with active_handlers(tracker):
+        llm.call("plan the work")
+
+    # イベントバスの同期ハンドラはスレッドプールで実行される
+    deadline = time.monotonic() + 5
+    while not tracker.calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(tracker.calls) == 1
+    assert tracker.calls[0]["agent"] == "planner"
+    assert tracker.calls[0]["estimated"]
+
+
+def test_handler_error_on_start_aborts_call(server):
+    class Reject(UsageTracker):
+        def on_llm_start(self, run_id, prompts, invocation_params):
+            raise TimeoutError("over budget")
+
+    tracker = UsageTracker()
+    server.reset_stats()
+    with active_handlers(Reject(), tracker), pytest.raises(TimeoutError):
+        _llm(server).call("hello")
+    assert server.stats()["requests"] == 0
+
+
+def test_result_cache_serves_repeated_calls(server, tmp_path):
+    from result_cache import DiskCache, LLMResultCache
+
+    cache = LLMResultCache(DiskCache(str(tmp_path / "cache.sqlite")))
+    llm = create_tracked_llm(model="gpt-4.1-mini", base_url=f"{server.url}/v1", api_key="test",
+                             temperature=0, cache=cache)
+    tracker = UsageTracker()
+    server.reset_stats()
+    with active_handlers(tracker):
+        first = llm.call("hello")
+        second = llm.call("hello")
+    assert first == second
+    assert server.stats()["requests"] == 1
+    assert len(tracker.calls) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_stream_chunks_are_forwarded_as_tokens(server):
+    class Tokens(UsageTracker):
+        def __init__(self):
+            super().__init__()
+            self.tokens = []
+            self.run_ids = []
+
+        def on_llm_start(self, run_id, prompts, invocation_params):
+            self.run_ids.append(run_id)
+            super().on_llm_start(run_id, prompts, invocation_params)
+
+        def on_llm_new_token(self, run_id, token):
+            self.tokens.append((run_id, token))
+
+    install_llm_hooks()
+    llm = create_tracked_llm(model="gpt-4.1-mini", base_url=f"{server.url}/v1", api_key="test",
+                             temperature=0, stream=True)
+    handler = Tokens()
+    with active_handlers(handler):
+        text = llm.call("hello")
+
+    assert "".join(token for _, token in handler.tokens) == text
+    # トークンは呼び出しと同じrun_idで届き、使用量はストリームの最後のチャンクから取得する
+    assert {run_id for run_id, _ in handler.tokens} == set(handler.run_ids)
+    assert handler.calls[0]["completion_tokens"] == 16
+    assert not handler.calls[0]["estimated"]
@@ -0,0 +1,445 @@
+"""
+LLM使用量アカウンティング
+各LLM呼び出しから実際のプロンプト/完了トークン数とレイテンシを取得し、
+エージェント別・タスク別・モデル別に集計して価格表からコストを算出する
+
+エンジンが作成するLLM（crewai_llm.TrackedLLM）は呼び出し元のスレッドでCALLBACK_ROUTERへ通知する。
+CrewAIが内部で作成するLLM（計画用LLMなど）の呼び出しは、install_llm_hooks() で登録する
+CrewAIのイベントバス（LLMCallStartedEvent / LLMCallCompletedEvent / LLMCallFailedEvent）から通知する
+"""
+
+import re
+import time
+import functools
+import uuid
+import threading
+import contextlib
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# 価格表（USD / 100万トークン）
+DEFAULT_PRICE_TABLE: Dict[str, Dict[str, float]] = {
+    "gpt-4.1": {"prompt": 2.00, "completion": 8.00},
+    "gpt-4.1-mini": {"prompt": 0.40, "completion": 1.60},
+    "gpt-4.1-nano": {"prompt": 0.10, "completion": 0.40},
+    "gpt-4o": {"prompt": 2.50, "completion": 10.00},
+    "gpt-4o-mini": {"prompt": 0.15, "completion": 0.60},
+}
+
+# レイテンシヒストグラムの境界（秒）
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60]
+
+
+# ===============================================
+# 呼び出しスコープとハンドラのルーティング
+# ===============================================
+
+_scope: ContextVar[Dict[str, str]] = ContextVar("llm_scope", default={})
+_active_handlers: ContextVar[Tuple["LLMCallHandler", ...]] = ContextVar("llm_active_handlers", default=())
+# 呼び出し元のスレッドで通知中の呼び出し（イベントバスからの二重通知を防ぐ）
+_tracked_call: ContextVar[Optional["TrackedCall"]] = ContextVar("llm_tracked_call", default=None)
+
+
+@contextlib.contextmanager
+def llm_scope(**labels: Optional[str]):
+    """このブロック内のLLM呼び出しにエージェント名・タスク名などのラベルを付与"""
+    merged = {**_scope.get(), **{k: v for k, v in labels.items() if v is not None}}
+    token = _scope.set(merged)
+    try:
+        yield merged
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Dict[str, str]:
+    """現在のLLM呼び出しスコープ"""
+    return _scope.get()
+
+
+@contextlib.contextmanager
+def active_handlers(*handlers: "LLMCallHandler"):
+    """このブロック内のLLM呼び出しを指定ハンドラへ転送する"""
+    token = _active_handlers.set(_active_handlers.get() + handlers)
+    try:
+        yield
+    finally:
+        _active_handlers.reset(token)
+
+
+class LLMResponse:
+    """ハンドラの on_llm_end に渡すLLM呼び出しの結果"""
+
+    def __init__(self, text: str, model: Optional[str] = None, usage: Optional[Dict[str, Any]] = None):
+        self.text = text
+        self.model = model
+        # APIが返した使用量（prompt_tokens / completion_tokens）。返らなかった場合はNone
+        self.usage = usage
+
+
+class LLMCallHandler:
+    """LLM呼び出しイベントを受け取るハンドラの基底クラス"""
+
+    def on_llm_start(self, run_id: Any, prompts: List[str], invocation_params: Dict[str, Any]) -> None:
+        pass
+
+    async def aon_llm_start(self, run_id: Any, prompts: List[str], invocation_params: Dict[str, Any]) -> None:
+        """非同期の呼び出し（TrackedLLM.acall）の開始。待機するハンドラはイベントループを止めないよう上書きする"""
+        self.on_llm_start(run_id, prompts, invocation_params)
+
+    def on_llm_new_token(self, run_id: Any, token: str) -> None:
+        pass
+
+    def on_llm_end(self, run_id: Any, response: Any) -> None:
+        pass
+
+    def on_llm_error(self, run_id: Any, error: BaseException) -> None:
+        pass
+
+
+class CallbackRouter(LLMCallHandler):
+    """
+    LLM呼び出しイベントを、現在のコンテキストで有効なハンドラへ転送する
+    LLMクライアントを共有したまま、ジョブごとに集計先を切り替えるために使用
+    """
+
+    def _handlers(self) -> Tuple[LLMCallHandler, ...]:
+        return _active_handlers.get()
+
+    def on_llm_start(self, run_id, prompts, invocation_params):
+        for handler in self._handlers():
+            handler.on_llm_start(run_id, prompts, invocation_params)
+
+    async def aon_llm_start(self, run_id, prompts, invocation_params):
+        for handler in self._handlers():
+            await handler.aon_llm_start(run_id, prompts, invocation_params)
+
+    def on_llm_new_token(self, run_id, token):
+        for handler in self._handlers():
+            handler.on_llm_new_token(run_id, token)
+
+    def on_llm_end(self, run_id, response):
+        for handler in self._handlers():
+            handler.on_llm_end(run_id, response)
+
+    def on_llm_error(self, run_id, error):
+        for handler in self._handlers():
+            handler.on_llm_error(run_id, error)
+
+
+# 全LLM呼び出しの通知先
+CALLBACK_ROUTER = CallbackRouter()
+
+
+def messages_text(messages: Any) -> str:
+    """CrewAIのメッセージ列（文字列または role / content の辞書のリスト）をプロンプト文字列にする"""
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for message in messages or []:
+        content = message.get("content") if isinstance(message, dict) else message
+        if isinstance(content, list):
+            # マルチモーダルのメッセージはテキスト部分のみ
+            content = "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+class TrackedCall:
+    """
+    呼び出し元のスレッドでハンドラへ通知する1回のLLM呼び出し（crewai_llm.TrackedLLM が使用）
+    with ブロック内でCrewAIが発行するイベントはこの呼び出しのものとして扱う
+    """
+
+    def __init__(self, model: str, messages: Any, invocation_params: Dict[str, Any]):
+        self.run_id = uuid.uuid4()
+        self.model = model
+        self.prompts = [messages_text(messages)]
+        self.invocation_params = {"model": model, **invocation_params}
+        # LLMがAPIのレスポンスから取得した使用量
+        self.usage: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> "TrackedCall":
+        self._token = _tracked_call.set(self)
+        try:
+            CALLBACK_ROUTER.on_llm_start(self.run_id, self.prompts, self.invocation_params)
+        except BaseException as e:
+            # レートリミッターのデッドライン超過など。開始を受け取ったハンドラの状態を破棄する
+            CALLBACK_ROUTER.on_llm_error(self.run_id, e)
+            _tracked_call.reset(self._token)
+            raise
+        return self
+
+    async def __aenter__(self) -> "TrackedCall":
+        # レートリミッターの待機をイベントループ上で行う（キャンセルも開始前のエラーとして扱う）
+        self._token = _tracked_call.set(self)
+        try:
+            await CALLBACK_ROUTER.aon_llm_start(self.run_id, self.prompts, self.invocation_params)
+        except BaseException as e:
+            CALLBACK_ROUTER.on_llm_error(self.run_id, e)
+            _tracked_call.reset(self._token)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc is not None:
+                CALLBACK_ROUTER.on_llm_error(self.run_id, exc)
+        finally:
+            _tracked_call.reset(self._token)
+
+    def finish(self, result: Any) -> None:
+        text = result if isinstance(result, str) else str(result)
+        CALLBACK_ROUTER.on_llm_end(self.run_id, LLMResponse(text, self.model, self.usage))
+
+
+def current_tracked_call() -> Optional[TrackedCall]:
+    return _tracked_call.get()
+
+
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def install_llm_hooks() -> None:
+    """
+    CrewAIのLLMイベントをCALLBACK_ROUTERへ転送する（初回のみ登録）
+    イベントバスは同期ハンドラを発行元のコンテキストのコピーで実行するため、スコープと有効なハンドラはそのまま使える。
+    TrackedLLMの呼び出しは呼び出し元で通知済みのため無視する（ストリーミングのチャンクはTrackedLLMの呼び出しにも転送する）
+    """
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        _hooks_installed = True
+    from crewai.events import crewai_event_bus
+    from crewai.events.types.llm_events import (
+        LLMCallStartedEvent, LLMCallCompletedEvent, LLMCallFailedEvent, LLMStreamChunkEvent
+    )
+
+    def run_id_for(source, event):
+        tracked = _tracked_call.get()
+        if tracked is not None:
+            return tracked.run_id
+        return ("event", id(source), event.agent_id, event.task_id)
+
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def _on_started(source, event):
+        if _tracked_call.get() is not None:
+            return
+        model = event.model or getattr(source, "model", None)
+        CALLBACK_ROUTER.on_llm_start(run_id_for(source, event), [messages_text(event.messages)],
+                                     {"model": model, "observed": True})
+
+    @crewai_event_bus.on(LLMCallCompletedEvent)
+    def _on_completed(source, event):
+        if _tracked_call.get() is not None:
+            return
+        model = event.model or getattr(source, "model", None)
+        CALLBACK_ROUTER.on_llm_end(run_id_for(source, event), LLMResponse(str(event.response or ""), model))
+
+    @crewai_event_bus.on(LLMCallFailedEvent)
+    def _on_failed(source, event):
+        if _tracked_call.get() is not None:
+            return
+        CALLBACK_ROUTER.on_llm_error(run_id_for(source, event), RuntimeError(event.error))
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _on_stream_chunk(source, event):
+        # ツール呼び出しの引数のチャンクは本文ではないため送らない
+        if event.chunk and event.tool_call is None:
+            CALLBACK_ROUTER.on_llm_new_token(run_id_for(source, event), event.chunk)
+
+
+# ===============================================
+# トークン数の推定（使用量メタデータがない場合のフォールバック）
+# ===============================================
+
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+@functools.lru_cache(maxsize=None)
+def token_encoding(model: str = ""):
+    """
+    モデルのtiktokenエンコーダ（不明なモデルは o200k_base）
+    tiktokenがない場合や、オフラインでエンコーダのファイルを取得できない場合はNone（プロセス内で1回だけ試す）
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        pass
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str, model: str = "") -> int:
+    """
+    トークン数を推定する
+    tiktokenのエンコーダが使えれば実際のトークン数、使えなければ日本語などの
+    CJK文字は1文字1トークン、それ以外は4文字1トークンとして概算する
+    """
+    if not text:
+        return 0
+    encoding = token_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + max(0, len(text) - cjk) // 4
+
+
+# ===============================================
+# 使用量トラッカー
+# ===============================================
+
+def _empty_bucket() -> Dict[str, Any]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class UsageTracker(LLMCallHandler):
+    """1回のクルー実行におけるLLM使用量を記録・集計する"""
+
+    def __init__(self, price_table: Optional[Dict[str, Dict[str, float]]] = None,
+                 default_agent: str = "(unscoped)"):
+        self.price_table = {**DEFAULT_PRICE_TABLE, **(price_table or {})}
+        self.default_agent = default_agent
+        self.calls: List[Dict[str, Any]] = []
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def price_for(self, model: str) -> Optional[Dict[str, float]]:
+        """モデル名から価格を取得（完全一致 → 最長前方一致）"""
+        if model in self.price_table:
+            return self.price_table[model]
+        candidates = [name for name in self.price_table if model.startswith(name)]
+        if candidates:
+            return self.price_table[max(candidates, key=len)]
+        return None
+
+    def on_llm_start(self, run_id, prompts, invocation_params):
+        scope = current_scope()
+        with self._lock:
+            self._pending[run_id] = {
+                "start": time.perf_counter(),
+                "prompts": prompts,
+                "model": invocation_params.get("model") or invocation_params.get("model_name"),
+                "agent": scope.get("agent", self.default_agent),
+                "task": scope.get("task", "(unscoped)"),
+            }
+
+    def on_llm_end(self, run_id, response):
+        with self._lock:
+            pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+
+        model = getattr(response, "model", None) or pending["model"] or "unknown"
+        prompt_tokens, completion_tokens, estimated = self._extract_usage(response, pending["prompts"])
+
+        price = self.price_for(model)
+        cost = 0.0
+        if price:
+            cost = (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1_000_000
+
+        record = {
+            "model": model,
+            "agent": pending["agent"],
+            "task": pending["task"],
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency": time.perf_counter() - pending["start"],
+            "cost": cost,
+            "estimated": estimated,
+            "priced": price is not None,
+        }
+        with self._lock:
+            self.calls.append(record)
+
+    def on_llm_error(self, run_id, error):
+        with self._lock:
+            self._pending.pop(run_id, None)
+
+    @staticmethod
+    def _extract_usage(response: Any, prompts: List[str]) -> Tuple[int, int, bool]:
+        """レスポンスから実トークン数を取得（なければ推定値）"""
+        usage = getattr(response, "usage", None) or {}
+        if usage.get("prompt_tokens") is not None:
+            return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0, False
+        prompt_tokens = sum(estimate_tokens(p) for p in prompts)
+        completion_tokens = estimate_tokens(getattr(response, "text", "") or "")
+        return prompt_tokens, completion_tokens, True
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(c["prompt_tokens"] + c["completion_tokens"] for c in self.calls)
+
+    @property
+    def total_cost(self) -> float:
+        return sum(c["cost"] for c in self.calls)
+
+    def summary(self) -> Dict[str, Any]:
+        """エージェント別・タスク別・モデル別の集計とレイテンシヒストグラム"""
+        with self._lock:
+            calls = list(self.calls)
+
+        totals = _empty_bucket()
+        groups: Dict[str, Dict[str, Dict[str, Any]]] = {"by_agent": {}, "by_task": {}, "by_model": {}}
+        latencies: Dict[str, List[float]] = {}
+
+        for call in calls:
+            buckets = [
+                totals,
+                groups["by_agent"].setdefault(call["agent"], _empty_bucket()),
+                groups["by_task"].setdefault(call["task"], _empty_bucket()),
+                groups["by_model"].setdefault(call["model"], _empty_bucket()),
+            ]
+            for bucket in buckets:
+                bucket["calls"] += 1
+                bucket["prompt_tokens"] += call["prompt_tokens"]
+                bucket["completion_tokens"] += call["completion_tokens"]
+                bucket["total_tokens"] += call["prompt_tokens"] + call["completion_tokens"]
+                bucket["cost"] += call["cost"]
+            latencies.setdefault(call["model"], []).append(call["latency"])
+
+        for bucket in [totals] + [b for group in groups.values() for b in group.values()]:
+            bucket["cost"] = round(bucket["cost"], 6)
+
+        return {
+            "source": "llm_callbacks",
+            "totals": totals,
+            **groups,
+            "latency": {model: self._latency_stats(values) for model, values in latencies.items()},
+            "estimated_calls": sum(1 for c in calls if c["estimated"]),
+            "unpriced_models": sorted({c["model"] for c in calls if not c["priced"]}),
+        }
+
+    @staticmethod
+    def _latency_stats(values: List[float]) -> Dict[str, Any]:
+        histogram = {}
+        lower = float("-inf")
+        for bound in LATENCY_BUCKETS:
+            histogram[f"<={bound}s"] = sum(1 for v in values if lower < v <= bound)
+            lower = bound
+        histogram[f">{LATENCY_BUCKETS[-1]}s"] = sum(1 for v in values if v > LATENCY_BUCKETS[-1])
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "p50": round(_percentile(values, 50), 3),
+            "p95": round(_percentile(values, 95), 3),
+            "max": round(max(values), 3),
+            "histogram": histogram,
+        }
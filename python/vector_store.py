@@ -0,0 +1,615 @@
+"""
+ローカルベクトルストア
+クルーの memory（短期記憶・エンティティ記憶）とナレッジを保存する永続ベクトルインデックス。
+同じクルーの実行間（常駐ワーカーではジョブ間、複数ワーカーではプロセス間）で共有する
+
+ディレクトリ構成（CREWAI_MEMORY_DIR/<クルー>/<種別>/）:
+    vectors.f32   ベクトル本体（float32、行 = スロット）。np.memmap で読み書きする
+    assign.i32    スロットが属するIVFリスト番号（-1 = 未割り当て）
+    centroids.npy IVFの重心
+    index.sqlite  スロット → ID・本文・メタデータ・最終アクセス時刻
+    lock          書き込み時のプロセス間ロック
+
+件数が IVF_MIN_ENTRIES 未満の間は全件探索、それ以上はk-meansで分割したIVF（転置リスト）で
+近いリストだけを探索する。件数が学習時の2倍になったら再学習する。
+件数が max_entries を超えたら最終アクセスが古いものから削除し、空いたスロットを再利用する
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import contextlib
+import functools
+import urllib.request
+from typing import List, Dict, Any, Optional, Sequence, Set
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 保存先（クルーごとにサブディレクトリを作成）
+MEMORY_DIR = os.getenv("CREWAI_MEMORY_DIR", os.path.join(os.path.expanduser("~"), ".cache", "crewai-memory"))
+
+DEFAULT_DIM = 384
+DEFAULT_MAX_ENTRIES = int(os.getenv("CREWAI_MEMORY_MAX_ENTRIES", "100000"))
+
+# 全件探索からIVFに切り替える件数と、検索時に探索するリスト数
+IVF_MIN_ENTRIES = 20000
+IVF_NPROBE = 16
+
+# 埋め込みをまとめて計算・書き込みする件数
+EMBED_BATCH = 64
+
+# ベクトルファイルを拡張するときの最小行数
+_GROW_ROWS = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    slot INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    content TEXT,
+    metadata TEXT,
+    created REAL,
+    accessed REAL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class VectorStoreError(ValueError):
+    """インデックスの次元・埋め込みモデルが保存済みのものと一致しない"""
+    pass
+
+
+# ===============================================
+# 埋め込み
+# ===============================================
+
+_TOKEN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]|[^\W_]+", re.UNICODE)
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+@functools.lru_cache(maxsize=200000)
+def _feature_slot(feature: str, dim: int):
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """
+    外部APIを使わない決定的な埋め込み（特徴量ハッシング）
+    英数字は単語、日本語などのCJK文字は1文字と2文字の組を特徴量にする
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        features = list(tokens)
+        cjk = [_CJK_PATTERN.match(token) is not None for token in tokens]
+        for i in range(len(tokens) - 1):
+            if cjk[i] and cjk[i + 1]:
+                features.append(tokens[i] + tokens[i + 1])
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # バッチ全体の (行, 次元) ごとの符号をまとめて集計する
+        positions: List[int] = []
+        signs: List[float] = []
+        for row, text in enumerate(texts):
+            base = row * self.dim
+            for feature in self._features(text):
+                index, sign = _feature_slot(feature, self.dim)
+                positions.append(base + index)
+                signs.append(sign)
+        vectors = np.bincount(np.asarray(positions, dtype=np.intp), weights=np.asarray(signs),
+                              minlength=len(texts) * self.dim)
+        return _normalize(vectors.reshape(len(texts), self.dim).astype(np.float32))
+
+
+class OpenAIEmbedder:
+    """OpenAI互換の /v1/embeddings を使う埋め込み（batch_size件ずつまとめて要求）"""
+
+    def __init__(self, model: str, base_url: str, api_key: str = "", batch_size: int = EMBED_BATCH,
+                 dim: Optional[int] = None):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.dim = dim
+        self.name = f"openai-{model}"
+
+    def _request(self, texts: Sequence[str]) -> List[List[float]]:
+        request = urllib.request.Request(
+            f"{self.base_url}/embeddings",
+            data=json.dumps({"model": self.model, "input": list(texts)}).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            data = json.loads(response.read().decode("utf-8"))["data"]
+        return [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            rows.extend(self._request(texts[start:start + self.batch_size]))
+        vectors = np.asarray(rows, dtype=np.float32).reshape(len(texts), -1)
+        self.dim = vectors.shape[1] if len(texts) else self.dim
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def create_embedder(config: Optional[Dict[str, Any]] = None, base_url: str = "", api_key: str = ""):
+    """
+    memoryConfig.embedder から埋め込みを作成
+    例: {"provider": "openai", "model": "text-embedding-3-small"} / {"provider": "hashing", "dim": 384}
+    """
+    config = config or {}
+    if config.get("provider") == "openai":
+        return OpenAIEmbedder(
+            config.get("model", "text-embedding-3-small"),
+            config.get("baseUrl") or base_url,
+            api_key,
+            batch_size=config.get("batchSize", EMBED_BATCH),
+            dim=config.get("dim"),
+        )
+    return HashingEmbedder(config.get("dim", DEFAULT_DIM))
+
+
+# ===============================================
+# インデックス
+# ===============================================
+
+def _kmeans(data: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """正規化済みベクトルの球面k-means（重心も正規化する）"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        empty = np.bincount(labels, minlength=clusters) == 0
+        # 空のクラスタは重心から最も遠い点で埋め直す
+        if empty.any():
+            farthest = np.argsort(np.max(data @ centroids.T, axis=1))[:int(empty.sum())]
+            sums[empty] = data[farthest]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class VectorIndex:
+    """
+    永続ベクトルインデックス（コサイン類似度）
+    同じディレクトリを開いた他のプロセスの書き込みは、次の検索時に世代番号で検出して読み直す
+    """
+
+    def __init__(self, directory: str, dim: int, embedder_name: str = "",
+                 max_entries: int = DEFAULT_MAX_ENTRIES, nprobe: int = IVF_NPROBE):
+        self.directory = directory
+        self.dim = dim
+        self.max_entries = max_entries
+        self.nprobe = nprobe
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._check_info(embedder_name)
+        self._generation = None
+        self._load()
+
+    # --- ファイル ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _check_info(self, embedder_name: str) -> None:
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        if "dim" in info and int(info["dim"]) != self.dim:
+            raise VectorStoreError(f"Index at {self.directory} has dim {info['dim']}, not {self.dim}")
+        if embedder_name and info.get("embedder") not in (None, embedder_name):
+            raise VectorStoreError(f"Index at {self.directory} was built with {info['embedder']}, not {embedder_name}")
+        with self._db:
+            self._db.execute("INSERT OR IGNORE INTO info VALUES ('dim', ?)", (str(self.dim),))
+            if embedder_name:
+                self._db.execute("INSERT OR IGNORE INTO info VALUES ('embedder', ?)", (embedder_name,))
+            self._db.execute("INSERT OR IGNORE INTO info VALUES ('generation', '0')")
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        with self._lock:
+            # 同じスレッドからの入れ子（upsert → train）は、既に取得したファイルロックをそのまま使う
+            if fcntl is None or self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            fd = os.open(self._path("lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                # ロック待ちの間に他のプロセスが書き込んでいれば読み直す
+                self._refresh()
+                yield
+            finally:
+                self._lock_depth = 0
+                os.close(fd)
+
+    def _map(self, name: str, dtype, rows: int, width: Optional[int], fill=None) -> np.memmap:
+        """行数rowsのファイルをmemmapで開く（足りなければ拡張）"""
+        path = self._path(name)
+        itemsize = np.dtype(dtype).itemsize * (width or 1)
+        current = os.path.getsize(path) if os.path.exists(path) else 0
+        if current < rows * itemsize:
+            with open(path, "ab") as f:
+                if fill is None:
+                    f.truncate(rows * itemsize)
+                else:
+                    f.write(np.full((rows - current // itemsize) * (width or 1), fill, dtype=dtype).tobytes())
+        rows = max(rows, current // itemsize)
+        shape = (rows, width) if width else (rows,)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _load(self) -> None:
+        """ファイルとSQLiteからメモリ上の状態（使用中スロット・IVFリスト）を作り直す"""
+        slots = np.fromiter((row[0] for row in self._db.execute("SELECT slot FROM entries")), dtype=np.int64)
+        high = int(slots.max()) + 1 if len(slots) else 0
+        capacity = max(high, _GROW_ROWS)
+        self._vectors = self._map("vectors.f32", np.float32, capacity, self.dim)
+        self._assign = self._map("assign.i32", np.int32, len(self._vectors), None, fill=-1)
+        self._valid = np.zeros(len(self._vectors), dtype=bool)
+        self._valid[slots] = True
+        self._high = high
+        self._count = len(slots)
+
+        self._centroids = None
+        self._lists: Dict[int, np.ndarray] = {}
+        self._trained_count = 0
+        if os.path.exists(self._path("centroids.npy")):
+            self._centroids = np.load(self._path("centroids.npy"))
+            self._trained_count = int(self._info("trained_count") or 0)
+            self._rebuild_lists()
+        self._generation = self._info("generation")
+
+    def _rebuild_lists(self) -> None:
+        assign = np.asarray(self._assign[:self._high])
+        valid = np.flatnonzero(self._valid[:self._high] & (assign >= 0))
+        order = valid[np.argsort(assign[valid], kind="stable")]
+        bounds = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+        self._lists = {c: order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))}
+
+    def _info(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _refresh(self) -> None:
+        if self._info("generation") != self._generation:
+            self._load()
+
+    def _bump_generation(self) -> None:
+        self._generation = str(int(self._generation or 0) + 1)
+        self._db.execute("UPDATE info SET value = ? WHERE key = 'generation'", (self._generation,))
+
+    def _ensure_capacity(self, rows: int) -> None:
+        if rows <= len(self._vectors):
+            return
+        capacity = max(rows, len(self._vectors) * 2, _GROW_ROWS)
+        self._vectors.flush()
+        self._assign.flush()
+        self._vectors = self._map("vectors.f32", np.float32, capacity, self.dim)
+        self._assign = self._map("assign.i32", np.int32, capacity, None, fill=-1)
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid
+        self._valid = valid
+
+    # --- 書き込み ---
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, contents: Sequence[str],
+               metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """IDが既にあれば置き換え、なければ空きスロットか末尾に追加（1トランザクション）"""
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        metadatas = metadatas or [{}] * len(ids)
+        now = time.time()
+
+        with self._write_lock():
+            existing = {}
+            for start in range(0, len(ids), 500):
+                chunk = list(ids[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(self._db.execute(
+                    f"SELECT id, slot FROM entries WHERE id IN ({placeholders})", chunk).fetchall())
+
+            new_count = sum(1 for i in dict.fromkeys(ids) if i not in existing)
+            free = np.flatnonzero(~self._valid[:self._high])[:new_count]
+            extra = new_count - len(free)
+            slots_for_new = iter([int(slot) for slot in free] + list(range(self._high, self._high + extra)))
+            self._ensure_capacity(self._high + extra)
+
+            slots = []
+            assigned = dict(existing)
+            for item_id in ids:
+                if item_id not in assigned:
+                    assigned[item_id] = next(slots_for_new)
+                slots.append(assigned[item_id])
+            slots_array = np.asarray(slots, dtype=np.int64)
+
+            self._vectors[slots_array] = vectors
+            self._valid[slots_array] = True
+            self._high = max(self._high, int(slots_array.max()) + 1)
+            if self._centroids is not None:
+                lists = np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+                self._assign[slots_array] = lists
+                # 置き換えで別のリストに移ったスロットは古いリストにも残る（検索時に除く）
+                for list_id in np.unique(lists):
+                    current = self._lists.get(int(list_id), np.empty(0, dtype=np.int64))
+                    self._lists[int(list_id)] = np.concatenate([current, slots_array[lists == list_id]])
+
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries (slot, id, content, metadata, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(slot, item_id, content, json.dumps(metadata, ensure_ascii=False, default=str), now, now)
+                     for slot, item_id, content, metadata in zip(slots, ids, contents, metadatas)],
+                )
+                self._count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                if self._count > self.max_entries:
+                    self._evict(self._count - self.max_entries)
+                self._bump_generation()
+            self._vectors.flush()
+            self._assign.flush()
+
+            if self._count >= IVF_MIN_ENTRIES and (self._centroids is None or self._count >= 2 * self._trained_count):
+                self.train()
+
+    def _evict(self, count: int) -> None:
+        """最終アクセスが古いものからcount件を削除（呼び出し側でトランザクション中）"""
+        rows = self._db.execute("SELECT slot FROM entries ORDER BY accessed ASC LIMIT ?", (count,)).fetchall()
+        slots = [row[0] for row in rows]
+        self._db.executemany("DELETE FROM entries WHERE slot = ?", [(slot,) for slot in slots])
+        self._valid[slots] = False
+        self._assign[slots] = -1
+        self._count -= len(slots)
+        self.evicted += len(slots)
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self._write_lock(), self._db:
+            slots = []
+            for item_id in ids:
+                row = self._db.execute("SELECT slot FROM entries WHERE id = ?", (item_id,)).fetchone()
+                if row:
+                    slots.append(row[0])
+            self._db.executemany("DELETE FROM entries WHERE slot = ?", [(slot,) for slot in slots])
+            self._valid[slots] = False
+            self._assign[slots] = -1
+            self._count -= len(slots)
+            self._bump_generation()
+        return len(slots)
+
+    def contains(self, ids: Sequence[str]) -> Set[str]:
+        """ids のうちインデックスに登録済みのもの"""
+        found: Set[str] = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = list(ids[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                found.update(row[0] for row in self._db.execute(
+                    f"SELECT id FROM entries WHERE id IN ({placeholders})", chunk))
+        return found
+
+    def reset(self) -> None:
+        with self._write_lock():
+            with self._db:
+                self._db.execute("DELETE FROM entries")
+                self._db.execute("DELETE FROM info WHERE key = 'trained_count'")
+                self._bump_generation()
+            for name in ("vectors.f32", "assign.i32", "centroids.npy"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._path(name))
+            self._load()
+
+    def train(self) -> None:
+        """IVFの重心（件数の平方根個）を学習し、全スロットを割り当て直す"""
+        with self._write_lock():
+            valid = np.flatnonzero(self._valid[:self._high])
+            if len(valid) < IVF_MIN_ENTRIES:
+                return
+            clusters = int(min(4096, max(16, np.sqrt(len(valid)))))
+            rng = np.random.default_rng(len(valid))
+            sample = np.sort(rng.choice(valid, min(64 * clusters, len(valid)), replace=False))
+            centroids = _kmeans(np.asarray(self._vectors[sample]), clusters).astype(np.float32)
+
+            for start in range(0, len(valid), 65536):
+                chunk = valid[start:start + 65536]
+                self._assign[chunk] = np.argmax(np.asarray(self._vectors[chunk]) @ centroids.T, axis=1)
+            self._assign.flush()
+            np.save(self._path("centroids.npy"), centroids)
+            self._centroids = centroids
+            self._trained_count = len(valid)
+            self._rebuild_lists()
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO info VALUES ('trained_count', ?)", (str(len(valid)),))
+                self._bump_generation()
+
+    # --- 検索 ---
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        if self._centroids is None:
+            return np.flatnonzero(self._valid[:self._high])
+        nearest = np.argsort(self._centroids @ query)[::-1][:self.nprobe]
+        candidates = np.unique(np.concatenate([self._lists.get(int(c), np.empty(0, dtype=np.int64)) for c in nearest]))
+        # 学習後に削除されたスロット・別のリストに移ったスロットを除く
+        candidates = candidates[self._valid[candidates]]
+        return candidates[np.isin(self._assign[candidates], nearest)]
+
+    def search(self, query: np.ndarray, limit: int = 5, score_threshold: float = 0.0,
+               exact: bool = False) -> List[Dict[str, Any]]:
+        """コサイン類似度の上位limit件（exact=TrueならIVFを使わず全件探索）"""
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            self._refresh()
+            if self._count == 0:
+                return []
+            if exact or self._centroids is None:
+                scores = np.asarray(self._vectors[:self._high]) @ query
+                scores[~self._valid[:self._high]] = -np.inf
+                candidates = None
+            else:
+                candidates = self._candidates(query)
+                scores = np.asarray(self._vectors[candidates]) @ query
+
+            k = min(limit, len(scores))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top = top[scores[top] >= score_threshold]
+            slots = top if candidates is None else candidates[top]
+            if not len(slots):
+                return []
+
+            placeholders = ",".join("?" * len(slots))
+            rows = {row[0]: row[1:] for row in self._db.execute(
+                f"SELECT slot, id, content, metadata FROM entries WHERE slot IN ({placeholders})",
+                [int(s) for s in slots])}
+            with self._db:
+                self._db.execute(f"UPDATE entries SET accessed = ? WHERE slot IN ({placeholders})",
+                                 [time.time(), *[int(s) for s in slots]])
+
+        results = []
+        for index, slot in zip(top, slots):
+            row = rows.get(int(slot))
+            if row is None:
+                continue
+            item_id, content, metadata = row
+            results.append({"id": item_id, "content": content, "metadata": json.loads(metadata or "{}"),
+                            "score": float(scores[index])})
+        return results
+
+    def __len__(self) -> int:
+        return self._count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self._count,
+            "capacity": len(self._vectors),
+            "ivf_lists": len(self._centroids) if self._centroids is not None else 0,
+            "evicted": self.evicted,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._vectors.flush()
+            self._assign.flush()
+            self._db.close()
+
+
+# ===============================================
+# CrewAIのStorage互換アダプター
+# ===============================================
+
+class VectorStorage:
+    """
+    CrewAIの memory（ShortTermMemory / EntityMemory の storage）として使うアダプター
+    save() は EMBED_BATCH 件たまるか検索・flush() の時点でまとめて埋め込み、インデックスに書き込む
+    """
+
+    def __init__(self, index: VectorIndex, embedder, score_threshold: Optional[float] = None):
+        self.index = index
+        self.embedder = embedder
+        # 特徴量ハッシングの類似度はモデルの埋め込みより低く出るため、CrewAIの既定値（0.6）を上書きできる
+        self.score_threshold = score_threshold
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def save(self, value: Any, metadata: Dict[str, Any]) -> None:
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        item_id = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+        with self._lock:
+            self._pending.append((item_id, text, metadata or {}))
+            full = len(self._pending) >= EMBED_BATCH
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        ids, texts, metadatas = zip(*pending)
+        self.index.upsert(ids, self.embedder.embed(texts), texts, metadatas)
+
+    def search(self, query: str, limit: int = 5, score_threshold: float = 0.6) -> List[Dict[str, Any]]:
+        self.flush()
+        threshold = score_threshold if self.score_threshold is None else self.score_threshold
+        return self.index.search(self.embedder.embed([query])[0], limit=limit, score_threshold=threshold)
+
+    async def asave(self, value: Any, metadata: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.save, value, metadata)
+
+    async def asearch(self, query: str, limit: int = 5, score_threshold: float = 0.6) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.search, query, limit, score_threshold)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending = []
+        self.index.reset()
+
+
+# プロセス内で開いたインデックス（同じクルーの実行間で共有）
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def crew_key(name: str, roles: Sequence[str]) -> str:
+    """クルー名とエージェント構成から保存先のディレクトリ名を作成"""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)[:48] or "crew"
+    digest = hashlib.sha256("\n".join(sorted(roles)).encode("utf-8")).hexdigest()[:8]
+    return f"{safe}-{digest}"
+
+
+def open_index(directory: str, dim: int, embedder_name: str = "",
+               max_entries: int = DEFAULT_MAX_ENTRIES) -> VectorIndex:
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = _indexes[directory] = VectorIndex(directory, dim, embedder_name, max_entries)
+        index.max_entries = max_entries
+        return index
+
+
+def open_storage(crew: str, kind: str, config: Optional[Dict[str, Any]] = None,
+                 base_url: str = "", api_key: str = "") -> VectorStorage:
+    """
+    クルーの記憶領域（kind: short_term / entities / knowledge など）を開く
+    config は memoryConfig（embedder・maxEntries・scoreThreshold・path）
+    """
+    config = config or {}
+    embedder = create_embedder(config.get("embedder"), base_url, api_key)
+    if embedder.dim is None:
+        # 次元が設定されていないモデルは1件埋め込んで確認する
+        embedder.dim = embedder.embed(["dimension probe"]).shape[1]
+    directory = os.path.join(config.get("path") or MEMORY_DIR, crew, kind)
+    index = open_index(directory, embedder.dim, embedder.name, config.get("maxEntries", DEFAULT_MAX_ENTRIES))
+    threshold = config.get("scoreThreshold", 0.1 if isinstance(embedder, HashingEmbedder) else None)
+    return VectorStorage(index, embedder, score_threshold=threshold)
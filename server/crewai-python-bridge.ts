@@ -5,11 +5,20 @@
 
 import { spawn } from "child_process";
 import * as path from "path";
+import * as readline from "readline";
+import type { Readable } from "stream";
 import { fileURLToPath } from "url";
 import { existsSync } from "fs";
 import * as db from "./db";
 import { Agent, Task, Crew } from "../drizzle/schema";
 import { emitCrewStart, emitCrewComplete, emitCrewError, emitLog } from "./_core/websocket";
+import { CrewAIWorkerPool } from "./crewai-worker-pool";
+import {
+  parseCrewAIEventFrame,
+  type CrewAIEventFrame,
+  type CrewAIResultChunkFrame,
+  type CrewAIBatchItemFrame,
+} from "@shared/crewaiEvents";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -40,6 +49,130 @@ function resolvePythonPath(): string {
   return "python3";
 }
 
+// イベント用の追加ファイルディスクリプタ（stdio[3]）
+export const CREWAI_EVENT_FD = 3;
+
+// エラー報告用に保持するstderrの最大長（verboseログ全体はメモリに溜めない）
+const STDERR_TAIL_LIMIT = 64 * 1024;
+
+/**
+ * stderrの末尾だけを保持
+ */
+export function appendTail(buffer: string, chunk: string, limit = STDERR_TAIL_LIMIT): string {
+  const combined = buffer + chunk;
+  return combined.length > limit ? combined.slice(combined.length - limit) : combined;
+}
+
+/**
+ * イベントチャネルのNDJSONを1行ずつ読み、フレームをコールバックへ渡す
+ */
+export function readEventFrames(
+  stream: Readable,
+  onFrame: (frame: CrewAIEventFrame) => void
+) {
+  const lines = readline.createInterface({ input: stream });
+  lines.on("line", (line) => {
+    const frame = parseCrewAIEventFrame(line);
+    if (frame) onFrame(frame);
+  });
+}
+
+/**
+ * 結果ストリーミングのチャンクを受け取り、最終結果の本文を組み立てる
+ * トークンチャンクはWebSocketへ転送するだけで保持しない
+ */
+export class ResultStreamAssembler {
+  private chunks = new Map<number, string>();
+
+  constructor(private executionId?: number) {}
+
+  accept(frame: CrewAIResultChunkFrame) {
+    if (frame.kind !== "token") {
+      this.chunks.set(frame.chunk, frame.text);
+    }
+    if (this.executionId !== undefined) {
+      emitLog(this.executionId, { ...frame, type: "result_chunk" });
+    }
+  }
+
+  /**
+   * バッチ実行の入力セットごとの結果をWebSocketへ転送（最終結果のitemsには成否のみが残る）
+   */
+  acceptBatchItem(frame: CrewAIBatchItemFrame) {
+    if (this.executionId !== undefined) {
+      emitLog(this.executionId, frame);
+    }
+  }
+
+  finish(result: PythonCrewAIResult): PythonCrewAIResult {
+    if (result.result_chunks) {
+      result.result = result.result_chunks.map((id) => this.chunks.get(id) ?? "").join("");
+    }
+    this.chunks.clear();
+    return result;
+  }
+}
+
+/**
+ * 結果ストリーミングを有効にするか（CREWAI_STREAM_RESULTS=false で無効化）
+ */
+function streamResultsEnabled(): boolean {
+  return process.env.CREWAI_STREAM_RESULTS !== "false";
+}
+
+/**
+ * Pythonプロセス用のクリーンな環境変数を作成
+ */
+function buildPythonEnv(): NodeJS.ProcessEnv {
+  // 環境変数を設定（venvが存在する場合のみVIRTUAL_ENVを設定）
+  const venvPath = path.join(__dirname, "../venv");
+  const venvExists = existsSync(venvPath);
+  return {
+    PYTHONUNBUFFERED: "1",
+    ...(venvExists ? { VIRTUAL_ENV: venvPath } : {}),
+    PATH: venvExists
+      ? `${path.join(venvPath, "bin")}:/usr/local/bin:/usr/bin:/bin`
+      : "/usr/local/bin:/usr/bin:/bin",
+    PYTHONPATH: "",
+    HOME: process.env.HOME,
+    USER: process.env.USER,
+    LANG: process.env.LANG || "en_US.UTF-8",
+    // OpenAI API keyを引き継ぐ
+    OPENAI_API_KEY: process.env.OPENAI_API_KEY,
+    // オフライン実行・ベンチマーク用の記録・再生サーバー（python/llm_replay.py）
+    ...(process.env.CREWAI_LLM_REPLAY_URL ? { CREWAI_LLM_REPLAY_URL: process.env.CREWAI_LLM_REPLAY_URL } : {}),
+    // イベントは標準エラー出力ではなく専用チャネルで受信
+    CREWAI_EVENT_FD: String(CREWAI_EVENT_FD),
+  };
+}
+
+let workerPool: CrewAIWorkerPool | null = null;
+
+/**
+ * 常駐ワーカープールを取得（初回呼び出し時に起動）
+ * CREWAI_WORKER_POOL_SIZE でワーカー数を指定（デフォルト: 2）
+ * CREWAI_WORKER_JOB_TIMEOUT_MS で1ジョブの最大実行時間を指定（デフォルト: 30分、0で無制限）
+ * CREWAI_WORKER_JOBS_PER_WORKER で1ワーカーが並行して実行するジョブ数を指定（デフォルト: 1）
+ */
+function getWorkerPool(): CrewAIWorkerPool {
+  if (!workerPool) {
+    const size = Math.max(1, parseInt(process.env.CREWAI_WORKER_POOL_SIZE || "2", 10) || 2);
+    const jobTimeout = parseInt(process.env.CREWAI_WORKER_JOB_TIMEOUT_MS || "", 10);
+    const jobsPerWorker = Math.max(1, parseInt(process.env.CREWAI_WORKER_JOBS_PER_WORKER || "1", 10) || 1);
+    console.log("[CrewAI Bridge] Starting worker pool, size:", size);
+    workerPool = new CrewAIWorkerPool({
+      pythonPath: resolvePythonPath(),
+      scriptPath: path.join(__dirname, "../python/crewai_engine.py"),
+      cwd: path.join(__dirname, ".."),
+      env: buildPythonEnv(),
+      size,
+      jobsPerWorker,
+      ...(Number.isNaN(jobTimeout) ? {} : { jobTimeoutMs: Math.max(0, jobTimeout) }),
+    });
+  }
+  return workerPool;
+}
+
 export interface PythonCrewAIResult {
   success: boolean;
   result?: string;
@@ -49,6 +182,61 @@ export interface PythonCrewAIResult {
   tasks_count?: number;
   token_usage?: number;
   cost?: number;
+  /** ストリーミング時、resultの本文を構成するチャンク番号 */
+  result_chunks?: number[];
+  stream?: {
+    chunks: number;
+    token_chunks: number;
+    task_outputs: { task: string; agent?: string; chunks: number[]; chars: number }[];
+  };
+  events?: {
+    sent: number;
+    dropped: Record<string, number>;
+    sampled_out: Record<string, number>;
+  };
+  usage?: {
+    source: string;
+    totals: PythonUsageBucket;
+    by_agent?: Record<string, PythonUsageBucket>;
+    by_task?: Record<string, PythonUsageBucket>;
+    by_model?: Record<string, PythonUsageBucket>;
+    latency?: Record<string, unknown>;
+  };
+  /** crewDataのbatchで実行した場合の件数・スループット */
+  batch?: {
+    items: number;
+    succeeded: number;
+    failed: number;
+    concurrency: number;
+    wall_seconds: number;
+    items_per_second: number | null;
+    tokens_per_second: number | null;
+  };
+  /** バッチ実行の入力セットごとの結果（ストリーミング時は成否のみ） */
+  items?: { index?: number; success: boolean; error?: string; [key: string]: unknown }[];
+  /** フェーズ別の所要時間（ミリ秒）とタスク・LLM・ツールの合計 */
+  timings?: {
+    phases_ms: Record<string, number>;
+    task?: { count: number; ms: number };
+    llm?: { count: number; ms: number };
+    tool?: { count: number; ms: number };
+  };
+  /** crewDataのprofileが有効な場合のスパン一覧とエクスポートしたファイル */
+  profile?: {
+    spans: unknown[];
+    dropped_spans: number;
+    sampler?: Record<string, unknown>;
+    files?: Record<string, string>;
+    export_error?: string;
+  };
+}
+
+export interface PythonUsageBucket {
+  calls: number;
+  prompt_tokens: number;
+  completion_tokens: number;
+  total_tokens: number;
+  cost: number;
 }
 
 /**
@@ -82,6 +270,7 @@ async function executePythonCrewAIMock(crewData: {
 
 /**
  * Python CrewAIエンジンを実行
+ * signal による中断はワーカーモードでのみ実行中のジョブへ伝わる
  */
 export async function executePythonCrewAI(crewData: {
   name: string;
@@ -89,7 +278,10 @@ export async function executePythonCrewAI(crewData: {
   verbose: boolean;
   agents: Agent[];
   tasks: Task[];
-}): Promise<PythonCrewAIResult> {
+  /** 指定するとクルー定義を入力セットごとに実行する（batchConcurrency件まで並行） */
+  batch?: Record<string, unknown>[];
+  batchConcurrency?: number;
+}, executionId?: number, signal?: AbortSignal): Promise<PythonCrewAIResult> {
   // 環境変数でモックモードを切り替え
   const mockEnvSetting = process.env.CREWAI_MOCK_MODE !== "false";
 
@@ -115,6 +307,16 @@ export async function executePythonCrewAI(crewData: {
     return executePythonCrewAIMock(crewData);
   }
 
+  // タスク出力とトークンを完了を待たずに受け取る
+  const stream = streamResultsEnabled();
+  const payload = stream ? { ...crewData, stream: true } : crewData;
+
+  // 常駐ワーカーモード: プロセス起動とimportのコストを省略
+  if (process.env.CREWAI_WORKER_MODE === "true") {
+    console.log("[CrewAI Bridge] Using WORKER POOL execution");
+    return getWorkerPool().execute(payload, executionId, signal);
+  }
+
   console.log("[CrewAI Bridge] Using REAL Python execution");
   // 本番実装（Python実行）
   return new Promise((resolve) => {
@@ -124,51 +326,67 @@ export async function executePythonCrewAI(crewData: {
     console.log("[CrewAI Bridge] __dirname:", __dirname);
     console.log("[CrewAI Bridge] Python command:", venvPython);
 
-    // 環境変数を設定（venvが存在する場合のみVIRTUAL_ENVを設定）
-    const venvPath = path.join(__dirname, "../venv");
-    const venvExists = existsSync(venvPath);
-    const cleanEnv: NodeJS.ProcessEnv = {
-      PYTHONUNBUFFERED: "1",
-      ...(venvExists ? { VIRTUAL_ENV: venvPath } : {}),
-      PATH: venvExists
-        ? `${path.join(venvPath, "bin")}:/usr/local/bin:/usr/bin:/bin`
-        : "/usr/local/bin:/usr/bin:/bin",
-      PYTHONPATH: "",
-      HOME: process.env.HOME,
-      USER: process.env.USER,
-      LANG: process.env.LANG || "en_US.UTF-8",
-      // OpenAI API keyを引き継ぐ
-      OPENAI_API_KEY: process.env.OPENAI_API_KEY,
-    };
+    const cleanEnv = buildPythonEnv();
 
     console.log("[CrewAI Bridge] Clean environment:", cleanEnv);
 
     const pythonProcess = spawn(venvPython, [pythonScript], {
       env: cleanEnv,
       cwd: path.join(__dirname, ".."),
+      stdio: ["pipe", "pipe", "pipe", "pipe"],
     });
 
     let stdout = "";
     let stderr = "";
+    let finalResult: PythonCrewAIResult | null = null;
+    const assembler = new ResultStreamAssembler(executionId);
 
-    // 入力データをJSON形式で送信
-    pythonProcess.stdin.write(JSON.stringify(crewData));
-    pythonProcess.stdin.end();
-
-    // 標準出力を受け取る
-    pythonProcess.stdout.on("data", (data) => {
-      stdout += data.toString();
+    // イベントチャネルのフレームをWebSocketへそのまま転送
+    readEventFrames(pythonProcess.stdio[CREWAI_EVENT_FD] as Readable, (frame) => {
+      if (executionId !== undefined) {
+        emitLog(executionId, frame);
+      }
     });
 
-    // 標準エラー出力を受け取る（ログ用）
-    pythonProcess.stderr.on("data", (data) => {
-      stderr += data.toString();
+    // 入力データをJSON形式で送信
+    pythonProcess.stdin!.write(JSON.stringify(payload));
+    pythonProcess.stdin!.end();
+
+    if (stream) {
+      // ストリーミング時の標準出力は改行区切りのチャンクフレームと最終結果フレーム
+      const lines = readline.createInterface({ input: pythonProcess.stdout! });
+      lines.on("line", (line) => {
+        if (!line.trim()) return;
+        let frame: any;
+        try {
+          frame = JSON.parse(line);
+        } catch {
+          console.log("[Python CrewAI] Non-frame output:", line);
+          return;
+        }
+        if (frame.type === "chunk") {
+          assembler.accept(frame);
+        } else if (frame.type === "batch_item") {
+          assembler.acceptBatchItem(frame);
+        } else if (frame.type === "result") {
+          finalResult = assembler.finish(frame.result);
+        } else {
+          // 初期化エラーなどストリーミング開始前の結果はそのまま扱う
+          finalResult = frame;
+        }
+      });
+    } else {
+      // 標準出力を受け取る
+      pythonProcess.stdout!.on("data", (data) => {
+        stdout += data.toString();
+      });
+    }
+
+    // 標準エラー出力を受け取る（ログ用、エラー報告には末尾のみ保持）
+    pythonProcess.stderr!.on("data", (data) => {
       const logMessage = data.toString();
+      stderr = appendTail(stderr, logMessage);
       console.log("[Python CrewAI]", logMessage);
-
-      // WebSocketでリアルタイムログを送信
-      // executionIdは外部スコープから取得する必要があるため、
-      // ここではログ出力のみを行う
     });
 
     // プロセス終了
@@ -181,6 +399,11 @@ export async function executePythonCrewAI(crewData: {
         return;
       }
 
+      if (stream) {
+        resolve(finalResult ?? { success: false, error: "Python process returned no result frame" });
+        return;
+      }
+
       try {
         const result = JSON.parse(stdout);
         resolve(result);
@@ -277,7 +500,7 @@ export async function executeCrewAI(crewId: number): Promise<{
       verbose: crew.verbose,
       agents: validAgents,
       tasks: validTasks,
-    });
+    }, execution.id);
     const executionTime = Date.now() - startTime;
 
     if (!pythonResult.success) {
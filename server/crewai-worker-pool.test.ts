@@ -0,0 +1,258 @@
+import { afterEach, beforeEach, describe, expect, it, vi } from "vitest";
+import { mkdtempSync, writeFileSync, rmSync } from "fs";
+import { tmpdir } from "os";
+import * as path from "path";
+
+vi.mock("./_core/websocket", () => ({
+  emitLog: vi.fn(),
+  emitCrewStart: vi.fn(),
+  emitCrewComplete: vi.fn(),
+  emitCrewError: vi.fn(),
+}));
+vi.mock("./db", () => ({}));
+
+import { emitLog } from "./_core/websocket";
+import { CrewAIWorkerPool, type WorkerPoolOptions } from "./crewai-worker-pool";
+import { ResultStreamAssembler } from "./crewai-python-bridge";
+import { parseCrewAIEventFrame } from "@shared/crewaiEvents";
+
+// crewai_engine.py --worker と同じフレームを返すNode製のワーカー
+// crew.mode: echo（結果を返す）/ stream（チャンク→結果）/ batch（入力セットごとの結果→集計）/ error / crash / hang / delay（crew.ms後に結果）
+// cancelフレームを受け取ったジョブIDは echo の結果に含める
+const FAKE_WORKER = `
+const fs = require("fs");
+const readline = require("readline");
+if (process.env.FAKE_WORKER_FAIL_ON_START) process.exit(3);
+const send = (frame) => process.stdout.write(JSON.stringify(frame) + "\\n");
+const cancelled = [];
+readline.createInterface({ input: process.stdin }).on("line", (line) => {
+  const frame = JSON.parse(line);
+  if (frame.type === "shutdown") process.exit(0);
+  if (frame.type === "cancel") {
+    cancelled.push(frame.id);
+    return send({ type: "error", id: frame.id, error: "Job cancelled" });
+  }
+  const crew = frame.crew || {};
+  fs.writeSync(3, JSON.stringify({ v: 1, seq: 1, type: "crew_start", data: { name: "c" }, timestamp: "t", job: frame.id }) + "\\n");
+  if (crew.mode === "crash") process.exit(1);
+  if (crew.mode === "hang") return;
+  if (crew.mode === "error") return send({ type: "error", id: frame.id, error: "bad crew" });
+  if (crew.mode === "stream") {
+    send({ type: "chunk", id: frame.id, chunk: 1, kind: "token", text: "tok" });
+    send({ type: "chunk", id: frame.id, chunk: 2, kind: "task_output", text: "Hello, " });
+    send({ type: "chunk", id: frame.id, chunk: 3, kind: "task_output", text: "world" });
+    return send({ type: "result", id: frame.id, result: { success: true, result: null, result_chunks: [2, 3] } });
+  }
+  if (crew.mode === "batch") {
+    send({ type: "batch_item", id: frame.id, index: 1, inputs: { topic: "b" }, result: { success: true, result: "B" } });
+    send({ type: "batch_item", id: frame.id, index: 0, inputs: { topic: "a" }, result: { success: false, error: "boom" } });
+    return send({ type: "result", id: frame.id, result: { success: true, result: "1/2 input sets succeeded", batch: { items: 2, succeeded: 1, failed: 1 } } });
+  }
+  const result = { success: true, result: "echo:" + JSON.stringify(crew), pid: process.pid, argv: process.argv.slice(2), cancelled };
+  if (crew.mode === "delay") return setTimeout(() => send({ type: "result", id: frame.id, result }), crew.ms);
+  send({ type: "result", id: frame.id, result });
+});
+`;
+
+describe("CrewAIWorkerPool", () => {
+  let dir: string;
+  let pool: CrewAIWorkerPool | null = null;
+
+  function createPool(overrides: Partial<WorkerPoolOptions> = {}, env: NodeJS.ProcessEnv = {}) {
+    pool = new CrewAIWorkerPool({
+      pythonPath: process.execPath,
+      scriptPath: path.join(dir, "worker.cjs"),
+      cwd: dir,
+      env: { PATH: process.env.PATH, ...env },
+      size: 1,
+      restartDelayMs: 10,
+      ...overrides,
+    });
+    return pool;
+  }
+
+  beforeEach(() => {
+    dir = mkdtempSync(path.join(tmpdir(), "crewai-pool-"));
+    writeFileSync(path.join(dir, "worker.cjs"), FAKE_WORKER);
+    vi.mocked(emitLog).mockClear();
+  });
+
+  afterEach(() => {
+    pool?.close();
+    pool = null;
+    rmSync(dir, { recursive: true, force: true });
+  });
+
+  it("runs jobs on a warm worker and forwards event frames", async () => {
+    const workers = createPool();
+    const first = await workers.execute({ mode: "echo", n: 1 }, 7);
+    const second = await workers.execute({ mode: "echo", n: 2 }, 7);
+
+    expect(first.success).toBe(true);
+    expect(first.result).toBe('echo:{"mode":"echo","n":1}');
+    // 同じワーカーが続けてジョブを処理する
+    expect((second as any).pid).toBe((first as any).pid);
+    expect(emitLog).toHaveBeenCalledWith(7, expect.objectContaining({ type: "crew_start" }));
+  });
+
+  it("assembles streamed result chunks", async () => {
+    const result = await createPool().execute({ mode: "stream" });
+    expect(result.result).toBe("Hello, world");
+  });
+
+  it("forwards batch item frames without finishing the job", async () => {
+    const result = await createPool().execute({ mode: "batch" }, 5);
+    expect(result.batch).toEqual({ items: 2, succeeded: 1, failed: 1 });
+    expect(emitLog).toHaveBeenCalledWith(5, expect.objectContaining({ type: "batch_item", index: 1 }));
+    expect(emitLog).toHaveBeenCalledWith(5, expect.objectContaining({ type: "batch_item", index: 0 }));
+  });
+
+  it("reports worker error frames without losing the worker", async () => {
+    const workers = createPool();
+    const failed = await workers.execute({ mode: "error" });
+    expect(failed).toEqual({ success: false, error: "bad crew" });
+    const next = await workers.execute({ mode: "echo" });
+    expect(next.success).toBe(true);
+  });
+
+  it("fails the running job and restarts a crashed worker", async () => {
+    const workers = createPool();
+    const crashed = await workers.execute({ mode: "crash" });
+    expect(crashed.success).toBe(false);
+    expect(crashed.error).toContain("exited with code 1");
+
+    const next = await workers.execute({ mode: "echo" });
+    expect(next.success).toBe(true);
+  });
+
+  it("stops restarting workers that keep failing", async () => {
+    const workers = createPool({ maxRestarts: 2 }, { FAKE_WORKER_FAIL_ON_START: "1" });
+    const result = await workers.execute({ mode: "echo" });
+    expect(result.success).toBe(false);
+    expect(result.error).toContain("exited with code 3");
+
+    // 10ms・20ms後の補充も失敗すると、それ以上は補充しない
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    const later = await workers.execute({ mode: "echo" });
+    expect(later).toEqual({ success: false, error: "No Python workers are running" });
+  });
+
+  it("times out hung jobs and replaces the worker", async () => {
+    const workers = createPool({ jobTimeoutMs: 200 });
+    const hung = await workers.execute({ mode: "hang" });
+    expect(hung.success).toBe(false);
+    expect(hung.error).toContain("timed out");
+
+    const next = await workers.execute({ mode: "echo" });
+    expect(next.success).toBe(true);
+  });
+
+  it("does not hand jobs to a worker that is being killed after a timeout", async () => {
+    const workers = createPool({ jobTimeoutMs: 200 });
+    const hung = workers.execute({ mode: "hang" });
+    // タイムアウトの解決直後（ワーカーの close より前）に投入する
+    const next = hung.then(() => workers.execute({ mode: "echo" }));
+
+    expect((await hung).error).toContain("timed out");
+    const result = await next;
+    expect(result.success).toBe(true);
+    expect(result.result).toBe('echo:{"mode":"echo"}');
+  });
+
+  it("runs several jobs at once on an async worker", async () => {
+    const workers = createPool({ jobsPerWorker: 2 });
+    const started = Date.now();
+    const [first, second] = await Promise.all([
+      workers.execute({ mode: "delay", ms: 300 }),
+      workers.execute({ mode: "delay", ms: 300 }),
+    ]);
+    expect((first as any).argv).toEqual(["--worker", "--async-jobs", "2"]);
+    expect((second as any).pid).toBe((first as any).pid);
+    expect(Date.now() - started).toBeLessThan(550);
+  });
+
+  it("cancels timed-out jobs on an async worker without restarting it", async () => {
+    const workers = createPool({ jobsPerWorker: 2, jobTimeoutMs: 200 });
+    const before = await workers.execute({ mode: "echo" });
+    const hung = await workers.execute({ mode: "hang" });
+    expect(hung.error).toContain("timed out");
+
+    const after = await workers.execute({ mode: "echo" });
+    expect((after as any).pid).toBe((before as any).pid);
+    expect((after as any).cancelled).toEqual(["job-2"]);
+  });
+
+  it("aborts queued and running jobs", async () => {
+    const workers = createPool({ jobsPerWorker: 2 });
+    const controller = new AbortController();
+    const running = [
+      workers.execute({ mode: "hang" }, undefined, controller.signal),
+      workers.execute({ mode: "delay", ms: 100 }),
+    ];
+    const queued = workers.execute({ mode: "echo" }, undefined, controller.signal);
+    controller.abort();
+
+    expect(await running[0]).toEqual({ success: false, error: "CrewAI job was cancelled" });
+    expect(await queued).toEqual({ success: false, error: "CrewAI job was cancelled" });
+    expect((await running[1]).success).toBe(true);
+
+    const next = await workers.execute({ mode: "echo" });
+    expect((next as any).cancelled).toEqual(["job-1"]);
+    const aborted = await workers.execute({ mode: "echo" }, undefined, controller.signal);
+    expect(aborted.error).toBe("CrewAI job was cancelled");
+  });
+
+  it("rejects jobs after close", async () => {
+    const workers = createPool();
+    workers.close();
+    const result = await workers.execute({ mode: "echo" });
+    expect(result).toEqual({ success: false, error: "Worker pool is closed" });
+  });
+});
+
+describe("ResultStreamAssembler", () => {
+  beforeEach(() => {
+    vi.mocked(emitLog).mockClear();
+  });
+
+  it("joins referenced chunks and forwards every chunk", () => {
+    const assembler = new ResultStreamAssembler(3);
+    assembler.accept({ type: "chunk", id: "job-1", chunk: 1, kind: "token", text: "x" });
+    assembler.accept({ type: "chunk", id: "job-1", chunk: 2, kind: "task_output", text: "a" });
+    assembler.accept({ type: "chunk", id: "job-1", chunk: 3, kind: "result", text: "b" });
+
+    const result = assembler.finish({ success: true, result_chunks: [2, 3] });
+    expect(result.result).toBe("ab");
+    expect(emitLog).toHaveBeenCalledTimes(3);
+    expect(emitLog).toHaveBeenCalledWith(3, expect.objectContaining({ type: "result_chunk", chunk: 1 }));
+  });
+
+  it("does not keep token chunks", () => {
+    const assembler = new ResultStreamAssembler();
+    assembler.accept({ type: "chunk", id: null, chunk: 1, kind: "token", text: "x" });
+    expect(assembler.finish({ success: true, result_chunks: [1] }).result).toBe("");
+    expect(emitLog).not.toHaveBeenCalled();
+  });
+
+  it("leaves unstreamed results unchanged", () => {
+    const result = new ResultStreamAssembler().finish({ success: true, result: "plain" });
+    expect(result.result).toBe("plain");
+  });
+});
+
+describe("parseCrewAIEventFrame", () => {
+  it("parses frames with the current schema version", () => {
+    const frame = parseCrewAIEventFrame(
+      JSON.stringify({ v: 1, seq: 4, type: "task_complete", data: { task_description: "t", output: "o" }, timestamp: "t", job: "job-2" })
+    );
+    expect(frame).toMatchObject({ seq: 4, type: "task_complete", job: "job-2" });
+  });
+
+  it("ignores blank, truncated and foreign lines", () => {
+    expect(parseCrewAIEventFrame("")).toBeNull();
+    expect(parseCrewAIEventFrame('{"v": 1, "seq": 1, "type": "crew_st')).toBeNull();
+    expect(parseCrewAIEventFrame(JSON.stringify({ v: 2, seq: 1, type: "crew_start" }))).toBeNull();
+    expect(parseCrewAIEventFrame(JSON.stringify({ v: 1, seq: 1 }))).toBeNull();
+    expect(parseCrewAIEventFrame("[CrewAI] verbose output")).toBeNull();
+  });
+});
@@ -0,0 +1,336 @@
+/**
+ * CrewAI Worker Pool
+ * crewai_engine.py を常駐ワーカーとして起動し、改行区切りJSONでジョブを投入するプール
+ * 異常終了したワーカーは指数バックオフで補充し、連続して起動に失敗した場合は補充を止める
+ * jobsPerWorker > 1 ではワーカーを --async-jobs で起動し、1プロセスのイベントループで複数ジョブを並行実行する
+ */
+
+import { spawn, type ChildProcess } from "child_process";
+import * as readline from "readline";
+import type { Readable } from "stream";
+import {
+  CREWAI_EVENT_FD,
+  readEventFrames,
+  ResultStreamAssembler,
+  type PythonCrewAIResult,
+} from "./crewai-python-bridge";
+import { emitLog } from "./_core/websocket";
+
+interface PendingJob {
+  resolve: (result: PythonCrewAIResult) => void;
+  executionId?: number;
+  assembler: ResultStreamAssembler;
+  timer?: ReturnType<typeof setTimeout>;
+  /** AbortSignalのリスナーを外す */
+  release?: () => void;
+}
+
+interface QueuedJob {
+  crewData: unknown;
+  executionId?: number;
+  resolve: (result: PythonCrewAIResult) => void;
+  signal?: AbortSignal;
+}
+
+interface Worker {
+  process: ChildProcess;
+  pending: Map<string, PendingJob>;
+  /** ジョブのタイムアウトでこちらから終了させた（異常終了として数えない） */
+  timedOut: boolean;
+}
+
+export interface WorkerPoolOptions {
+  pythonPath: string;
+  scriptPath: string;
+  cwd: string;
+  env: NodeJS.ProcessEnv;
+  size: number;
+  /** 1ジョブの最大実行時間（ミリ秒、0で無制限）。超えたワーカーは終了して補充する */
+  jobTimeoutMs?: number;
+  /** 補充までの初回の待ち時間（ミリ秒）。連続して異常終了するたびに倍にする */
+  restartDelayMs?: number;
+  /** 補充までの待ち時間の上限（ミリ秒） */
+  maxRestartDelayMs?: number;
+  /** ジョブを完了せずに連続して異常終了できる回数。超えると補充を止める */
+  maxRestarts?: number;
+  /**
+   * 1ワーカーで同時に実行するジョブ数（デフォルト: 1）
+   * 2以上ではタイムアウト・キャンセル時にワーカーを終了せず、cancelフレームで該当ジョブだけを止める
+   */
+  jobsPerWorker?: number;
+}
+
+export const DEFAULT_JOB_TIMEOUT_MS = 30 * 60 * 1000;
+export const DEFAULT_RESTART_DELAY_MS = 500;
+export const DEFAULT_MAX_RESTART_DELAY_MS = 30 * 1000;
+export const DEFAULT_MAX_RESTARTS = 5;
+
+export const JOB_CANCELLED_ERROR = "CrewAI job was cancelled";
+
+/**
+ * ウォームなPythonワーカーのプール
+ * 各ワーカーは同時に jobsPerWorker 件までジョブを実行し、空きがなければキューで待機する
+ */
+export class CrewAIWorkerPool {
+  private workers: Worker[] = [];
+  private queue: QueuedJob[] = [];
+  private nextJobId = 0;
+  private closed = false;
+  /** ジョブを完了せずに異常終了した回数（いずれかのワーカーが応答すると0に戻す） */
+  private consecutiveFailures = 0;
+  private restartTimers = new Set<ReturnType<typeof setTimeout>>();
+
+  constructor(private options: WorkerPoolOptions) {
+    for (let i = 0; i < options.size; i++) {
+      this.workers.push(this.spawnWorker());
+    }
+  }
+
+  private get jobsPerWorker(): number {
+    return Math.max(1, this.options.jobsPerWorker ?? 1);
+  }
+
+  private spawnWorker(): Worker {
+    const args = [this.options.scriptPath, "--worker"];
+    if (this.jobsPerWorker > 1) {
+      args.push("--async-jobs", String(this.jobsPerWorker));
+    }
+    const child = spawn(this.options.pythonPath, args, {
+      env: this.options.env,
+      cwd: this.options.cwd,
+      stdio: ["pipe", "pipe", "pipe", "pipe"],
+    });
+
+    const worker: Worker = { process: child, pending: new Map(), timedOut: false };
+
+    // 終了したワーカーへの書き込みエラー（EPIPE）はcloseで処理する
+    child.stdin!.on("error", () => {});
+
+    // イベントフレームはジョブIDから実行IDを引いてWebSocketへ転送
+    readEventFrames(child.stdio[CREWAI_EVENT_FD] as Readable, (frame) => {
+      const job = frame.job ? worker.pending.get(frame.job) : undefined;
+      if (job?.executionId !== undefined) {
+        emitLog(job.executionId, frame);
+      }
+    });
+
+    // 標準出力はレスポンスフレーム専用
+    const lines = readline.createInterface({ input: child.stdout! });
+    lines.on("line", (line) => {
+      if (!line.trim()) return;
+      let frame: any;
+      try {
+        frame = JSON.parse(line);
+      } catch {
+        console.log("[CrewAI Worker] Non-frame output:", line);
+        return;
+      }
+      const job = frame.id != null ? worker.pending.get(frame.id) : undefined;
+      if (!job) return;
+      // チャンクフレームとバッチの入力セットごとの結果はジョブ完了前に届く
+      if (frame.type === "chunk") {
+        job.assembler.accept(frame);
+        return;
+      }
+      if (frame.type === "batch_item") {
+        job.assembler.acceptBatchItem(frame);
+        return;
+      }
+      worker.pending.delete(frame.id);
+      if (job.timer) clearTimeout(job.timer);
+      job.release?.();
+      this.consecutiveFailures = 0;
+      job.resolve(
+        frame.type === "result"
+          ? job.assembler.finish(frame.result)
+          : { success: false, error: frame.error || "Unknown worker error" }
+      );
+      this.drain();
+    });
+
+    child.stderr!.on("data", (data) => {
+      console.log("[Python CrewAI Worker]", data.toString());
+    });
+
+    child.on("close", (code) => {
+      this.handleExit(worker, `Python worker exited with code ${code}`);
+    });
+
+    child.on("error", (error) => {
+      console.error("[CrewAI Worker] Failed to start:", error.message);
+      // 起動に失敗した場合はcloseが届かないことがある
+      if (child.pid === undefined) {
+        this.handleExit(worker, `Python worker failed to start: ${error.message}`);
+      }
+    });
+
+    return worker;
+  }
+
+  /**
+   * 終了したワーカーの実行中ジョブを失敗として解決し、バックオフ後に補充する
+   */
+  private handleExit(worker: Worker, error: string) {
+    const index = this.workers.indexOf(worker);
+    if (index < 0) return;
+    this.workers.splice(index, 1);
+
+    for (const job of Array.from(worker.pending.values())) {
+      if (job.timer) clearTimeout(job.timer);
+      job.release?.();
+      job.resolve({ success: false, error });
+    }
+    worker.pending.clear();
+    if (this.closed) return;
+
+    if (worker.timedOut) {
+      this.restartWorker(0);
+      return;
+    }
+
+    this.consecutiveFailures++;
+    const maxRestarts = this.options.maxRestarts ?? DEFAULT_MAX_RESTARTS;
+    if (this.consecutiveFailures > maxRestarts) {
+      console.error(
+        `[CrewAI Worker] ${this.consecutiveFailures} consecutive worker failures, not restarting`
+      );
+      this.failQueuedJobs(`Python workers keep exiting (${error})`);
+      return;
+    }
+    const base = this.options.restartDelayMs ?? DEFAULT_RESTART_DELAY_MS;
+    const cap = this.options.maxRestartDelayMs ?? DEFAULT_MAX_RESTART_DELAY_MS;
+    this.restartWorker(Math.min(cap, base * 2 ** (this.consecutiveFailures - 1)));
+  }
+
+  private restartWorker(delayMs: number) {
+    const timer = setTimeout(() => {
+      this.restartTimers.delete(timer);
+      if (this.closed) return;
+      this.workers.push(this.spawnWorker());
+      this.drain();
+    }, delayMs);
+    this.restartTimers.add(timer);
+  }
+
+  /**
+   * 補充を止めたあと、実行できるワーカーがなければ待機中のジョブを失敗にする
+   */
+  private failQueuedJobs(error: string) {
+    if (this.workers.length > 0 || this.restartTimers.size > 0) return;
+    for (const job of this.queue) {
+      job.resolve({ success: false, error });
+    }
+    this.queue = [];
+  }
+
+  private drain() {
+    while (this.queue.length > 0) {
+      // 終了させたワーカーは close が届くまで workers に残るため、新しいジョブを割り当てない
+      const worker = this.workers.find((w) => !w.timedOut && w.pending.size < this.jobsPerWorker);
+      if (!worker) return;
+      const job = this.queue.shift()!;
+      if (job.signal?.aborted) {
+        // 実行中のジョブのキャンセル処理中に取り出された（待機中のキャンセルより先に通知された）ジョブ
+        job.resolve({ success: false, error: JOB_CANCELLED_ERROR });
+        continue;
+      }
+      const id = `job-${++this.nextJobId}`;
+      const pending: PendingJob = {
+        resolve: job.resolve,
+        executionId: job.executionId,
+        assembler: new ResultStreamAssembler(job.executionId),
+      };
+      const timeoutMs = this.options.jobTimeoutMs ?? DEFAULT_JOB_TIMEOUT_MS;
+      if (timeoutMs > 0) {
+        pending.timer = setTimeout(
+          () => this.stopJob(worker, id, `CrewAI job timed out after ${timeoutMs} ms`),
+          timeoutMs
+        );
+      }
+      if (job.signal) {
+        const onAbort = () => this.stopJob(worker, id, JOB_CANCELLED_ERROR);
+        job.signal.addEventListener("abort", onAbort, { once: true });
+        pending.release = () => job.signal!.removeEventListener("abort", onAbort);
+      }
+      worker.pending.set(id, pending);
+      worker.process.stdin!.write(
+        JSON.stringify({ type: "job", id, crew: job.crewData }) + "\n"
+      );
+    }
+  }
+
+  /**
+   * 時間切れ・キャンセルされたジョブを失敗にして止める
+   * 1ジョブずつのワーカーは終了して補充し（closeで補充される）、並行実行のワーカーにはcancelフレームを送る
+   */
+  private stopJob(worker: Worker, id: string, error: string) {
+    const job = worker.pending.get(id);
+    if (!job) return;
+    worker.pending.delete(id);
+    if (job.timer) clearTimeout(job.timer);
+    job.release?.();
+    job.resolve({ success: false, error });
+    if (this.jobsPerWorker > 1) {
+      // ワーカーが返す "Job cancelled" のエラーフレームは、pendingにないため無視される
+      worker.process.stdin!.write(JSON.stringify({ type: "cancel", id }) + "\n");
+      this.drain();
+      return;
+    }
+    worker.timedOut = true;
+    worker.process.kill("SIGKILL");
+  }
+
+  /**
+   * クルー定義を空いているワーカーで実行
+   * signalが中断されると、待機中のジョブはキューから外し、実行中のジョブはワーカー上で止める
+   */
+  execute(crewData: unknown, executionId?: number, signal?: AbortSignal): Promise<PythonCrewAIResult> {
+    if (this.closed) {
+      return Promise.resolve({ success: false, error: "Worker pool is closed" });
+    }
+    if (this.workers.length === 0 && this.restartTimers.size === 0) {
+      return Promise.resolve({ success: false, error: "No Python workers are running" });
+    }
+    if (signal?.aborted) {
+      return Promise.resolve({ success: false, error: JOB_CANCELLED_ERROR });
+    }
+    return new Promise((resolve) => {
+      const job: QueuedJob = { crewData, executionId, resolve, signal };
+      if (signal) {
+        const onAbort = () => {
+          const index = this.queue.indexOf(job);
+          if (index < 0) return;
+          this.queue.splice(index, 1);
+          resolve({ success: false, error: JOB_CANCELLED_ERROR });
+        };
+        // キューから出た後のキャンセルは drain で登録するリスナーが処理する
+        signal.addEventListener("abort", onAbort, { once: true });
+        job.resolve = (result) => {
+          signal.removeEventListener("abort", onAbort);
+          resolve(result);
+        };
+      }
+      this.queue.push(job);
+      this.drain();
+    });
+  }
+
+  /**
+   * 全ワーカーを終了
+   */
+  close() {
+    this.closed = true;
+    for (const timer of Array.from(this.restartTimers)) {
+      clearTimeout(timer);
+    }
+    this.restartTimers.clear();
+    for (const worker of this.workers) {
+      worker.process.stdin!.write(JSON.stringify({ type: "shutdown" }) + "\n");
+      worker.process.stdin!.end();
+    }
+    for (const job of this.queue) {
+      job.resolve({ success: false, error: "Worker pool is closed" });
+    }
+    this.queue = [];
+  }
+}
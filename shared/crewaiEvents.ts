@@ -0,0 +1,104 @@
+/**
+ * CrewAIイベントチャネルのスキーマ
+ * python/event_channel.py が CREWAI_EVENT_FD に書き出すNDJSONフレームと対応
+ */
+
+export const CREWAI_EVENT_SCHEMA_VERSION = 1;
+
+export const CREWAI_EVENT_TYPES = [
+  "crew_start",
+  "crew_complete",
+  "task_start",
+  "task_complete",
+  "agent_action",
+  "warning",
+  "error",
+  "cache_hit",
+  "batch_start",
+  "batch_item",
+  "batch_complete",
+] as const;
+
+export type CrewAIEventType = (typeof CREWAI_EVENT_TYPES)[number];
+
+export interface CrewAIEventDataMap {
+  crew_start: { name: string; process?: string };
+  crew_complete: { name: string; process?: string };
+  task_start: { task_description: string; agent_role: string | null };
+  task_complete: { task_description: string; output: string };
+  agent_action: { agent_role: string; action: string };
+  warning: { message: string };
+  error: { message: string };
+  cache_hit: { name: string; key: string };
+  batch_start: { name: string; items: number; concurrency: number };
+  batch_item: { index: number; success: boolean; error?: string | null };
+  batch_complete: {
+    name: string;
+    items: number;
+    succeeded: number;
+    failed: number;
+    concurrency: number;
+    wall_seconds: number;
+    items_per_second: number | null;
+    tokens_per_second: number | null;
+  };
+}
+
+export interface CrewAIEventFrame<T extends CrewAIEventType = CrewAIEventType> {
+  /** スキーマバージョン */
+  v: typeof CREWAI_EVENT_SCHEMA_VERSION;
+  /** 送信対象イベントの通し番号（欠番はキュー溢れによる破棄を示す） */
+  seq: number;
+  type: T;
+  data: CrewAIEventDataMap[T];
+  timestamp: string;
+  /** ワーカーモードのジョブID */
+  job?: string;
+}
+
+/**
+ * 1行のNDJSONをイベントフレームとして解釈（不正な行はnull）
+ */
+export function parseCrewAIEventFrame(line: string): CrewAIEventFrame | null {
+  if (!line.trim()) return null;
+  try {
+    const frame = JSON.parse(line);
+    if (frame && frame.v === CREWAI_EVENT_SCHEMA_VERSION && typeof frame.type === "string") {
+      return frame as CrewAIEventFrame;
+    }
+  } catch {
+    // 不完全な行は無視
+  }
+  return null;
+}
+
+/**
+ * 結果ストリーミングのチャンクフレーム（python/result_stream.py と対応）
+ * task_output / result は最終結果の本文、token はLLMの生成途中のトークン
+ */
+export interface CrewAIResultChunkFrame {
+  type: "chunk";
+  /** ワーカーモードのジョブID（単発実行ではnull） */
+  id: string | null;
+  /** ジョブ内の通し番号。最終結果の result_chunks から参照される */
+  chunk: number;
+  kind: "task_output" | "token" | "result";
+  text: string;
+  task?: string;
+  agent?: string;
+  run?: string;
+}
+
+/**
+ * バッチ実行（crewDataのbatch）で入力セットが完了するごとに届く結果フレーム（python/crewai_engine.py と対応）
+ */
+export interface CrewAIBatchItemFrame {
+  type: "batch_item";
+  /** ワーカーモードのジョブID（単発実行ではnull） */
+  id: string | null;
+  /** batch内の入力セットの位置 */
+  index: number;
+  inputs: Record<string, unknown>;
+  /** 入力セット1件分のクルー実行結果 */
+  result: { success: boolean; result?: string; error?: string; [key: string]: unknown };
+}